@@ -0,0 +1,152 @@
+"""
+Context compaction for the agent loop
+Every iteration of the agent sends the whole conversation to the LLM, so
+tool outputs (execute_code stdout, dataset stats, execution histories)
+are paid for again on every call. Before each call, tool outputs that are
+superseded by a later call of the same snapshot tool, or that are older
+than the most recent few, are replaced in the prompt by a short digest
+with a handle; ``get_tool_result`` returns the full text to the same session
+(handles are only looked up within the session that compacted them). The
+graph state itself is not changed.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+# Tools whose output is a snapshot of session state: only the latest call is current
+SNAPSHOT_TOOLS = {'get_dataset_info', 'list_datasets', 'list_models', 'list_versions', 'get_execution_history'}
+
+# Fields worth keeping in a digest, nested results included
+DIGEST_FIELDS = ('success', 'message', 'error_type', 'limit', 'dataset_shape', 'type', 'shape', 'handle',
+                 'cursor', 'model', 'cv_score', 'version')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English and JSON)."""
+    return (len(text) + 3) // 4
+
+
+def _clip(value: Any, limit: int = 120) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit - 3] + "..."
+    return value
+
+
+def digest(content: str) -> str:
+    """Key facts of a tool output: status, message, shapes and result handles."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return json.dumps(_clip(content.strip(), 160))
+    if not isinstance(data, dict):
+        kind = f"list of {len(data)}" if isinstance(data, list) else type(data).__name__
+        return json.dumps({'type': kind})
+    facts = {k: _clip(data[k]) for k in DIGEST_FIELDS if k in data}
+    if isinstance(data.get('output'), str) and data['output'].strip():
+        facts['output'] = _clip(data['output'].strip(), 80)
+    for key, value in data.items():
+        if isinstance(value, dict) and key not in facts:
+            nested = {k: _clip(value[k]) for k in DIGEST_FIELDS if k in value}
+            if nested:
+                facts[key] = nested
+    return json.dumps(facts, default=str)
+
+
+class ToolOutputArchive:
+    """
+    Full text of compacted tool outputs by session and tool call id, bounded by
+    total size (oldest dropped first). A handle is only found in its own session.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._outputs: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, handle: str, content: str, session: str = "default"):
+        key = (session, handle)
+        with self._lock:
+            if key in self._outputs:
+                self._outputs.move_to_end(key)
+                return
+            self._outputs[key] = content
+            self._bytes += len(content)
+            while self._bytes > self.max_bytes and len(self._outputs) > 1:
+                _, dropped = self._outputs.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def get(self, handle: str, session: str = "default") -> Optional[str]:
+        with self._lock:
+            return self._outputs.get((session, handle))
+
+
+class ContextCompactor:
+    """
+    Replaces stale tool outputs in the prompt with digests. The ``keep_recent``
+    newest tool outputs are always sent verbatim, as are outputs shorter than
+    ``min_chars`` (their digest would not be much shorter).
+    """
+
+    def __init__(self, enabled: bool = True, keep_recent: int = 4, min_chars: int = 400,
+                 archive: Optional[ToolOutputArchive] = None):
+        self.enabled = enabled
+        self.keep_recent = keep_recent
+        self.min_chars = min_chars
+        self.archive = archive or ToolOutputArchive()
+
+    @classmethod
+    def from_env(cls) -> 'ContextCompactor':
+        """Read AGENT_CONTEXT_COMPACTION (on/off), AGENT_CONTEXT_KEEP_RECENT (4), AGENT_CONTEXT_MIN_CHARS (400) and AGENT_CONTEXT_ARCHIVE_MB (64)."""
+        return cls(
+            enabled=os.getenv("AGENT_CONTEXT_COMPACTION", "on").strip().lower() not in ("off", "false", "0"),
+            keep_recent=int(os.getenv("AGENT_CONTEXT_KEEP_RECENT", "4")),
+            min_chars=int(os.getenv("AGENT_CONTEXT_MIN_CHARS", "400")),
+            archive=ToolOutputArchive(int(float(os.getenv("AGENT_CONTEXT_ARCHIVE_MB", "64")) * 1024 * 1024)),
+        )
+
+    def _stale(self, messages: List[BaseMessage]) -> Dict[int, str]:
+        """Positions of tool messages to compact, with the reason."""
+        tool_positions = [i for i, m in enumerate(messages) if isinstance(m, ToolMessage)]
+        recent = set(tool_positions[-self.keep_recent:]) if self.keep_recent > 0 else set()
+        latest_snapshot = {}
+        for i in tool_positions:
+            if messages[i].name in SNAPSHOT_TOOLS:
+                latest_snapshot[messages[i].name] = i
+        stale = {}
+        for i in tool_positions:
+            message = messages[i]
+            if len(str(message.content)) < self.min_chars or message.name == 'get_tool_result':
+                continue
+            if message.name in SNAPSHOT_TOOLS and latest_snapshot[message.name] != i:
+                stale[i] = 'superseded'
+            elif i not in recent:
+                stale[i] = 'old'
+        return stale
+
+    def compact(self, messages: List[BaseMessage], session: str = "default") -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """Return the messages to send and a report of what was compacted and the tokens saved; full texts are archived under ``session``."""
+        report = {'compacted': 0, 'superseded': 0, 'tokens_before': 0, 'tokens_after': 0, 'tokens_saved': 0}
+        stale = self._stale(messages) if self.enabled else {}
+        compacted = []
+        for i, message in enumerate(messages):
+            content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+            report['tokens_before'] += estimate_tokens(content)
+            if i in stale:
+                handle = message.tool_call_id
+                self.archive.put(handle, content, session)
+                content = (f"[{stale[i]} {message.name} output compacted from {len(content)} chars; "
+                           f"call get_tool_result('{handle}') for the full text] {digest(content)}")
+                message = ToolMessage(content=content, name=message.name, tool_call_id=message.tool_call_id,
+                                      id=message.id)
+                report['compacted'] += 1
+                report['superseded'] += stale[i] == 'superseded'
+            report['tokens_after'] += estimate_tokens(content)
+            compacted.append(message)
+        report['tokens_saved'] = report['tokens_before'] - report['tokens_after']
+        return compacted, report
@@ -1,58 +1,209 @@
 import json
-from typing import Dict, Any, List, Optional, Annotated, Sequence
+from typing import Callable, Dict, Any, List, Optional, Annotated, Sequence
 import operator
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, BaseMessage
 from langchain_core.tools import tool
+from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.graph import StateGraph, END, START, MessagesState
+from langgraph.config import get_stream_writer
 import config
-from tools.dataset_tools import dataset_tools
+from tools.dataset_tools import get_dataset_tools
+from agent.context_compaction import ContextCompactor, estimate_tokens
+from agent.model_router import ModelRouter
+from agent.resilience import ResiliencePolicy
+from agent.loop_budget import LoopBudget, call_key, final_answer_prompt, EXHAUSTED_REASONS
+from observability.metrics import metrics, start_http_server
+from observability.tracing import install_local_tracing
+import multiprocessing
 import os
 
-# Set up LangSmith tracing
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
-os.environ["LANGCHAIN_API_KEY"] = config.LANGSMITH_API_KEY
-os.environ["LANGCHAIN_PROJECT"] = config.LANGSMITH_PROJECT
-os.environ["LANGCHAIN_ENDPOINT"] = config.LANGSMITH_ENDPOINT
+# Worker processes (the training pool) import the main module again while they start;
+# the exporter and tracing set-up below belong to the parent process only
+_WORKER_BOOTSTRAP = (multiprocessing.parent_process() is not None
+                     or getattr(multiprocessing.current_process(), '_inheriting', False))
+
+# Set up tracing: AGENT_TRACING=langsmith (default), local (spans to .traces/) or off
+TRACING_MODE = os.getenv("AGENT_TRACING", "langsmith").lower()
+if TRACING_MODE == "langsmith" and not _WORKER_BOOTSTRAP:
+    os.environ["LANGCHAIN_TRACING_V2"] = "true"
+    os.environ["LANGCHAIN_API_KEY"] = config.LANGSMITH_API_KEY
+    os.environ["LANGCHAIN_PROJECT"] = config.LANGSMITH_PROJECT
+    os.environ["LANGCHAIN_ENDPOINT"] = config.LANGSMITH_ENDPOINT
+elif not _WORKER_BOOTSTRAP:
+    # Never ship runs to a remote endpoint unless LangSmith was asked for
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    os.environ["LANGSMITH_TRACING"] = "false"
+    if TRACING_MODE == "local":
+        install_local_tracing()
+
+# Expose local metrics over HTTP when requested (AGENT_METRICS_ENABLED=true, AGENT_METRICS_PORT=9464)
+if metrics.enabled and os.getenv("AGENT_METRICS_PORT") and not _WORKER_BOOTSTRAP:
+    try:
+        start_http_server(int(os.environ["AGENT_METRICS_PORT"]), os.getenv("AGENT_METRICS_HOST", "127.0.0.1"))
+    except OSError as e:
+        print(f"Warning: Could not start metrics exporter: {e}")
+
+# Deadlines, retries with jittered backoff, hedging and circuit breaking for LLM calls (AGENT_LLM_*)
+resilience = ResiliencePolicy.from_env()
 
 # Initialize the LLM
-llm = ChatOpenAI(
-    model=config.MODEL_NAME,
-    temperature=config.TEMPERATURE,
-    api_key=config.OPENAI_API_KEY
-)
+def _chat_model(model_name: str) -> ChatOpenAI:
+    options = {}
+    if resilience.enabled:
+        # The resilience policy retries; the client's HTTP timeout releases abandoned attempts
+        options = {'max_retries': 0, 'timeout': resilience.timeout_seconds}
+    return ChatOpenAI(
+        model=model_name,
+        temperature=config.TEMPERATURE,
+        api_key=config.OPENAI_API_KEY,
+        **options
+    )
+
+llm = _chat_model(config.MODEL_NAME)
+
+# Optional fast tier for summaries and simple follow-ups (AGENT_FAST_MODEL)
+router = ModelRouter.from_env(llm, make_model=_chat_model, resilience=resilience)
+
+def set_llm_rate_limit(requests_per_second: Optional[float], max_bucket_size: float = 1):
+    """Throttle LLM calls of every model tier across all sessions in this process (None removes the limit)."""
+    limiter = InMemoryRateLimiter(
+        requests_per_second=requests_per_second,
+        max_bucket_size=max_bucket_size
+    ) if requests_per_second else None
+    for model in router.models.values():
+        if model is not None:
+            model.rate_limiter = limiter
+
+if os.getenv("AGENT_LLM_RPS"):
+    set_llm_rate_limit(float(os.environ["AGENT_LLM_RPS"]))
+
+# Stale tool outputs are replaced by digests in the prompt (AGENT_CONTEXT_COMPACTION=off disables)
+compactor = ContextCompactor.from_env()
+
+# Per-turn limits on LLM calls, tokens, wall time and repeated tool calls
+loop_budget = LoopBudget.from_env()
+
+def _stream_writer():
+    """The graph's custom stream writer inside a run (see ``stream_mode="custom"``), else None."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return None
 
 # Tool definitions
 @tool
-def load_dataset(dataset_name: str = "iris") -> str:
-    """Load a dataset for analysis. Currently supports 'iris' dataset."""
-    if dataset_name.lower() == "iris":
-        result = dataset_tools.load_iris_dataset()
-        if result['success']:
-            return json.dumps(result, indent=2)
-        else:
-            return f"Error loading dataset: {result['message']}"
+def load_dataset(dataset_name: str = "iris", name: Optional[str] = None, lazy: bool = False) -> str:
+    """Load a dataset for analysis: 'iris' or a path to a CSV/Parquet/JSON file. It is registered under `name` (default: the file name) and becomes the active `df`; earlier datasets stay available by name. With lazy=True the file is read only when first used."""
+    result = get_dataset_tools().load_dataset(dataset_name, name=name, lazy=lazy, activate=not lazy)
+    if result['success']:
+        return json.dumps(result, indent=2, default=str)
     else:
-        return f"Dataset '{dataset_name}' not supported yet. Please use 'iris'."
+        return f"Error loading dataset: {result['message']}"
+
+@tool
+def list_datasets() -> str:
+    """List the named datasets of this session with their shape, memory use and which one is active as `df`."""
+    result = get_dataset_tools().list_datasets()
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def switch_dataset(name: str) -> str:
+    """Make another named dataset the active `df` (no reload)."""
+    result = get_dataset_tools().switch_dataset(name)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def list_versions(name: Optional[str] = None) -> str:
+    """List the recorded versions of a dataset (default: all datasets): each change made by code or run_sql(into=...) with its id, parent, shape and whether it is the current state (head)."""
+    result = get_dataset_tools().list_versions(name)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def undo_dataset(name: Optional[str] = None) -> str:
+    """Undo the last change to a dataset (default: the active `df`), restoring the version before it."""
+    result = get_dataset_tools().undo_dataset(name)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def checkout_dataset(version: int) -> str:
+    """Restore a dataset to a specific version id from list_versions."""
+    result = get_dataset_tools().checkout_dataset(version)
+    return json.dumps(result, indent=2, default=str)
 
 @tool
 def get_dataset_info() -> str:
     """Get information about the currently loaded dataset."""
-    result = dataset_tools.get_dataset_info()
+    result = get_dataset_tools().get_dataset_info()
     return json.dumps(result, indent=2)
 
 @tool
-def execute_code(code: str) -> str:
-    """Execute Python code on the current dataset. The dataset is available as 'df'."""
-    result = dataset_tools.execute_python_code(code)
+def execute_code(code: str, return_result: bool = True, profile: bool = False) -> str:
+    """Execute Python code on the current dataset. The dataset is available as 'df'. The value of the last expression is returned as a typed 'result' (DataFrames/Series as a row-limited preview with schema, true shape and a handle). Set profile=True to also get the slowest functions and snippet lines, peak memory and the largest allocations."""
+    # Prints and progress() calls are streamed as custom graph events while the code runs
+    result = get_dataset_tools().execute_python_code(code, return_result=return_result, profile=profile,
+                                                     on_output=_stream_writer())
     # Ensure we return a proper JSON string
     return json.dumps(result, indent=2, default=str)
 
+@tool
+def list_variables() -> str:
+    """List the variables kept between execute_code calls (kernel mode): name, type, shape, memory and idle time."""
+    result = get_dataset_tools().list_variables()
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def drop_variable(name: str) -> str:
+    """Forget a variable kept between execute_code calls to free its memory."""
+    result = get_dataset_tools().drop_variable(name)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def get_result(handle: str, start: int = 0, rows: int = 20) -> str:
+    """Page through rows of a stored result (e.g. 'r3') from an earlier execute_code call without recomputing it."""
+    result = get_dataset_tools().get_result(handle, start, rows)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def run_sql(query: str, rows: Optional[int] = None, into: Optional[str] = None) -> str:
+    """Run a SQL query (DuckDB dialect) over the loaded datasets: the active dataset is `df` and every named dataset is a table of the same name; lazily registered files are scanned from disk. Returns the first batch of rows and a `cursor` if more remain. Set `into` to store the full result as a new named dataset instead."""
+    result = get_dataset_tools().run_sql(query, rows=rows, into=into)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def fetch_sql(cursor: str, rows: Optional[int] = None) -> str:
+    """Fetch the next batch of rows from a run_sql cursor."""
+    result = get_dataset_tools().fetch_sql(cursor, rows)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def train_model(target: str, features: Optional[List[str]] = None, estimator: str = "random_forest", cv: int = 5,
+                params: Optional[Dict[str, Any]] = None, param_grid: Optional[Dict[str, List[Any]]] = None,
+                metric: Optional[str] = None, name: Optional[str] = None) -> str:
+    """Train and cross-validate a model on the active dataset using all CPU cores. estimator: random_forest, gradient_boosting, extra_trees, decision_tree, logistic_regression, linear_regression, ridge or knn (classification vs regression is inferred from the target). features defaults to every other column (text columns are one-hot encoded). params are fixed hyperparameters; param_grid (e.g. {"max_depth": [4, 8, null]}) is searched with every candidate and fold in parallel. metric is any scikit-learn scorer name (default accuracy / r2). Returns per-fold scores and timings; the refitted best model is stored as models[name]."""
+    result = get_dataset_tools().train_model(target, features=features, estimator=estimator, cv=cv, params=params,
+                                             param_grid=param_grid, metric=metric, name=name)
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def list_models() -> str:
+    """List the fitted models stored with `models.fit(...)` in code: class, features, target, hyperparameters, fit time and whether they are stale (trained on an older version of df)."""
+    result = get_dataset_tools().list_models()
+    return json.dumps(result, indent=2, default=str)
+
+@tool
+def get_tool_result(handle: str, start: int = 0, length: int = 4000) -> str:
+    """Get the full text of an earlier tool output that was compacted in the conversation, by the handle named in its digest. Use start/length to read long outputs in parts."""
+    content = compactor.archive.get(handle, get_dataset_tools().session_id)
+    if content is None:
+        return json.dumps({'success': False, 'message': f"Unknown or expired tool output handle '{handle}'"})
+    return content[start:start + length]
+
 @tool
 def create_visualization(code: str) -> str:
-    """Execute Python code to create a visualization. The code should generate a plot using matplotlib/seaborn/plotly, and the resulting image will be returned as PNG bytes."""
+    """Execute Python code to create a visualization. The code should generate a plot using matplotlib/seaborn, which is saved as a PNG, or end with a Plotly figure (e.g. `px.scatter(df, ...)`), which is saved as an interactive JSON spec rendered by the client."""
     import base64
-    result = dataset_tools.create_visualization(code)
+    result = get_dataset_tools().create_visualization(code)
     if result['success'] and 'plot_data' in result:
         # Convert bytes to base64 string for JSON serialization
         result['plot_data'] = base64.b64encode(result['plot_data']).decode('utf-8')
@@ -61,20 +212,32 @@ def create_visualization(code: str) -> str:
 @tool
 def get_execution_history() -> str:
     """Get the history of executed code."""
-    history = dataset_tools.get_execution_history()
+    history = get_dataset_tools().get_execution_history()
     return json.dumps(history, indent=2)
 
 # Create the tools list
-tools = [load_dataset, get_dataset_info, execute_code, create_visualization, get_execution_history]
+tools = [load_dataset, list_datasets, switch_dataset, list_versions, undo_dataset, checkout_dataset, get_dataset_info,
+         execute_code, list_variables, drop_variable, get_result, run_sql, fetch_sql, train_model, list_models,
+         get_tool_result, create_visualization, get_execution_history]
 
 # System prompt for the agent
 SYSTEM_PROMPT = """You are a data analysis AI agent that helps users analyze datasets using Python code.
 
 Available tools:
-- load_dataset: Load a dataset (currently supports 'iris')
+- load_dataset: Load a dataset ('iris' or a path to a CSV/Parquet/JSON file) under a name; it becomes the active 'df'
+- list_datasets: List the named datasets with their shape and memory use
+- switch_dataset: Make another named dataset the active 'df' without reloading it
+- list_versions / undo_dataset / checkout_dataset: Show the recorded versions of a dataset, undo its last change or restore a version
 - get_dataset_info: Get information about the current dataset
-- execute_code: Execute Python code on the dataset (available as 'df')
-- create_visualization: Execute Python code to create a visualization (provide the code as a string; the code should generate a plot using matplotlib/seaborn/plotly, and the resulting image will be returned as PNG bytes)
+- execute_code: Execute Python code on the dataset (available as 'df'); the last expression's value is returned as a typed result
+- list_variables / drop_variable: List or drop the variables kept between execute_code calls (kernel mode)
+- get_result: Page through rows of a stored result by its handle
+- run_sql: Run a SQL query over the datasets (tables: df and each dataset name); results come back in batches with a cursor
+- fetch_sql: Fetch the next batch of a run_sql cursor
+- train_model: Cross-validate a model (optionally with a hyperparameter grid) in parallel on all cores
+- list_models: List fitted models stored with models.fit(...) or train_model
+- get_tool_result: Get the full text of an earlier tool output that was compacted to a digest
+- create_visualization: Execute Python code to create a visualization (provide the code as a string; matplotlib/seaborn plots are saved as PNG; if the code ends with a Plotly figure, e.g. `px.histogram(df, x='target')`, it is saved as an interactive JSON chart instead, which is cheaper for large data)
 - get_execution_history: Get history of executed code
 
 When the user asks for analysis, you should:
@@ -84,14 +247,36 @@ When the user asks for analysis, you should:
 4. Write and execute Python code to create visualizations if requested (using the create_visualization tool)
 5. Provide clear explanations of your findings
 
-CRITICAL: Always use print() statements to display results. For example:
-- Use: print(df['column_name'].mean())
-- NOT: df['column_name'].mean()
+RESULTS: End your code with the expression you want to see instead of printing it. For example:
+- Use: df.groupby('species').mean(numeric_only=True)
+- NOT: print(df.groupby('species').mean(numeric_only=True))
+DataFrames and Series come back as a compact preview with schema, true shape and a handle such as 'r3'.
+Reuse earlier results in later code as results['r3'] instead of recomputing them, and use get_result to see more rows.
+Use print() only for short extra messages.
+If execute_code results include 'variables', kernel mode is on: variables you define (e.g. `corr = df.corr()`, a fitted scaler) stay available in later snippets, so reuse them instead of recomputing. Variables may be evicted when memory runs low; check 'evicted' or list_variables.
+Older tool outputs in the conversation may be compacted to a short digest with a handle; call get_tool_result with that handle only when you need details the digest leaves out.
 
 IMPORTANT: You can use import statements for any library you need. Common libraries are pre-loaded:
 - pandas (pd), numpy (np), matplotlib (plt), seaborn (sns), plotly (px, go), scikit-learn
 - You can also import additional libraries as needed
 
+Large matplotlib/seaborn plots are aggregated automatically (density bins for scatter, downsampled lines, precomputed histogram bins); if a visualization result has an 'aggregation' field, tell the user how the data was summarized.
+
+Prints from execute_code are shown to the user while the code runs. In long loops (folds, epochs, batches) call `progress(i + 1, total, 'fitting fold')` so the user can follow along.
+
+Code runs under time and memory limits. If a result reports 'limit_exceeded', the dataset is unchanged: rewrite the code with a cheaper, vectorized approach (or sample the data) instead of retrying it. If a result lists 'slow_patterns' (or execution was refused with 'slow_pattern'), rewrite those lines as its suggestions say. When code is slow, re-run it with profile=True: the 'profile' shows which functions and lines took the time and memory, so you can rewrite exactly that part.
+
+MULTIPLE DATASETS: Every loaded dataset is also available in code by its name (e.g. `sales`) and as `datasets['sales']`, so join them directly, e.g. `df.merge(customers, on='customer_id')`. Store a derived table for later steps with `datasets['joined'] = ...`.
+
+VERSIONS: Every change code makes to a dataset (e.g. `df = df[df['x'] > 0]`) is recorded. If a change was wrong, call undo_dataset (or checkout_dataset with an id from list_versions) instead of reloading the data.
+
+MODELS: Fit models through the registry so follow-up questions reuse them instead of retraining:
+`rf = models.fit('rf', RandomForestClassifier(n_estimators=200), df[features], df['species'])`, then later `models['rf'].feature_importances_`.
+For cross-validation or hyperparameter search use the train_model tool instead of writing the loop in code; it runs folds and candidates in parallel on all cores and stores the best model as models[name].
+For statsmodels pass the unfitted model: `ols = models.fit('ols', smf.ols('y ~ x', data=df))`. The same call returns the stored model when data, features and hyperparameters are unchanged.
+
+SQL: Prefer run_sql for filter/group-by/join/aggregate questions; it is multithreaded and reads large files without loading them into pandas. Select only the columns you need. Inside Python code, `sql("SELECT ...")` returns a DataFrame.
+
 Always write safe, well-documented Python code. The dataset is available as 'df' in your code.
 Use the pre-loaded libraries: pandas (pd), numpy (np), matplotlib (plt), seaborn (sns), plotly (px, go), and scikit-learn."""
 
@@ -101,36 +286,112 @@ tools_by_name = {tool.name: tool for tool in tools}
 # Bind tools to the LLM with system prompt
 from langchain_core.messages import SystemMessage
 
-llm_with_tools = llm.bind_tools(tools)
+router.bind_tools(tools)
+llm_with_tools = router.model('strong', with_tools=True)
 
-# Define the agent function
-def call_model(state: MessagesState):
-    # Add system message if not present
-    messages = state["messages"]
+def set_llm(model, fast_model=None):
+    """Swap the chat models used by the agent (strong tier, optional fast tier), e.g. for a scripted model in benchmarks."""
+    global llm, llm_with_tools
+    llm = model
+    router.set_models(model, fast_model)
+    llm_with_tools = router.model('strong', with_tools=True)
+
+class AgentLoopState(MessagesState):
+    # Consumption of the current turn (see agent.loop_budget), reported in the result state
+    budget: Dict[str, Any]
+    # Identical tool calls of this turn -> id of the ToolMessage holding their result
+    tool_cache: Dict[str, str]
+
+def start_turn(state: AgentLoopState):
+    return {"budget": loop_budget.start(), "tool_cache": {}}
+
+def _with_system_prompt(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
     if not messages or not isinstance(messages[0], SystemMessage):
-        messages = [SystemMessage(content=SYSTEM_PROMPT)] + messages
+        return [SystemMessage(content=SYSTEM_PROMPT)] + list(messages)
+    return list(messages)
+
+def _tokens_used(response, compaction: Dict[str, Any]) -> int:
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    # No usage reported (e.g. local models): estimate from the prompt and the reply
+    return compaction['tokens_after'] + estimate_tokens(str(response.content))
+
+# Define the agent function
+def call_model(state: AgentLoopState):
+    messages, compaction = compactor.compact(_with_system_prompt(state["messages"]), get_dataset_tools().session_id)
+    if metrics.enabled and compaction['compacted']:
+        metrics.observe("agent_context_tokens_saved", compaction['tokens_saved'])
     
-    response = llm_with_tools.invoke(messages)
-    return {"messages": [response]}
+    tier, reason = router.route(state["messages"])
+    response = router.invoke(messages, tier, purpose="agent", with_tools=True)
+    tokens = _tokens_used(response, compaction)
+    response.response_metadata["route_reason"] = reason
+    response.response_metadata["context_compaction"] = compaction
+    return {"messages": [response], "budget": loop_budget.charge(state["budget"], steps=1, tokens=tokens)}
+
+# Tools without side effects: an identical call is answered with its earlier result while nothing changed
+READ_ONLY_TOOLS = {'list_datasets', 'list_versions', 'get_dataset_info', 'list_variables', 'get_result', 'list_models',
+                   'get_tool_result', 'get_execution_history'}
+
+def _is_error(result: Any) -> bool:
+    try:
+        payload = json.loads(result)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(payload, dict) and payload.get('success') is False
+
+def _earlier_result(messages: Sequence[BaseMessage], tool_call_id: Optional[str]) -> Optional[str]:
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage) and message.tool_call_id == tool_call_id:
+            return str(message.content)
+    return None
 
 # Define the tool function
-def call_tool(state: MessagesState):
+def call_tool(state: AgentLoopState):
     messages = state["messages"]
     last_message = messages[-1]
+    cache = dict(state.get("tool_cache") or {})
+    repeated = 0
     
     tool_messages = []
     for tool_call in last_message.tool_calls:
         tool_name = tool_call["name"]
         tool_input = tool_call["args"]
+        read_only = tool_name in READ_ONLY_TOOLS
+        # Read-only calls are keyed on the session's state; others are only compared by their results
+        key = call_key(tool_name, tool_input, get_dataset_tools().mutations if read_only else None)
+        earlier = _earlier_result(messages, cache.get(key))
         
-        # Get the tool function
-        tool_func = tools_by_name[tool_name]
-        
-        try:
-            # Call the tool
-            result = tool_func.invoke(tool_input)
-        except Exception as e:
-            result = f"Error calling tool {tool_name}: {str(e)}"
+        if read_only and earlier is not None:
+            # Same read-only call and nothing changed since: serve the earlier result instead of running it again
+            repeated += 1
+            result = ("[Repeated call: identical to an earlier call in this request and nothing has changed since, "
+                      "so this is the earlier result. Do not repeat it; change the approach or answer.] " + earlier)
+        else:
+            # Get the tool function
+            tool_func = tools_by_name[tool_name]
+            
+            failed = False
+            try:
+                # Call the tool
+                with metrics.time("agent_tool_seconds", tool=tool_name):
+                    result = tool_func.invoke(tool_input)
+            except Exception as e:
+                result = f"Error calling tool {tool_name}: {str(e)}"
+                failed = True
+            if earlier is not None and str(result) == earlier:
+                # Ran again and got the same result: the loop is not making progress
+                repeated += 1
+                result = ("[Repeated call: identical to an earlier call in this request and it returned the same "
+                          "result again. Do not repeat it; change the approach or answer.] " + str(result))
+            elif not (read_only and (failed or _is_error(result))):
+                # Errors are never served again, so a transient failure can be retried
+                cache[key] = tool_call["id"]
+
+        if metrics.enabled:
+            metrics.observe("agent_tool_payload_bytes", len(json.dumps(tool_input, default=str)), tool=tool_name, direction="input")
+            metrics.observe("agent_tool_payload_bytes", len(str(result)), tool=tool_name, direction="output")
         
         # Create tool message
         tool_message = ToolMessage(
@@ -140,27 +401,57 @@ def call_tool(state: MessagesState):
         )
         tool_messages.append(tool_message)
 
-    return {"messages": tool_messages}
+    return {"messages": tool_messages, "tool_cache": cache,
+            "budget": loop_budget.charge(state["budget"], repeated_calls=repeated)}
+
+def final_answer(state: AgentLoopState):
+    """Answer without tools once the turn's budget is exhausted."""
+    messages = list(state["messages"])
+    last_message = messages[-1]
+    # Tool calls of the last response are skipped but must still be answered
+    skipped = [ToolMessage(content=json.dumps({'success': False, 'message': "Skipped: the request's budget is exhausted"}),
+                           name=call["name"], tool_call_id=call["id"])
+               for call in getattr(last_message, "tool_calls", None) or []]
+    reason = state["budget"]["exhausted"]
+    prompt, compaction = compactor.compact(_with_system_prompt(messages + skipped))
+    prompt.append(HumanMessage(content=final_answer_prompt(reason)))
+    try:
+        response = router.invoke(prompt, router.route(messages)[0], purpose="final_answer")
+        tokens = _tokens_used(response, compaction)
+    except Exception as e:
+        response = AIMessage(content=f"I stopped because {EXHAUSTED_REASONS.get(reason, reason)} "
+                                     f"and could not write a final summary ({type(e).__name__}).")
+        tokens = 0
+    response.response_metadata["budget_exhausted"] = reason
+    return {"messages": skipped + [response], "budget": loop_budget.charge(state["budget"], steps=1, tokens=tokens)}
 
 # Define condition for calling tools
-def should_continue(state: MessagesState):
+def should_continue(state: AgentLoopState):
     messages = state["messages"]
     last_message = messages[-1]
     # If there are no tool calls, then we finish
     if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
         return END
+    elif state["budget"]["exhausted"]:
+        return "final_answer"
     else:
         return "tools"
 
+def after_tools(state: AgentLoopState):
+    return "final_answer" if loop_budget.charge(state["budget"])["exhausted"] else "agent"
+
 # Build the graph
-workflow = StateGraph(MessagesState)
+workflow = StateGraph(AgentLoopState)
 
 # Add the agent node
+workflow.add_node("start_turn", start_turn)
 workflow.add_node("agent", call_model)
 workflow.add_node("tools", call_tool)
+workflow.add_node("final_answer", final_answer)
 
 # Set the entrypoint
-workflow.add_edge(START, "agent")
+workflow.add_edge(START, "start_turn")
+workflow.add_edge("start_turn", "agent")
 
 # Add conditional edges
 workflow.add_conditional_edges(
@@ -168,31 +459,42 @@ workflow.add_conditional_edges(
     should_continue,
     {
         "tools": "tools",
+        "final_answer": "final_answer",
         END: END,
     }
 )
 
-# Add edge from tools to agent
-workflow.add_edge("tools", "agent")
+# Back to the agent after tools, unless the budget ran out
+workflow.add_conditional_edges("tools", after_tools, {"agent": "agent", "final_answer": "final_answer"})
+workflow.add_edge("final_answer", END)
 
 # Compile the workflow
-app = workflow.compile()
+app = workflow.compile().with_config(recursion_limit=loop_budget.recursion_limit())
 
-def run_agent(user_query: str) -> Dict[str, Any]:
+def run_agent(user_query: str, on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
     """
     Run the agent with a user query (CLI interface).
-    Maintains backward compatibility with existing CLI.
+    Maintains backward compatibility with existing CLI. ``on_event`` receives
+    live events (code output, progress) while the turn runs.
     """
-    # Run the agent
-    result = app.invoke({
+    state = {
         "messages": [
             HumanMessage(content=user_query)
         ]
-    })
+    }
+    if on_event is None:
+        result = app.invoke(state)
+    else:
+        for mode, payload in app.stream(state, stream_mode=["custom", "values"]):
+            if mode == "custom":
+                on_event(payload)
+            else:
+                result = payload
     
     return {
         "final_messages": result["messages"],
-        "user_query": user_query
+        "user_query": user_query,
+        "budget": result.get("budget")
     }
 
 # Legacy state definition for backward compatibility
@@ -230,9 +532,10 @@ def run_agent_with_state(user_query: str, initial_state: Optional[AgentState] =
     result = app.invoke(initial_state)
     
     # Update state with results
-    result["dataset_loaded"] = dataset_tools.current_dataset is not None
-    result["dataset_info"] = dataset_tools.dataset_info if dataset_tools.current_dataset is not None else None
-    result["execution_history"] = dataset_tools.get_execution_history()
+    session = get_dataset_tools()
+    result["dataset_loaded"] = session.current_dataset is not None
+    result["dataset_info"] = session.dataset_info if session.current_dataset is not None else None
+    result["execution_history"] = session.get_execution_history()
     result["current_step"] = "completed"
     
     return result
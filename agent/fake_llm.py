@@ -0,0 +1,76 @@
+"""
+Scripted chat model for local benchmarking
+Plays a fixed analysis turn without network calls: load the dataset, run one
+code snippet, then stream a short answer token by token. Responses depend
+only on the messages passed in, so one instance can serve many concurrent
+sessions. Optional delays approximate a remote model's latency.
+"""
+
+import json
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeAnalysisLLM(BaseChatModel):
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    code: str = "df.describe()"
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-analysis"
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> 'FakeAnalysisLLM':
+        return self.model_copy(update={'tools_bound': True})
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        if not self.tools_bound:
+            # Used as a plain model, e.g. by the conversation summarizer
+            return AIMessage(content=f"Summary of {len(messages)} earlier messages.")
+        last = messages[-1] if messages else None
+        if not isinstance(last, ToolMessage):
+            call = {'name': 'load_dataset', 'args': {'dataset_name': 'iris'}}
+        elif last.name == 'load_dataset':
+            call = {'name': 'execute_code', 'args': {'code': self.code}}
+        else:
+            answer = ("I loaded the iris dataset and summarized it: 150 rows, four numeric measurements "
+                      "and the species label. Petal length varies the most across species.")
+            return AIMessage(content=answer)
+        return AIMessage(content="", tool_calls=[dict(call, id=f"call_{uuid.uuid4().hex[:12]}")])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.first_token_latency)
+        message = self._next_message(messages)
+        time.sleep(self.token_latency * len(message.content.split()))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        message = self._next_message(messages)
+        if message.tool_calls:
+            chunks = [AIMessageChunk(content="", tool_call_chunks=[
+                {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': i}
+                for i, call in enumerate(message.tool_calls)
+            ])]
+        else:
+            words = message.content.split(" ")
+            chunks = [AIMessageChunk(content=word if i == 0 else " " + word) for i, word in enumerate(words)]
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.token_latency)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {'first_token_latency': self.first_token_latency, 'token_latency': self.token_latency}
@@ -0,0 +1,98 @@
+"""
+Per-turn budget for the agent loop
+The agent and tool nodes alternate until the model stops calling tools. A
+budget bounds one turn (one graph invocation) by LLM calls, tokens and wall
+time. Identical calls of read-only tools repeated while the session is
+unchanged are answered from the earlier result instead of running again;
+other tools always run. Too many repeats (served, or run again with the same
+result) also end the turn. An exhausted budget routes to a final LLM call
+without tools, so the user still gets an answer from what was found.
+"""
+
+import json
+import os
+import time
+from typing import Dict, Any, Optional
+
+
+def call_key(name: str, args: Dict[str, Any], state_version: Optional[int] = None) -> str:
+    """Identity of a tool call: same tool, same arguments and (if given) the same session state."""
+    return json.dumps([name, args, state_version], sort_keys=True, default=str)
+
+
+class LoopBudget:
+    """
+    Limits of one agent turn; ``None`` disables a limit. ``max_repeats`` is
+    the number of repeated identical calls tolerated before the turn ends.
+    """
+
+    def __init__(self, max_steps: Optional[int] = 10, max_tokens: Optional[int] = None,
+                 max_seconds: Optional[float] = None, max_repeats: int = 2):
+        self.max_steps = max_steps
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.max_repeats = max_repeats
+
+    @classmethod
+    def from_env(cls) -> 'LoopBudget':
+        """Read AGENT_MAX_STEPS (10), AGENT_MAX_TURN_TOKENS, AGENT_MAX_TURN_SECONDS and AGENT_MAX_REPEATED_CALLS (2)."""
+        def optional(name, cast, default=None):
+            value = os.getenv(name, default)
+            return cast(value) if value not in (None, "", "0", "none") else None
+
+        return cls(
+            max_steps=optional("AGENT_MAX_STEPS", int, "10"),
+            max_tokens=optional("AGENT_MAX_TURN_TOKENS", int),
+            max_seconds=optional("AGENT_MAX_TURN_SECONDS", float),
+            max_repeats=int(os.getenv("AGENT_MAX_REPEATED_CALLS", "2")),
+        )
+
+    def recursion_limit(self) -> int:
+        """Graph steps needed for a full budget: start, agent/tools pairs and the final answer."""
+        return 2 * (self.max_steps or 50) + 5
+
+    def start(self) -> Dict[str, Any]:
+        """Usage of a new turn, as stored in the graph state."""
+        return {
+            'steps': 0,
+            'tokens': 0,
+            'seconds': 0.0,
+            'repeated_calls': 0,
+            'started_at': time.time(),
+            'exhausted': None,
+            'limits': {'steps': self.max_steps, 'tokens': self.max_tokens, 'seconds': self.max_seconds,
+                       'repeated_calls': self.max_repeats},
+        }
+
+    def charge(self, usage: Dict[str, Any], steps: int = 0, tokens: int = 0, repeated_calls: int = 0) -> Dict[str, Any]:
+        """Return ``usage`` with the given consumption added and ``exhausted`` set to the first limit reached."""
+        usage = dict(usage, steps=usage['steps'] + steps, tokens=usage['tokens'] + tokens,
+                     repeated_calls=usage['repeated_calls'] + repeated_calls,
+                     seconds=round(time.time() - usage['started_at'], 3))
+        if usage['exhausted'] is None:
+            usage['exhausted'] = self._exhausted(usage)
+        return usage
+
+    def _exhausted(self, usage: Dict[str, Any]) -> Optional[str]:
+        if self.max_steps is not None and usage['steps'] >= self.max_steps:
+            return 'steps'
+        if self.max_tokens is not None and usage['tokens'] >= self.max_tokens:
+            return 'tokens'
+        if self.max_seconds is not None and usage['seconds'] >= self.max_seconds:
+            return 'wall_time'
+        if usage['repeated_calls'] > self.max_repeats:
+            return 'repeated_calls'
+        return None
+
+
+EXHAUSTED_REASONS = {
+    'steps': "the maximum number of steps for this request was reached",
+    'tokens': "the token budget for this request was used up",
+    'wall_time': "the time limit for this request was reached",
+    'repeated_calls': "the same tool calls kept being repeated with the same results",
+}
+
+
+def final_answer_prompt(reason: str) -> str:
+    return (f"Stop calling tools: {EXHAUSTED_REASONS.get(reason, reason)}. Answer the user's request now "
+            f"using only the results above. Say briefly what was completed and what remains undone.")
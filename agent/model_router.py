@@ -0,0 +1,130 @@
+"""
+Model tier routing
+The agent can run with two chat models: a strong tier (``config.MODEL_NAME``)
+and an optional fast tier (``AGENT_FAST_MODEL``). Conversation summaries and
+short, simple follow-ups ("what columns are there?") go to the fast tier.
+Turns that ask for modelling, statistics or plots, long requests and any
+turn where a tool call failed are escalated to the strong tier. Routing is
+a keyword/length check, so it adds no model call of its own. Latency and
+tokens are recorded per tier, and every call runs under the resilience
+policy (see agent.resilience) with one circuit breaker per tier.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from agent.resilience import ResiliencePolicy
+from observability.metrics import metrics
+
+# Requests that need the strong tier even when short
+COMPLEX_REQUEST = re.compile(
+    r"\b(model|predict|regress|classif|cluster|train|forecast|correlat|significan|hypothes|test|compar|why|"
+    r"explain|feature|anomal|outlier|trend|plot|chart|graph|visuali[sz]|distribution|analy[sz]|segment|join|merge)",
+    re.IGNORECASE,
+)
+
+
+def _is_error(message: ToolMessage) -> bool:
+    content = str(message.content)
+    if content.startswith("Error"):
+        return True
+    try:
+        result = json.loads(content)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(result, dict) and result.get('success') is False
+
+
+def _current_turn(messages: Sequence[BaseMessage]) -> Tuple[Optional[str], List[BaseMessage]]:
+    """The latest user request and the messages that followed it."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return str(messages[i].content), list(messages[i + 1:])
+    return None, list(messages)
+
+
+class ModelRouter:
+    """Chooses the 'fast' or 'strong' model per call; without a fast model everything uses 'strong'."""
+
+    TIERS = ('fast', 'strong')
+
+    def __init__(self, strong, fast=None, enabled: bool = True, short_request_chars: int = 120,
+                 resilience: Optional[ResiliencePolicy] = None):
+        self.models = {'strong': strong, 'fast': fast}
+        self.enabled = enabled
+        self.short_request_chars = short_request_chars
+        self.resilience = resilience or ResiliencePolicy(enabled=False)
+        self._bound: Dict[str, Any] = {}
+        self._tools = None
+
+    @classmethod
+    def from_env(cls, strong, make_model=None, resilience: Optional[ResiliencePolicy] = None) -> 'ModelRouter':
+        """
+        Read AGENT_FAST_MODEL (model name of the fast tier; unset keeps one tier),
+        AGENT_MODEL_ROUTING (on/off) and AGENT_ROUTER_SHORT_CHARS (default 120).
+        ``make_model`` builds a chat model from a model name.
+        """
+        fast_name = os.getenv("AGENT_FAST_MODEL")
+        return cls(
+            strong=strong,
+            fast=make_model(fast_name) if fast_name and make_model else None,
+            enabled=os.getenv("AGENT_MODEL_ROUTING", "on").strip().lower() not in ("off", "false", "0"),
+            short_request_chars=int(os.getenv("AGENT_ROUTER_SHORT_CHARS", "120")),
+            resilience=resilience,
+        )
+
+    def set_models(self, strong, fast=None):
+        self.models = {'strong': strong, 'fast': fast}
+        # Circuit state and latencies belonged to the previous models
+        self.resilience.reset()
+        if self._tools is not None:
+            self.bind_tools(self._tools)
+
+    def bind_tools(self, tools):
+        self._tools = tools
+        self._bound = {tier: model.bind_tools(tools) for tier, model in self.models.items() if model is not None}
+
+    def available(self, tier: str) -> str:
+        """``tier`` if it is configured, else the strong tier."""
+        return tier if self.enabled and self.models.get(tier) is not None else 'strong'
+
+    def model(self, tier: str, with_tools: bool = False):
+        tier = self.available(tier)
+        return self._bound[tier] if with_tools else self.models[tier]
+
+    def route(self, messages: Sequence[BaseMessage]) -> Tuple[str, str]:
+        """Return (tier, reason) for the next agent call."""
+        if self.available('fast') != 'fast':
+            return 'strong', 'single_tier'
+        request, turn = _current_turn(messages)
+        if request is None:
+            return 'strong', 'no_request'
+        if any(isinstance(m, ToolMessage) and _is_error(m) for m in turn):
+            return 'strong', 'tool_error'
+        if len(request) > self.short_request_chars or COMPLEX_REQUEST.search(request):
+            return 'strong', 'complex'
+        return 'fast', 'simple'
+
+    def invoke(self, messages: List[BaseMessage], tier: str, purpose: str, with_tools: bool = False, **options):
+        """
+        Call the tier's model under the resilience policy, recording latency and
+        tokens by tier and purpose. ``options`` (e.g. ``temperature``) are passed
+        to the model for this call only.
+        """
+        tier = self.available(tier)
+        model = self.model(tier, with_tools)
+        metrics.inc("agent_model_route_total", tier=tier, purpose=purpose)
+        with metrics.time("agent_call_model_seconds", tier=tier, purpose=purpose):
+            response = self.resilience.call(lambda: model.invoke(messages, **options), name=tier)
+        if metrics.enabled:
+            usage = getattr(response, "usage_metadata", None) or {}
+            for direction in ('input', 'output'):
+                if usage.get(f"{direction}_tokens") is not None:
+                    metrics.observe("agent_call_model_tokens", usage[f"{direction}_tokens"], direction=direction,
+                                    tier=tier)
+        response.response_metadata["model_tier"] = tier
+        return response
@@ -0,0 +1,365 @@
+"""
+Resilience policy for LLM calls
+A slow or failing upstream response should not decide a turn's latency. Every
+model call runs under a policy:
+
+- a per-attempt timeout and an overall deadline for the call, retries included
+- retries of transient failures (time-outs, connection errors, 408/409/429
+  and 5xx responses) with exponential backoff and full jitter
+- optional hedging: once an attempt has taken longer than a percentile of
+  recent latencies, a duplicate request is sent and the first success wins
+- a circuit breaker per model tier: after a run of consecutive failures,
+  calls fail fast until a cool-down has passed, then a single trial call
+  decides whether to close it again
+
+The per-attempt timeout and the deadline bound the wait for an attempt's
+first output (its first streamed token, or the whole answer of a call that
+does not stream); once an attempt is answering it runs to completion, so
+long streamed answers are not cut off.
+
+Attempts run in worker threads with a copy of the caller's context, so
+callbacks (tracing, token streaming) still see the caller's run. Only the
+attempt whose output arrives first reaches those callbacks: every other
+attempt, whether hedged or timed out, is stopped with ``AttemptCancelled``
+at its next token or at its end, before the caller's handlers see it. An
+attempt waiting for its first token cannot be interrupted; set the client's
+own HTTP timeout as well so it is eventually abandoned.
+"""
+
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.runnables.config import var_child_runnable_config
+
+from observability.metrics import metrics
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the model while its circuit breaker is open."""
+
+
+class LLMCallTimeout(TimeoutError):
+    """No attempt produced output within its timeout or the call's deadline."""
+
+
+class AttemptCancelled(RuntimeError):
+    """Raised inside an attempt that lost the race or was abandoned, to stop it."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures worth another attempt; client errors (bad request, auth) are not."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS or status >= 500
+    # Client libraries wrap socket errors in their own types (APITimeoutError, APIConnectionError)
+    name = type(error).__name__
+    return 'Timeout' in name or 'Connection' in name
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures -> half-open after ``reset_seconds``."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        self.state = state
+        metrics.inc("llm_circuit_transitions_total", tier=self.name, state=state)
+
+    def allow(self) -> bool:
+        """Whether a call may go through; the first call after the cool-down is the half-open trial."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._transition('half_open')
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != 'closed':
+                self._transition('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition('open')
+
+    def release_trial(self):
+        """A half-open trial ended without an outcome (interrupted); the next call is the trial again."""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+
+    def describe(self) -> Dict[str, Any]:
+        return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class _Race:
+    """The attempts of one call; the first to produce output wins and all others are cancelled."""
+
+    def __init__(self):
+        self.winner: Optional[int] = None
+        self.closed = False
+        self.first_output_at: Optional[float] = None
+        self.wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim(self, index: int) -> bool:
+        """Whether attempt ``index`` may deliver output: it is the winner, or becomes it now."""
+        with self._lock:
+            if self.winner is None and not self.closed:
+                self.winner = index
+                self.first_output_at = time.monotonic()
+                self.wake.set()
+            return self.winner == index
+
+    def close(self):
+        """No attempt may win any more (the call timed out or returned)."""
+        with self._lock:
+            self.closed = True
+
+    def start(self, fn: Callable[[], Any], index: int) -> Future:
+        """Run ``fn`` in a daemon thread with a copy of the current context and this attempt's monitor."""
+        future: Future = Future()
+        context = contextvars.copy_context()
+        monitor = _AttemptMonitor(self, index)
+
+        def run():
+            try:
+                future.set_result(context.run(_monitored, fn, monitor))
+            except BaseException as e:
+                future.set_exception(e)
+            self.wake.set()
+
+        threading.Thread(target=run, name='llm-call', daemon=True).start()
+        return future
+
+
+class _AttemptMonitor(BaseCallbackHandler):
+    """
+    First callback handler of an attempt: claims the race at the first token
+    or at the end, and raises in attempts that lost, which stops them before
+    the caller's handlers see their output.
+    """
+
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, race: _Race, index: int):
+        self.race = race
+        self.index = index
+
+    def _output(self):
+        if not self.race.claim(self.index):
+            raise AttemptCancelled(f"attempt {self.index + 1} lost the race or was abandoned")
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self._output()
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        self._output()
+
+
+class _QuietCancellations(logging.Filter):
+    """Cancelling an attempt is expected; drop LangChain's "Error in callback" warning for it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not (isinstance(record.args, tuple) and record.args[:1] == (_AttemptMonitor.__name__,))
+
+
+logging.getLogger('langchain_core.callbacks.manager').addFilter(_QuietCancellations())
+
+
+def _monitored(fn: Callable[[], Any], monitor: _AttemptMonitor) -> Any:
+    """Call ``fn`` with ``monitor`` ahead of the inherited callbacks of model calls made in it."""
+    config = dict(var_child_runnable_config.get() or {})
+    callbacks = config.get('callbacks')
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.handlers = [monitor] + callbacks.handlers
+    else:
+        callbacks = [monitor] + list(callbacks or [])
+    config['callbacks'] = callbacks
+    var_child_runnable_config.set(config)
+    return fn()
+
+
+class ResiliencePolicy:
+    """
+    Timeouts, retries, hedging and circuit breaking for model calls; ``None``
+    disables a timeout or deadline and ``hedge_percentile=None`` disables hedging.
+    """
+
+    def __init__(self, enabled: bool = True, timeout_seconds: Optional[float] = 60,
+                 deadline_seconds: Optional[float] = 180, max_retries: int = 2, backoff_seconds: float = 0.5,
+                 backoff_max_seconds: float = 8, hedge_percentile: Optional[float] = None,
+                 hedge_min_samples: int = 20, breaker_failures: int = 5, breaker_reset_seconds: float = 30):
+        self.enabled = enabled
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ResiliencePolicy':
+        """
+        Read AGENT_LLM_RESILIENCE (on/off), AGENT_LLM_TIMEOUT_SECONDS (60, per
+        attempt), AGENT_LLM_DEADLINE_SECONDS (180, per call), AGENT_LLM_RETRIES
+        (2), AGENT_LLM_BACKOFF_SECONDS (0.5) / _BACKOFF_MAX_SECONDS (8),
+        AGENT_LLM_HEDGE_PERCENTILE (off; e.g. 95), AGENT_LLM_BREAKER_FAILURES (5)
+        and AGENT_LLM_BREAKER_RESET_SECONDS (30).
+        """
+        def optional(name, default=None):
+            value = os.getenv(name, default)
+            return float(value) if value not in (None, "", "0", "none", "off") else None
+
+        return cls(
+            enabled=os.getenv("AGENT_LLM_RESILIENCE", "on").strip().lower() not in ("off", "false", "0"),
+            timeout_seconds=optional("AGENT_LLM_TIMEOUT_SECONDS", "60"),
+            deadline_seconds=optional("AGENT_LLM_DEADLINE_SECONDS", "180"),
+            max_retries=int(os.getenv("AGENT_LLM_RETRIES", "2")),
+            backoff_seconds=float(os.getenv("AGENT_LLM_BACKOFF_SECONDS", "0.5")),
+            backoff_max_seconds=float(os.getenv("AGENT_LLM_BACKOFF_MAX_SECONDS", "8")),
+            hedge_percentile=optional("AGENT_LLM_HEDGE_PERCENTILE"),
+            breaker_failures=int(os.getenv("AGENT_LLM_BREAKER_FAILURES", "5")),
+            breaker_reset_seconds=float(os.getenv("AGENT_LLM_BREAKER_RESET_SECONDS", "30")),
+        )
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, self.breaker_failures, self.breaker_reset_seconds)
+            return self._breakers[name]
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Seconds after which a duplicate request is sent, or None (hedging off or too few samples)."""
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2**attempt)]."""
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_seconds * 2 ** attempt))
+
+    def call(self, fn: Callable[[], Any], name: str = 'llm') -> Any:
+        """Run ``fn`` under the policy; ``name`` selects the circuit breaker and latency history."""
+        if not self.enabled:
+            return fn()
+        breaker = self.breaker(name)
+        deadline = time.monotonic() + self.deadline_seconds if self.deadline_seconds is not None else None
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                metrics.inc("llm_call_failures_total", tier=name, reason='circuit_open')
+                raise CircuitOpenError(f"LLM circuit '{name}' is open after {breaker.failures} consecutive "
+                                       f"failures; retrying after {self.breaker_reset_seconds:g}s")
+            try:
+                result = self._attempt(fn, name, deadline)
+            except Exception as e:
+                retryable = is_retryable(e)
+                # A client error still means the upstream answered
+                breaker.record_failure() if retryable else breaker.record_success()
+                reason = 'timeout' if isinstance(e, TimeoutError) else 'error'
+                metrics.inc("llm_call_failures_total", tier=name, reason=reason)
+                wait_seconds = self.backoff(attempt)
+                if (not retryable or attempt >= self.max_retries
+                        or (deadline is not None and time.monotonic() + wait_seconds >= deadline)):
+                    raise
+                metrics.inc("llm_call_retries_total", tier=name, reason=reason)
+                attempt += 1
+                time.sleep(wait_seconds)
+                continue
+            except BaseException:
+                # KeyboardInterrupt, SystemExit: says nothing about the upstream
+                breaker.release_trial()
+                raise
+            breaker.record_success()
+            return result
+
+    def _attempt(self, fn: Callable[[], Any], name: str, deadline: Optional[float]) -> Any:
+        """
+        One attempt, hedged with a duplicate request when it has produced no
+        output by the hedge delay. The attempt that answers first wins; the
+        time to its first output is recorded for the hedge delay.
+        """
+        limits = [t for t in (self.timeout_seconds,
+                              deadline - time.monotonic() if deadline is not None else None) if t is not None]
+        timeout = max(0.0, min(limits)) if limits else None
+        start = time.monotonic()
+        ends_at = start + timeout if timeout is not None else None
+        delay = self.hedge_delay(name)
+        hedge_at = start + delay if delay is not None and (timeout is None or delay < timeout) else None
+        race = _Race()
+        futures: List[Future] = [race.start(fn, 0)]
+        try:
+            while race.winner is None:
+                race.wake.clear()
+                for index, future in enumerate(futures):
+                    if future.done() and future.exception() is None:
+                        race.claim(index)  # answered without model callbacks
+                if race.winner is not None:
+                    break
+                if all(future.done() for future in futures):
+                    raise futures[-1].exception()
+                now = time.monotonic()
+                if ends_at is not None and now >= ends_at:
+                    raise LLMCallTimeout(f"LLM call '{name}' produced no output within {timeout:g}s")
+                if hedge_at is not None and now >= hedge_at:
+                    futures.append(race.start(fn, len(futures)))
+                    metrics.inc("llm_call_hedges_total", tier=name)
+                    hedge_at = None
+                    continue
+                wake_at = min((t for t in (ends_at, hedge_at) if t is not None), default=None)
+                race.wake.wait(wake_at - now if wake_at is not None else None)
+        finally:
+            race.close()
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=200)).append(race.first_output_at - start)
+        if len(futures) > 1:
+            metrics.inc("llm_call_hedge_wins_total", tier=name, winner='hedge' if race.winner else 'primary')
+        return futures[race.winner].result()
+
+    def reset(self):
+        """Forget breaker states and latencies, e.g. when the models are replaced."""
+        with self._lock:
+            self._breakers.clear()
+            self._latencies.clear()
+
+    def describe(self) -> Dict[str, Any]:
+        return {name: dict(breaker.describe(), hedge_delay_seconds=self.hedge_delay(name))
+                for name, breaker in list(self._breakers.items())}
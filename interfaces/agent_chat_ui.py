@@ -9,22 +9,21 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from agent.data_analysis_agent import app, SYSTEM_PROMPT
+from agent.data_analysis_agent import app, router, SYSTEM_PROMPT
 from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.graph import StateGraph, MessagesState
-from langchain_openai import ChatOpenAI
-import config
+from observability.metrics import metrics
+
+# Summaries should restate the conversation, not vary it, whatever the agent's own temperature
+SUMMARY_TEMPERATURE = 0.1
 
 class ConversationSummarizer:
     """
     Handles conversation summarization to manage token usage
     """
-    def __init__(self):
-        self.summarizer_llm = ChatOpenAI(
-            model=config.MODEL_NAME,
-            temperature=0.1,
-            api_key=config.OPENAI_API_KEY
-        )
+    def __init__(self, llm=None):
+        # Without an explicit model, summaries go to the router's fast tier (AGENT_FAST_MODEL) when configured
+        self.summarizer_llm = llm
     
     def should_summarize(self, messages, max_messages=8):
         """Check if conversation should be summarized"""
@@ -58,7 +57,13 @@ Summary:"""
         
         try:
             # Generate summary
-            summary_response = self.summarizer_llm.invoke([HumanMessage(content=summary_prompt)])
+            with metrics.time("summarization_seconds"):
+                if self.summarizer_llm is not None:
+                    summary_response = router.resilience.call(
+                        lambda: self.summarizer_llm.invoke([HumanMessage(content=summary_prompt)]), name='summary')
+                else:
+                    summary_response = router.invoke([HumanMessage(content=summary_prompt)], 'fast', purpose="summary",
+                                                      temperature=SUMMARY_TEMPERATURE)
             summary = summary_response.content
             
             # Create new message list with system message, summary, and current query
@@ -75,23 +80,22 @@ Summary:"""
             return new_messages
             
         except Exception as e:
-            print(f"Warning: Failed to summarize conversation: {e}")
-            # Fallback: keep only system message and current query
-            return [messages[0], messages[-1]] if len(messages) > 1 else messages
+            # Keep the full history rather than losing it; the next turn tries again
+            # (stale tool outputs are still compacted in the prompt)
+            print(f"Warning: Failed to summarize conversation, keeping full history: {e}")
+            metrics.inc("summarization_failures_total", reason=type(e).__name__)
+            return messages
 
 class AgentChatUIWrapper:
     """
     Wrapper for the agent that provides a clean interface for Agent Chat UI
     with conversation summarization
     """
-    def __init__(self, app):
+    def __init__(self, app, summarizer_llm=None):
         self.app = app
-        self.summarizer = ConversationSummarizer()
+        self.summarizer = ConversationSummarizer(summarizer_llm)
     
-    def invoke(self, state):
-        """
-        Invoke the app with conversation summarization to manage token usage
-        """
+    def _prepare(self, state):
         messages = state.get("messages", [])
         
         # Check if we need to summarize
@@ -99,11 +103,23 @@ class AgentChatUIWrapper:
             print("📝 Summarizing conversation to manage token usage...")
             messages = self.summarizer.summarize_conversation(messages)
             state["messages"] = messages
-        
+        return state
+    
+    def invoke(self, state):
+        """
+        Invoke the app with conversation summarization to manage token usage
+        """
         # Call the original app
-        result = self.app.invoke(state)
+        result = self.app.invoke(self._prepare(state))
         
         return result
+    
+    def stream(self, state, **kwargs):
+        """
+        Stream the app (see ``StateGraph.stream``) after the same summarization;
+        ``state["messages"]`` holds the possibly summarized history afterwards.
+        """
+        yield from self.app.stream(self._prepare(state), **kwargs)
 
 # Export the wrapped app for Agent Chat UI
 # The Agent Chat UI expects a LangGraph app with a 'messages' key in the state
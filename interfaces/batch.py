@@ -0,0 +1,158 @@
+"""
+Headless batch runner for the Data Analysis AI Agent
+Reads analysis questions from JSONL, runs each in its own isolated session on
+a thread pool and appends one result line per question. Questions whose id is
+already recorded as finished in the output file are skipped, so an
+interrupted run can simply be restarted.
+"""
+
+import json
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Optional, Set
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage
+
+from tools.dataset_tools import DatasetTools, use_dataset_tools
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    """
+    Read queries from JSONL. Each line is either a JSON string or an object
+    with 'query' and optional 'id' and 'dataset'; ids default to the line number.
+    """
+    items = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {'query': item}
+            if 'query' not in item:
+                raise ValueError(f"{path}:{line_number}: missing 'query'")
+            item['id'] = str(item.get('id', line_number))
+            items.append(item)
+    return items
+
+
+def finished_ids(path: str, retry_failed: bool = True) -> Set[str]:
+    """Ids already recorded in an output file (only successful ones when ``retry_failed``)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if record.get('status') == 'ok' or not retry_failed:
+                done.add(str(record.get('id')))
+    return done
+
+
+class ResultWriter:
+    """Append-only JSONL writer; each record is flushed and fsynced before the next."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        needs_newline = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self._file = open(path, 'a', encoding='utf-8')
+        if needs_newline:
+            self._file.write('\n')
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _default_run(query: str) -> Dict[str, Any]:
+    from agent.data_analysis_agent import run_agent
+    return run_agent(query)
+
+
+def run_item(item: Dict[str, Any], run: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run one query in a fresh session and describe the outcome."""
+    tools = DatasetTools(session_id=f"batch-{item['id']}")
+    started_at = time.time()
+    start = time.perf_counter()
+    record = {'id': item['id'], 'query': item['query']}
+    try:
+        with use_dataset_tools(tools):
+            if item.get('dataset'):
+                loaded = tools.load_dataset(item['dataset'])
+                if not loaded['success']:
+                    raise RuntimeError(loaded['message'])
+            result = run(item['query'])
+        messages = result.get('final_messages', [])
+        answers = [m.content for m in messages if isinstance(m, AIMessage) and m.content]
+        record.update({
+            'status': 'ok',
+            'answer': answers[-1] if answers else None,
+            'tool_calls': [call['name'] for m in messages if isinstance(m, AIMessage) for call in m.tool_calls],
+        })
+    except Exception as e:
+        record.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        tools.close()
+    record['artifacts'] = [entry['visualization_file'] for entry in tools.execution_history
+                           if entry.get('visualization_file')]
+    record['timing'] = {
+        'started_at': started_at,
+        'total_seconds': round(time.perf_counter() - start, 3),
+        'code_executions': len(tools.execution_history),
+    }
+    return record
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 4, retry_failed: bool = True,
+              run: Optional[Callable[[str], Dict[str, Any]]] = None,
+              on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run every query in ``input_path`` not yet finished in ``output_path``
+    with ``concurrency`` isolated sessions in parallel.
+    """
+    items = load_queries(input_path)
+    done = finished_ids(output_path, retry_failed)
+    pending = [item for item in items if item['id'] not in done]
+    run = run or _default_run
+    writer = ResultWriter(output_path)
+    counts = {'ok': 0, 'error': 0}
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='batch') as pool:
+            futures = [pool.submit(run_item, item, run) for item in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                writer.write(record)
+                counts[record['status']] += 1
+                if on_result is not None:
+                    on_result(record)
+    finally:
+        writer.close()
+    return {
+        'total': len(items),
+        'skipped': len(items) - len(pending),
+        'ok': counts['ok'],
+        'error': counts['error'],
+        'wall_seconds': round(time.perf_counter() - start, 3),
+    }
@@ -16,9 +16,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from agent.data_analysis_agent import run_agent
 from tools.dataset_tools import dataset_tools
+from observability.metrics import metrics
+from observability.tracing import load_spans, slowest_traces
 import os
 import base64
 import sys
+import queue
 import subprocess
 import threading
 import time
@@ -27,6 +30,112 @@ import webbrowser
 app = typer.Typer()
 console = Console()
 
+def show_metrics():
+    """Print a table of the histogram metrics collected in this process."""
+    if not metrics.enabled:
+        console.print("[yellow]Metrics are disabled. Set AGENT_METRICS_ENABLED=true to collect them.[/yellow]")
+        return
+    
+    table = Table(title="Latency Metrics")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Labels", style="magenta")
+    table.add_column("Count", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p90", justify="right")
+    table.add_column("p99", justify="right")
+    table.add_column("Max", justify="right", style="yellow")
+    
+    def fmt(value):
+        return "-" if value is None else f"{value:.3f}"
+    
+    for name, metric in sorted(metrics.snapshot().items()):
+        if metric['type'] != 'histogram':
+            continue
+        for series in metric['series']:
+            labels = ", ".join(f"{k}={v}" for k, v in series['labels'].items())
+            table.add_row(name, labels, str(series['count']), fmt(series['p50']),
+                          fmt(series['p90']), fmt(series['p99']), fmt(series['max']))
+    
+    console.print(table)
+
+def show_in_webview(path: str, note: str):
+    """Start the web viewer in the background if needed and open ``path`` in the browser."""
+    url = f"http://localhost:8080{path}"
+
+    # Start web server in background if not already running
+    def start_web_server():
+        try:
+            subprocess.run([sys.executable, "interfaces/webview.py"],
+                         capture_output=True, timeout=5)
+        except subprocess.TimeoutExpired:
+            pass  # Server started successfully
+        except Exception as e:
+            console.print(f"[yellow]Warning: Web server may not have started properly: {str(e)}[/yellow]")
+
+    # Start server in background thread
+    server_thread = threading.Thread(target=start_web_server, daemon=True)
+    server_thread.start()
+
+    # Wait a moment for server to start
+    time.sleep(1)
+
+    # Try to open browser automatically
+    try:
+        webbrowser.open(url)
+        console.print(Panel(
+            f"[green]{note} and browser opened![/green]\nIf the browser didn't open, visit [bold blue]{url}[/bold blue]",
+            title="Visualization",
+            border_style="magenta"
+        ))
+    except Exception:
+        console.print(Panel(
+            f"[green]{note}![/green]\nOpen [bold blue]{url}[/bold blue] in your browser to view it.",
+            title="Visualization",
+            border_style="magenta"
+        ))
+
+def show_live_event(event):
+    """Print output and progress of the agent's running code as it arrives."""
+    if event.get('type') == 'output':
+        console.print(Text(event['text'], style="dim"), end="")
+    elif event.get('type') == 'progress':
+        parts = [event.get('message') or "Working"]
+        if 'done' in event:
+            parts.append(f"{event['done']}/{event['total']}" if 'total' in event else str(event['done']))
+        if 'percent' in event:
+            parts.append(f"({event['percent']}%)")
+        console.print(f"[cyan]⏳ {' '.join(parts)}[/cyan]")
+
+def run_with_live_output(user_input: str):
+    """Run the agent in a worker thread and show its code output live; Ctrl+C cancels the running code."""
+    events = queue.Queue()
+    outcome = {}
+
+    def work():
+        try:
+            outcome['result'] = run_agent(user_input, on_event=events.put)
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            events.put(None)
+
+    threading.Thread(target=work, name='agent-turn', daemon=True).start()
+    while True:
+        try:
+            event = events.get()
+        except KeyboardInterrupt:
+            if dataset_tools.cancel_execution():
+                console.print("\n[yellow]Cancelling the running code...[/yellow]")
+            else:
+                console.print("\n[yellow]No code is running; waiting for the agent to finish.[/yellow]")
+            continue
+        if event is None:
+            break
+        show_live_event(event)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
 @app.command()
 def chat():
     """Start an interactive chat session with the AI agent."""
@@ -41,6 +150,7 @@ def chat():
     console.print("• 'history' - Show execution history")
     console.print("• 'info' - Show current dataset info")
     console.print("• 'reset' - Reset to original dataset")
+    console.print("• 'metrics' - Show latency metrics (AGENT_METRICS_ENABLED=true)")
     console.print("• 'help' - Show this help")
     
     while True:
@@ -104,12 +214,16 @@ def chat():
                 else:
                     console.print(f"[red]{result['message']}[/red]")
                 continue
+            elif user_input.lower() == 'metrics':
+                show_metrics()
+                continue
             elif user_input.lower() == 'help':
                 console.print("\n[green]Available commands:[/green]")
                 console.print("• 'quit' or 'exit' - End the session")
                 console.print("• 'history' - Show execution history")
                 console.print("• 'info' - Show current dataset info")
                 console.print("• 'reset' - Reset to original dataset")
+                console.print("• 'metrics' - Show latency metrics (AGENT_METRICS_ENABLED=true)")
                 console.print("• 'help' - Show this help")
                 console.print("\n[green]Example queries:[/green]")
                 console.print("• 'Load the iris dataset and show me basic statistics'")
@@ -119,8 +233,8 @@ def chat():
                 continue
             
             # Run the agent
-            console.print("\n[bold blue]AI Agent[/bold blue] is thinking...")
-            result = run_agent(user_input)
+            console.print("\n[bold blue]AI Agent[/bold blue] is thinking... [dim](Ctrl+C cancels running code)[/dim]")
+            result = run_with_live_output(user_input)
             
             # Display the response
             for message in result["final_messages"]:
@@ -137,37 +251,12 @@ def chat():
                                 # Decode base64 data back to bytes
                                 plot_bytes = base64.b64decode(data['plot_data'])
                                 f.write(plot_bytes)
-                            # Start web server in background if not already running
-                            def start_web_server():
-                                try:
-                                    subprocess.run([sys.executable, "interfaces/webview.py"], 
-                                                 capture_output=True, timeout=5)
-                                except subprocess.TimeoutExpired:
-                                    pass  # Server started successfully
-                                except Exception as e:
-                                    console.print(f"[yellow]Warning: Web server may not have started properly: {str(e)}[/yellow]")
-                            
-                            # Start server in background thread
-                            server_thread = threading.Thread(target=start_web_server, daemon=True)
-                            server_thread.start()
-                            
-                            # Wait a moment for server to start
-                            time.sleep(1)
-                            
-                            # Try to open browser automatically
-                            try:
-                                webbrowser.open('http://localhost:8080/')
-                                console.print(Panel(
-                                    f"[green]Visualization saved and browser opened![/green]\nIf the browser didn't open, visit [bold blue]http://localhost:8080/[/bold blue]",
-                                    title="Visualization",
-                                    border_style="magenta"
-                                ))
-                            except Exception:
-                                console.print(Panel(
-                                    f"[green]Visualization saved![/green]\nOpen [bold blue]http://localhost:8080/[/bold blue] in your browser to view the latest plot.",
-                                    title="Visualization",
-                                    border_style="magenta"
-                                ))
+                            show_in_webview('/', "Visualization saved")
+                            continue
+                        if (isinstance(data, dict) and data.get('success') and data.get('artifact_id')
+                                and data.get('figure', {}).get('format') in ('plotly', 'vega-lite')):
+                            # Interactive charts are rendered client-side from the stored JSON spec
+                            show_in_webview(f"/view/{data['artifact_id']}", "Interactive chart ready")
                             continue
                     except Exception:
                         pass
@@ -250,5 +339,96 @@ def demo():
     
     console.print("\n[bold green]Demo completed![/bold green]")
 
+@app.command()
+def batch(
+    input_file: str = typer.Argument(..., help="JSONL file of queries (strings or objects with 'query', 'id', 'dataset')"),
+    output: str = typer.Option("batch_results.jsonl", help="JSONL file results are appended to"),
+    concurrency: int = typer.Option(4, help="Number of queries run in parallel, each in its own session"),
+    rps: float = typer.Option(0, help="Maximum LLM requests per second across all workers (0 = unlimited)"),
+    retry_failed: bool = typer.Option(True, help="Re-run queries that failed in an earlier run"),
+):
+    """Run many queries headlessly; restarting skips queries already finished in the output file."""
+    from interfaces.batch import run_batch
+    from agent.data_analysis_agent import set_llm_rate_limit
+    
+    if rps:
+        set_llm_rate_limit(rps)
+    
+    def report(record):
+        status = "[green]ok[/green]" if record['status'] == 'ok' else f"[red]error[/red] {record.get('error', '')}"
+        console.print(f"[cyan]{record['id']}[/cyan] {status} [dim]{record['timing']['total_seconds']:.1f}s[/dim]")
+    
+    console.print(f"[bold blue]Running batch[/bold blue] {input_file} -> {output} (concurrency {concurrency})")
+    summary = run_batch(input_file, output, concurrency=concurrency, retry_failed=retry_failed, on_result=report)
+    console.print(Panel(
+        f"Total: {summary['total']}  Skipped (already done): {summary['skipped']}\n"
+        f"Succeeded: {summary['ok']}  Failed: {summary['error']}  Wall time: {summary['wall_seconds']:.1f}s",
+        title="Batch complete",
+        border_style="green" if summary['error'] == 0 else "yellow"
+    ))
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Interface to bind"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+    max_runs: int = typer.Option(int(os.getenv("AGENT_SERVER_MAX_RUNS", "8")), help="Agent runs executed at once"),
+    fake_llm: bool = typer.Option(False, help="Use the scripted local model instead of the API (for benchmarking)"),
+):
+    """Serve the agent over HTTP with SSE streaming, dataset upload and artifact download."""
+    from interfaces.server import run_server
+    
+    console.print(f"[bold blue]Serving[/bold blue] on http://{host}:{port} "
+                  f"(max {max_runs} concurrent runs{', fake LLM' if fake_llm else ''})")
+    run_server(host, port, fake_llm=fake_llm, max_concurrent_runs=max_runs)
+
+@app.command()
+def bench(
+    url: str = typer.Option("http://127.0.0.1:8000", help="Base URL of a running server"),
+    requests: int = typer.Option(100, help="Number of chats to run"),
+    concurrency: int = typer.Option(10, help="Chats in flight at once"),
+):
+    """Load-test a running server; start it with `serve --fake-llm` to measure the server alone."""
+    import asyncio
+    from interfaces.server import benchmark
+    
+    result = asyncio.run(benchmark(url, requests=requests, concurrency=concurrency))
+    table = Table(title=f"{requests} chats, concurrency {concurrency}")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", justify="right", style="yellow")
+    for key, value in result.items():
+        table.add_row(key, str(value))
+    console.print(table)
+
+@app.command()
+def traces(
+    limit: int = typer.Option(10, help="Number of traces to show"),
+    recent: int = typer.Option(200, help="Only consider this many most recent traces"),
+    trace_dir: str = typer.Option(os.getenv("AGENT_TRACE_DIR", ".traces"), "--dir", help="Trace directory"),
+):
+    """Show the slowest recent runs recorded with AGENT_TRACING=local."""
+    spans = load_spans(trace_dir)
+    if not spans:
+        console.print(f"[yellow]No traces found in {trace_dir}. Run the agent with AGENT_TRACING=local first.[/yellow]")
+        return
+    
+    table = Table(title=f"Slowest of the last {recent} runs")
+    table.add_column("Started", style="cyan")
+    table.add_column("Run", style="green")
+    table.add_column("Duration", justify="right", style="yellow")
+    table.add_column("LLM", justify="right")
+    table.add_column("Tools", justify="right")
+    table.add_column("Tokens", justify="right")
+    table.add_column("Slowest span", style="magenta")
+    table.add_column("Status")
+    
+    for trace in slowest_traces(spans, limit=limit, recent=recent):
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(trace['start_time']))
+        status = "[green]ok[/green]" if trace['status'] == 'ok' else "[red]error[/red]"
+        table.add_row(started, trace['name'], f"{trace['duration_ms'] / 1000:.2f}s",
+                      str(trace['llm_calls']), str(trace['tool_calls']), str(trace['tokens']),
+                      trace['slowest_span'] or "-", status)
+    
+    console.print(table)
+
 if __name__ == "__main__":
     app() 
\ No newline at end of file
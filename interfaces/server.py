@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Async HTTP API for the Data Analysis AI Agent
+aiohttp service with session-scoped endpoints:
+
+  POST   /sessions                           create a session
+  GET    /sessions/{id}                      datasets, message count, artifacts
+  DELETE /sessions/{id}                      drop a session
+  POST   /sessions/{id}/chat                 {"message": ...} -> Server-Sent Events
+  POST   /sessions/{id}/cancel               cancel the running code snippet
+  POST   /sessions/{id}/datasets?name=&format=   streamed upload of a data file
+  GET    /artifacts/{artifact_id}            download a stored visualization
+  GET    /health, /metrics
+
+Agent runs execute on a bounded thread pool; a request that cannot get a slot
+within ``queue_timeout`` is refused with 503. Events flow to the client
+through a bounded queue, so a slow reader pauses the agent instead of
+buffering without limit. Connections are kept alive between requests.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from aiohttp import web
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+
+from agent.data_analysis_agent import app as agent_app, SYSTEM_PROMPT, set_llm
+from interfaces.agent_chat_ui import AgentChatUIWrapper
+from observability.metrics import metrics
+from tools.artifact_store import artifact_store
+from tools.dataset_registry import FILE_READERS
+from tools.dataset_tools import DatasetTools, use_dataset_tools
+
+_DONE = object()
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.tools = DatasetTools(session_id=session_id)
+        self.messages: List[Any] = [SystemMessage(content=SYSTEM_PROMPT)]
+        self.lock = asyncio.Lock()
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.cancelled = None
+
+    def close(self):
+        self.tools.close()
+
+    def describe(self) -> Dict[str, Any]:
+        datasets = self.tools.list_datasets()
+        return {
+            'session_id': self.id,
+            'created_at': self.created_at,
+            'last_used': self.last_used,
+            'busy': self.lock.locked(),
+            'messages': len(self.messages),
+            'active_dataset': datasets['active'],
+            'datasets': datasets['datasets'],
+            'artifacts': [entry['visualization_file'] for entry in self.tools.execution_history
+                          if entry.get('visualization_file')],
+        }
+
+
+class SessionManager:
+    """In-memory sessions; idle ones are evicted first when ``max_sessions`` is reached or after ``idle_ttl``."""
+
+    def __init__(self, max_sessions: int = 100, idle_ttl: float = 3600):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: Dict[str, Session] = {}
+
+    def create(self) -> Session:
+        self.evict()
+        if len(self._sessions) >= self.max_sessions:
+            idle = [s for s in self._sessions.values() if not s.lock.locked()]
+            if not idle:
+                raise web.HTTPServiceUnavailable(reason="Too many active sessions")
+            self._sessions.pop(min(idle, key=lambda s: s.last_used).id).close()
+        session = Session(uuid.uuid4().hex)
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({'error': f"Unknown session '{session_id}'"}),
+                                   content_type='application/json')
+        session.last_used = time.time()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def evict(self):
+        now = time.time()
+        for session in list(self._sessions.values()):
+            if not session.lock.locked() and now - session.last_used > self.idle_ttl:
+                self._sessions.pop(session.id).close()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class AgentServer:
+    def __init__(self, max_concurrent_runs: int = 8, queue_timeout: float = 30.0, event_queue_size: int = 64,
+                 max_upload_mb: float = 512, upload_dir: str = ".uploads", max_sessions: int = 100,
+                 summarizer_llm=None):
+        self.max_concurrent_runs = max_concurrent_runs
+        self.queue_timeout = queue_timeout
+        self.event_queue_size = event_queue_size
+        self.max_upload_bytes = int(max_upload_mb * 1024 * 1024)
+        self.upload_dir = upload_dir
+        self.sessions = SessionManager(max_sessions=max_sessions)
+        self.agent = AgentChatUIWrapper(agent_app, summarizer_llm)
+        self._slots = asyncio.Semaphore(max_concurrent_runs)
+        self._running = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_runs, thread_name_prefix='agent-run')
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'AgentServer':
+        """Read AGENT_SERVER_MAX_RUNS, _QUEUE_TIMEOUT, _EVENT_QUEUE, _MAX_SESSIONS and AGENT_UPLOAD_DIR / _MAX_MB."""
+        settings = dict(
+            max_concurrent_runs=int(os.getenv("AGENT_SERVER_MAX_RUNS", "8")),
+            queue_timeout=float(os.getenv("AGENT_SERVER_QUEUE_TIMEOUT", "30")),
+            event_queue_size=int(os.getenv("AGENT_SERVER_EVENT_QUEUE", "64")),
+            max_sessions=int(os.getenv("AGENT_SERVER_MAX_SESSIONS", "100")),
+            upload_dir=os.getenv("AGENT_UPLOAD_DIR", ".uploads"),
+            max_upload_mb=float(os.getenv("AGENT_UPLOAD_MAX_MB", "512")),
+        )
+        settings.update(overrides)
+        return cls(**settings)
+
+    def make_app(self) -> web.Application:
+        application = web.Application()
+        application.add_routes([
+            web.get('/health', self.health),
+            web.get('/metrics', self.metrics),
+            web.post('/sessions', self.create_session),
+            web.get('/sessions/{session_id}', self.get_session),
+            web.delete('/sessions/{session_id}', self.delete_session),
+            web.post('/sessions/{session_id}/chat', self.chat),
+            web.post('/sessions/{session_id}/cancel', self.cancel),
+            web.post('/sessions/{session_id}/datasets', self.upload_dataset),
+            web.get('/artifacts/{artifact_id}', self.download_artifact),
+        ])
+        application.on_cleanup.append(self._shutdown)
+        return application
+
+    async def _shutdown(self, application):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Basic endpoints
+
+    async def health(self, request):
+        return web.json_response({
+            'status': 'ok',
+            'sessions': len(self.sessions),
+            'free_run_slots': self.max_concurrent_runs - self._running,
+        })
+
+    async def metrics(self, request):
+        return web.Response(text=metrics.render_prometheus(), content_type='text/plain')
+
+    async def create_session(self, request):
+        session = self.sessions.create()
+        return web.json_response({'session_id': session.id}, status=201)
+
+    async def get_session(self, request):
+        return web.json_response(self.sessions.get(request.match_info['session_id']).describe(), dumps=_dumps)
+
+    async def delete_session(self, request):
+        session = self.sessions.get(request.match_info['session_id'])
+        session.tools.cancel_execution()
+        self.sessions.delete(session.id)
+        return web.json_response({'deleted': session.id})
+
+    async def cancel(self, request):
+        session = self.sessions.get(request.match_info['session_id'])
+        if session.cancelled is not None:
+            session.cancelled.set()
+        return web.json_response({'cancelled': session.tools.cancel_execution()})
+
+    # Chat with Server-Sent Events
+
+    def _run_agent(self, session: Session, query: str, queue: asyncio.Queue, loop, cancelled) -> None:
+        """Worker thread: stream the graph and hand events to the event loop, blocking while the queue is full."""
+        def emit(event, data):
+            if not cancelled.is_set():  # nobody reads the queue once the client has gone
+                asyncio.run_coroutine_threadsafe(queue.put((event, data)), loop).result()
+
+        state = {'messages': session.messages + [HumanMessage(content=query)]}
+        new_messages = []
+        final = None
+        budget = None
+        start = time.perf_counter()
+        try:
+            with use_dataset_tools(session.tools):
+                for mode, payload in self.agent.stream(state, stream_mode=["messages", "updates", "custom"]):
+                    if cancelled.is_set():
+                        final = ('error', {'message': 'cancelled'})
+                        return
+                    if mode == "custom":
+                        # Live code output and progress ('output' / 'progress' events)
+                        emit(payload.get('type', 'custom'), payload)
+                        continue
+                    if mode == "messages":
+                        chunk, meta = payload
+                        if (isinstance(chunk, AIMessageChunk) and chunk.content
+                                and meta.get('langgraph_node') in ('agent', 'final_answer')):
+                            emit('token', {'text': chunk.content})
+                        continue
+                    for node, update in payload.items():
+                        budget = (update or {}).get('budget', budget)
+                        for message in (update or {}).get('messages', []):
+                            new_messages.append(message)
+                            for event, data in _message_events(message):
+                                emit(event, data)
+            session.messages = state['messages'] + new_messages
+            final = ('done', {'seconds': round(time.perf_counter() - start, 3), 'messages': len(session.messages),
+                              'budget': budget})
+        except Exception as e:
+            final = ('error', {'message': f"{type(e).__name__}: {e}"})
+        finally:
+            loop.call_soon_threadsafe(_finish, queue, final)
+
+    async def chat(self, request):
+        session = self.sessions.get(request.match_info['session_id'])
+        try:
+            body = await request.json()
+            query = body['message']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text=json.dumps({'error': "Body must be JSON with a 'message' field"}),
+                                     content_type='application/json')
+        if session.lock.locked():
+            raise web.HTTPConflict(text=json.dumps({'error': "A chat is already running in this session"}),
+                                   content_type='application/json')
+
+        async with session.lock:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise web.HTTPServiceUnavailable(headers={'Retry-After': '5'},
+                                                 text=json.dumps({'error': "Server busy, retry later"}),
+                                                 content_type='application/json')
+            self._running += 1
+            try:
+                return await self._stream_chat(request, session, query)
+            finally:
+                self._running -= 1
+                self._slots.release()
+
+    async def _stream_chat(self, request, session: Session, query: str):
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        await response.prepare(request)
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.event_queue_size)
+        cancelled = session.cancelled = threading.Event()
+        worker = loop.run_in_executor(self._executor, self._run_agent, session, query, queue, loop, cancelled)
+        try:
+            while True:
+                event, data = await queue.get()
+                if data is _DONE:
+                    break
+                # write() waits for the transport to drain, so a slow client slows the producer
+                await response.write(f"event: {event}\ndata: {_dumps(data)}\n\n".encode('utf-8'))
+        except (ConnectionResetError, asyncio.CancelledError):
+            cancelled.set()
+            session.tools.cancel_execution()
+            # The slot and the session are only freed once the worker stops using them
+            await _settle(worker, queue)
+            raise
+        finally:
+            session.cancelled = None
+        await worker
+        await response.write_eof()
+        return response
+
+    # Uploads and artifacts
+
+    async def upload_dataset(self, request):
+        session = self.sessions.get(request.match_info['session_id'])
+        name = request.query.get('name') or f"upload_{uuid.uuid4().hex[:8]}"
+        extension = '.' + request.query.get('format', 'csv').lstrip('.').lower()
+        if extension not in FILE_READERS:
+            raise web.HTTPBadRequest(text=json.dumps({'error': f"Unsupported format '{extension}'"}),
+                                     content_type='application/json')
+        if not name.isidentifier():
+            raise web.HTTPBadRequest(text=json.dumps({'error': "Dataset name must be a valid identifier"}),
+                                     content_type='application/json')
+
+        directory = os.path.join(self.upload_dir, session.id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name + extension)
+        received = 0
+        # Stream the body to disk in chunks; the whole file is never held in memory
+        with open(path + '.part', 'wb') as f:
+            async for chunk in request.content.iter_chunked(256 * 1024):
+                received += len(chunk)
+                if received > self.max_upload_bytes:
+                    f.close()
+                    os.remove(path + '.part')
+                    raise web.HTTPRequestEntityTooLarge(max_size=self.max_upload_bytes, actual_size=received)
+                f.write(chunk)
+        os.replace(path + '.part', path)
+
+        lazy = request.query.get('lazy', 'true').lower() != 'false'
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(session.tools.load_dataset, path, name=name, lazy=lazy,
+                                              activate=not lazy))
+        status = 201 if result['success'] else 400
+        return web.json_response(dict(result, bytes=received), status=status, dumps=_dumps)
+
+    async def download_artifact(self, request):
+        artifact_id = request.match_info['artifact_id']
+        path = artifact_store.path_for(artifact_id)
+        if path is None:
+            raise web.HTTPNotFound()
+        return web.FileResponse(path, headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
+
+def _finish(queue: asyncio.Queue, final):
+    """Queue the closing event and end-of-stream marker without blocking the worker."""
+    for item in ([final] if final else []) + [(None, _DONE)]:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+
+def _drain(queue: asyncio.Queue):
+    """Empty the queue so a worker blocked on put() can finish."""
+    while not queue.empty():
+        queue.get_nowait()
+
+
+async def _settle(worker: asyncio.Future, queue: asyncio.Queue):
+    """Wait for a cancelled run's worker to return, draining events it may still be blocked on."""
+    while not worker.done():
+        _drain(queue)
+        try:
+            # wait() never cancels the worker future, even if this task is cancelled again
+            await asyncio.wait({worker}, timeout=0.1)
+        except asyncio.CancelledError:
+            pass
+    _drain(queue)
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, default=str)
+
+
+def _message_events(message):
+    if isinstance(message, AIMessage):
+        for call in message.tool_calls:
+            yield 'tool_start', {'id': call['id'], 'name': call['name'], 'args': call['args']}
+        if not message.tool_calls and message.content:
+            yield 'message', {'content': message.content}
+    elif isinstance(message, ToolMessage):
+        data = {'id': message.tool_call_id, 'name': message.name, 'content': str(message.content)[:2000]}
+        try:
+            result = json.loads(message.content)
+            if isinstance(result, dict) and result.get('artifact_id'):
+                data['artifact_id'] = result['artifact_id']
+                data['artifact_url'] = f"/artifacts/{result['artifact_id']}"
+        except (TypeError, ValueError):
+            pass
+        yield 'tool_end', data
+
+
+def use_fake_llm(first_token_latency: float = 0.0, token_latency: float = 0.0):
+    """Route the agent (and summarizer) to the scripted model so the server can be benchmarked offline."""
+    from agent.fake_llm import FakeAnalysisLLM
+    model = FakeAnalysisLLM(first_token_latency=first_token_latency, token_latency=token_latency)
+    set_llm(model)
+    return model
+
+
+def run_server(host: str = "127.0.0.1", port: int = 8000, fake_llm: bool = False, **settings):
+    summarizer = use_fake_llm(float(os.getenv("AGENT_FAKE_LLM_LATENCY", "0")),
+                              float(os.getenv("AGENT_FAKE_TOKEN_LATENCY", "0"))) if fake_llm else None
+    server = AgentServer.from_env(summarizer_llm=summarizer, **settings)
+    web.run_app(server.make_app(), host=host, port=port, keepalive_timeout=75, print=None)
+
+
+async def benchmark(url: str, requests: int = 100, concurrency: int = 10,
+                    message: str = "Load the iris dataset and describe it") -> Dict[str, Any]:
+    """Drive ``requests`` chats (one new session each) with ``concurrency`` in flight; report latency percentiles."""
+    import aiohttp
+
+    first_token, total, failures = [], [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async def one(client):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            async with client.post(f"{url}/sessions") as r:
+                session_id = (await r.json())['session_id']
+            seen_token = None
+            async with client.post(f"{url}/sessions/{session_id}/chat", json={'message': message}) as r:
+                if r.status != 200:
+                    failures += 1
+                    return
+                async for line in r.content:
+                    if line.startswith(b"event: token") and seen_token is None:
+                        seen_token = time.perf_counter() - start
+                    if line.startswith(b"event: error"):
+                        failures += 1
+            total.append(time.perf_counter() - start)
+            if seen_token is not None:
+                first_token.append(seen_token)
+            await client.delete(f"{url}/sessions/{session_id}")
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as client:
+        await asyncio.gather(*(one(client) for _ in range(requests)))
+    wall = time.perf_counter() - start
+
+    def pct(values, q):
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(q * len(values)))], 4) if values else None
+
+    return {
+        'requests': requests,
+        'failures': failures,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(len(total) / wall, 2) if wall else None,
+        'latency_p50': pct(total, 0.5),
+        'latency_p95': pct(total, 0.95),
+        'first_token_p50': pct(first_token, 0.5),
+        'first_token_p95': pct(first_token, 0.95),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Async HTTP API for the Data Analysis AI Agent")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--fake-llm', action='store_true', help="Use the scripted local model (benchmarking)")
+    args = parser.parse_args()
+    run_server(args.host, args.port, fake_llm=args.fake_llm)
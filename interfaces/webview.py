@@ -1,10 +1,35 @@
-from flask import Flask, send_from_directory, render_template_string
+from flask import Flask, send_from_directory, send_file, render_template_string, abort
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tools.artifact_store import artifact_store
+from tools.interactive_figures import VEGA_LITE_CONTENT_TYPE
 
 app = Flask(__name__)
 STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
 PLOT_PATH = os.path.join(STATIC_DIR, 'last_plot.png')
 
+# Interactive charts are rendered in the browser from the stored JSON spec.
+# Plotly >= 2.28 decodes the {dtype, bdata} typed arrays written by the agent.
+PLOTLY_VIEW = '''
+    <script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>
+    <div id="chart" style="width:90vw; height:80vh;"></div>
+    <script>
+        fetch("/artifacts/{{ artifact_id }}").then(r => r.json()).then(spec => {
+            Plotly.newPlot("chart", spec.data, spec.layout, {responsive: true});
+        });
+    </script>
+'''
+
+VEGA_VIEW = '''
+    <script src="https://cdn.jsdelivr.net/npm/vega@5"></script>
+    <script src="https://cdn.jsdelivr.net/npm/vega-lite@5"></script>
+    <script src="https://cdn.jsdelivr.net/npm/vega-embed@6"></script>
+    <div id="chart"></div>
+    <script>vegaEmbed("#chart", "/artifacts/{{ artifact_id }}");</script>
+'''
+
 @app.route('/')
 def index():
     if os.path.exists(PLOT_PATH):
@@ -16,10 +41,30 @@ def index():
     else:
         return '<h2>No visualization generated yet.</h2>'
 
+@app.route('/artifacts/<artifact_id>')
+def artifact(artifact_id):
+    path = artifact_store.path_for(artifact_id)
+    if path is None:
+        abort(404)
+    mimetype = 'application/json' if path.endswith('.json') else None
+    return send_file(path, mimetype=mimetype)
+
+@app.route('/view/<artifact_id>')
+def view(artifact_id):
+    record = next((r for r in artifact_store.list_artifacts() if r['artifact_id'] == artifact_id), None)
+    if record is None:
+        abort(404)
+    if record.get('content_type') == VEGA_LITE_CONTENT_TYPE:
+        return render_template_string(VEGA_VIEW, artifact_id=artifact_id)
+    if record['extension'].endswith('json'):
+        return render_template_string(PLOTLY_VIEW, artifact_id=artifact_id)
+    return render_template_string('<img src="/artifacts/{{ artifact_id }}" style="max-width:90vw; max-height:80vh;"/>',
+                                  artifact_id=artifact_id)
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     return send_from_directory(STATIC_DIR, filename)
 
 if __name__ == '__main__':
     os.makedirs(STATIC_DIR, exist_ok=True)
-    app.run(host='0.0.0.0', port=8080, debug=True) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8080, debug=True)
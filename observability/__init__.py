@@ -0,0 +1,2 @@
+# Observability package
+# Contains local metrics and tracing instrumentation for the agent
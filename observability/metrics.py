@@ -0,0 +1,323 @@
+"""
+Local metrics for the Data Analysis AI Agent
+Latency, token and payload-size histograms with a Prometheus text exporter
+and an in-process snapshot API. Disabled by default; when disabled every
+recording call returns immediately.
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# Default bucket layouts (upper bounds, +Inf is implicit)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0, 'max': value}
+                self._series[key] = series
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+            if value > series['max']:
+                series['max'] = value
+
+    def quantile(self, q: float, counts: List[int], total: int) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i >= len(self.buckets):
+                    # +Inf bucket: the best we can say is "at least the last bound"
+                    return self.buckets[-1] if self.buckets else None
+                upper = self.buckets[i]
+                return lower + (upper - lower) * ((rank - cumulative) / count)
+            cumulative += count
+        return self.buckets[-1] if self.buckets else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [(key, dict(s, counts=list(s['counts']))) for key, s in self._series.items()]
+        result = []
+        for key, series in items:
+            total = series['count']
+            # Bucket interpolation can overshoot the largest value actually seen
+            estimate = lambda q: min(self.quantile(q, series['counts'], total), series['max'])
+            result.append({
+                'labels': dict(key),
+                'count': total,
+                'sum': series['sum'],
+                'mean': series['sum'] / total if total else None,
+                'max': series['max'],
+                'p50': estimate(0.50),
+                'p90': estimate(0.90),
+                'p99': estimate(0.99),
+            })
+        return result
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, dict(s, counts=list(s['counts']))) for key, s in self._series.items()]
+        for key, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic counter, one series per label combination."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'labels': dict(key), 'value': value} for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class _Timer:
+    """Context manager that records elapsed seconds into a histogram."""
+    __slots__ = ('registry', 'name', 'labels', 'start', 'elapsed')
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, labels: Dict[str, Any]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.labels = dict(self.labels, status='error')
+        self.registry.observe(self.name, self.elapsed, **self.labels)
+        return False
+
+
+class _NullTimer:
+    """Shared no-op timer handed out while metrics are disabled."""
+    __slots__ = ()
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    Holds all agent metrics. Recording methods are no-ops while disabled so
+    instrumentation can stay in hot paths unconditionally.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description, buckets)
+            return self._metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self.histogram(name, name)
+        metric.observe(value, **labels)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self.counter(name, name)
+        metric.inc(amount, **labels)
+
+    def time(self, name: str, **labels):
+        """Time a block: ``with metrics.time("agent_call_model_seconds"): ...``"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current value of every metric as plain Python data."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+            result[metric.name] = {'type': kind, 'description': metric.description, 'series': metric.snapshot()}
+        return result
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Global registry
+metrics = MetricsRegistry(enabled=_env_flag("AGENT_METRICS_ENABLED"))
+
+metrics.histogram("agent_call_model_seconds", "Latency of LLM calls by model tier and purpose")
+metrics.histogram("agent_call_model_tokens", "Tokens per LLM call by direction and model tier", TOKEN_BUCKETS)
+metrics.counter("agent_model_route_total", "LLM calls routed to each model tier by purpose")
+metrics.histogram("agent_context_tokens_saved", "Estimated prompt tokens saved per LLM call by compacting stale tool outputs", TOKEN_BUCKETS)
+metrics.histogram("agent_tool_seconds", "Latency of tool calls by tool name")
+metrics.histogram("agent_tool_payload_bytes", "Tool input and output payload sizes by tool name", BYTES_BUCKETS)
+metrics.histogram("sandbox_execution_seconds", "Time spent executing sandboxed code")
+metrics.histogram("plot_render_seconds", "Time spent rendering and saving visualizations")
+metrics.histogram("sql_query_seconds", "Latency of run_sql queries")
+metrics.histogram("summarization_seconds", "Latency of conversation summarization")
+metrics.histogram("train_model_seconds", "Wall time of train_model cross-validation and refit by estimator")
+metrics.counter("model_registry_lookups_total", "models.fit calls answered from the model registry (hit) or trained (miss)")
+metrics.counter("model_registry_spills_total", "Fitted models spilled to disk to stay within the memory budget")
+metrics.counter("dataset_history_spills_total", "Dataset versions spilled to Arrow files to stay within the history memory cap")
+metrics.counter("code_slow_patterns_total", "Slow pandas patterns found in executed code by pattern and action")
+metrics.counter("tool_calls_coalesced_total", "Tool calls that joined an identical in-flight call instead of running, by operation")
+metrics.counter("llm_call_failures_total", "Failed LLM call attempts by tier and reason (timeout, error, circuit_open)")
+metrics.counter("llm_call_retries_total", "LLM call attempts retried after a transient failure")
+metrics.counter("llm_call_hedges_total", "Duplicate LLM requests sent after an attempt exceeded the hedge delay")
+metrics.counter("llm_call_hedge_wins_total", "Hedged LLM calls by the request that answered first (primary or hedge)")
+metrics.counter("llm_circuit_transitions_total", "LLM circuit breaker state changes by tier and new state")
+metrics.counter("summarization_failures_total", "Conversation summaries that failed; the full history was kept")
+metrics.counter("index_builds_total", "Column indexes built for frequently filtered columns by structure (groups, sorted)")
+metrics.counter("index_filters_accelerated_total", "Snippet row filters answered from a column index by structure")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = metrics
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = self.registry.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body = json.dumps(self.registry.snapshot(), default=str).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = '127.0.0.1', registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """
+    Serve ``/metrics`` (Prometheus text) and ``/metrics.json`` (snapshot)
+    from a daemon thread. Returns the server so callers can shut it down.
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry or metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True)
+    thread.start()
+    return server
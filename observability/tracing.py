@@ -0,0 +1,381 @@
+"""
+Local trace recorder for the Data Analysis AI Agent
+A LangChain callback handler that records spans for graph steps, LLM calls
+and tool calls to rotating JSONL files or SQLite, with head-based sampling and
+a batching background writer. Nothing leaves the machine.
+"""
+
+import os
+import json
+import time
+import glob
+import queue
+import random
+import atexit
+import sqlite3
+import threading
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Iterable
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+
+class JSONLTraceSink:
+    """Append spans to ``traces.jsonl``, rotating to ``traces.1.jsonl`` ... by size."""
+
+    def __init__(self, directory: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.path = os.path.join(directory, "traces.jsonl")
+        os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            src = os.path.join(self.directory, f"traces.{i}.jsonl")
+            if os.path.exists(src):
+                os.replace(src, os.path.join(self.directory, f"traces.{i + 1}.jsonl"))
+        if self.backup_count > 0:
+            os.replace(self.path, os.path.join(self.directory, "traces.1.jsonl"))
+        else:
+            os.remove(self.path)
+
+    def write(self, spans: List[Dict[str, Any]]):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + "\n")
+
+    def read(self) -> Iterable[Dict[str, Any]]:
+        paths = sorted(glob.glob(os.path.join(self.directory, "traces*.jsonl")))
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # partially written line from a crash
+
+    def close(self):
+        pass
+
+
+class SQLiteTraceSink:
+    """Store spans in a single SQLite table, keeping at most ``max_spans`` rows."""
+
+    def __init__(self, directory: str, max_spans: int = 200000):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "traces.sqlite")
+        self.max_spans = max_spans
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spans ("
+            "span_id TEXT PRIMARY KEY, trace_id TEXT, parent_id TEXT, name TEXT, kind TEXT, "
+            "start_time REAL, end_time REAL, duration_ms REAL, status TEXT, span TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spans_trace ON spans(trace_id)")
+        self._conn.commit()
+
+    def write(self, spans: List[Dict[str, Any]]):
+        rows = [
+            (s["span_id"], s["trace_id"], s.get("parent_id"), s["name"], s["kind"],
+             s["start_time"], s["end_time"], s["duration_ms"], s["status"], json.dumps(s, default=str))
+            for s in spans
+        ]
+        self._conn.executemany("INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._conn.execute(
+            "DELETE FROM spans WHERE rowid IN (SELECT rowid FROM spans ORDER BY start_time DESC LIMIT -1 OFFSET ?)",
+            (self.max_spans,)
+        )
+        self._conn.commit()
+
+    def read(self) -> Iterable[Dict[str, Any]]:
+        for (span,) in self._conn.execute("SELECT span FROM spans ORDER BY start_time"):
+            yield json.loads(span)
+
+    def close(self):
+        self._conn.close()
+
+
+class BatchingTraceWriter:
+    """
+    Buffers spans in a bounded queue and hands them to the sink from a
+    background thread, so the agent never blocks on disk I/O. Spans are
+    dropped (and counted) if the queue is full.
+    """
+    def __init__(self, sink, batch_size: int = 100, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, span: Dict[str, Any]):
+        try:
+            with self._flushed:
+                self._pending += 1
+            self._queue.put_nowait(span)
+        except queue.Full:
+            with self._flushed:
+                self._pending -= 1
+            self.dropped += 1
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    span = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if span is None:
+                    stop = True
+                    break
+                batch.append(span)
+            if batch:
+                try:
+                    self.sink.write(batch)
+                except Exception as e:
+                    print(f"Warning: Failed to write {len(batch)} trace spans: {e}")
+                with self._flushed:
+                    self._pending -= len(batch)
+                    self._flushed.notify_all()
+
+    def flush(self, timeout: float = 5.0):
+        """Block until every submitted span has been handed to the sink."""
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._flushed.wait(remaining)
+
+    def close(self):
+        if self._thread.is_alive():
+            self.flush()
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+            self.sink.close()
+
+
+class LocalTraceRecorder(BaseCallbackHandler):
+    """
+    Callback handler that turns LangChain/LangGraph run events into spans.
+
+    Sampling is decided once per trace at the root run (head-based), so a
+    trace is either recorded completely or not at all.
+    """
+    raise_error = False
+
+    def __init__(self, writer: BatchingTraceWriter, sample_rate: float = 1.0):
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+        self._unsampled: Dict[UUID, UUID] = {}  # run_id -> root run_id
+        self._lock = threading.Lock()
+
+    # Span bookkeeping
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str,
+               attributes: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            parent = self._open.get(parent_run_id) if parent_run_id else None
+            if parent_run_id is not None and parent_run_id in self._unsampled:
+                self._unsampled[run_id] = self._unsampled[parent_run_id]
+                return
+            if parent is None:
+                # New root: take the sampling decision for the whole trace
+                if random.random() >= self.sample_rate:
+                    self._unsampled[run_id] = run_id
+                    return
+                trace_id = str(run_id)
+            else:
+                trace_id = parent["trace_id"]
+            self._open[run_id] = {
+                "trace_id": trace_id,
+                "span_id": str(run_id),
+                "parent_id": str(parent_run_id) if parent is not None else None,
+                "name": name,
+                "kind": kind,
+                "start_time": time.time(),
+                "attributes": attributes or {},
+            }
+
+    def _end(self, run_id: UUID, status: str = "ok", error: Optional[BaseException] = None,
+             attributes: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            if self._unsampled.pop(run_id, None) is not None:
+                return
+            span = self._open.pop(run_id, None)
+        if span is None:
+            return
+        span["end_time"] = time.time()
+        span["duration_ms"] = round((span["end_time"] - span["start_time"]) * 1000, 3)
+        span["status"] = status
+        if error is not None:
+            span["error"] = f"{type(error).__name__}: {error}"[:500]
+        if attributes:
+            span["attributes"].update(attributes)
+        self.writer.submit(span)
+
+    @staticmethod
+    def _name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+        if kwargs.get("name"):
+            return kwargs["name"]
+        if serialized:
+            return serialized.get("name") or (serialized.get("id") or [default])[-1]
+        return default
+
+    # Chains and graph steps
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = self._name(serialized, kwargs, "chain")
+        if "langgraph_node" in metadata and metadata.get("langgraph_node") == name:
+            self._start(run_id, parent_run_id, name, "graph_step", {"step": metadata.get("langgraph_step")})
+        else:
+            self._start(run_id, parent_run_id, name, "chain")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "error", error)
+
+    # LLM calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        count = sum(len(batch) for batch in messages)
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chat_model"), "llm", {"input_messages": count})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "llm"), "llm", {"prompts": len(prompts)})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attributes = {}
+        usage = (response.llm_output or {}).get("token_usage") if response.llm_output else None
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    if message is not None and getattr(message, "usage_metadata", None):
+                        usage = dict(message.usage_metadata)
+        if usage:
+            attributes["input_tokens"] = usage.get("input_tokens", usage.get("prompt_tokens"))
+            attributes["output_tokens"] = usage.get("output_tokens", usage.get("completion_tokens"))
+        self._end(run_id, attributes=attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "error", error)
+
+    # Tool calls
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = self._name(serialized, kwargs, "tool")
+        self._start(run_id, parent_run_id, name, "tool", {"input_bytes": len(input_str or "")})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, "content", output)
+        self._end(run_id, attributes={"output_bytes": len(str(content))})
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "error", error)
+
+
+def create_sink(directory: str, fmt: str = "jsonl", max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+    """Build the sink for ``fmt`` ('jsonl' or 'sqlite')."""
+    if fmt == "sqlite":
+        return SQLiteTraceSink(directory)
+    if fmt == "jsonl":
+        return JSONLTraceSink(directory, max_bytes=max_bytes, backup_count=backup_count)
+    raise ValueError(f"Unknown trace format '{fmt}'. Use 'jsonl' or 'sqlite'.")
+
+
+def recorder_from_env() -> LocalTraceRecorder:
+    """Create a recorder configured from the AGENT_TRACE_* environment variables."""
+    sink = create_sink(
+        os.getenv("AGENT_TRACE_DIR", ".traces"),
+        os.getenv("AGENT_TRACE_FORMAT", "jsonl").lower(),
+        max_bytes=int(os.getenv("AGENT_TRACE_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("AGENT_TRACE_BACKUPS", "5")),
+    )
+    return LocalTraceRecorder(BatchingTraceWriter(sink), sample_rate=float(os.getenv("AGENT_TRACE_SAMPLE_RATE", "1.0")))
+
+
+_installed: Optional[LocalTraceRecorder] = None
+
+
+def install_local_tracing(recorder: Optional[LocalTraceRecorder] = None) -> LocalTraceRecorder:
+    """
+    Attach ``recorder`` to every LangChain run in this process, the same way
+    LangSmith attaches its tracer, so the graph needs no extra config.
+    """
+    global _installed
+    if _installed is not None:
+        return _installed
+    _installed = recorder or recorder_from_env()
+    register_configure_hook(ContextVar("local_trace_recorder", default=_installed), inheritable=True)
+    return _installed
+
+
+def load_spans(directory: str = ".traces") -> List[Dict[str, Any]]:
+    """Read every stored span from ``directory`` (JSONL and SQLite)."""
+    spans = []
+    if glob.glob(os.path.join(directory, "traces*.jsonl")):
+        spans.extend(JSONLTraceSink(directory).read())
+    if os.path.exists(os.path.join(directory, "traces.sqlite")):
+        sink = SQLiteTraceSink(directory)
+        spans.extend(sink.read())
+        sink.close()
+    return spans
+
+
+def slowest_traces(spans: List[Dict[str, Any]], limit: int = 10, recent: int = 200) -> List[Dict[str, Any]]:
+    """
+    Summarize the ``recent`` most recent traces and return the ``limit``
+    slowest, each with its LLM/tool counts, tokens and slowest child span.
+    """
+    by_trace: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        by_trace.setdefault(span["trace_id"], []).append(span)
+
+    summaries = []
+    for trace_id, trace_spans in by_trace.items():
+        root = next((s for s in trace_spans if s.get("parent_id") is None), None)
+        if root is None:
+            continue
+        children = [s for s in trace_spans if s is not root and s["kind"] in ("llm", "tool")]
+        slowest = max(children, key=lambda s: s["duration_ms"], default=None)
+        summaries.append({
+            "trace_id": trace_id,
+            "name": root["name"],
+            "start_time": root["start_time"],
+            "duration_ms": root["duration_ms"],
+            "status": "error" if any(s["status"] == "error" for s in trace_spans) else "ok",
+            "llm_calls": sum(1 for s in trace_spans if s["kind"] == "llm"),
+            "tool_calls": sum(1 for s in trace_spans if s["kind"] == "tool"),
+            "tokens": sum((s["attributes"].get("input_tokens") or 0) + (s["attributes"].get("output_tokens") or 0)
+                          for s in trace_spans if s["kind"] == "llm"),
+            "slowest_span": f"{slowest['kind']}:{slowest['name']} ({slowest['duration_ms']:.0f} ms)" if slowest else None,
+        })
+
+    summaries.sort(key=lambda s: s["start_time"], reverse=True)
+    summaries = summaries[:recent]
+    summaries.sort(key=lambda s: s["duration_ms"], reverse=True)
+    return summaries[:limit]
@@ -1,2 +1,15 @@
 # Tests package
-# Contains all test files for the project 
\ No newline at end of file
+# Contains all test files for the project and the helpers they share
+
+
+def iris_tools(session_id: str = "default", **components):
+    """
+    A fresh DatasetTools session with the iris dataset loaded. ``components``
+    replace session attributes (``kernel=...``, ``models=...``) before loading.
+    """
+    from tools.dataset_tools import DatasetTools
+    tools = DatasetTools(session_id=session_id)
+    for name, component in components.items():
+        setattr(tools, name, component)
+    tools.load_iris_dataset()
+    return tools
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Test script for the async HTTP API
+Tests sessions, SSE streaming with the scripted model, chunked uploads and the concurrency limit
+"""
+
+import asyncio
+import json
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from agent import data_analysis_agent
+from agent.data_analysis_agent import set_llm
+from interfaces.server import AgentServer, use_fake_llm
+
+REAL_LLM = data_analysis_agent.llm
+
+async def read_events(response):
+    """Parse an SSE body into (event, data) pairs."""
+    events, event = [], None
+    async for raw in response.content:
+        line = raw.decode().rstrip("\n")
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+def with_client(test, **settings):
+    async def runner():
+        server = AgentServer(upload_dir=tempfile.mkdtemp(), **settings)
+        async with TestClient(TestServer(server.make_app())) as client:
+            await test(client)
+    asyncio.run(runner())
+
+def test_chat_streams_events():
+    """Test that a chat streams tokens and tool events and keeps the session history"""
+    print("🧪 Testing SSE Chat...")
+    print("=" * 60)
+    use_fake_llm()
+
+    async def check(client):
+        r = await client.post("/sessions")
+        session_id = (await r.json())['session_id']
+        r = await client.post(f"/sessions/{session_id}/chat", json={'message': "Describe iris"})
+        assert r.status == 200 and r.headers['Content-Type'].startswith('text/event-stream')
+        events = await read_events(r)
+        kinds = [event for event, _ in events]
+        print(f"Events: {kinds}")
+        assert [data['name'] for event, data in events if event == 'tool_start'] == ['load_dataset', 'execute_code']
+        assert kinds.count('tool_end') == 2
+        assert kinds.count('token') > 5
+        assert kinds[-2:] == ['message', 'done']
+
+        r = await client.get(f"/sessions/{session_id}")
+        info = await r.json()
+        assert info['messages'] == 7 and info['active_dataset'] == 'iris'
+
+        r = await client.post(f"/sessions/{session_id}/chat", json={})
+        assert r.status == 400
+        r = await client.get("/sessions/missing")
+        assert r.status == 404
+    try:
+        with_client(check)
+    finally:
+        set_llm(REAL_LLM)
+    print("✅ Chat streams tokens and tool events!")
+
+def test_upload_and_artifacts():
+    """Test that uploads are streamed to disk and registered as datasets"""
+    print("\n🧪 Testing Upload...")
+    print("=" * 60)
+
+    async def chunks():
+        yield b"a,b\n"
+        for i in range(1000):
+            yield f"{i},{i * 2}\n".encode()
+
+    async def check(client):
+        session_id = (await (await client.post("/sessions")).json())['session_id']
+        r = await client.post(f"/sessions/{session_id}/datasets?name=pairs&format=csv&lazy=false", data=chunks())
+        result = await r.json()
+        print(f"Upload: {result['message']} ({result['bytes']} bytes)")
+        assert r.status == 201 and result['success']
+        info = await (await client.get(f"/sessions/{session_id}")).json()
+        assert info['active_dataset'] == 'pairs'
+
+        r = await client.post(f"/sessions/{session_id}/datasets?name=big&format=csv", data=b"x" * 65536)
+        assert r.status == 413
+        r = await client.get("/artifacts/does-not-exist")
+        assert r.status == 404
+    with_client(check, max_upload_mb=0.05)
+    print("✅ Uploads stream to datasets!")
+
+def test_concurrency_limit():
+    """Test that runs beyond the limit wait for a slot and are refused after the queue timeout"""
+    print("\n🧪 Testing Concurrency Limit...")
+    print("=" * 60)
+    use_fake_llm(first_token_latency=0.3)
+
+    async def check(client):
+        ids = [(await (await client.post("/sessions")).json())['session_id'] for _ in range(3)]
+
+        async def chat(session_id):
+            r = await client.post(f"/sessions/{session_id}/chat", json={'message': "hi"})
+            if r.status != 200:
+                return r.status
+            await read_events(r)
+            return r.status
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(chat(i) for i in ids))
+        print(f"Statuses: {statuses} in {time.perf_counter() - start:.2f}s")
+        assert sorted(statuses) == [200, 503, 503]
+
+        health = await (await client.get("/health")).json()
+        assert health['free_run_slots'] == 1 and health['sessions'] == 3
+    try:
+        with_client(check, max_concurrent_runs=1, queue_timeout=0.2)
+    finally:
+        set_llm(REAL_LLM)
+    print("✅ Excess runs are refused!")
+
+def test_disconnect_waits_for_worker():
+    """Test that a client leaving mid-stream frees its run slot only after the worker has stopped"""
+    print("\n🧪 Testing Disconnect Cleanup...")
+    print("=" * 60)
+    use_fake_llm(token_latency=0.01)
+    finished = []
+
+    class SlowServer(AgentServer):
+        def _run_agent(self, *args):
+            super()._run_agent(*args)
+            time.sleep(0.3)  # a tool call still finishing after the cancel
+            finished.append(time.perf_counter())
+
+    async def runner():
+        server = SlowServer(upload_dir=tempfile.mkdtemp(), max_concurrent_runs=1)
+        async with TestClient(TestServer(server.make_app())) as client:
+            session_id = (await (await client.post("/sessions")).json())['session_id']
+            r = await client.post(f"/sessions/{session_id}/chat", json={'message': "Describe iris"})
+            await r.content.readline()
+            r.close()
+            while (await (await client.get("/health")).json())['free_run_slots'] == 0:
+                await asyncio.sleep(0.02)
+            print(f"Slot freed, worker finished: {bool(finished)}")
+            assert finished
+            r = await client.post(f"/sessions/{session_id}/chat", json={'message': "hi"})
+            assert r.status == 200 and (await read_events(r))[-1][0] == 'done'
+    try:
+        asyncio.run(runner())
+    finally:
+        set_llm(REAL_LLM)
+    print("✅ Slot held until the worker stopped!")
+
+def main():
+    """Run all API server tests"""
+    print("🚀 Testing API Server")
+    print("=" * 60)
+
+    test_chat_streams_events()
+    test_upload_and_artifacts()
+    test_concurrency_limit()
+    test_disconnect_waits_for_worker()
+
+    print("\n🎉 All API server tests completed!")
+
+if __name__ == "__main__":
+    main()
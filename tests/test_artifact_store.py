@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for the content-addressed artifact store
+Tests deduplication, metadata and retention-based garbage collection
+"""
+
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tools.artifact_store import ArtifactStore
+
+def make_store(**limits):
+    return ArtifactStore(root=tempfile.mkdtemp(), gc_interval_seconds=None, **limits)
+
+def test_deduplication():
+    """Test that identical content is stored once with both references"""
+    print("🧪 Testing Deduplication...")
+    print("=" * 60)
+
+    store = make_store()
+    first = store.put(b"same plot", "png", session_id="a", code="plt.plot(x)", dataset_version=1)
+    second = store.put(b"same plot", "png", session_id="b", code="plt.plot(x)", dataset_version=1)
+
+    assert first['artifact_id'] == second['artifact_id']
+    assert first['deduplicated'] is False and second['deduplicated'] is True
+    assert [r['session_id'] for r in second['references']] == ["a", "b"]
+    assert len(store.list_artifacts()) == 1
+    assert store.path_for(first['artifact_id']) == first['path']
+    print("✅ Identical artifacts deduplicated!")
+
+def test_retention_by_count_and_bytes():
+    """Test that GC drops the least recently used artifacts first"""
+    print("\n🧪 Testing Count and Size Retention...")
+    print("=" * 60)
+
+    store = make_store(max_count=2, max_bytes=None)
+    ids = []
+    for i in range(4):
+        ids.append(store.put(f"plot {i}".encode(), "png")['artifact_id'])
+        time.sleep(0.01)
+    store.put(b"plot 0", "png")  # touch the oldest so it becomes most recent
+
+    report = store.collect_garbage()
+    print(f"GC report: {report}")
+    remaining = {r['artifact_id'] for r in store.list_artifacts()}
+    assert report['removed'] == 2
+    assert remaining == {ids[0], ids[3]}
+
+    store.max_count = None
+    store.max_bytes = 7
+    store.collect_garbage()
+    assert [r['artifact_id'] for r in store.list_artifacts()] == [ids[0]]
+    print("✅ Count and size retention working!")
+
+def test_retention_by_age():
+    """Test that artifacts unused for longer than max_age are removed"""
+    print("\n🧪 Testing Age Retention...")
+    print("=" * 60)
+
+    store = make_store(max_age_seconds=0.05)
+    record = store.put(b"old plot", "png")
+    time.sleep(0.1)
+    store.collect_garbage()
+
+    assert store.path_for(record['artifact_id']) is None
+    assert not os.path.exists(record['path'])
+    print("✅ Age retention working!")
+
+def main():
+    """Run all artifact store tests"""
+    print("🚀 Testing Artifact Store")
+    print("=" * 60)
+
+    test_deduplication()
+    test_retention_by_count_and_bytes()
+    test_retention_by_age()
+
+    print("\n🎉 All artifact store tests completed!")
+
+if __name__ == "__main__":
+    main()
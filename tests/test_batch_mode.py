@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for headless batch mode
+Tests isolated sessions, parallel execution, thread-safe output capture and restarts
+"""
+
+import json
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage
+
+from interfaces.batch import run_batch
+from tools.dataset_tools import dataset_tools, get_dataset_tools
+
+def fake_agent(query):
+    """Stand-in for run_agent that uses the tools the way the agent would."""
+    tools = get_dataset_tools()
+    tools.load_iris_dataset()
+    n = int(query.split()[-1])
+    result = tools.execute_python_code(f"import time\ntime.sleep(0.2)\nprint({n})\ndf = df.head({n})\nlen(df)")
+    if query.startswith("fail"):
+        raise RuntimeError("model unavailable")
+    answer = f"{result['output'].strip()} rows, session {tools.session_id}, shape {tools.current_dataset.shape[0]}"
+    return {'final_messages': [AIMessage(content=answer)]}
+
+def write_queries(queries):
+    path = os.path.join(tempfile.mkdtemp(), "queries.jsonl")
+    with open(path, 'w') as f:
+        for item in queries:
+            f.write(json.dumps(item) + "\n")
+    return path
+
+def read_results(path):
+    results = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record['id']] = record
+    return results
+
+def test_parallel_isolated_sessions():
+    """Test that queries run concurrently, each with its own dataset state and stdout"""
+    print("🧪 Testing Parallel Isolated Sessions...")
+    print("=" * 60)
+
+    queries = [{'id': f"q{n}", 'query': f"keep rows {n}"} for n in range(1, 9)]
+    input_path = write_queries(queries)
+    output_path = input_path.replace("queries", "results")
+
+    start = time.perf_counter()
+    summary = run_batch(input_path, output_path, concurrency=8, run=fake_agent)
+    elapsed = time.perf_counter() - start
+    print(f"Summary: {summary}, elapsed {elapsed:.2f}s")
+
+    results = read_results(output_path)
+    assert summary['ok'] == 8 and summary['error'] == 0
+    for n in range(1, 9):
+        assert results[f"q{n}"]['answer'] == f"{n} rows, session batch-q{n}, shape {n}"
+        assert results[f"q{n}"]['timing']['code_executions'] == 1
+    assert elapsed < 8 * 0.2
+    assert dataset_tools.current_dataset is None or dataset_tools.session_id == "default"
+    print("✅ Sessions isolated and run in parallel!")
+
+def test_restart_skips_finished():
+    """Test that a rerun only repeats failed or missing queries"""
+    print("\n🧪 Testing Restart...")
+    print("=" * 60)
+
+    input_path = write_queries(["keep rows 3", {'id': 'bad', 'query': "fail rows 2"}, {'id': 'x', 'query': "keep rows 5"}])
+    output_path = input_path.replace("queries", "results")
+    first = run_batch(input_path, output_path, concurrency=2, run=fake_agent)
+    assert first['ok'] == 2 and first['error'] == 1
+
+    # Simulate a crash in the middle of writing a line
+    with open(output_path, 'a') as f:
+        f.write('{"id": "x", "stat')
+    second = run_batch(input_path, output_path, concurrency=2, run=fake_agent)
+    print(f"Second run: {second}")
+    assert second['skipped'] == 2 and second['error'] == 1
+    assert 'model unavailable' in read_results(output_path)['bad']['error']
+    print("✅ Restart skips finished queries!")
+
+def main():
+    """Run all batch mode tests"""
+    print("🚀 Testing Batch Mode")
+    print("=" * 60)
+
+    test_parallel_isolated_sessions()
+    test_restart_skips_finished()
+
+    print("\n🎉 All batch mode tests completed!")
+
+if __name__ == "__main__":
+    main()
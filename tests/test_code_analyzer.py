@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the slow-pattern analyzer
+Tests detection of row-wise pandas code, cost estimates and warn/block modes
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from observability.metrics import metrics
+from tools.code_analyzer import CodeAnalyzer
+from tools.dataset_tools import DatasetTools
+
+SHAPES = {'df': (1_000_000, 10)}
+
+def patterns(code, shapes=SHAPES):
+    return [(f['pattern'], f['line']) for f in CodeAnalyzer().analyze(code, shapes)]
+
+def test_detects_anti_patterns():
+    """Test that each slow pattern is found at the right line and vectorized code is not flagged"""
+    print("🧪 Testing Pattern Detection...")
+    print("=" * 60)
+
+    assert patterns("for i, row in df.iterrows():\n    total += row['a']") == [('iterrows', 1)]
+    assert patterns("df['c'] = df.apply(lambda r: r['a'] * r['b'], axis=1)") == [('apply_axis1', 1)]
+    assert patterns("out = pd.DataFrame()\nfor g in groups:\n    out = pd.concat([out, g])") == [('concat_in_loop', 3)]
+    assert set(patterns("for i in range(len(df)):\n    res = res.append(df.iloc[i])")) == {('row_index_loop', 2), ('append_in_loop', 2)}
+    assert patterns("for c in df.columns:\n    df[c] = df[c].map(lambda v: v * 2)") == [('column_loop', 1)]
+    clean = "df['c'] = df['a'] * df['b']\ndf.groupby('k')['c'].mean()\nfor c in df.columns:\n    print(c)\nparts = [1, 2]\nparts.append(3)"
+    assert patterns(clean) == []
+    assert patterns("this is not python") == []
+    print("✅ Anti-patterns detected!")
+
+def test_cost_estimates_scale_with_data():
+    """Test that estimates follow the frame shape, including other named frames"""
+    print("\n🧪 Testing Cost Estimates...")
+    print("=" * 60)
+
+    analyzer = CodeAnalyzer()
+    big = analyzer.analyze("df.apply(f, axis=1)", {'df': (1_000_000, 5)})[0]['estimated_seconds']
+    small = analyzer.analyze("df.apply(f, axis=1)", {'df': (1_000, 5)})[0]['estimated_seconds']
+    other = analyzer.analyze("sales.apply(f, axis=1)", {'df': (1_000, 5), 'sales': (1_000_000, 5)})[0]['estimated_seconds']
+    print(f"1M rows: {big}s, 1k rows: {small}s, named frame: {other}s")
+    assert big > 1 and small < 0.1 and other == big
+
+    quadratic = analyzer.analyze("for i in range(len(df)):\n    out = pd.concat([out, df.iloc[[i]]])", {'df': (100_000, 10)})
+    grow = [f for f in quadratic if f['pattern'] == 'concat_in_loop'][0]
+    assert grow['estimated_seconds'] > 10
+    assert CodeAnalyzer(mode='off').analyze("df.iterrows()", SHAPES) == []
+    print("✅ Estimates scale with data!")
+
+def test_execute_warns_and_blocks():
+    """Test that execute_python_code attaches findings, blocks expensive code and counts detections"""
+    print("\n🧪 Testing Warn and Block Modes...")
+    print("=" * 60)
+
+    metrics.enabled = True
+    metrics.reset()
+    try:
+        tools = DatasetTools()
+        tools.load_iris_dataset()
+        result = tools.execute_python_code("ratios = df.apply(lambda r: r['petal length (cm)'] / r['petal width (cm)'], axis=1)\nratios.mean()")
+        print(f"Warned: {result['slow_patterns']}")
+        assert result['success'] and result['slow_patterns'][0]['pattern'] == 'apply_axis1'
+        assert 'slow_patterns' not in tools.execute_python_code("df['sepal length (cm)'].mean()")
+
+        tools.code_analyzer = CodeAnalyzer(mode='block', block_seconds=1.0)
+        tools.execute_python_code("datasets['big'] = pd.concat([df] * 2000, ignore_index=True)")
+        blocked = tools.execute_python_code("for i, row in big.iterrows():\n    total = row['target']")
+        print(f"Blocked: {blocked['message']}")
+        assert blocked['success'] is False and blocked['error_type'] == 'slow_pattern'
+        assert blocked['slow_patterns'][0]['estimated_seconds'] >= 1.0
+
+        counts = {s['labels']['action']: s['value'] for s in metrics.snapshot()['code_slow_patterns_total']['series']}
+        assert counts == {'warned': 1, 'blocked': 1}
+    finally:
+        metrics.enabled = False
+        metrics.reset()
+    print("✅ Findings surfaced and counted!")
+
+def main():
+    """Run all code analyzer tests"""
+    print("🚀 Testing Code Analyzer")
+    print("=" * 60)
+
+    test_detects_anti_patterns()
+    test_cost_estimates_scale_with_data()
+    test_execute_warns_and_blocks()
+
+    print("\n🎉 All code analyzer tests completed!")
+
+if __name__ == "__main__":
+    main()
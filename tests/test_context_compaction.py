@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for context compaction
+Tests that stale tool outputs are digested before LLM calls, recent ones stay verbatim and full text stays retrievable
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
+from agent.context_compaction import ContextCompactor, digest
+
+def tool_turn(index, name, content):
+    call_id = f"call_{index}"
+    return [AIMessage(content="", tool_calls=[{'name': name, 'args': {}, 'id': call_id}]),
+            ToolMessage(content=content, name=name, tool_call_id=call_id)]
+
+def long_output(i):
+    return json.dumps({'success': True, 'output': f"run {i}\n" + "x" * 2000,
+                       'result': {'type': 'dataframe', 'shape': [150, 6], 'handle': f"r{i}", 'preview': "y" * 1000}})
+
+def conversation():
+    messages = [SystemMessage(content="system"), HumanMessage(content="analyze")]
+    messages += tool_turn(0, 'get_dataset_info', json.dumps({'success': True, 'info': {'stats': "z" * 3000}}))
+    for i in range(1, 6):
+        messages += tool_turn(i, 'execute_code', long_output(i))
+    messages += tool_turn(6, 'get_dataset_info', json.dumps({'success': True, 'info': {'stats': "z" * 3000}}))
+    return messages
+
+def test_stale_outputs_are_digested():
+    """Test that old and superseded outputs become digests while the newest stay verbatim"""
+    print("🧪 Testing Compaction of Stale Outputs...")
+    print("=" * 60)
+
+    compactor = ContextCompactor(keep_recent=3)
+    messages = conversation()
+    compacted, report = compactor.compact(messages)
+    print(f"Report: {report}")
+
+    tool_messages = [m for m in compacted if isinstance(m, ToolMessage)]
+    assert len(compacted) == len(messages)
+    assert 'superseded get_dataset_info output compacted' in tool_messages[0].content
+    assert [m.content.startswith('[old execute_code') for m in tool_messages[1:5]] == [True, True, True, False]
+    assert tool_messages[-2].content == messages[-3].content and tool_messages[-1].content == messages[-1].content
+    assert "'r1'" not in tool_messages[1].content and '"handle": "r1"' in tool_messages[1].content
+    assert report['compacted'] == 4 and report['superseded'] == 1
+    assert report['tokens_saved'] > 1500 and report['tokens_after'] < report['tokens_before']
+    assert messages[3].content.startswith('{"success"')  # the state itself is untouched
+    print("✅ Stale outputs digested!")
+
+def test_full_text_is_retrievable():
+    """Test that a compacted output can be read back by its handle"""
+    print("\n🧪 Testing Retrieval by Handle...")
+    print("=" * 60)
+
+    compactor = ContextCompactor(keep_recent=1)
+    messages = conversation()
+    compactor.compact(messages)
+    assert compactor.archive.get('call_2') == messages[7].content
+    assert compactor.archive.get('call_6') is None
+
+    # Another session cannot read it with the same handle
+    compactor.compact(messages, session="s1")
+    assert compactor.archive.get('call_2', "s1") == messages[7].content
+    assert compactor.archive.get('call_2', "s2") is None
+
+    print(f"Digest: {digest(long_output(2))}")
+    assert json.loads(digest(long_output(2)))['result'] == {'type': 'dataframe', 'shape': [150, 6], 'handle': 'r2'}
+    assert json.loads(digest("plain text " * 100)).endswith("...")
+    print("✅ Full text retrievable!")
+
+def test_disabled_and_short_outputs():
+    """Test that short outputs and disabled compaction leave messages alone"""
+    print("\n🧪 Testing Short Outputs and Disabled Compaction...")
+    print("=" * 60)
+
+    messages = conversation()
+    _, report = ContextCompactor(enabled=False).compact(messages)
+    assert report['compacted'] == 0 and report['tokens_saved'] == 0
+
+    short = [HumanMessage(content="hi")] + tool_turn(1, 'execute_code', '{"success": true}') * 6
+    _, report = ContextCompactor(keep_recent=1).compact(short)
+    assert report['compacted'] == 0
+    print("✅ Nothing compacted when it would not help!")
+
+def main():
+    """Run all context compaction tests"""
+    print("🚀 Testing Context Compaction")
+    print("=" * 60)
+
+    test_stale_outputs_are_digested()
+    test_full_text_is_retrievable()
+    test_disabled_and_short_outputs()
+
+    print("\n🎉 All context compaction tests completed!")
+
+if __name__ == "__main__":
+    main()
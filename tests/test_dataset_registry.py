@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the named dataset registry
+Tests lazy loading, switching without reloads, zero-copy views, joins and changes made by helper functions
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from tools.dataset_registry import DatasetRegistry, view
+from tools.dataset_tools import DatasetTools
+
+def write_csv(frame):
+    path = os.path.join(tempfile.mkdtemp(), "species_names.csv")
+    frame.to_csv(path, index=False)
+    return path
+
+def test_lazy_loading_and_switching():
+    """Test that loaders run once, on first use, and switching never reloads"""
+    print("🧪 Testing Lazy Loading and Switching...")
+    print("=" * 60)
+
+    calls = []
+    registry = DatasetRegistry()
+    registry.register('a', loader=lambda: calls.append('a') or pd.DataFrame({'x': [1, 2]}))
+    registry.register('b', frame=pd.DataFrame({'y': [3]}))
+    assert calls == [] and registry.entry('a').memory_bytes() == 0
+
+    registry.activate('a')
+    registry.activate('b')
+    registry.activate('a')
+    assert calls == ['a']
+    assert registry.entry('a').memory_bytes() > 0
+    print("✅ Lazy loading and switching working!")
+
+def test_views_share_memory():
+    """Test that views do not copy until written"""
+    print("\n🧪 Testing Zero-Copy Views...")
+    print("=" * 60)
+
+    frame = pd.DataFrame({'x': np.arange(1000.0), 'y': np.arange(1000.0)})
+    shallow = view(frame)
+    columns = view(frame, ['x'])
+    assert np.shares_memory(shallow['x'].to_numpy(), frame['x'].to_numpy())
+    assert np.shares_memory(columns['x'].to_numpy(), frame['x'].to_numpy())
+
+    shallow.loc[0, 'x'] = -1.0
+    assert frame.loc[0, 'x'] == 0.0
+    print("✅ Views are copy-on-write!")
+
+def test_named_datasets_in_sandbox():
+    """Test joins across named datasets and storing derived tables"""
+    print("\n🧪 Testing Named Datasets in the Sandbox...")
+    print("=" * 60)
+
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    path = write_csv(pd.DataFrame({'target': [0, 1, 2], 'label': ['setosa', 'versicolor', 'virginica']}))
+    result = tools.load_dataset(path, name='labels', lazy=True, activate=False)
+    assert result['success'] and result['dataset']['loaded'] is False
+    assert tools.current_dataset.shape == (150, 6)
+
+    joined = tools.execute_python_code("datasets['joined'] = df.merge(datasets['labels'], on='target')\n"
+                                       "datasets['joined'].shape")
+    assert joined['result']['value'] == [150, 7], joined
+
+    listing = tools.list_datasets()
+    print(f"Datasets: {[(d['name'], d['loaded'], d['memory_bytes']) for d in listing['datasets']]}")
+    assert listing['active'] == 'iris'
+    assert [d['name'] for d in listing['datasets']] == ['iris', 'labels', 'joined']
+    assert listing['total_memory_bytes'] == sum(d['memory_bytes'] for d in listing['datasets'])
+
+    version = tools.dataset_version
+    switched = tools.switch_dataset('joined')
+    assert switched['success'] and tools.dataset_version == version + 1
+    assert tools.execute_python_code("df['label'].nunique()")['result']['value'] == 3
+    assert tools.execute_python_code("len(iris)")['result']['value'] == 150
+    assert not tools.switch_dataset('missing')['success']
+    print("✅ Named datasets working!")
+
+def test_helper_mutations_persist():
+    """Test that a frame changed by a helper function is stored back, and read-only calls leave the version alone"""
+    print("\n🧪 Testing Helper Mutations...")
+    print("=" * 60)
+
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    version = tools.dataset_version
+    for code in ("len(df)", "print(df.shape)", "sns.histplot(data=df, x='target')\nplt.close('all')"):
+        assert tools.execute_python_code(code)['success']
+    assert tools.dataset_version == version
+
+    tools.execute_python_code("def flag(d):\n    d['flag'] = d['target'] > 0\nflag(df)")
+    print(f"Columns after the helper: {list(tools.current_dataset.columns)}")
+    assert 'flag' in tools.current_dataset.columns and tools.dataset_version == version + 1
+    assert tools.execute_python_code("int(df['flag'].sum())")['result']['value'] == 100
+    print("✅ Helper changes persisted!")
+
+def main():
+    """Run all dataset registry tests"""
+    print("🚀 Testing Dataset Registry")
+    print("=" * 60)
+
+    test_lazy_loading_and_switching()
+    test_views_share_memory()
+    test_named_datasets_in_sandbox()
+    test_helper_mutations_persist()
+
+    print("\n🎉 All dataset registry tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for the index advisor
+Tests that hot filter, group, join and sort columns are mined from snippets and SQL, that their indexes answer
+row filters with exactly the rows of a scan, fall back once the data changes, and that SQL reads sorted tables
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from observability.metrics import metrics
+from tools.dataset_tools import DatasetTools
+from tools.index_advisor import IndexAdvisor, mine_snippet, mine_sql
+
+def make_tools(rows=200_000, **advisor):
+    tools = DatasetTools()
+    tools.index_advisor = IndexAdvisor(**dict({'min_uses': 2, 'min_rows': 1000}, **advisor))
+    rng = np.random.default_rng(7)
+    frame = pd.DataFrame({
+        'city': rng.choice([f"city{i}" for i in range(200)], rows),
+        'price': rng.random(rows) * 100,
+        'when': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 10 ** 6, rows), unit='s'),
+    })
+    frame.loc[::1000, 'price'] = np.nan
+    tools.current_dataset = frame
+    return tools
+
+def test_mining():
+    """Test that filters, groupbys, merges, sorts, queries and embedded SQL are counted per column"""
+    print("🧪 Testing Column Mining...")
+    print("=" * 60)
+
+    uses = mine_snippet("a = df[df['city'] == 'x']\nb = df.loc[df.price.between(1, 2)]\n"
+                        "df.groupby(['city', 'year']).size()\ndf.merge(other, on='id').sort_values(by='price')\n"
+                        "df.query('price > 3')\nsql(\"SELECT * FROM df WHERE city = 'x'\")")
+    print(f"Snippet uses: {dict(uses)}")
+    assert uses['filter', 'city'] == 1 and uses['filter', 'price'] == 2
+    assert uses['group', 'city'] == uses['group', 'year'] == uses['join', 'id'] == uses['sort', 'price'] == 1
+    assert uses['sql_filter', 'city'] == 1
+
+    uses = mine_sql('SELECT city, avg(price) FROM df JOIN t ON df.id = t.id WHERE "when" > 5 AND price BETWEEN 1 AND 2 '
+                    'GROUP BY city ORDER BY city')
+    print(f"SQL uses: {dict(uses)}")
+    assert uses['sql_filter', 'when'] == uses['sql_filter', 'price'] == 1
+    assert uses['join', 'id'] == 2 and uses['group', 'city'] == uses['sort', 'city'] == 1
+    assert mine_snippet("df[") == {}
+    print("✅ Hot columns mined from code!")
+
+def test_accelerated_filters():
+    """Test that filters on hot columns are answered from indexes with the same rows as a scan"""
+    print("\n🧪 Testing Accelerated Filters...")
+    print("=" * 60)
+
+    metrics.enabled = True
+    metrics.reset()
+    try:
+        tools = make_tools()
+        frame = tools.current_dataset
+        first = tools.execute_python_code("len(df[df['city'] == 'city1'])")
+        assert 'accelerated' not in first and 'accelerators_built' not in first
+
+        code = ("a = df[df['city'] == 'city3']\nb = df.loc[df.price > 99.5]\nc = df[df['city'].isin(['city1', 'city9'])]\n"
+                "d = df[df['price'].between(10, 10.5)]\ne = df[df['when'] < '2024-01-01 01:00']\n"
+                "f = df[df.price == 50]\n(a, b, c, d, e, f)")
+        tools.execute_python_code(code)
+        result = tools.execute_python_code(code.replace("(a, b, c, d, e, f)", "print(len(a), len(b))"))
+        print(f"Accelerated: {result['accelerated']}")
+        assert result['success'] and result['accelerated']['filters'] == 6
+        assert {i['column']: i['structure'] for i in tools.list_datasets()['accelerators']['indexes']} == {
+            'city': 'groups', 'price': 'sorted', 'when': 'sorted'}
+        assert result['output'] == f"{(frame['city'] == 'city3').sum()} {(frame['price'] > 99.5).sum()}\n"
+
+        # The same rows, labels and order as the scan
+        namespace = tools._build_namespace()
+        accelerator = tools.index_advisor.accelerator()
+        cases = [('city', '==', 'city3', frame['city'] == 'city3'), ('price', '>', 99.5, frame['price'] > 99.5),
+                 ('city', 'isin', ['city1', 'city9'], frame['city'].isin(['city1', 'city9'])),
+                 ('price', 'between', (10, 10.5), frame['price'].between(10, 10.5)),
+                 ('when', '<', '2024-01-01 01:00', frame['when'] < '2024-01-01 01:00'),
+                 ('price', '==', 50, frame['price'] == 50),
+                 ('when', 'isin', [frame['when'][3], frame['when'][3], frame['when'][4]],
+                  frame['when'].isin([frame['when'][3], frame['when'][4]]))]
+        for column, op, value, scan in cases:
+            pd.testing.assert_frame_equal(accelerator.filter(namespace['df'], column, False, op, value, False),
+                                          frame[scan])
+        assert accelerator.filters == 7
+        built = {tuple(sorted(s['labels'].items())): s['value']
+                 for s in metrics.snapshot()['index_builds_total']['series']}
+        assert built == {(('structure', 'groups'),): 1, (('structure', 'sorted'),): 2}
+    finally:
+        metrics.reset()
+        metrics.enabled = False
+    print("✅ Filters answered from indexes!")
+
+def test_fallback_after_changes():
+    """Test that edits in the snippet fall back to a scan and the index follows the new dataset version"""
+    print("\n🧪 Testing Fallback and Rebuilds...")
+    print("=" * 60)
+
+    tools = make_tools()
+    for _ in range(2):
+        tools.execute_python_code("len(df[df.price < 1])")
+    result = tools.execute_python_code("df.loc[0, 'price'] = -5\nlen(df[df.price < 0])")
+    print(f"After an edit: {result['result']}, accelerated: {result.get('accelerated')}")
+    assert result['result']['value'] == 1 and 'accelerated' not in result
+
+    result = tools.execute_python_code("len(df[df.price < 0])")
+    print(f"Next snippet: {result['result']}, rebuilt: {[b['column'] for b in result['accelerators_built']]}")
+    assert result['result']['value'] == 1 and result['accelerated']['filters'] == 1
+
+    # Values that do not compare like the column go through pandas, errors included
+    assert tools.execute_python_code("len(df[df.price < np.nan])")['result']['value'] == 0
+    assert not tools.execute_python_code("df[df.price < 'x']")['success']
+
+    tools.index_advisor.enabled = False
+    assert 'accelerated' not in tools.execute_python_code("len(df[df.price < 0])")
+    print("✅ Changed data never read from a stale index!")
+
+def test_sorted_sql_tables():
+    """Test that a column filtered in SQL gets a sorted table that returns the same rows in the same order"""
+    print("\n🧪 Testing Sorted SQL Tables...")
+    print("=" * 60)
+
+    tools = make_tools()
+    query = "SELECT city, price FROM df WHERE city = 'city5'"
+    plain = tools.run_sql(query, rows=1000)
+    assert 'accelerated' not in plain
+    result = tools.run_sql(query, rows=1000)
+    print(f"Built: {result['accelerators_built']}, used: {result['accelerated']}")
+    assert result['accelerated'] == tools.list_datasets()['accelerators']['sorted_tables']
+    assert result['rows'] == plain['rows'] and result['columns'] == ['city', 'price']
+    # Queries not mentioning the column read the DataFrame
+    assert 'accelerated' not in tools.run_sql("SELECT count(*) FROM df")
+
+    # A new dataset version is never read from the old table; the table is rebuilt for it
+    tools.execute_python_code("df = df.head(5000)")
+    assert tools.sql.sorted_for(query) == []
+    # Snippets never build sorted tables and drop the stale ones; the next query builds the new one
+    built = tools.execute_python_code("len(df)").get('accelerators_built', [])
+    assert all(b['structure'] != 'sql_sorted' for b in built)
+    assert tools.sql.describe_sorted() == []
+    result = tools.run_sql("SELECT count(*) FROM df WHERE city = 'city5'")
+    assert result['rows'] == [[int((tools.current_dataset['city'] == 'city5').sum())]]
+    assert result['accelerators_built'][-1]['structure'] == 'sql_sorted' and result['accelerated']
+    print("✅ SQL filters read the sorted table!")
+
+def main():
+    """Run all index advisor tests"""
+    print("🚀 Testing Index Advisor")
+    print("=" * 60)
+
+    test_mining()
+    test_accelerated_filters()
+    test_fallback_after_changes()
+    test_sorted_sql_tables()
+
+    print("\n🎉 All index advisor tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for interactive Plotly visualization output
+Tests JSON spec capture, typed-array encoding and the PNG fallback
+"""
+
+import json
+import base64
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import plotly.graph_objects as go
+
+import tools.dataset_tools as dataset_tools_module
+from tools.artifact_store import ArtifactStore
+from tests import iris_tools
+from tools.interactive_figures import serialize_figure, PLOTLY_CONTENT_TYPE
+
+def make_tools():
+    dataset_tools_module.artifact_store = ArtifactStore(root=tempfile.mkdtemp(), gc_interval_seconds=None)
+    return iris_tools()
+
+def test_serialize_typed_arrays():
+    """Test that numeric data arrays are binary-encoded in the spec"""
+    print("🧪 Testing Typed Array Encoding...")
+    print("=" * 60)
+
+    x = np.arange(1000, dtype='float64')
+    payload, extension, content_type, summary = serialize_figure(go.Figure(go.Scattergl(x=x, y=x * 2)))
+    spec = json.loads(payload)
+    print(f"Payload: {len(payload)} bytes, summary: {summary}")
+
+    encoded = spec['data'][0]['x']
+    assert extension == 'plotly.json' and content_type == PLOTLY_CONTENT_TYPE
+    assert encoded['dtype'] == 'f8'
+    assert np.array_equal(np.frombuffer(base64.b64decode(encoded['bdata']), dtype='float64'), x)
+    assert summary == {'format': 'plotly', 'traces': 1, 'trace_types': ['scattergl'], 'points': 1000}
+    print("✅ Typed arrays encoded!")
+
+def test_plotly_visualization_skips_png():
+    """Test that a trailing Plotly figure is stored as JSON instead of a PNG"""
+    print("\n🧪 Testing Plotly Visualization Path...")
+    print("=" * 60)
+
+    tools = make_tools()
+    result = tools.create_visualization("px.scatter(df, x='sepal length (cm)', y='petal length (cm)')")
+    print(f"Result: {result['message']}")
+
+    assert result['success'], result
+    assert result['file_path'].endswith('.plotly.json')
+    assert result['figure']['format'] == 'plotly' and result['figure']['points'] == 150
+    with open(result['file_path']) as f:
+        assert 'data' in json.load(f)
+
+    shown = tools.create_visualization("fig = px.histogram(df, x='target')\nfig.show()")
+    assert shown['success'] and shown['figure']['trace_types'] == ['histogram']
+    print("✅ Plotly figures stored as JSON!")
+
+def test_matplotlib_fallback():
+    """Test that matplotlib plots are still rendered to PNG"""
+    print("\n🧪 Testing Matplotlib Fallback...")
+    print("=" * 60)
+
+    tools = make_tools()
+    result = tools.create_visualization("plt.hist(df['target'])")
+    assert result['success'], result
+    assert result['file_path'].endswith('.png')
+    assert result['figure'] == {'format': 'png'}
+    print("✅ Matplotlib fallback working!")
+
+def main():
+    """Run all interactive figure tests"""
+    print("🚀 Testing Interactive Figures")
+    print("=" * 60)
+
+    test_serialize_typed_arrays()
+    test_plotly_visualization_skips_png()
+    test_matplotlib_fallback()
+
+    print("\n🎉 All interactive figure tests completed!")
+
+if __name__ == "__main__":
+    main()
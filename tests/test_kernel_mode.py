@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for kernel mode
+Tests that snippet variables persist between calls, memory accounting, eviction, dropping variables and
+failures while injecting them
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tests import iris_tools
+from tools.kernel import KernelNamespace
+
+def make_tools(**settings):
+    return iris_tools(kernel=KernelNamespace(enabled=True, **settings))
+
+def test_variables_persist():
+    """Test that variables defined in one snippet are available in the next"""
+    print("🧪 Testing Persistent Variables...")
+    print("=" * 60)
+
+    tools = make_tools()
+    result = tools.execute_python_code("import math\ncorr = df.corr(numeric_only=True)\nsetosa = df[df['species'] == 'setosa']\n_tmp = 1")
+    print(f"Stored: {result['variables']}")
+    assert sorted(result['variables']['stored']) == ['corr', 'setosa']
+
+    result = tools.execute_python_code("corr.shape[0] + len(setosa)")
+    assert result['success'] and result['result']['value'] == 55
+
+    listed = {v['name']: v for v in tools.list_variables()['variables']}
+    print(f"Listed: {listed}")
+    assert listed['setosa']['shape'] == [50, 6] and listed['setosa']['size_kb'] > 1
+    assert tools.list_variables()['memory_bytes'] == tools.kernel.memory_bytes() > 0
+
+    tools.execute_python_code("del setosa")
+    assert tools.kernel.names() == ['corr']
+    assert tools.create_visualization("plt.imshow(corr.values)")['success']
+
+    off = iris_tools()
+    off.execute_python_code("corr = df.corr(numeric_only=True)")
+    assert not off.execute_python_code("corr.shape")['success'] and not off.list_variables()['success']
+    print("✅ Variables persist between snippets!")
+
+def test_eviction_and_drop():
+    """Test that the least recently used variables are evicted and can be dropped explicitly"""
+    print("\n🧪 Testing Eviction and Drop...")
+    print("=" * 60)
+
+    tools = make_tools(max_memory_mb=2)
+    tools.execute_python_code("a = np.ones(100000)")
+    tools.execute_python_code("b = np.ones(100000)")
+    tools.execute_python_code("a.sum()")  # a is now more recently used than b
+    result = tools.execute_python_code("c = np.ones(100000)")
+    print(f"Variables: {result['variables']}")
+    assert result['variables']['evicted'] == ['b'] and sorted(tools.kernel.names()) == ['a', 'c']
+
+    counted = make_tools(max_variables=2)
+    for name in ('x', 'y', 'z'):
+        counted.execute_python_code(f"{name} = 1")
+    assert counted.kernel.names() == ['y', 'z']
+
+    assert tools.drop_variable('a')['success'] and tools.kernel.names() == ['c']
+    assert not tools.drop_variable('a')['success']
+    tools.set_kernel_mode(False)
+    assert tools.kernel.names() == [] and 'variables' not in tools.execute_python_code("1")
+    print("✅ Eviction and drop work!")
+
+def test_inject_failure():
+    """Test that a failure while injecting kept variables is reported and stdout is restored"""
+    print("\n🧪 Testing Injection Failures...")
+    print("=" * 60)
+
+    tools = make_tools()
+    tools.execute_python_code("kept = df.head(3)")
+    stdout = sys.stdout._target() if hasattr(sys.stdout, '_target') else sys.stdout
+    def broken(namespace, code):
+        raise MemoryError("cannot restore 'kept'")
+    tools.kernel.inject = broken
+    for result in (tools.execute_python_code("len(kept)"), tools.create_visualization("kept.plot()")):
+        print(f"  {result['message']}")
+        assert result['success'] is False and "cannot restore 'kept'" in result['message']
+    assert (sys.stdout._target() if hasattr(sys.stdout, '_target') else sys.stdout) is stdout
+    print("✅ Injection failures reported cleanly!")
+
+def main():
+    """Run all kernel mode tests"""
+    print("🚀 Testing Kernel Mode")
+    print("=" * 60)
+
+    test_variables_persist()
+    test_eviction_and_drop()
+    test_inject_failure()
+
+    print("\n🎉 All kernel mode tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for live code output
+Tests that prints and progress of running snippets are streamed while they run, rate limited and capped,
+sent as custom graph events and that a snippet can be cancelled mid-run
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import HumanMessage
+
+from agent import data_analysis_agent
+from agent.data_analysis_agent import set_llm
+from agent.fake_llm import FakeAnalysisLLM
+from tests import iris_tools
+from tools.dataset_tools import use_dataset_tools
+from tools.output_stream import OutputStreamSettings, StreamingOutput
+
+REAL_LLM = data_analysis_agent.llm
+
+LOOP = "for i in range({steps}):\n    print(f'step {{i}}')\n    progress(i + 1, {steps}, 'fitting')\n    time.sleep({pause})\n'done'"
+
+def make_tools():
+    return iris_tools(output_stream=OutputStreamSettings(interval_seconds=0.05))
+
+def test_rate_limit_and_cap():
+    """Test that bursts of writes are batched and streaming stops at the byte cap"""
+    print("🧪 Testing Rate Limit and Byte Cap...")
+    print("=" * 60)
+
+    events = []
+    output = StreamingOutput(events.append, OutputStreamSettings(interval_seconds=0.2, max_bytes=1000))
+    for i in range(50):
+        output.write(f"line {i}\n")
+    time.sleep(0.3)
+    print(f"Events after a burst of 50 writes: {len(events)}")
+    assert len(events) == 2 and ''.join(e['text'] for e in events) == output.getvalue()
+
+    output.write("x" * 2000)
+    output.close_stream()
+    output.write("after close\n")
+    print(f"Streamed {output.sent_bytes} bytes, truncated: {output.truncated}")
+    assert output.truncated and output.sent_bytes == 1000 and events[-1]['truncated']
+    assert len(output.getvalue()) > 2000 and 'after close' not in ''.join(e['text'] for e in events)
+    print("✅ Output batched and capped!")
+
+def test_output_streams_while_running():
+    """Test that prints and progress arrive before the snippet finishes, in order"""
+    print("\n🧪 Testing Live Snippet Output...")
+    print("=" * 60)
+
+    tools = make_tools()
+    events = []
+    result = tools.execute_python_code("import time\n" + LOOP.format(steps=3, pause=0.3),
+                                       on_output=lambda e: events.append((time.time(), e)))
+    finished = time.time()
+    outputs = [e['text'] for _, e in events if e['type'] == 'output']
+    progress = [e for _, e in events if e['type'] == 'progress']
+    print(f"Outputs: {outputs}, progress: {[p['percent'] for p in progress]}")
+
+    assert result['success'] and result['output'] == ''.join(outputs) == "step 0\nstep 1\nstep 2\n"
+    assert [p['done'] for p in progress] == [1, 2, 3] and progress[-1]['percent'] == 100.0
+    assert events[0][0] < finished - 0.5  # the first step was seen long before the end
+    assert tools.execute_python_code("progress(1, 2)\n1")['success']  # no-op without a listener
+    print("✅ Output and progress streamed live!")
+
+def test_cancel_mid_run():
+    """Test that a running snippet can be cancelled after its first output"""
+    print("\n🧪 Testing Cancel Mid-run...")
+    print("=" * 60)
+
+    tools = make_tools()
+    first_output = threading.Event()
+    results = []
+    worker = threading.Thread(target=lambda: results.append(tools.execute_python_code(
+        "import time\n" + LOOP.format(steps=100, pause=0.1), on_output=lambda e: first_output.set())))
+    worker.start()
+    assert first_output.wait(5)
+    assert tools.cancel_execution()
+    worker.join(5)
+    print(f"Result: {results[0]['error_type']}, output: {results[0]['output'][:20]!r}")
+    assert results[0]['error_type'] == 'cancelled' and results[0]['output'].startswith('step 0')
+    print("✅ Running snippet cancelled!")
+
+def test_graph_custom_events():
+    """Test that the agent's execute_code tool emits output as custom stream events"""
+    print("\n🧪 Testing Custom Graph Events...")
+    print("=" * 60)
+
+    try:
+        set_llm(FakeAnalysisLLM(code="print('fitting...')\nprogress(1, 1, 'fit')\n42"))
+        events = []
+        with use_dataset_tools(make_tools()):
+            result = data_analysis_agent.run_agent("Describe iris", on_event=events.append)
+        print(f"Custom events: {events}")
+        assert {'type': 'output', 'tool': 'execute_code', 'text': 'fitting...\n'} in events
+        assert any(e['type'] == 'progress' and e['percent'] == 100.0 for e in events)
+        assert result['final_messages'][-1].content
+    finally:
+        set_llm(REAL_LLM)
+    print("✅ Live output reaches the graph stream!")
+
+def main():
+    """Run all live output tests"""
+    print("🚀 Testing Live Code Output")
+    print("=" * 60)
+
+    test_rate_limit_and_cap()
+    test_output_streams_while_running()
+    test_cancel_mid_run()
+    test_graph_custom_events()
+
+    print("\n🎉 All live output tests completed!")
+
+if __name__ == "__main__":
+    main()
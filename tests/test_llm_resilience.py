@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Test script for LLM call resilience
+Tests retries with backoff, time-outs to the first token, hedged requests whose losers are cancelled before reaching
+callbacks, the circuit breaker and summaries that keep history on failure, against a local stub of the chat completions
+API that injects latency and errors
+"""
+
+import sys
+import os
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+
+from agent.model_router import ModelRouter
+from agent.resilience import ResiliencePolicy, CircuitOpenError, LLMCallTimeout, AttemptCancelled
+from interfaces.agent_chat_ui import ConversationSummarizer
+from observability.metrics import metrics
+
+class StubLLMServer:
+    """
+    Chat completions endpoint answering each request by the next scripted (status, delay) step, then 200s.
+    Streaming requests get the answer word by word; a third step value spreads the words over that many seconds.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        self.disconnects = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                with stub._lock:
+                    stub.requests += 1
+                    status, delay, *stream_seconds = stub.script.pop(0) if stub.script else (200, 0)
+                time.sleep(delay)
+                if status == 200 and request.get('stream'):
+                    self.stream(f"streamed answer after {delay}s", stream_seconds[0] if stream_seconds else 0)
+                    return
+                if status == 200:
+                    body = {'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+                            'choices': [{'index': 0, 'finish_reason': 'stop',
+                                         'message': {'role': 'assistant', 'content': f"answer after {delay}s"}}],
+                            'usage': {'prompt_tokens': 5, 'completion_tokens': 3, 'total_tokens': 8}}
+                else:
+                    body = {'error': {'message': f"injected {status}", 'type': 'stub_error'}}
+                payload = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up on this attempt
+
+            def stream(self, answer, seconds):
+                words = answer.split(" ")
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.end_headers()
+                    for i, word in enumerate(words + [None]):
+                        delta = {'content': word if i == 0 else " " + word} if word is not None else {}
+                        chunk = {'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+                                 'choices': [{'index': 0, 'delta': delta,
+                                              'finish_reason': None if word is not None else 'stop'}]}
+                        if i:
+                            time.sleep(seconds / len(words))
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.disconnects += 1  # the client cancelled this attempt
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def model(self, **options) -> ChatOpenAI:
+        return ChatOpenAI(model='stub', api_key='test', base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+                          max_retries=0, timeout=10, **options)
+
+# Started once for the module; requests are answered on daemon threads
+stub = StubLLMServer()
+
+@contextlib.contextmanager
+def recording_metrics():
+    metrics.enabled = True
+    metrics.reset()
+    try:
+        yield
+    finally:
+        metrics.reset()
+        metrics.enabled = False
+
+class TokenRecorder(BaseCallbackHandler):
+    """The caller's callbacks: tokens, ends and errors of the model runs they see."""
+
+    def __init__(self):
+        self.tokens, self.ends, self.errors = [], 0, []
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.tokens.append(token)
+
+    def on_llm_end(self, response, **kwargs):
+        self.ends += 1
+
+    def on_llm_error(self, error, **kwargs):
+        self.errors.append(error)
+
+def make_router(streaming=False, **policy):
+    policy = dict({'backoff_seconds': 0.01, 'backoff_max_seconds': 0.05}, **policy)
+    return ModelRouter(strong=stub.model(streaming=streaming), resilience=ResiliencePolicy(**policy))
+
+def ask(router, callbacks=None):
+    """Ask from inside a runnable (as graph nodes do) so the model inherits ``callbacks``."""
+    node = RunnableLambda(lambda _: router.invoke([HumanMessage(content="how many rows?")], 'strong', purpose="agent"))
+    return node.invoke(None, config={'callbacks': callbacks} if callbacks else None)
+
+def counter(name):
+    return {tuple(sorted(s['labels'].items())): s['value'] for s in metrics.snapshot()[name]['series']}
+
+def test_retries_and_timeouts():
+    """Test that transient errors and slow attempts are retried, and client errors are not"""
+    print("🧪 Testing Retries and Time-outs...")
+    print("=" * 60)
+
+    with recording_metrics():
+        router = make_router()
+        stub.script, stub.requests = [(500, 0), (429, 0)], 0
+        assert ask(router).content == "answer after 0s" and stub.requests == 3
+
+        router = make_router(timeout_seconds=0.3)
+        stub.script, stub.requests = [(200, 2)], 0
+        start = time.time()
+        response = ask(router)
+        print(f"Slow attempt abandoned, answered in {time.time() - start:.2f}s")
+        assert response.content == "answer after 0s" and time.time() - start < 1.5
+
+        stub.script, stub.requests = [(400, 0)], 0
+        try:
+            ask(router)
+            assert False, "a bad request should not be retried"
+        except Exception as e:
+            assert getattr(e, 'status_code', None) == 400 and stub.requests == 1
+
+        router = make_router(timeout_seconds=0.2, deadline_seconds=0.5, max_retries=10)
+        stub.script, stub.requests = [(200, 1)] * 10, 0
+        try:
+            ask(router)
+            assert False, "the deadline should end the call"
+        except LLMCallTimeout:
+            assert stub.requests <= 3
+
+        retries = counter('llm_call_retries_total')
+        print(f"Retries: {retries}")
+        assert retries[(('reason', 'error'), ('tier', 'strong'))] == 2
+        assert retries[(('reason', 'timeout'), ('tier', 'strong'))] >= 1
+        print("✅ Transient failures retried within the deadline!")
+
+def test_hedged_requests():
+    """Test that an attempt slower than the latency percentile is hedged and the first answer wins"""
+    print("\n🧪 Testing Hedged Requests...")
+    print("=" * 60)
+
+    with recording_metrics():
+        router = make_router(hedge_percentile=90, hedge_min_samples=5)
+        stub.script = []
+        for _ in range(5):
+            ask(router)
+        delay = router.resilience.hedge_delay('strong')
+        print(f"Hedge delay: {delay:.3f}s")
+        assert delay is not None and delay < 0.5
+
+        stub.script, stub.requests = [(200, 2)], 0
+        start = time.time()
+        response = ask(router)
+        print(f"Hedged call answered in {time.time() - start:.2f}s: {response.content}")
+        assert response.content == "answer after 0s" and time.time() - start < 1.5 and stub.requests == 2
+        assert counter('llm_call_hedge_wins_total') == {(('tier', 'strong'), ('winner', 'hedge')): 1}
+        print("✅ Slow attempt overtaken by its hedge!")
+
+def test_streaming_attempts():
+    """Test that time-outs bound the first token only and that only the winning attempt reaches the callbacks"""
+    print("\n🧪 Testing Streaming Attempts...")
+    print("=" * 60)
+
+    with recording_metrics():
+        # A long answer whose first token arrives in time is not cut off
+        router = make_router(streaming=True, timeout_seconds=0.5, deadline_seconds=0.8)
+        stub.script, stub.requests = [(200, 0.1, 1.5)], 0
+        recorder = TokenRecorder()
+        response = ask(router, [recorder])
+        print(f"Streamed for longer than the timeout: {response.content!r}")
+        assert response.content == "streamed answer after 0.1s" and stub.requests == 1
+        assert ''.join(recorder.tokens) == response.content and recorder.ends == 1
+
+        # A timed-out attempt is cancelled at its first token, after the retry answered
+        router = make_router(streaming=True, timeout_seconds=0.3)
+        stub.script, stub.requests, stub.disconnects = [(200, 0.8)], 0, 0
+        recorder = TokenRecorder()
+        response = ask(router, [recorder])
+        time.sleep(1)
+        print(f"Abandoned attempt: {stub.disconnects} disconnect(s), errors seen: {recorder.errors}")
+        assert response.content == "streamed answer after 0s" and ''.join(recorder.tokens) == response.content
+        assert recorder.ends == 1 and [type(e) for e in recorder.errors] == [AttemptCancelled]
+        assert stub.disconnects == 1
+
+        # A hedged primary that answers late is cancelled the same way
+        router = make_router(streaming=True, hedge_percentile=90, hedge_min_samples=5)
+        stub.script = []
+        for _ in range(5):
+            ask(router)
+        stub.script, stub.requests, stub.disconnects = [(200, 1)], 0, 0
+        recorder = TokenRecorder()
+        start = time.time()
+        response = ask(router, [recorder])
+        print(f"Hedged stream answered in {time.time() - start:.2f}s")
+        assert response.content == "streamed answer after 0s" and time.time() - start < 0.9
+        time.sleep(1.2)
+        assert ''.join(recorder.tokens) == response.content and recorder.ends == 1 and stub.disconnects == 1
+        assert counter('llm_call_hedge_wins_total') == {(('tier', 'strong'), ('winner', 'hedge')): 1}
+        print("✅ Only the winning attempt reached the callbacks!")
+
+def test_circuit_breaker():
+    """Test that consecutive failures open the circuit, calls then fail fast and a trial call closes it"""
+    print("\n🧪 Testing Circuit Breaker...")
+    print("=" * 60)
+
+    with recording_metrics():
+        router = make_router(max_retries=0, breaker_failures=2, breaker_reset_seconds=0.3)
+        stub.script, stub.requests = [(503, 0), (503, 0)], 0
+        for _ in range(2):
+            try:
+                ask(router)
+            except Exception as e:
+                assert getattr(e, 'status_code', None) == 503
+        try:
+            ask(router)
+            assert False, "the open circuit should reject the call"
+        except CircuitOpenError as e:
+            print(f"Rejected: {e}")
+            assert stub.requests == 2
+        assert router.resilience.describe()['strong']['state'] == 'open'
+
+        time.sleep(0.35)
+        assert ask(router).content == "answer after 0s"
+        assert router.resilience.describe()['strong']['state'] == 'closed'
+        states = [labels[0][1] for labels in counter('llm_circuit_transitions_total')]
+        assert sorted(states) == ['closed', 'half_open', 'open']
+        print("✅ Circuit opened, failed fast and closed again!")
+
+    # An interrupt is neither a failure nor a success, and a half-open trial can be made again
+    policy = ResiliencePolicy(max_retries=0, breaker_failures=2, breaker_reset_seconds=0.1)
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    def failing():
+        raise ConnectionError("down")
+
+    for fn in (failing, interrupted, failing):
+        try:
+            policy.call(fn)
+        except (KeyboardInterrupt, ConnectionError):
+            pass
+    assert policy.describe()['llm']['state'] == 'open'
+    time.sleep(0.15)
+    try:
+        policy.call(interrupted)
+    except KeyboardInterrupt:
+        pass
+    assert policy.describe()['llm']['state'] == 'open'
+    assert policy.call(lambda: "ok") == "ok" and policy.describe()['llm']['state'] == 'closed'
+    print("✅ Interrupts leave the breaker alone!")
+
+def test_summary_failure_keeps_history():
+    """Test that a failed summary leaves the conversation untouched"""
+    print("\n🧪 Testing Summary Failures...")
+    print("=" * 60)
+
+    with recording_metrics():
+        messages = [AIMessage(content="system"), HumanMessage(content="q1"), AIMessage(content="a1"),
+                    HumanMessage(content="q2"), AIMessage(content="a2"), HumanMessage(content="q3")]
+        stub.script = [(400, 0)]
+        assert ConversationSummarizer(stub.model()).summarize_conversation(messages) == messages
+        assert sum(counter('summarization_failures_total').values()) == 1
+
+        summary = ConversationSummarizer(stub.model()).summarize_conversation(messages)
+        assert len(summary) == 3 and summary[1].content.startswith("Previous conversation summary")
+        print("✅ History kept when summarization fails!")
+
+def main():
+    """Run all LLM resilience tests"""
+    print("🚀 Testing LLM Call Resilience")
+    print("=" * 60)
+
+    test_retries_and_timeouts()
+    test_hedged_requests()
+    test_streaming_attempts()
+    test_circuit_breaker()
+    test_summary_failure_keeps_history()
+
+    print("\n🎉 All LLM resilience tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the local trace recorder
+Tests span recording, head-based sampling and the slowest-runs summary
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import StateGraph, MessagesState, START, END
+
+from observability.tracing import (
+    LocalTraceRecorder, BatchingTraceWriter, create_sink, load_spans, slowest_traces
+)
+
+@tool
+def echo(text: str) -> str:
+    """Echo the input back."""
+    return text
+
+def build_graph():
+    llm = FakeListChatModel(responses=["done"])
+
+    def agent(state: MessagesState):
+        return {"messages": [llm.invoke(state["messages"])]}
+
+    def tools(state: MessagesState):
+        echo.invoke({"text": "hello"})
+        return {"messages": []}
+
+    workflow = StateGraph(MessagesState)
+    workflow.add_node("tools", tools)
+    workflow.add_node("agent", agent)
+    workflow.add_edge(START, "tools")
+    workflow.add_edge("tools", "agent")
+    workflow.add_edge("agent", END)
+    return workflow.compile()
+
+def run_traced(fmt, sample_rate=1.0, runs=1):
+    directory = tempfile.mkdtemp()
+    writer = BatchingTraceWriter(create_sink(directory, fmt), flush_interval=0.05)
+    recorder = LocalTraceRecorder(writer, sample_rate=sample_rate)
+    graph = build_graph()
+    for _ in range(runs):
+        graph.invoke({"messages": [HumanMessage(content="hi")]}, config={"callbacks": [recorder]})
+    writer.close()
+    return load_spans(directory)
+
+def test_jsonl_spans():
+    """Test that graph steps, LLM and tool calls become spans"""
+    print("🧪 Testing JSONL Span Recording...")
+    print("=" * 60)
+
+    spans = run_traced("jsonl")
+    kinds = {(s["kind"], s["name"]) for s in spans}
+    print(f"Recorded spans: {sorted(kinds)}")
+
+    assert ("graph_step", "agent") in kinds
+    assert ("graph_step", "tools") in kinds
+    assert ("tool", "echo") in kinds
+    assert any(kind == "llm" for kind, _ in kinds)
+    assert len({s["trace_id"] for s in spans}) == 1
+    print("✅ JSONL spans recorded!")
+
+def test_sqlite_sink_and_summary():
+    """Test the SQLite sink and the slowest-runs summary"""
+    print("\n🧪 Testing SQLite Sink and Summary...")
+    print("=" * 60)
+
+    spans = run_traced("sqlite", runs=3)
+    summary = slowest_traces(spans, limit=2)
+    print(f"Summary: {summary}")
+
+    assert len(summary) == 2
+    assert summary[0]["duration_ms"] >= summary[1]["duration_ms"]
+    assert summary[0]["llm_calls"] == 1
+    assert summary[0]["tool_calls"] == 1
+    print("✅ SQLite sink and summary working!")
+
+def test_head_sampling():
+    """Test that unsampled traces record nothing at all"""
+    print("\n🧪 Testing Head-Based Sampling...")
+    print("=" * 60)
+
+    spans = run_traced("jsonl", sample_rate=0.0, runs=3)
+    assert spans == []
+    print("✅ Sampling drops whole traces!")
+
+def main():
+    """Run all tracing tests"""
+    print("🚀 Testing Local Trace Recorder")
+    print("=" * 60)
+
+    test_jsonl_spans()
+    test_sqlite_sink_and_summary()
+    test_head_sampling()
+
+    print("\n🎉 All tracing tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test script for the agent loop budget
+Tests repeated-call caching of read-only tools, step and token limits and the final answer given when a budget runs out
+"""
+
+import sys
+import os
+import json
+import uuid
+from typing import Any, List
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agent import data_analysis_agent
+from agent.data_analysis_agent import set_llm
+from agent.loop_budget import LoopBudget, call_key
+from tools.dataset_tools import DatasetTools, use_dataset_tools
+
+REAL_LLM = data_analysis_agent.llm
+REAL_BUDGET = data_analysis_agent.loop_budget
+
+class StubbornLLM(BaseChatModel):
+    """Keeps calling execute_code (the same snippet unless ``vary``); answers plainly when unbound."""
+    code: str = "df['no such column'].mean()"
+    vary: bool = False
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "stubborn"
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> 'StubbornLLM':
+        return self.model_copy(update={'tools_bound': True})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if not self.tools_bound:
+            message = AIMessage(content="Final answer from what was found.")
+        else:
+            calls = sum(isinstance(m, ToolMessage) for m in messages)
+            code = f"{calls} + 1" if self.vary else self.code
+            message = AIMessage(content="", tool_calls=[{'name': 'execute_code', 'args': {'code': code},
+                                                          'id': f"call_{uuid.uuid4().hex[:12]}"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+def run_turn(budget: LoopBudget, **llm_settings):
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    data_analysis_agent.loop_budget = budget
+    set_llm(StubbornLLM(**llm_settings))
+    try:
+        with use_dataset_tools(tools):
+            return data_analysis_agent.app.invoke({'messages': [HumanMessage(content="mean of a column")]})
+    finally:
+        set_llm(REAL_LLM)
+        data_analysis_agent.loop_budget = REAL_BUDGET
+
+def test_repeated_calls_are_served_from_cache():
+    """Test that an identical failing call returning the same result again is flagged and ends the turn"""
+    print("🧪 Testing Repeated Call Detection...")
+    print("=" * 60)
+
+    result = run_turn(LoopBudget(max_steps=20, max_repeats=2))
+    budget = result['budget']
+    tool_messages = [m for m in result['messages'] if isinstance(m, ToolMessage)]
+    print(f"Budget: {budget}")
+
+    assert budget['exhausted'] == 'repeated_calls' and budget['repeated_calls'] == 3
+    assert not tool_messages[0].content.startswith('[Repeated call')
+    assert all(m.content.startswith('[Repeated call') for m in tool_messages[1:])
+    final = result['messages'][-1]
+    assert final.content == "Final answer from what was found."
+    assert final.response_metadata['budget_exhausted'] == 'repeated_calls'
+    print("✅ Repeated calls detected!")
+
+def call_tools(tools, state, *calls):
+    """Run one tool node step for ``calls`` ((name, args) pairs) and return the updated state."""
+    message = AIMessage(content="", tool_calls=[{'name': name, 'args': args, 'id': f"call_{uuid.uuid4().hex[:12]}"}
+                                                for name, args in calls])
+    with use_dataset_tools(tools):
+        update = data_analysis_agent.call_tool(dict(state, messages=state['messages'] + [message]))
+    return dict(state, messages=state['messages'] + [message] + update['messages'], tool_cache=update['tool_cache'],
+                budget=update['budget'])
+
+def test_only_read_only_calls_are_served():
+    """Test that cursors keep paging, read-only results follow state changes and errors are never served"""
+    print("\n🧪 Testing Read-only Cache...")
+    print("=" * 60)
+
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    state = {'messages': [], 'tool_cache': {}, 'budget': LoopBudget().start()}
+    state = call_tools(tools, state, ('run_sql', {'query': "SELECT * FROM df", 'rows': 10}))
+    starts = []
+    for _ in range(3):
+        state = call_tools(tools, state, ('fetch_sql', {'cursor': 'sql1', 'rows': 10}))
+        starts.append(json.loads(state['messages'][-1].content)['start'])
+    print(f"fetch_sql pages start at: {starts}")
+    assert starts == [10, 20, 30] and state['budget']['repeated_calls'] == 0
+
+    state = call_tools(tools, state, ('list_datasets', {}))
+    state = call_tools(tools, state, ('list_datasets', {}))
+    assert state['messages'][-1].content.startswith('[Repeated call') and state['budget']['repeated_calls'] == 1
+    # A dataset stored under another name changes the listing without touching the active version
+    state = call_tools(tools, state, ('run_sql', {'query': "SELECT 1 AS x", 'into': 'other'}))
+    state = call_tools(tools, state, ('list_datasets', {}))
+    assert '"other"' in state['messages'][-1].content and not state['messages'][-1].content.startswith('[Repeated')
+
+    for _ in range(2):
+        state = call_tools(tools, state, ('get_result', {'handle': 'r99'}))
+        assert not state['messages'][-1].content.startswith('[Repeated call')
+    print("✅ Only unchanged read-only results are served again!")
+
+def test_step_and_token_limits():
+    """Test that the step and token limits end the turn with a final answer"""
+    print("\n🧪 Testing Step and Token Limits...")
+    print("=" * 60)
+
+    result = run_turn(LoopBudget(max_steps=3), vary=True)
+    budget = result['budget']
+    print(f"Steps: {budget}")
+    assert budget['exhausted'] == 'steps' and budget['steps'] == 4  # three agent calls and the final answer
+    assert budget['repeated_calls'] == 0 and budget['tokens'] > 0
+    # The unanswered tool call of the last step is closed before the final answer
+    skipped = result['messages'][-2]
+    assert isinstance(skipped, ToolMessage) and 'Skipped' in skipped.content
+
+    result = run_turn(LoopBudget(max_tokens=10), vary=True)
+    print(f"Tokens: {result['budget']}")
+    assert result['budget']['exhausted'] == 'tokens' and result['budget']['steps'] == 2
+    print("✅ Limits end the turn gracefully!")
+
+def test_dataset_change_invalidates_cache():
+    """Test that the cache key includes the session state"""
+    print("\n🧪 Testing Cache Key...")
+    print("=" * 60)
+
+    assert call_key('execute_code', {'code': 'df.head()'}, 1) == call_key('execute_code', {'code': 'df.head()'}, 1)
+    assert call_key('execute_code', {'code': 'df.head()'}, 1) != call_key('execute_code', {'code': 'df.head()'}, 2)
+    assert LoopBudget().charge(LoopBudget().start())['exhausted'] is None
+    print("✅ Cache key follows the session state!")
+
+def main():
+    """Run all loop budget tests"""
+    print("🚀 Testing Agent Loop Budget")
+    print("=" * 60)
+
+    test_repeated_calls_are_served_from_cache()
+    test_only_read_only_calls_are_served()
+    test_step_and_token_limits()
+    test_dataset_change_invalidates_cache()
+
+    print("\n🎉 All loop budget tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the local metrics registry
+Tests histograms, the Prometheus exporter and the disabled fast path
+"""
+
+import sys
+import os
+import urllib.request
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from observability.metrics import MetricsRegistry, start_http_server
+
+def test_histogram_snapshot():
+    """Test that observations land in the snapshot with quantiles"""
+    print("🧪 Testing Histogram Snapshot...")
+    print("=" * 60)
+
+    registry = MetricsRegistry(enabled=True)
+    registry.histogram("tool_seconds", "Tool latency", buckets=(0.1, 0.5, 1.0))
+    for value in [0.05, 0.2, 0.3, 0.7, 2.0]:
+        registry.observe("tool_seconds", value, tool="execute_code")
+
+    series = registry.snapshot()["tool_seconds"]["series"][0]
+    print(f"Series: {series}")
+    assert series["labels"] == {"tool": "execute_code"}
+    assert series["count"] == 5
+    assert series["max"] == 2.0
+    assert 0.1 <= series["p50"] <= 0.5
+    print("✅ Histogram snapshot working!")
+
+def test_prometheus_text():
+    """Test the Prometheus text exposition format"""
+    print("\n🧪 Testing Prometheus Text Format...")
+    print("=" * 60)
+
+    registry = MetricsRegistry(enabled=True)
+    registry.histogram("call_seconds", "Call latency", buckets=(1.0,))
+    registry.observe("call_seconds", 0.5)
+    registry.observe("call_seconds", 3.0)
+    registry.inc("calls_total", 2, kind="llm")
+
+    text = registry.render_prometheus()
+    print(text)
+    assert '# TYPE call_seconds histogram' in text
+    assert 'call_seconds_bucket{le="1.0"} 1' in text
+    assert 'call_seconds_bucket{le="+Inf"} 2' in text
+    assert 'calls_total{kind="llm"} 2' in text
+    print("✅ Prometheus text format working!")
+
+def test_disabled_registry():
+    """Test that a disabled registry records nothing"""
+    print("\n🧪 Testing Disabled Registry...")
+    print("=" * 60)
+
+    registry = MetricsRegistry(enabled=False)
+    registry.histogram("call_seconds", "Call latency")
+    with registry.time("call_seconds"):
+        pass
+    registry.observe("call_seconds", 1.0)
+
+    assert registry.snapshot()["call_seconds"]["series"] == []
+    print("✅ Disabled registry is a no-op!")
+
+def test_http_exporter():
+    """Test the /metrics endpoint"""
+    print("\n🧪 Testing HTTP Exporter...")
+    print("=" * 60)
+
+    registry = MetricsRegistry(enabled=True)
+    with registry.time("block_seconds"):
+        pass
+
+    server = start_http_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert "block_seconds_count 1" in body
+        print("✅ HTTP exporter serving metrics!")
+    finally:
+        server.shutdown()
+
+def main():
+    """Run all metrics tests"""
+    print("🚀 Testing Local Metrics")
+    print("=" * 60)
+
+    test_histogram_snapshot()
+    test_prometheus_text()
+    test_disabled_registry()
+    test_http_exporter()
+
+    print("\n🎉 All metrics tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the fitted-model registry
+Tests reuse across snippets, invalidation on changes, statsmodels support and disk spill
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tests import iris_tools
+from tools.model_registry import ModelRegistry
+
+FIT = ("features = ['sepal length (cm)', 'petal length (cm)']\n"
+       "rf = models.fit('rf', RandomForestClassifier(n_estimators=N, random_state=0), df[features], df['species'])\n")
+
+def make_tools():
+    return iris_tools("models-test", models=ModelRegistry("models-test", spill_dir=tempfile.mkdtemp()))
+
+def test_reuse_across_snippets():
+    """Test that a model fitted in one snippet is reused by later snippets until something changes"""
+    print("🧪 Testing Model Reuse...")
+    print("=" * 60)
+
+    tools = make_tools()
+    assert tools.execute_python_code(FIT.replace("N", "50") + "rf.score(df[features], df['species'])")['success']
+    entry = tools.models.entry('rf')
+    first = entry.model
+
+    # Same fit call in a later snippet: no retraining
+    tools.execute_python_code(FIT.replace("N", "50") + "rf.n_estimators")
+    assert tools.models.entry('rf').model is first and tools.models.entry('rf').hits == 1
+    importances = tools.execute_python_code("list(models['rf'].feature_importances_.round(2))")
+    print(f"Importances: {importances['result']}")
+    assert importances['success']
+
+    # Different hyperparameters retrain
+    tools.execute_python_code(FIT.replace("N", "60") + "rf.n_estimators")
+    assert tools.models.entry('rf').model is not first
+
+    # A changed dataset retrains and marks the listing
+    second = tools.models.entry('rf').model
+    tools.execute_python_code("df = df[df['species'] != 'setosa']")
+    listing = tools.list_models()['models'][0]
+    print(f"Listing: {listing}")
+    assert listing['stale'] and listing['features'] == ['sepal length (cm)', 'petal length (cm)']
+    tools.execute_python_code(FIT.replace("N", "60") + "rf.n_estimators")
+    assert tools.models.entry('rf').model is not second
+    assert tools.list_models()['models'][0]['stale'] is False
+    print("✅ Models reused until inputs change!")
+
+def test_statsmodels_and_manual_store():
+    """Test statsmodels models and storing already fitted models by assignment"""
+    print("\n🧪 Testing statsmodels and Assignment...")
+    print("=" * 60)
+
+    tools = make_tools()
+    code = ("data = df.rename(columns=lambda c: c.split(' (')[0].replace(' ', '_'))\n"
+            "ols = models.fit('ols', smf.ols('petal_length ~ sepal_length', data=data))\n"
+            "models['lr'] = LogisticRegression(max_iter=500).fit(df[['petal width (cm)']], df['target'])\n"
+            "ols.rsquared")
+    result = tools.execute_python_code(code)
+    print(f"R²: {result['result']['value']:.3f}")
+    assert result['success']
+    tools.execute_python_code(code)
+    assert tools.models.entry('ols').hits == 1
+    names = [m['name'] for m in tools.list_models()['models']]
+    assert names == ['ols', 'lr']
+    assert tools.execute_python_code("models['lr'].predict(df[['petal width (cm)']]).shape[0]")['result']['value'] == 150
+    print("✅ statsmodels and fitted models stored!")
+
+def test_spill_to_disk():
+    """Test that models beyond the memory budget are spilled with joblib and reloaded on access"""
+    print("\n🧪 Testing Spill to Disk...")
+    print("=" * 60)
+
+    tools = make_tools()
+    tools.models.max_memory_bytes = 120_000
+    for name in ('a', 'b', 'c'):
+        tools.execute_python_code(f"models.fit('{name}', RandomForestClassifier(n_estimators=30, random_state=0), df.iloc[:, :4], df['species'])")
+    state = {m['name']: (m['in_memory'], m['size_kb']) for m in tools.list_models()['models']}
+    print(f"State: {state}")
+    assert state['c'][0] and not state['a'][0]
+    assert state['b'][0] and tools.models.memory_bytes() <= 120_000
+
+    result = tools.execute_python_code("models['a'].predict(df.iloc[:3, :4]).tolist()")
+    assert result['success'] and tools.models.entry('a').in_memory
+    assert not tools.models.entry('b').in_memory
+
+    # Closing the session removes its spilled models
+    assert os.listdir(tools.models.spill_dir)
+    tools.close()
+    assert not os.path.exists(tools.models.spill_dir)
+    print("✅ Models spilled and reloaded!")
+
+def main():
+    """Run all model registry tests"""
+    print("🚀 Testing Model Registry")
+    print("=" * 60)
+
+    test_reuse_across_snippets()
+    test_statsmodels_and_manual_store()
+    test_spill_to_disk()
+
+    print("\n🎉 All model registry tests completed!")
+
+if __name__ == "__main__":
+    main()
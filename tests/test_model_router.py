@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for model tier routing
+Tests routing decisions, escalation after tool errors, low-temperature summaries on the fast tier and per-tier
+metrics
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+
+from agent import data_analysis_agent
+from agent.data_analysis_agent import set_llm
+from agent.fake_llm import FakeAnalysisLLM
+from agent.model_router import ModelRouter
+from interfaces.agent_chat_ui import ConversationSummarizer, SUMMARY_TEMPERATURE
+from observability.metrics import metrics
+from tools.dataset_tools import DatasetTools, use_dataset_tools
+
+REAL_LLM = data_analysis_agent.llm
+
+CALL_OPTIONS = []
+
+class RecordingLLM(FakeAnalysisLLM):
+    """Fake model that records the call options of each request."""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        CALL_OPTIONS.append(kwargs)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+def test_routing_decisions():
+    """Test that simple follow-ups go to the fast tier and complex or failing turns to the strong tier"""
+    print("🧪 Testing Routing Decisions...")
+    print("=" * 60)
+
+    router = ModelRouter(strong=FakeAnalysisLLM(), fast=FakeAnalysisLLM())
+    ask = lambda text: [HumanMessage(content=text)]
+    assert router.route(ask("what columns are there?")) == ('fast', 'simple')
+    assert router.route(ask("train a model to predict species")) == ('strong', 'complex')
+    assert router.route(ask("show rows " + "x" * 200)) == ('strong', 'complex')
+    failed = ask("how many rows?") + [AIMessage(content="", tool_calls=[{'name': 'execute_code', 'args': {}, 'id': 'c1'}]),
+                                      ToolMessage(content='{"success": false, "message": "boom"}', tool_call_id='c1')]
+    assert router.route(failed) == ('strong', 'tool_error')
+    # Errors of earlier turns do not count against a new request
+    assert router.route(failed + [AIMessage(content="done"), HumanMessage(content="list the columns")]) == ('fast', 'simple')
+
+    assert ModelRouter(strong=FakeAnalysisLLM()).route(ask("what columns?")) == ('strong', 'single_tier')
+    assert ModelRouter(strong=FakeAnalysisLLM(), fast=FakeAnalysisLLM(), enabled=False).available('fast') == 'strong'
+    print("✅ Routing decisions correct!")
+
+def run_turn(query):
+    tools = DatasetTools()
+    with use_dataset_tools(tools):
+        result = data_analysis_agent.app.invoke({'messages': [HumanMessage(content=query)]})
+    return [m.response_metadata.get('model_tier') for m in result['messages'] if isinstance(m, AIMessage)]
+
+def test_agent_turns_use_tiers():
+    """Test that whole agent turns run on the routed tier and escalate after a failed tool call"""
+    print("\n🧪 Testing Tiers in Agent Turns...")
+    print("=" * 60)
+
+    metrics.enabled = True
+    metrics.reset()
+    try:
+        set_llm(FakeAnalysisLLM(), fast_model=RecordingLLM())
+        tiers = run_turn("what columns are there?")
+        print(f"Simple turn: {tiers}")
+        assert tiers == ['fast', 'fast', 'fast']
+
+        set_llm(FakeAnalysisLLM(code="df['no such column']"), fast_model=RecordingLLM(code="df['no such column']"))
+        tiers = run_turn("what columns are there?")
+        print(f"Turn with a tool error: {tiers}")
+        assert tiers == ['fast', 'fast', 'strong']
+
+        summary = ConversationSummarizer().summarize_conversation(
+            [AIMessage(content="system"), HumanMessage(content="q1"), AIMessage(content="a1"), HumanMessage(content="q2")])
+        assert summary[1].content.startswith("Previous conversation summary")
+        assert CALL_OPTIONS[-1] == {'temperature': SUMMARY_TEMPERATURE} == {'temperature': 0.1}
+        assert all('temperature' not in options for options in CALL_OPTIONS[:-1])
+
+        routes = {(s['labels']['tier'], s['labels']['purpose']): s['value']
+                  for s in metrics.snapshot()['agent_model_route_total']['series']}
+        latency = {s['labels']['tier'] for s in metrics.snapshot()['agent_call_model_seconds']['series']}
+        print(f"Routes: {routes}")
+        assert routes[('fast', 'agent')] == 5 and routes[('strong', 'agent')] == 1
+        assert routes[('fast', 'summary')] == 1 and latency == {'fast', 'strong'}
+    finally:
+        set_llm(REAL_LLM)
+        metrics.reset()
+        metrics.enabled = False
+    print("✅ Agent turns routed per tier!")
+
+def main():
+    """Run all model router tests"""
+    print("🚀 Testing Model Tier Routing")
+    print("=" * 60)
+
+    test_routing_decisions()
+    test_agent_turns_use_tiers()
+
+    print("\n🎉 All model router tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for plot acceleration on large datasets
+Tests hexbin density, LTTB downsampling, precomputed histogram bins and the tool note
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from tools.dataset_tools import DatasetTools
+from tools.plot_acceleration import PlotThresholds, accelerate_plots, lttb_indices
+
+SMALL = PlotThresholds(scatter_points=1000, line_points=1000, hist_points=1000,
+                       line_target_points=100, sample_points=500, hexbin_gridsize=20)
+
+def make_frame(n=20_000):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({'x': rng.normal(size=n), 'y': rng.normal(size=n),
+                         't': np.arange(n), 'g': rng.choice(['a', 'b'], size=n)})
+
+def test_lttb_keeps_extremes():
+    """Test that LTTB keeps the endpoints and the spike"""
+    print("🧪 Testing LTTB Downsampling...")
+    print("=" * 60)
+
+    y = np.zeros(10_000)
+    y[4321] = 50.0
+    idx = lttb_indices(np.arange(10_000), y, 100)
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == 9_999
+    assert 4321 in idx
+    print("✅ LTTB keeps endpoints and peaks!")
+
+def test_large_plots_are_reduced():
+    """Test each reduction path and that small plots are untouched"""
+    print("\n🧪 Testing Plot Reductions...")
+    print("=" * 60)
+
+    df = make_frame()
+    with accelerate_plots(SMALL) as report:
+        plt.scatter(df['x'], df['y'])
+        sns.scatterplot(data=df, x='x', y='y', hue='g')
+        plt.figure()
+        line, = plt.plot(df['t'], df['y'].cumsum())
+        plt.hist(df['x'], bins=25)
+        sns.histplot(df, x='y', bins=40)
+        plt.scatter(df['x'][:10], df['y'][:10])
+    plt.close('all')
+    print(f"Notes: {report.describe()}")
+
+    methods = [(n['function'], n['method'], n['output_points']) for n in report.notes]
+    assert methods == [
+        ('scatter', 'hexbin_density', 400),
+        ('scatterplot', 'random_sample', 500),
+        ('plot', 'lttb', 100),
+        ('hist', 'precomputed_bins', 25),
+        ('histplot', 'precomputed_bins', 40),
+    ]
+    assert len(line.get_xdata()) == 100
+    print("✅ Large plots reduced!")
+
+def test_visualization_reports_aggregation():
+    """Test that create_visualization notes the aggregation in its result"""
+    print("\n🧪 Testing Tool Aggregation Note...")
+    print("=" * 60)
+
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    tools.current_dataset = make_frame()
+    tools.plot_thresholds = SMALL
+    result = tools.create_visualization("sns.scatterplot(data=df, x='x', y='y')")
+    print(f"Message: {result['message']}")
+
+    assert result['success'], result
+    assert result['aggregation'][0]['method'] == 'hexbin_density'
+    assert 'aggregated' in result['message']
+
+    small = tools.create_visualization("plt.scatter(df['x'][:50], df['y'][:50])")
+    assert 'aggregation' not in small
+    print("✅ Aggregation reported!")
+
+def test_hist_weights_kept():
+    """Test that hist keeps its weights once the patches are installed, inside and outside the accelerated path"""
+    print("\n🧪 Testing Histogram Weights...")
+    print("=" * 60)
+
+    with accelerate_plots(SMALL):
+        counts, _, _ = plt.hist([0, 1, 2], bins=3, weights=[10, 10, 10])
+        large, _, _ = plt.hist(make_frame()['x'], bins=5, weights=None)
+    plt.close('all')
+    after, _, _ = plt.hist([0, 1, 2], bins=3, weights=[10, 10, 10])
+    plt.close('all')
+    print(f"Counts while accelerating: {counts.tolist()}, after: {after.tolist()}")
+    assert counts.tolist() == after.tolist() == [10, 10, 10]
+    assert large.sum() == 20_000
+    print("✅ Weights kept!")
+
+def main():
+    """Run all plot acceleration tests"""
+    print("🚀 Testing Plot Acceleration")
+    print("=" * 60)
+
+    test_lttb_keeps_extremes()
+    test_large_plots_are_reduced()
+    test_visualization_reports_aggregation()
+    test_hist_weights_kept()
+
+    print("\n🎉 All plot acceleration tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for snippet profiling
+Tests time attribution to functions and lines, memory reporting and profiles of timed-out runs
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tests import iris_tools
+
+def test_row_wise_apply_is_found():
+    """Test that a slow row-wise apply dominates the profile and gets a hint"""
+    print("🧪 Testing Profile of a Row-wise Apply...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    code = (
+        "big = pd.concat([df] * 200, ignore_index=True)\n"
+        "big['ratio'] = big.apply(lambda row: row['sepal length (cm)'] / row['sepal width (cm)'], axis=1)\n"
+        "big['ratio'].mean()"
+    )
+    result = tools.execute_python_code(code, profile=True)
+    profile = result['profile']
+    print(f"Top functions: {[(f['function'], f['cumulative_pct']) for f in profile['top_functions'][:3]]}")
+    print(f"Hot lines: {profile['hot_lines']}")
+
+    assert result['success'] and profile['samples'] > 10
+    apply = [f for f in profile['top_functions'] if f['function'].endswith(':apply')]
+    assert apply and apply[0]['cumulative_pct'] > 50
+    assert profile['hot_lines'][0]['line'] == 2 and 'apply' in profile['hot_lines'][0]['code']
+    assert 'vectorized' in profile['hint']
+    assert 'profile' not in tools.execute_python_code("df.shape")
+    print("✅ Row-wise apply identified!")
+
+def test_memory_report():
+    """Test that peak memory and retained allocations point at the allocating line"""
+    print("\n🧪 Testing Memory Report...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    result = tools.execute_python_code("small = list(range(10))\nblock = np.ones((2000, 1000))\nblock.sum()", profile=True)
+    profile = result['profile']
+    print(f"Peak: {profile['peak_memory_mb']} MB, allocations: {profile['largest_allocations']}")
+
+    assert profile['peak_memory_mb'] >= 15
+    top = profile['largest_allocations'][0]
+    assert top['line'] == 2 and top['size_mb'] >= 15
+    print("✅ Memory attributed to lines!")
+
+def test_profile_of_timed_out_run():
+    """Test that a run stopped by the wall-time limit still reports where it spent its time"""
+    print("\n🧪 Testing Profile of a Timed-out Run...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    tools.set_execution_limits(wall_time_seconds=0.5)
+    code = "def slow(n):\n    total = 0\n    while n:\n        total += n\n        n -= 1\n    return total\nwhile True:\n    slow(1000)"
+    result = tools.execute_python_code(code, profile=True)
+    profile = result['profile']
+    print(f"Result: {result['message']}, top: {profile['top_functions'][:1]}")
+
+    assert result['limit'] == 'wall_time'
+    assert profile['top_functions'][0]['function'] == '<snippet>:slow'
+    assert 'Python function defined in the snippet' in profile['hint']
+    print("✅ Timed-out run profiled!")
+
+def main():
+    """Run all profiler tests"""
+    print("🚀 Testing Snippet Profiler")
+    print("=" * 60)
+
+    test_row_wise_apply_is_found()
+    test_memory_report()
+    test_profile_of_timed_out_run()
+
+    print("\n🎉 All profiler tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for sandbox execution limits
+Tests wall-time, CPU-time and memory limits and cooperative cancellation
+"""
+
+import sys
+import os
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tests import iris_tools
+from tools.sandbox import ExecutionGuard, ExecutionLimits
+
+def test_wall_time_limit():
+    """Test that a runaway loop is stopped and the dataset is left intact"""
+    print("🧪 Testing Wall-Time Limit...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    tools.set_execution_limits(wall_time_seconds=0.5)
+    result = tools.execute_python_code("df = df.head(3)\nx = 0\nwhile True:\n    x += 1")
+    print(f"Result: {result['message']}")
+
+    assert result['success'] is False
+    assert result['limit'] == 'wall_time'
+    assert result['line'] in (3, 4)  # inside the loop
+    assert "timed out after 0.5s at line" in result['message']
+    assert tools.current_dataset.shape == (150, 6)
+    print("✅ Wall-time limit enforced!")
+
+def test_cpu_time_limit():
+    """Test the CPU-time limit"""
+    print("\n🧪 Testing CPU-Time Limit...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    tools.set_execution_limits(wall_time_seconds=None, cpu_time_seconds=0.3)
+    result = tools.execute_python_code("total = 0\nfor i in range(10**10):\n    total += i")
+    print(f"Result: {result['message']}")
+
+    assert result['limit'] == 'cpu_time'
+    print("✅ CPU-time limit enforced!")
+
+def test_memory_limit():
+    """Test that an oversized allocation is reported as a memory limit hit"""
+    print("\n🧪 Testing Memory Limit...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    tools.set_execution_limits(wall_time_seconds=None, memory_mb=200)
+    result = tools.execute_python_code("big = np.ones((20000, 20000))")
+    print(f"Result: {result['message']}")
+
+    if sys.platform.startswith('linux'):
+        assert result['limit'] == 'memory'
+        assert result['line'] == 1
+    assert result['success'] is False
+
+    # The limit must be lifted again after the run
+    assert tools.execute_python_code("print(np.ones((1000, 1000)).sum())")['success']
+    print("✅ Memory limit enforced!")
+
+def test_overlapping_memory_limits():
+    """Test that guards overlapping in threads share the memory cap and the last one to exit lifts it"""
+    print("\n🧪 Testing Overlapping Memory Limits...")
+    print("=" * 60)
+
+    try:
+        import resource
+    except ImportError:
+        print("⚠️ No RLIMIT_AS on this platform, skipping")
+        return
+    host = resource.getrlimit(resource.RLIMIT_AS)
+    limits = ExecutionLimits(wall_time_seconds=None, memory_mb=500)
+    first_in, second_in, first_out = threading.Event(), threading.Event(), threading.Event()
+    seen = {}
+
+    def first():
+        with ExecutionGuard(limits):
+            first_in.set()
+            second_in.wait(5)
+        first_out.set()
+
+    def second():
+        first_in.wait(5)
+        with ExecutionGuard(limits):
+            second_in.set()
+            first_out.wait(5)
+            seen['while_second_runs'] = resource.getrlimit(resource.RLIMIT_AS)
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Host limit: {host}, after both: {resource.getrlimit(resource.RLIMIT_AS)}")
+    if sys.platform.startswith('linux'):
+        assert seen['while_second_runs'][0] != resource.RLIM_INFINITY
+    assert resource.getrlimit(resource.RLIMIT_AS) == host
+    print("✅ Host limit restored after overlapping guards!")
+
+def test_cancellation():
+    """Test cancelling a running snippet from another thread"""
+    print("\n🧪 Testing Cancellation...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    tools.set_execution_limits(wall_time_seconds=None)
+    timer = threading.Timer(0.3, tools.cancel_execution)
+    timer.start()
+    result = tools.execute_python_code("while True:\n    pass")
+    print(f"Result: {result['message']}")
+
+    assert result['error_type'] == 'cancelled'
+    assert tools.execute_python_code("print(len(df))")['output'] == "150\n"
+    print("✅ Cancellation working!")
+
+def main():
+    """Run all sandbox limit tests"""
+    print("🚀 Testing Sandbox Execution Limits")
+    print("=" * 60)
+
+    test_wall_time_limit()
+    test_cpu_time_limit()
+    test_memory_limit()
+    test_overlapping_memory_limits()
+    test_cancellation()
+
+    print("\n🎉 All sandbox limit tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test script for shared base datasets
+Tests that sessions share one base frame per file, copy only on write, release it with the last view and map large bases from Arrow files
+"""
+
+import sys
+import os
+import gc
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from tools.dataset_tools import DatasetTools
+from tools.shared_datasets import shared_datasets
+
+def write_csv(directory, rows=1000):
+    path = os.path.join(directory, "sales.csv")
+    pd.DataFrame({'amount': np.arange(rows, dtype='float64'), 'units': np.arange(rows) % 7}).to_csv(path, index=False)
+    return path
+
+def bases_for(path):
+    return [b for b in shared_datasets.describe() if b['source'] == path]
+
+def test_sessions_share_one_base():
+    """Test that two sessions loading the same file share its data and writes stay private"""
+    print("🧪 Testing Shared Base Frames...")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_csv(directory)
+        first, second = DatasetTools(), DatasetTools()
+        first.load_dataset(path)
+        second.load_dataset(path)
+        print(f"Bases: {bases_for(path)}")
+
+        assert len(bases_for(path)) == 1 and bases_for(path)[0]['views'] == 2
+        assert np.shares_memory(first.current_dataset['amount'].to_numpy(), second.current_dataset['amount'].to_numpy())
+
+        first.execute_python_code("df['amount'] = df['amount'] * 2")
+        assert first.current_dataset['amount'].iloc[1] == 2.0 and second.current_dataset['amount'].iloc[1] == 1.0
+        assert np.shares_memory(first.current_dataset['units'].to_numpy(), second.current_dataset['units'].to_numpy())
+
+        del first, second
+        gc.collect()
+        assert bases_for(path) == []
+    print("✅ One base shared, writes private, released with the last view!")
+
+def test_changed_file_gets_new_base():
+    """Test that a modified file is loaded again instead of served from the old base"""
+    print("\n🧪 Testing Modified Files...")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_csv(directory)
+        old = DatasetTools()
+        old.load_dataset(path)
+        write_csv(directory, rows=10)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+        new = DatasetTools()
+        new.load_dataset(path)
+        print(f"Bases: {bases_for(path)}")
+
+        assert sorted(b['shape'][0] for b in bases_for(path)) == [10, 1000]
+        assert len(old.current_dataset) == 1000 and len(new.current_dataset) == 10
+    print("✅ Modified file loaded as a new base!")
+
+def test_arrow_backed_base():
+    """Test that large bases are memory-mapped from an Arrow file and still writable per session"""
+    print("\n🧪 Testing Arrow-backed Bases...")
+    print("=" * 60)
+
+    min_bytes, cache_dir = shared_datasets.arrow_min_bytes, shared_datasets.cache_dir
+    with tempfile.TemporaryDirectory() as directory:
+        shared_datasets.arrow_min_bytes, shared_datasets.cache_dir = 0, os.path.join(directory, "cache")
+        try:
+            path = write_csv(directory)
+            tools = DatasetTools()
+            tools.load_dataset(path)
+            base = bases_for(path)[0]
+            print(f"Base: {base}")
+
+            assert base['backing'] == 'arrow' and os.listdir(shared_datasets.cache_dir)
+            assert not tools.current_dataset['amount'].to_numpy().flags.writeable  # mapped pages are read-only
+            result = tools.execute_python_code("df.loc[0, 'amount'] = -1\ndf['amount'].min()")
+            assert result['success'] and result['result']['value'] == -1.0
+            assert tools.list_datasets()['shared_bases']
+        finally:
+            shared_datasets.arrow_min_bytes, shared_datasets.cache_dir = min_bytes, cache_dir
+    print("✅ Arrow-backed base mapped and copy-on-write!")
+
+def main():
+    """Run all shared dataset tests"""
+    print("🚀 Testing Shared Base Datasets")
+    print("=" * 60)
+
+    test_sessions_share_one_base()
+    test_changed_file_gets_new_base()
+    test_arrow_backed_base()
+
+    print("\n🎉 All shared dataset tests completed!")
+
+if __name__ == "__main__":
+    main()
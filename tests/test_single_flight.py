@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test script for request coalescing
+Tests that concurrent identical loads, dataset profiles and plots run once and report how many calls they served
+"""
+
+import sys
+import os
+import tempfile
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from tools import dataset_registry
+from tools.dataset_tools import DatasetTools
+from tools.single_flight import SingleFlight, single_flight
+
+def run_concurrently(release, first, *others):
+    """Start ``first``, wait until its call is in flight, then run ``others`` alongside it until ``release`` is set."""
+    results = [None] * (len(others) + 1)
+
+    def call(index, fn):
+        results[index] = fn()
+
+    threads = [threading.Thread(target=call, args=(i, fn)) for i, fn in enumerate((first,) + others)]
+    threads[0].start()
+    while not single_flight.in_flight():
+        threads[0].join(0.01)
+    for thread in threads[1:]:
+        thread.start()
+    # Let the first call finish once the others are waiting on it
+    while sum(f['callers'] for f in single_flight.in_flight()) < len(threads):
+        threads[0].join(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+def held(session, method, release):
+    """Make ``session.method`` wait for ``release`` before running."""
+    original = getattr(session, method)
+    setattr(session, method, lambda *args: (release.wait(), original(*args))[1])
+
+def test_single_flight():
+    """Test that concurrent callers of a key share one run, its result and its exception"""
+    print("🧪 Testing Single Flight...")
+    print("=" * 60)
+
+    flights = SingleFlight()
+    started, release, runs = threading.Event(), threading.Event(), []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait()
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('op', 'key', work)))]
+    threads[0].start()
+    started.wait()
+    threads += [threading.Thread(target=lambda: results.append(flights.do('op', 'key', work))) for _ in range(3)]
+    for thread in threads[1:]:
+        thread.start()
+    while flights.in_flight()[0]['callers'] < 4:
+        threads[0].join(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    print(f"Runs: {len(runs)}, results: {[(value, flight.coalesced, joined) for value, flight, joined in results]}")
+
+    assert len(runs) == 1 and all(value == 42 and flight.coalesced == 3 for value, flight, _ in results)
+    assert sum(joined for _, _, joined in results) == 3 and flights.coalesced_total == 3
+    # Nothing is cached once the call has finished
+    flights.do('op', 'key', work)
+    assert not flights.do('op', 'key', work)[2] and len(runs) == 3
+
+    try:
+        flights.do('op', 'key', lambda: 1 / 0)
+        assert False, "the exception should be raised"
+    except ZeroDivisionError:
+        pass
+    assert flights.in_flight() == []
+    print("✅ One run shared by concurrent callers!")
+
+def test_concurrent_loads():
+    """Test that sessions loading the same file at once read it once"""
+    print("\n🧪 Testing Coalesced Loads...")
+    print("=" * 60)
+
+    reads = []
+    read_csv = dataset_registry.FILE_READERS['.csv']
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sales.csv")
+        pd.DataFrame({'amount': np.arange(100.0)}).to_csv(path, index=False)
+        release = threading.Event()
+
+        def slow_read(source):
+            reads.append(source)
+            release.wait()
+            return read_csv(source)
+
+        dataset_registry.FILE_READERS['.csv'] = slow_read
+        try:
+            sessions = [DatasetTools() for _ in range(3)]
+            results = run_concurrently(release, *[lambda s=s: s.load_dataset(path) for s in sessions])
+        finally:
+            dataset_registry.FILE_READERS['.csv'] = read_csv
+        print(f"Reads: {len(reads)}, coalesced: {[r['coalesced'] for r in results]}")
+
+        assert len(reads) == 1 and all(r['success'] and r['coalesced'] == 2 for r in results)
+        assert all(len(s.current_dataset) == 100 for s in sessions)
+        assert DatasetTools().load_dataset(path)['coalesced'] == 0
+    print("✅ Concurrent loads read the file once!")
+
+def test_concurrent_info_and_plots():
+    """Test that identical profiles and plots share one computation, but session-local plots do not"""
+    print("\n🧪 Testing Coalesced Profiles and Plots...")
+    print("=" * 60)
+
+    sessions = [DatasetTools() for _ in range(3)]
+    for session in sessions:
+        session.load_iris_dataset()
+    release = threading.Event()
+    held(sessions[0], '_dataset_info', release)
+    infos = run_concurrently(release, *[s.get_dataset_info for s in sessions])
+    print(f"Info coalesced: {[i['coalesced'] for i in infos]}")
+    assert all(i['coalesced'] == 2 and i['info']['shape'] == (150, 6) for i in infos)
+
+    code = "plt.hist(df['sepal length (cm)'])"
+    release = threading.Event()
+    held(sessions[0], '_create_visualization', release)
+    plots = run_concurrently(release, *[lambda s=s: s.create_visualization(code) for s in sessions])
+    print(f"Plot coalesced: {[p['coalesced'] for p in plots]}")
+    assert all(p['success'] and p['coalesced'] == 2 for p in plots)
+    assert len({p['artifact_id'] for p in plots}) == 1
+    assert all(s.execution_history[-1]['code'] == code for s in sessions)
+
+    # A session whose data changed does not share the others' results
+    sessions[2].execute_python_code("df['sepal length (cm)'] = df['sepal length (cm)'] * 10")
+    assert sessions[0]._plot_key(code) == sessions[1]._plot_key(code) != sessions[2]._plot_key(code)
+    # Plots with session-local effects always run on their own
+    assert sessions[0]._plot_key("df['x'] = 1\nplt.plot(df['x'])") is None
+    assert sessions[0]._plot_key("plt.plot(datasets['iris']['target'])") is None
+    print("✅ Profiles and plots shared only across identical data!")
+
+def main():
+    """Run all request coalescing tests"""
+    print("🚀 Testing Request Coalescing")
+    print("=" * 60)
+
+    test_single_flight()
+    test_concurrent_loads()
+    test_concurrent_info_and_plots()
+
+    print("\n🎉 All request coalescing tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script for the run_sql query engine
+Tests queries over DataFrames, batched cursors, file scans without loading and limits
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from tests import iris_tools
+
+def test_query_datasets():
+    """Test SQL over the active dataset and named datasets"""
+    print("🧪 Testing SQL Over DataFrames...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    result = tools.run_sql("SELECT species, COUNT(*) AS n FROM df GROUP BY species ORDER BY species")
+    print(f"Rows: {result['rows']}")
+    assert result['columns'] == ['species', 'n']
+    assert result['rows'] == [['setosa', 50], ['versicolor', 50], ['virginica', 50]]
+    assert result['cursor'] is None
+
+    stored = tools.run_sql("SELECT * FROM iris WHERE target = 2", into='virginica')
+    assert stored['dataset']['shape'] == [50, 6]
+    assert tools.execute_python_code("len(virginica)")['result']['value'] == 50
+    print("✅ SQL over DataFrames working!")
+
+def test_batched_cursor():
+    """Test that large results are paged through a cursor"""
+    print("\n🧪 Testing Batched Cursor...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    first = tools.run_sql("SELECT * FROM df", rows=64)
+    assert len(first['rows']) == 64 and first['cursor'] is not None
+
+    second = tools.fetch_sql(first['cursor'], rows=64)
+    third = tools.fetch_sql(first['cursor'], rows=64)
+    assert second['start'] == 64 and len(second['rows']) == 64
+    assert third['start'] == 128 and len(third['rows']) == 22
+    assert third['exhausted'] is True and third['cursor'] is None
+    assert not tools.fetch_sql(first['cursor'])['success']
+    print("✅ Batched cursor working!")
+
+def test_lazy_file_is_scanned_in_place():
+    """Test that a lazily registered file is queried without loading it into pandas"""
+    print("\n🧪 Testing File Scan Without Loading...")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "events.csv")
+    pd.DataFrame({'user': np.arange(10_000) % 7, 'value': np.arange(10_000.0)}).to_csv(path, index=False)
+
+    tools = iris_tools()
+    tools.load_dataset(path, name='events', lazy=True, activate=False)
+    result = tools.run_sql("SELECT user, SUM(value) AS total FROM events WHERE user < 2 GROUP BY user ORDER BY user")
+    print(f"Rows: {result['rows']}")
+    assert [row[0] for row in result['rows']] == [0, 1]
+    assert tools.datasets.entry('events').loaded is False
+    print("✅ Files scanned in place!")
+
+def test_limits_and_errors():
+    """Test that SQL errors and time limits come back as results"""
+    print("\n🧪 Testing SQL Errors and Limits...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    assert 'Error running SQL' in tools.run_sql("SELECT missing_column FROM df")['message']
+
+    tools.set_execution_limits(wall_time_seconds=0.3)
+    result = tools.run_sql("SELECT COUNT(*) FROM range(100000000000)")
+    assert result['error_type'] == 'limit_exceeded' and result['limit'] == 'wall_time'
+
+    # The memory limit applies to its own query only, not to later ones on the same database
+    setting = "SELECT current_setting('memory_limit')"
+    default = tools.sql.query(setting)['rows']
+    tools.set_execution_limits(wall_time_seconds=None, memory_mb=64)
+    assert tools.run_sql("SELECT COUNT(*) FROM df")['success']
+    assert tools.sql.query(setting)['rows'] == default
+    print("✅ Errors and limits reported!")
+
+def main():
+    """Run all SQL engine tests"""
+    print("🚀 Testing SQL Engine")
+    print("=" * 60)
+
+    test_query_datasets()
+    test_batched_cursor()
+    test_lazy_file_is_scanned_in_place()
+    test_limits_and_errors()
+
+    print("\n🎉 All SQL engine tests completed!")
+
+if __name__ == "__main__":
+    main()
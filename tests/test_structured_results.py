@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for structured execute_code results
+Tests last-expression capture, previews, result handles and the store's memory budget
+"""
+
+import json
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tests import iris_tools
+from tools.results import ResultStore
+
+def test_dataframe_result():
+    """Test that a trailing DataFrame expression comes back as a typed preview"""
+    print("🧪 Testing DataFrame Result...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    result = tools.execute_python_code("df[df['target'] > 0]")
+    print(json.dumps(result['result'], default=str)[:300])
+
+    encoded = result['result']
+    assert encoded['type'] == 'dataframe'
+    assert encoded['shape'] == [100, 6]
+    assert encoded['rows_shown'] == 10 and encoded['truncated'] is True
+    assert encoded['schema']['target'] == 'int64'
+    assert len(encoded['preview']['data']) == 10
+    json.dumps(result, default=str)
+    print("✅ DataFrame result encoded!")
+
+def test_result_handles():
+    """Test that later snippets and get_result reuse stored results"""
+    print("\n🧪 Testing Result Handles...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    handle = tools.execute_python_code("df.describe()")['result']['handle']
+    reused = tools.execute_python_code(f"results['{handle}'].loc['mean', 'target']")
+    print(f"Reused value: {reused['result']}")
+    assert reused['result'] == {'type': 'scalar', 'dtype': 'float64', 'value': 1.0}
+
+    page = tools.get_result(handle, start=2, rows=3)
+    assert page['result']['preview']['index'] == ['std', 'min', '25%']
+    print("✅ Result handles working!")
+
+def test_result_memory_budget():
+    """Test that stored results are evicted by memory, not only by count, and oversized ones are not kept"""
+    print("\n🧪 Testing Result Memory Budget...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    tools.results = ResultStore(max_entries=20, max_memory_mb=1)
+    handles = [tools.execute_python_code(f"np.full(50_000, {i}.0)")['result']['handle'] for i in range(5)]
+    print(f"Kept {tools.results.keys()} of {handles} in {tools.results.size_bytes} bytes")
+    assert tools.results.keys() == handles[-2:] and tools.results.size_bytes == 800_000
+    assert not tools.get_result(handles[0])['success']
+
+    big = tools.execute_python_code("np.zeros(200_000)")
+    assert big['result']['shape'] == [200000] and 'handle' not in big['result']
+    assert tools.results.keys() == handles[-2:]
+    print("✅ Results bounded by memory!")
+
+def test_namespace_failure():
+    """Test that a failure while preparing a snippet is reported and stdout is restored"""
+    print("\n🧪 Testing Namespace Failures...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    stdout = sys.stdout._target() if hasattr(sys.stdout, '_target') else sys.stdout
+    def broken():
+        raise RuntimeError("namespace unavailable")
+    tools._build_namespace = broken
+    for result in (tools.execute_python_code("1 + 1"), tools.create_visualization("df.plot()")):
+        print(f"  {result['message']}")
+        assert result['success'] is False and "namespace unavailable" in result['message']
+    assert (sys.stdout._target() if hasattr(sys.stdout, '_target') else sys.stdout) is stdout
+    print("✅ Failures before running reported cleanly!")
+
+def test_print_only_snippet():
+    """Test that snippets without a trailing expression keep the old shape"""
+    print("\n🧪 Testing Print-Only Snippet...")
+    print("=" * 60)
+
+    tools = iris_tools()
+    result = tools.execute_python_code("print(len(df))")
+    assert result['output'] == "150\n"
+    assert 'result' not in result
+
+    result = tools.execute_python_code("df.shape", return_result=False)
+    assert 'result' not in result
+    print("✅ Print-only snippets unchanged!")
+
+def main():
+    """Run all structured result tests"""
+    print("🚀 Testing Structured Results")
+    print("=" * 60)
+
+    test_dataframe_result()
+    test_result_handles()
+    test_result_memory_budget()
+    test_namespace_failure()
+    test_print_only_snippet()
+
+    print("\n🎉 All structured result tests completed!")
+
+if __name__ == "__main__":
+    main()
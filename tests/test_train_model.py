@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the train_model tool
+Tests parallel cross-validation over a shared process pool, time-outs, grid search, reuse and error handling
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from tests import iris_tools
+from tools.model_registry import ModelRegistry
+from tools.training import TrainingSettings, cross_validate
+
+def make_tools(rows=None):
+    tools = iris_tools("train-test", models=ModelRegistry("train-test", spill_dir=tempfile.mkdtemp()))
+    if rows:
+        rng = np.random.default_rng(0)
+        frame = pd.DataFrame({
+            'x1': rng.normal(size=rows),
+            'x2': rng.normal(size=rows),
+            'region': rng.choice(['north', 'south', 'east'], size=rows),
+        })
+        frame['y'] = 3 * frame['x1'] - frame['x2'] + (frame['region'] == 'north') + rng.normal(scale=0.1, size=rows)
+        tools.current_dataset = frame
+    return tools
+
+def test_parallel_grid_search():
+    """Test that folds and candidates run in worker processes with shared-memory data"""
+    print("🧪 Testing Parallel Cross-Validation...")
+    print("=" * 60)
+
+    tools = make_tools(rows=6000)
+    tools.training = TrainingSettings(workers=2, inline_rows=0)
+    result = tools.train_model('y', estimator='ridge', cv=3, param_grid={'alpha': [0.1, 10.0]})
+    print(f"Score: {result['cv_score']} ± {result['cv_std']}, timing: {result['timing']}")
+
+    assert result['success'] and result['task'] == 'regression' and result['metric'] == 'r2'
+    assert result['timing']['workers'] == 2 and result['timing']['fits'] == 6
+    assert result['encoded_features'] == 5 and result['cv_score'] > 0.95
+    assert len(result['folds']) == 3 and all(f['test_rows'] == 2000 for f in result['folds'])
+    assert [c['params']['alpha'] for c in result['candidates']] == [0.1, 10.0]
+    model = tools.models.get('ridge')
+    assert list(model.feature_names_in_)[:2] == ['x1', 'x2']
+    print("✅ Folds ran in parallel!")
+
+def test_classification_and_reuse():
+    """Test classification on iris, reuse of an identical request and stale data retraining"""
+    print("\n🧪 Testing Classification and Reuse...")
+    print("=" * 60)
+
+    tools = make_tools()
+    features = ['sepal length (cm)', 'sepal width (cm)', 'petal length (cm)', 'petal width (cm)']
+    result = tools.train_model('species', features=features, params={'n_estimators': 20, 'random_state': 0}, name='rf')
+    print(f"Accuracy: {result['cv_score']}, classes: {result['classes']}")
+    assert result['task'] == 'classification' and result['cv_score'] > 0.9
+    assert result['timing']['workers'] == 1  # small data runs one fit at a time
+    assert result['classes'] == ['setosa', 'versicolor', 'virginica']
+
+    again = tools.train_model('species', features=features, params={'n_estimators': 20, 'random_state': 0}, name='rf')
+    assert again['reused'] and again['cv_score'] == result['cv_score']
+    assert tools.execute_python_code("models['rf'].predict(df[['sepal length (cm)', 'sepal width (cm)', 'petal length (cm)', 'petal width (cm)']].head(2)).tolist()")['result']['value'] == ['setosa', 'setosa']
+
+    tools.execute_python_code("df = df.sample(frac=0.5, random_state=1)")
+    changed = tools.train_model('species', features=features, params={'n_estimators': 20, 'random_state': 0}, name='rf')
+    assert 'reused' not in changed and changed['rows'] == 75
+    print("✅ Requests reused until data changes!")
+
+def test_shared_pool_timeouts():
+    """Test that a timed-out call cancels only its own tasks and leaves the shared pool to other calls"""
+    print("\n🧪 Testing Shared Pool Time-Outs...")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(20000, 8)), rng.normal(size=20000)
+    forest = 'sklearn.ensemble.RandomForestRegressor'
+    slow = [{'n_estimators': 100, 'random_state': i} for i in range(4)]
+    quick = [{'alpha': a} for a in (0.1, 1.0)]
+    cross_validate(X[:100], y[:100], 'sklearn.linear_model.Ridge', quick, 2, 'r2', 'regression', 2)  # start the workers
+
+    outcome = {}
+    def other_session():
+        time.sleep(0.2)
+        outcome['records'] = cross_validate(X, y, 'sklearn.linear_model.Ridge', quick, 3, 'r2', 'regression', 2,
+                                            timeout=60)
+    thread = threading.Thread(target=other_session)
+    thread.start()
+    for workers in (2, 1):  # the one-at-a-time path obeys the limit too
+        start = time.monotonic()
+        try:
+            cross_validate(X, y, forest, slow, 5, 'r2', 'regression', workers, timeout=0.5)
+            assert False, "expected a time-out"
+        except FutureTimeout:
+            pass
+        print(f"  {workers} worker(s) timed out after {time.monotonic() - start:.2f}s")
+        assert time.monotonic() - start < 5
+    thread.join()
+    assert len(outcome['records']) == 6 and all(r['score'] > -1 for r in outcome['records'])
+    print("✅ Time-outs stay within their own call!")
+
+def test_errors():
+    """Test that invalid requests come back as readable errors"""
+    print("\n🧪 Testing Errors...")
+    print("=" * 60)
+
+    tools = make_tools()
+    cases = [
+        tools.train_model('nope'),
+        tools.train_model('species', estimator='svm'),
+        tools.train_model('species', estimator='linear_regression'),
+        tools.train_model('species', params={'n_trees': 10}),
+        tools.train_model('species', metric='nonsense'),
+        tools.train_model('species', cv=1),
+    ]
+    for case in cases:
+        print(f"  {case['message']}")
+        assert case['success'] is False
+    print("✅ Errors reported!")
+
+def main():
+    """Run all train_model tests"""
+    print("🚀 Testing train_model")
+    print("=" * 60)
+
+    test_parallel_grid_search()
+    test_classification_and_reuse()
+    test_shared_pool_timeouts()
+    test_errors()
+
+    print("\n🎉 All train_model tests completed!")
+
+if __name__ == "__main__":
+    main()
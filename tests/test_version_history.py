@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script for dataset version history
+Tests undo/checkout of snippet changes, reset without reloading, and spilling old versions to disk
+"""
+
+import sys
+import os
+import tempfile
+import gc
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from tools.dataset_tools import DatasetTools
+from tools.version_history import VersionHistory
+
+def test_undo_and_checkout():
+    """Test that a destructive snippet can be undone and any version restored"""
+    print("🧪 Testing Undo and Checkout...")
+    print("=" * 60)
+
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    tools.execute_python_code("df = df[df['species'] == 'setosa']")
+    tools.execute_python_code("df = df.head(10)")
+    versions = tools.list_versions('iris')['versions']
+    print(f"Versions: {[(v['version'], v['description'], v['shape']) for v in versions]}")
+
+    assert [v['shape'][0] for v in versions] == [150, 50, 10]
+    assert versions[0]['description'] == 'loaded from sklearn:iris' and versions[-1]['head']
+
+    result = tools.undo_dataset()
+    print(f"Undo: {result['message']}")
+    assert result['success'] and tools.current_dataset.shape[0] == 50
+    assert tools.undo_dataset()['success'] and tools.current_dataset.shape[0] == 150
+    assert not tools.undo_dataset()['success']
+
+    assert tools.checkout_dataset(versions[-1]['version'])['success']
+    assert tools.current_dataset.shape[0] == 10
+    assert not tools.checkout_dataset(999)['success']
+    print("✅ Undo and checkout restore earlier states!")
+
+def test_reset_uses_history():
+    """Test that reset_dataset returns to the loaded state and a new change branches from a restored one"""
+    print("\n🧪 Testing Reset from History...")
+    print("=" * 60)
+
+    tools = DatasetTools()
+    tools.load_iris_dataset()
+    tools.execute_python_code("df = df.drop(columns=['species'])")
+    version = tools.dataset_version
+    result = tools.reset_dataset()
+    print(f"Reset: {result['message']}")
+
+    assert 'species' in tools.current_dataset.columns and tools.dataset_version > version
+    tools.execute_python_code("df['double'] = df['target'] * 2")
+    head = [v for v in tools.list_versions()['versions'] if v['head']][0]
+    assert head['parent'] == 1 and 'double' in tools.current_dataset.columns
+
+    # The version as loaded outlives the version cap
+    tools = DatasetTools()
+    tools.history = VersionHistory(max_versions=3)
+    tools.load_iris_dataset()
+    for _ in range(5):
+        tools.execute_python_code("df = df.iloc[1:]")
+    assert len(tools.list_versions()['versions']) == 3
+    assert tools.reset_dataset()['success'] and tools.current_dataset.shape[0] == 150
+    print("✅ Reset restored the first version!")
+
+def test_spill_to_disk():
+    """Test that old versions spill to Arrow files, load back intact and respect the disk cap"""
+    print("\n🧪 Testing Spill to Disk...")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        tools = DatasetTools()
+        tools.history = VersionHistory(max_memory_mb=0.02, max_disk_mb=0.05, spill_dir=spill_dir)
+        tools.load_iris_dataset()
+        for step in range(6):
+            tools.execute_python_code(f"df = df.assign(step{step}=df['target'] + {step})")
+        versions = tools.list_versions()
+        print(f"Locations: {[(v['version'], v['location']) for v in versions['versions']]}, "
+              f"disk: {versions['disk_bytes']} bytes")
+
+        locations = [v['location'] for v in versions['versions']]
+        assert locations[-1] == 'memory' and 'disk' in locations
+        assert versions['disk_bytes'] <= 0.05 * 1024 * 1024
+        assert len(versions['versions']) < 7
+
+        spilled = [v for v in versions['versions'] if v['location'] == 'disk'][-1]
+        assert tools.checkout_dataset(spilled['version'])['success']
+        assert list(tools.current_dataset.shape) == spilled['shape']
+        assert tools.current_dataset['species'].iloc[0] == 'setosa'
+
+        # Closing the session (or dropping it) removes its spill directory
+        assert os.listdir(tools.history.spill_dir)
+        tools.close()
+        assert not os.path.exists(tools.history.spill_dir)
+        other = DatasetTools()
+        other.history = VersionHistory(max_memory_mb=0.02, spill_dir=spill_dir)
+        other.load_iris_dataset()
+        for step in range(4):
+            other.execute_python_code(f"df = df.assign(step{step}=1)")
+        assert os.listdir(spill_dir)
+        del other
+        gc.collect()
+        assert os.listdir(spill_dir) == []
+    print("✅ Old versions spilled, restored and cleaned up!")
+
+def main():
+    """Run all version history tests"""
+    print("🚀 Testing Dataset Version History")
+    print("=" * 60)
+
+    test_undo_and_checkout()
+    test_reset_uses_history()
+    test_spill_to_disk()
+
+    print("\n🎉 All version history tests completed!")
+
+if __name__ == "__main__":
+    main()
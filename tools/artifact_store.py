@@ -0,0 +1,188 @@
+"""
+Content-addressed artifact store
+Visualizations and other generated files are stored under their SHA-256
+digest with a ``.meta.json`` metadata sidecar, so identical plots are written once.
+Retention by age, count and total size is enforced by garbage collection,
+optionally from a background thread.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+
+def _env_number(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    if value.strip().lower() in ('', 'none', '0'):
+        return None
+    return float(value)
+
+
+class ArtifactStore:
+    def __init__(self, root: str = os.path.join("static", "visualizations"),
+                 max_age_seconds: Optional[float] = None, max_count: Optional[int] = 1000,
+                 max_bytes: Optional[int] = 1024 * 1024 * 1024, gc_interval_seconds: Optional[float] = 600):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.gc_interval_seconds = gc_interval_seconds
+        self._lock = threading.Lock()
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> 'ArtifactStore':
+        """Build a store from AGENT_ARTIFACT_* environment variables."""
+        max_age_days = _env_number("AGENT_ARTIFACT_MAX_AGE_DAYS", None)
+        max_count = _env_number("AGENT_ARTIFACT_MAX_COUNT", 1000)
+        max_mb = _env_number("AGENT_ARTIFACT_MAX_MB", 1024)
+        return cls(
+            root=os.getenv("AGENT_ARTIFACT_DIR", os.path.join("static", "visualizations")),
+            max_age_seconds=max_age_days * 86400 if max_age_days else None,
+            max_count=int(max_count) if max_count else None,
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+            gc_interval_seconds=_env_number("AGENT_ARTIFACT_GC_INTERVAL", 600),
+        )
+
+    def _paths(self, digest: str, extension: str):
+        return os.path.join(self.root, f"{digest}.{extension}"), os.path.join(self.root, f"{digest}.meta.json")
+
+    def _write_atomic(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, data: bytes, extension: str, session_id: Optional[str] = None, code: Optional[str] = None,
+            dataset_version: Optional[int] = None, content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store ``data`` and return its metadata record. If the same bytes are
+        already stored, nothing is rewritten and ``deduplicated`` is True.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path, meta_path = self._paths(digest, extension)
+        now = time.time()
+        os.makedirs(self.root, exist_ok=True)
+
+        with self._lock:
+            deduplicated = os.path.exists(path) and os.path.exists(meta_path)
+            if deduplicated:
+                with open(meta_path, encoding='utf-8') as f:
+                    record = json.load(f)
+                os.utime(path, (now, now))
+            else:
+                self._write_atomic(path, data)
+                record = {
+                    'artifact_id': digest,
+                    'extension': extension,
+                    'content_type': content_type,
+                    'bytes': len(data),
+                    'created_at': now,
+                    'references': [],
+                }
+            record['last_used'] = now
+            record['references'] = (record.get('references', []) + [{
+                'session_id': session_id,
+                'code_sha256': hashlib.sha256(code.encode('utf-8')).hexdigest() if code is not None else None,
+                'dataset_version': dataset_version,
+                'at': now,
+            }])[-20:]
+            self._write_atomic(meta_path, json.dumps(record).encode('utf-8'))
+
+        self.ensure_background_gc()
+        return dict(record, path=os.path.abspath(path), deduplicated=deduplicated)
+
+    def path_for(self, artifact_id: str) -> Optional[str]:
+        """Absolute path of a stored artifact, or None if it is unknown or collected."""
+        meta_path = os.path.join(self.root, f"{artifact_id}.meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            record = json.load(f)
+        path = os.path.join(self.root, f"{artifact_id}.{record['extension']}")
+        return os.path.abspath(path) if os.path.exists(path) else None
+
+    def list_artifacts(self) -> List[Dict[str, Any]]:
+        """Metadata for every stored artifact, most recently used first."""
+        records = []
+        if not os.path.isdir(self.root):
+            return records
+        for name in os.listdir(self.root):
+            if not name.endswith('.meta.json') or name.startswith('.'):
+                continue
+            try:
+                with open(os.path.join(self.root, name), encoding='utf-8') as f:
+                    records.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+        records.sort(key=lambda r: r.get('last_used', 0), reverse=True)
+        return records
+
+    def _remove(self, record: Dict[str, Any]):
+        path, meta_path = self._paths(record['artifact_id'], record['extension'])
+        for p in (path, meta_path):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def collect_garbage(self) -> Dict[str, Any]:
+        """Apply the age, count and size limits, dropping least recently used artifacts first."""
+        now = time.time()
+        removed, freed = 0, 0
+        with self._lock:
+            records = self.list_artifacts()
+            keep = []
+            for record in records:
+                if self.max_age_seconds and now - record.get('last_used', 0) > self.max_age_seconds:
+                    self._remove(record)
+                    removed += 1
+                    freed += record.get('bytes', 0)
+                else:
+                    keep.append(record)
+            total = sum(r.get('bytes', 0) for r in keep)
+            while keep and ((self.max_count and len(keep) > self.max_count) or
+                            (self.max_bytes and total > self.max_bytes)):
+                record = keep.pop()
+                self._remove(record)
+                removed += 1
+                freed += record.get('bytes', 0)
+                total -= record.get('bytes', 0)
+        return {'removed': removed, 'freed_bytes': freed, 'remaining': len(keep), 'total_bytes': total}
+
+    def ensure_background_gc(self):
+        """Start the periodic GC thread once, if an interval is configured."""
+        if not self.gc_interval_seconds or (self._gc_thread is not None and self._gc_thread.is_alive()):
+            return
+        self._gc_stop.clear()
+        self._gc_thread = threading.Thread(target=self._gc_loop, name='artifact-gc', daemon=True)
+        self._gc_thread.start()
+
+    def _gc_loop(self):
+        while not self._gc_stop.wait(self.gc_interval_seconds):
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                print(f"Warning: Artifact garbage collection failed: {e}")
+
+    def stop_background_gc(self):
+        self._gc_stop.set()
+        if self._gc_thread is not None:
+            self._gc_thread.join(timeout=5.0)
+            self._gc_thread = None
+
+
+# Global instance
+artifact_store = ArtifactStore.from_env()
@@ -0,0 +1,254 @@
+"""
+Static detection of slow pandas patterns
+An AST pass over a snippet before it runs. It flags row-wise iteration
+(``iterrows``, ``itertuples``, ``apply(axis=1)``, indexing rows in a loop),
+frames grown with ``pd.concat``/``append`` inside loops and per-column
+loops doing element-wise work. Each finding carries a vectorized
+suggestion and a rough cost estimate from the shapes of the loaded frames,
+so the model can rewrite the code before paying for it.
+"""
+
+import ast
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+# Rough per-unit costs in seconds (pandas 2.x, one core)
+COST_PER_ROW = {
+    'iterrows': 3e-5,
+    'itertuples': 2.5e-6,
+    'apply_axis1': 1e-5,
+    'row_index_loop': 3e-5,     # per .loc/.iloc/.at access per row
+}
+ELEMENTWISE_COST = 3.5e-7       # Series.apply/map with a Python callable, per element
+GROW_COST_PER_ITERATION = 8e-5  # pd.concat/append call overhead
+COPY_BYTES_PER_SECOND = 2e9     # re-copying the accumulated frame on each iteration
+
+SUGGESTIONS = {
+    'iterrows': "Avoid iterrows(): use column arithmetic, np.where/np.select for conditions, "
+                ".str/.dt accessors, or groupby aggregations on whole columns.",
+    'itertuples': "itertuples() still loops in Python; use vectorized column operations instead.",
+    'apply_axis1': "apply(axis=1) calls Python once per row; combine columns directly "
+                   "(e.g. df['a'] / df['b'], np.where(df['a'] > 0, ...)).",
+    'row_index_loop': "Indexing one row at a time (.loc/.iloc/.at in a loop) is slow; "
+                      "operate on whole columns or use boolean masks.",
+    'concat_in_loop': "pd.concat inside a loop copies the growing frame every time; "
+                      "collect pieces in a list and call pd.concat once after the loop.",
+    'append_in_loop': "Appending to a DataFrame in a loop is quadratic; collect rows in a "
+                      "list of dicts and build one DataFrame (or pd.concat once) at the end.",
+    'column_loop': "Looping over columns with element-wise work; apply the operation to "
+                   "all columns at once (df[cols] * x, df[cols].agg(...), df.select_dtypes(...)).",
+}
+
+
+def _call_name(node: ast.Call) -> Optional[str]:
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+
+def _base_name(node) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_axis1(node: ast.Call) -> bool:
+    for keyword in node.keywords:
+        if keyword.arg == 'axis' and isinstance(keyword.value, ast.Constant):
+            return keyword.value.value in (1, 'columns')
+    # apply(func, 1)
+    return len(node.args) >= 2 and isinstance(node.args[1], ast.Constant) and node.args[1].value in (1, 'columns')
+
+
+def _has_callable_arg(node: ast.Call) -> bool:
+    return any(isinstance(arg, (ast.Lambda, ast.Name)) for arg in node.args)
+
+
+class _Finder(ast.NodeVisitor):
+    def __init__(self, shapes: Dict[str, Tuple[int, int]]):
+        self.shapes = shapes
+        self.loops: List[Tuple[Optional[int], str]] = []  # (iterations, kind) of enclosing loops
+        self.findings: List[Dict[str, Any]] = []
+
+    def shape(self, name: Optional[str]) -> Tuple[int, int]:
+        return self.shapes.get(name) or self.shapes.get('df') or (0, 0)
+
+    def add(self, pattern: str, node, seconds: Optional[float]):
+        self.findings.append({
+            'pattern': pattern,
+            'line': node.lineno,
+            'estimated_seconds': round(seconds, 3) if seconds is not None else None,
+            'suggestion': SUGGESTIONS[pattern],
+        })
+
+    def loop_iterations(self, iterable) -> Tuple[Optional[int], str]:
+        """Iterations of ``for ... in iterable`` when it ranges over a known frame's rows or columns."""
+        if isinstance(iterable, ast.Call):
+            name = _call_name(iterable)
+            if name in ('iterrows', 'itertuples', 'items', 'iteritems') and isinstance(iterable.func, ast.Attribute):
+                rows, cols = self.shape(_base_name(iterable.func.value))
+                return (cols, 'columns') if name in ('items', 'iteritems') else (rows, 'rows')
+            if name == 'range' and iterable.args:
+                bound = iterable.args[-1] if len(iterable.args) <= 2 else iterable.args[1]
+                if isinstance(bound, ast.Call) and _call_name(bound) == 'len' and bound.args:
+                    return self.shape(_base_name(bound.args[0]))[0], 'rows'
+                if isinstance(bound, ast.Constant) and isinstance(bound.value, int):
+                    return bound.value, 'other'
+            if name == 'enumerate' and iterable.args:
+                return self.loop_iterations(iterable.args[0])
+        if isinstance(iterable, ast.Attribute):
+            rows, cols = self.shape(_base_name(iterable.value))
+            if iterable.attr == 'columns':
+                return cols, 'columns'
+            if iterable.attr == 'index':
+                return rows, 'rows'
+        return None, 'other'
+
+    def visit_For(self, node: ast.For):
+        iterations, kind = self.loop_iterations(node.iter)
+        if kind == 'columns' and self._has_elementwise(node.body):
+            rows = self.shape(None)[0]
+            self.add('column_loop', node, (iterations or 0) * rows * ELEMENTWISE_COST)
+        self.visit(node.iter)
+        self.loops.append((iterations, kind))
+        for child in node.body + node.orelse:
+            self.visit(child)
+        self.loops.pop()
+
+    def visit_While(self, node: ast.While):
+        self.visit(node.test)
+        self.loops.append((None, 'other'))
+        for child in node.body + node.orelse:
+            self.visit(child)
+        self.loops.pop()
+
+    def visit_comprehension_owner(self, node):
+        iterations, kind = self.loop_iterations(node.generators[0].iter)
+        for generator in node.generators:
+            self.visit(generator.iter)
+        self.loops.append((iterations, kind))
+        for generator in node.generators:
+            for condition in generator.ifs:
+                self.visit(condition)
+        for child in ('elt', 'key', 'value'):
+            if hasattr(node, child):
+                self.visit(getattr(node, child))
+        self.loops.pop()
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = visit_comprehension_owner
+
+    def _has_elementwise(self, body) -> bool:
+        for node in ast.walk(ast.Module(body=body, type_ignores=[])):
+            if isinstance(node, ast.Call) and _call_name(node) in ('apply', 'map', 'applymap') and _has_callable_arg(node):
+                return True
+        return False
+
+    def _in_row_loop(self) -> Optional[int]:
+        for iterations, kind in reversed(self.loops):
+            if kind == 'rows':
+                return iterations
+        return None
+
+    def _loop_iterations(self) -> Optional[int]:
+        total = None
+        for iterations, _ in self.loops:
+            if iterations is not None:
+                total = iterations * (total or 1)
+        return total
+
+    def visit_Call(self, node: ast.Call):
+        name = _call_name(node)
+        if isinstance(node.func, ast.Attribute):
+            rows = self.shape(_base_name(node.func.value))[0]
+            if name in ('iterrows', 'itertuples'):
+                self.add(name, node, rows * COST_PER_ROW[name])
+            elif name == 'apply' and _is_axis1(node):
+                self.add('apply_axis1', node, rows * COST_PER_ROW['apply_axis1'])
+        if name == 'concat' and self.loops:
+            self.add('concat_in_loop', node, self._grow_cost())
+        self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        # frame = frame.append(...) / frame = frame._append(...): list.append returns None, so this is a frame
+        value = node.value
+        if (self.loops and isinstance(value, ast.Call) and _call_name(value) in ('append', '_append')
+                and isinstance(value.func, ast.Attribute) and isinstance(value.func.value, ast.Name)
+                and any(isinstance(t, ast.Name) and t.id == value.func.value.id for t in node.targets)):
+            self.add('append_in_loop', node, self._grow_cost())
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node: ast.Subscript):
+        if isinstance(node.value, ast.Attribute) and node.value.attr in ('loc', 'iloc', 'at', 'iat'):
+            iterations = self._in_row_loop()
+            if iterations is not None and not self._already(node.lineno, 'row_index_loop'):
+                self.add('row_index_loop', node, iterations * COST_PER_ROW['row_index_loop'])
+        self.generic_visit(node)
+
+    def _already(self, line: int, pattern: str) -> bool:
+        return any(f['line'] == line and f['pattern'] == pattern for f in self.findings)
+
+    def _grow_cost(self) -> Optional[float]:
+        iterations = self._loop_iterations()
+        if iterations is None:
+            return None
+        rows, cols = self.shape(None)
+        row_bytes = 8 * max(cols, 1)
+        return iterations * GROW_COST_PER_ITERATION + iterations * iterations / 2 * row_bytes / COPY_BYTES_PER_SECOND
+
+
+class CodeAnalyzer:
+    """
+    Finds slow pandas patterns in a snippet. ``mode`` is 'off', 'warn'
+    (findings are attached to the result) or 'block' (snippets whose
+    estimated cost reaches ``block_seconds`` are returned unexecuted).
+    """
+
+    MODES = ('off', 'warn', 'block')
+
+    def __init__(self, mode: str = 'warn', block_seconds: float = 5.0, min_seconds: float = 0.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown code analysis mode '{mode}' (expected one of {', '.join(self.MODES)})")
+        self.mode = mode
+        self.block_seconds = block_seconds
+        self.min_seconds = min_seconds
+
+    @classmethod
+    def from_env(cls) -> 'CodeAnalyzer':
+        """Read AGENT_CODE_ANALYSIS (off/warn/block), AGENT_CODE_ANALYSIS_BLOCK_SECONDS and _MIN_SECONDS."""
+        return cls(
+            mode=os.getenv("AGENT_CODE_ANALYSIS", "warn").strip().lower(),
+            block_seconds=float(os.getenv("AGENT_CODE_ANALYSIS_BLOCK_SECONDS", "5")),
+            min_seconds=float(os.getenv("AGENT_CODE_ANALYSIS_MIN_SECONDS", "0")),
+        )
+
+    def analyze(self, code: str, shapes: Optional[Dict[str, Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
+        """
+        Return findings ordered by line. ``shapes`` maps frame names to
+        (rows, columns); unknown names are assumed to be the size of ``df``.
+        """
+        if self.mode == 'off':
+            return []
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return []
+        finder = _Finder(shapes or {})
+        finder.visit(tree)
+        lines = code.splitlines()
+        findings = []
+        for finding in sorted(finder.findings, key=lambda f: f['line']):
+            seconds = finding['estimated_seconds']
+            if seconds is not None and seconds < self.min_seconds:
+                continue
+            text = lines[finding['line'] - 1].strip() if finding['line'] <= len(lines) else ""
+            findings.append(dict(finding, code=text if len(text) <= 100 else text[:97] + "..."))
+        return findings
+
+    def should_block(self, findings: List[Dict[str, Any]]) -> bool:
+        return self.mode == 'block' and estimated_total(findings) >= self.block_seconds
+
+
+def estimated_total(findings: List[Dict[str, Any]]) -> float:
+    return sum(f['estimated_seconds'] or 0.0 for f in findings)
@@ -0,0 +1,244 @@
+"""
+Named dataset registry
+Holds several named DataFrames per session. Datasets can be registered with
+a loader and are only read on first use; switching the active dataset never
+reloads. Snippets receive copy-on-write views, so exposing a frame (or a
+subset of its columns) to the sandbox does not copy its data.
+"""
+
+import os
+import threading
+import time
+import keyword
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional
+
+import pandas as pd
+
+# Copy-on-write makes shallow copies and column selections lazy: data is only
+# copied when a snippet writes to it. It is always on from pandas 3; before
+# that it is switched on only while views are made and snippets run.
+_COPY_ON_WRITE_OPTION = int(pd.__version__.split('.')[0]) < 3
+_copy_on_write_lock = threading.Lock()
+_copy_on_write_users = 0
+_copy_on_write_previous = None
+
+
+@contextmanager
+def copy_on_write():
+    """
+    Enable pandas copy-on-write for the duration of the block (a no-op from
+    pandas 3). Options are process-wide, so overlapping blocks in several
+    sessions are counted and the host's setting returns after the last one.
+    """
+    global _copy_on_write_users, _copy_on_write_previous
+    if not _COPY_ON_WRITE_OPTION:
+        yield
+        return
+    with _copy_on_write_lock:
+        if _copy_on_write_users == 0:
+            _copy_on_write_previous = pd.get_option('mode.copy_on_write')
+            pd.set_option('mode.copy_on_write', True)
+        _copy_on_write_users += 1
+    try:
+        yield
+    finally:
+        with _copy_on_write_lock:
+            _copy_on_write_users -= 1
+            if _copy_on_write_users == 0:
+                pd.set_option('mode.copy_on_write', _copy_on_write_previous)
+
+FILE_READERS = {
+    '.csv': pd.read_csv,
+    '.tsv': lambda path: pd.read_csv(path, sep='\t'),
+    '.parquet': pd.read_parquet,
+    '.json': pd.read_json,
+    '.feather': pd.read_feather,
+}
+
+
+def view(frame: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Zero-copy view of ``frame`` (optionally a subset of columns); writes copy on demand."""
+    with copy_on_write():
+        return frame[list(columns)] if columns is not None else frame.copy(deep=False)
+
+
+def file_loader(path: str) -> Callable[[], pd.DataFrame]:
+    """Loader for a CSV/TSV/Parquet/JSON/Feather file, chosen by extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FILE_READERS:
+        raise ValueError(f"Unsupported file type '{extension}'. Supported: {sorted(FILE_READERS)}")
+    reader = FILE_READERS[extension]
+    return lambda: reader(path)
+
+
+class DatasetEntry:
+    def __init__(self, name: str, loader: Optional[Callable[[], pd.DataFrame]] = None,
+                 frame: Optional[pd.DataFrame] = None, source: Optional[str] = None):
+        self.name = name
+        self.loader = loader
+        self.frame = frame
+        self.source = source
+        self.version = 0 if frame is None else 1
+        self.load_seconds = None
+        self.last_used = time.time()
+        self._memory_bytes = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.frame is not None
+
+    def load(self) -> pd.DataFrame:
+        if self.frame is None:
+            if self.loader is None:
+                raise KeyError(f"Dataset '{self.name}' has no data and no loader")
+            start = time.perf_counter()
+            self.frame = self.loader()
+            self.load_seconds = time.perf_counter() - start
+            self.version += 1
+        self.last_used = time.time()
+        return self.frame
+
+    def replace(self, frame: pd.DataFrame):
+        self.frame = frame
+        self.version += 1
+        self._memory_bytes = None
+
+    def unload(self) -> bool:
+        """Drop the in-memory frame if it can be reloaded later."""
+        if self.loader is None or self.frame is None:
+            return False
+        self.frame = None
+        self._memory_bytes = None
+        return True
+
+    def memory_bytes(self) -> int:
+        if self.frame is None:
+            return 0
+        if self._memory_bytes is None:
+            self._memory_bytes = int(self.frame.memory_usage(index=True, deep=True).sum())
+        return self._memory_bytes
+
+    def describe(self) -> Dict[str, Any]:
+        info = {
+            'name': self.name,
+            'loaded': self.loaded,
+            'source': self.source,
+            'version': self.version,
+            'memory_bytes': self.memory_bytes(),
+        }
+        if self.loaded:
+            info['shape'] = list(self.frame.shape)
+            info['columns'] = [str(col) for col in self.frame.columns]
+        if self.load_seconds is not None:
+            info['load_seconds'] = round(self.load_seconds, 4)
+        return info
+
+
+class DatasetRegistry:
+    """Named datasets of one session plus the name of the active one (``df`` in snippets)."""
+
+    def __init__(self):
+        self._entries: Dict[str, DatasetEntry] = {}
+        self.active_name: Optional[str] = None
+
+    def register(self, name: str, frame: Optional[pd.DataFrame] = None,
+                 loader: Optional[Callable[[], pd.DataFrame]] = None, source: Optional[str] = None) -> DatasetEntry:
+        """Add or replace a dataset. With only a ``loader`` nothing is read until first use."""
+        if frame is None and loader is None:
+            raise ValueError("Provide a frame or a loader")
+        entry = DatasetEntry(name, loader=loader, frame=frame, source=source)
+        previous = self._entries.get(name)
+        if previous is not None:
+            entry.version = previous.version + 1
+        self._entries[name] = entry
+        return entry
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def entry(self, name: str) -> DatasetEntry:
+        if name not in self._entries:
+            raise KeyError(f"Unknown dataset '{name}'. Available: {self.names()}")
+        return self._entries[name]
+
+    def get(self, name: str) -> pd.DataFrame:
+        """The dataset's frame, loading it on first access."""
+        return self.entry(name).load()
+
+    def set(self, name: str, frame: pd.DataFrame):
+        if name in self._entries:
+            self._entries[name].replace(frame)
+        else:
+            self.register(name, frame=frame, source='derived')
+
+    def drop(self, name: str):
+        self.entry(name)
+        del self._entries[name]
+        if self.active_name == name:
+            self.active_name = None
+
+    def activate(self, name: str) -> DatasetEntry:
+        """Make ``name`` the active dataset; it is loaded only if it never was."""
+        entry = self.entry(name)
+        entry.load()
+        self.active_name = name
+        return entry
+
+    @property
+    def active(self) -> Optional[pd.DataFrame]:
+        if self.active_name is None:
+            return None
+        return self.get(self.active_name)
+
+    def loaded_frames(self) -> Dict[str, pd.DataFrame]:
+        return {name: entry.frame for name, entry in self._entries.items() if entry.loaded}
+
+    def total_memory_bytes(self) -> int:
+        return sum(entry.memory_bytes() for entry in self._entries.values())
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [dict(entry.describe(), active=name == self.active_name) for name, entry in self._entries.items()]
+
+
+class DatasetAccessor:
+    """
+    The ``datasets`` object in the sandbox: ``datasets['sales']`` loads lazily
+    and returns a copy-on-write view, ``datasets['joined'] = frame`` registers a
+    new dataset and ``datasets.view('sales', ['a', 'b'])`` selects columns
+    without copying them.
+    """
+
+    def __init__(self, registry: DatasetRegistry):
+        self._registry = registry
+        self.assigned: Dict[str, pd.DataFrame] = {}
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        if name in self.assigned:
+            return self.assigned[name]
+        return view(self._registry.get(name))
+
+    def __setitem__(self, name: str, frame: pd.DataFrame):
+        if not isinstance(frame, pd.DataFrame):
+            raise TypeError("Only DataFrames can be stored as datasets")
+        self.assigned[name] = frame
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.assigned or name in self._registry
+
+    def view(self, name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return view(self[name], columns)
+
+    def keys(self) -> List[str]:
+        return list(dict.fromkeys(self._registry.names() + list(self.assigned)))
+
+    def __repr__(self) -> str:
+        return f"datasets({self.keys()})"
+
+
+def is_namespace_name(name: str) -> bool:
+    """Whether a dataset name can be bound as a plain variable in snippets."""
+    return name.isidentifier() and not keyword.iskeyword(name)
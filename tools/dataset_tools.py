@@ -18,35 +18,268 @@ import statsmodels.formula.api as smf
 import statsmodels
 import warnings
 import io
+import os
 import sys
+import threading
+from contextvars import ContextVar
 from typing import Dict, Any, List, Optional
 import traceback
+import contextlib
+import json
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
 import ast
+import functools
 import re
+from observability.metrics import metrics
+from tools.sandbox import (
+    ExecutionLimits, ExecutionGuard, ExecutionLimitExceeded, compile_snippet, snippet_modifies, RESULT_VARIABLE,
+    redirect_stdout, restore_stdout
+)
+from tools.artifact_store import artifact_store
+from tools.results import ResultStore, encode_result
+from tools.interactive_figures import capture_plotly_show, find_interactive_figure, serialize_figure
+from tools.plot_acceleration import PlotThresholds, accelerate_plots
+from tools.dataset_registry import DatasetRegistry, DatasetAccessor, copy_on_write, view, is_namespace_name
+from tools.sql_engine import SQLEngine
+from tools.profiler import SnippetProfiler
+from tools.code_analyzer import CodeAnalyzer, estimated_total
+from tools.model_registry import ModelRegistry, ModelAccessor, data_fingerprint
+from tools.training import TrainingSettings, train
+from tools.version_history import VersionHistory
+from tools.kernel import KernelNamespace, referenced_names
+from tools.shared_datasets import shared_datasets, shared_loader, shared_file_loader
+from tools.single_flight import single_flight
+from tools.output_stream import OutputStreamSettings, StreamingOutput, Sink
+from tools.index_advisor import IndexAdvisor, ACCELERATOR_VARIABLE
 
 warnings.filterwarnings('ignore')
 
+_render_lock = threading.RLock()
+
+def _iris_frame() -> pd.DataFrame:
+    iris = load_iris()
+    frame = pd.DataFrame(iris.data, columns=iris.feature_names)
+    frame['target'] = iris.target
+    frame['species'] = [iris.target_names[i] for i in iris.target]
+    return frame
+
+def _describe_change(code: str) -> str:
+    """A one-line label for a version: the last statement of the code that produced it."""
+    lines = [line.strip() for line in code.strip().splitlines() if line.strip() and not line.strip().startswith('#')]
+    text = lines[-1] if lines else ''
+    if len(lines) > 1:
+        text = f"{text} (+{len(lines) - 1} lines)"
+    return text if len(text) <= 100 else text[:97] + "..."
+
+def _changes_state(method):
+    """Count calls of ``method`` as changes of session state (datasets, variables, models, results, history)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.mutations += 1
+    return wrapper
+
+# Every session's iris is a view of one shared base frame
+_shared_iris = shared_loader(('sklearn:iris',), _iris_frame, 'sklearn:iris')
+
 class DatasetTools:
-    def __init__(self):
-        self.current_dataset = None
+    def __init__(self, session_id: str = "default"):
+        self.session_id = session_id
+        self.datasets = DatasetRegistry()
+        self.sql = SQLEngine.from_env(self.datasets)
+        self.dataset_version = 0
+        # Bumped by every call that may change session state; repeated read-only tool calls are keyed on it
+        self.mutations = 0
         self.dataset_info = {}
         self.execution_history = []
+        self.limits = ExecutionLimits.from_env()
+        self.plot_thresholds = PlotThresholds.from_env()
+        self.code_analyzer = CodeAnalyzer.from_env()
+        self.results = ResultStore.from_env()
+        self.models = ModelRegistry.from_env(session_id)
+        self.training = TrainingSettings.from_env()
+        self.history = VersionHistory.from_env(session_id)
+        self.kernel = KernelNamespace.from_env()
+        self.output_stream = OutputStreamSettings.from_env()
+        self.index_advisor = IndexAdvisor.from_env()
+        self._active_guard = None
+        self._live_output: Optional[StreamingOutput] = None
+    
+    @property
+    def current_dataset(self) -> Optional[pd.DataFrame]:
+        """The active dataset, exposed to snippets as ``df``."""
+        return self.datasets.active
+    
+    @current_dataset.setter
+    def current_dataset(self, frame: Optional[pd.DataFrame]):
+        self.mutations += 1
+        if frame is None:
+            self.datasets.active_name = None
+            return
+        name = self.datasets.active_name or 'df'
+        self.datasets.set(name, frame)
+        self.datasets.active_name = name
+    
+    def set_execution_limits(self, wall_time_seconds: Optional[float] = None, cpu_time_seconds: Optional[float] = None,
+                             memory_mb: Optional[float] = None) -> Dict[str, Any]:
+        """Set the time and memory limits for code run in this session (None disables a limit)."""
+        self.limits = ExecutionLimits(wall_time_seconds, cpu_time_seconds, memory_mb)
+        return {'success': True, 'limits': self.limits.to_dict()}
+    
+    def cancel_execution(self) -> bool:
+        """Cancel the snippet currently running in this session, if any."""
+        guard = self._active_guard
+        if guard is None:
+            return False
+        guard.cancel()
+        return True
+    
+    def close(self):
+        """Release what the session keeps outside memory (spilled dataset versions and models)."""
+        self.history.close()
+        self.models.close()
+    
+    def _progress(self, done: Optional[float] = None, total: Optional[float] = None, message: str = ''):
+        """``progress(done, total, message)`` in snippets: sent live while the caller streams output."""
+        live = self._live_output
+        if live is not None:
+            live.progress(done, total, message)
+    
+    def _build_namespace(self) -> Dict[str, Any]:
+        """Create a safe execution environment for one snippet."""
+        namespace = {
+            'df': view(self.current_dataset),
+            'pd': pd,
+            'np': np,
+            'plt': plt,
+            'sns': sns,
+            'px': px,
+            'go': go,
+            'print': print,
+            'progress': self._progress,
+            'len': len,
+            'range': range,
+            'list': list,
+            'dict': dict,
+            'str': str,
+            'int': int,
+            'float': float,
+            'sklearn': sklearn,
+            'train_test_split': train_test_split,
+            'StandardScaler': StandardScaler,
+            'LinearRegression': LinearRegression,
+            'LogisticRegression': LogisticRegression,
+            'RandomForestClassifier': RandomForestClassifier,
+            'RandomForestRegressor': RandomForestRegressor,
+            'accuracy_score': accuracy_score,
+            'classification_report': classification_report,
+            'confusion_matrix': confusion_matrix,
+            'sm': sm,
+            'smf': smf,
+            'statsmodels': statsmodels,
+            'results': self.results,
+            'models': ModelAccessor(self.models, lambda: self.dataset_version),
+            'datasets': DatasetAccessor(self.datasets),
+            'sql': lambda query: self.sql.to_frame(query, self.limits)
+        }
+        # Loaded named datasets are also bound by name, as copy-on-write views
+        for name, frame in self.datasets.loaded_frames().items():
+            if is_namespace_name(name) and name not in namespace:
+                namespace[name] = view(frame)
+        return namespace
+    
+    def _store_back(self, processed_code: str, local_vars: Dict[str, Any]):
+        """Persist datasets a snippet changed: ``df``, named frames and ``datasets[...] = ...``."""
+        active = self.datasets.active_name
+        changed = {}
+        if local_vars.get('df') is not None and snippet_modifies(processed_code, 'df'):
+            changed[active] = local_vars['df']
+        for name in self.datasets.names():
+            if (name != 'df' and isinstance(local_vars.get(name), pd.DataFrame)
+                    and snippet_modifies(processed_code, name)):
+                changed.setdefault(name, local_vars[name])
+        accessor = local_vars.get('datasets')
+        if isinstance(accessor, DatasetAccessor):
+            changed.update(accessor.assigned)
+        description = _describe_change(processed_code)
+        for name, frame in changed.items():
+            self._set_dataset(name, frame, description)
+        if active in changed:
+            self.dataset_version += 1
+    
+    def _set_dataset(self, name: str, frame: pd.DataFrame, description: str):
+        """Replace a dataset and record the change in the version history."""
+        if not self.history.has(name) and name in self.datasets.names():
+            entry = self.datasets.entry(name)
+            if entry.loaded:
+                origin = 'initial state' if entry.source in (None, 'derived') else f"loaded from {entry.source}"
+                self.history.record(name, entry.frame, origin)
+        self.datasets.set(name, frame)
+        self.history.record(name, frame, description)
+    
+    def _run_sandboxed(self, processed_code: str, local_vars: Dict[str, Any], mode: str,
+                       capture_result: bool = False, profiler: Optional[SnippetProfiler] = None,
+                       transform=None) -> Any:
+        """
+        Execute code under this session's limits; raises ExecutionLimitExceeded.
+        Returns the value of the last expression when ``capture_result`` is set.
+        """
+        compiled = compile_snippet(processed_code, capture_result, transform)
+        with metrics.time("sandbox_execution_seconds", mode=mode):
+            with ExecutionGuard(self.limits) as guard, copy_on_write():
+                self._active_guard = guard
+                try:
+                    with profiler or contextlib.nullcontext():
+                        exec(compiled, {'__builtins__': {'__import__': __import__}}, local_vars)
+                finally:
+                    self._active_guard = None
+        return local_vars.pop(RESULT_VARIABLE, None)
         
+    def _refresh_accelerators(self, sql: bool = False) -> List[Dict[str, Any]]:
+        """
+        Keep indexes for the hot columns of the loaded datasets; returns those built now.
+        Sorted SQL tables are only (re)built when ``sql`` is set, i.e. just before a query
+        reads them, so snippets that store datasets back only drop the stale ones.
+        """
+        advisor = self.index_advisor
+        frames = self.datasets.loaded_frames() if advisor.enabled else {}
+        built = advisor.refresh(frames)
+        if not sql:
+            self.sql.drop_stale_sorted()
+            return built
+        wanted = {}
+        budget = advisor.max_memory_bytes - advisor.memory_bytes()
+        for name, frame in frames.items():
+            column = advisor.sql_column(frame)
+            size = int(frame.memory_usage(index=False).sum()) if column is not None else 0
+            if column is not None and size <= budget:
+                wanted[name] = (frame, column)
+                budget -= size
+        if wanted or self.sql.describe_sorted():
+            built += self.sql.sort_tables(wanted)
+        return built
+    
+    def _refresh_dataset_info(self):
+        # Create minimal dataset info to reduce token usage
+        self.dataset_info = {
+            'shape': self.current_dataset.shape,
+            'columns': [str(col) for col in self.current_dataset.columns],
+            'numeric_columns': [str(col) for col in self.current_dataset.select_dtypes(include=[np.number]).columns],
+            'categorical_columns': [str(col) for col in self.current_dataset.select_dtypes(include=['object']).columns]
+        }
+    
+    @_changes_state
     def load_iris_dataset(self) -> Dict[str, Any]:
         """Load the Iris dataset and return basic information."""
         try:
-            iris = load_iris()
-            self.current_dataset = pd.DataFrame(iris.data, columns=iris.feature_names)
-            self.current_dataset['target'] = iris.target
-            self.current_dataset['species'] = [iris.target_names[i] for i in iris.target]
-            
-            # Create minimal dataset info to reduce token usage
-            self.dataset_info = {
-                'shape': self.current_dataset.shape,
-                'columns': [str(col) for col in self.current_dataset.columns],
-                'numeric_columns': [str(col) for col in self.current_dataset.select_dtypes(include=[np.number]).columns],
-                'categorical_columns': [str(col) for col in self.current_dataset.select_dtypes(include=['object']).columns]
-            }
+            self.datasets.register('iris', loader=_shared_iris, source='sklearn:iris')
+            self.history.forget('iris')
+            self.datasets.activate('iris')
+            self.dataset_version += 1
+            self._refresh_dataset_info()
             
             return {
                 'success': True,
@@ -56,22 +289,121 @@ class DatasetTools:
         except Exception as e:
             return {'success': False, 'message': f"Error loading dataset: {str(e)}"}
     
+    @_changes_state
+    def load_dataset(self, source: str = "iris", name: Optional[str] = None, lazy: bool = False,
+                     activate: bool = True) -> Dict[str, Any]:
+        """
+        Register a dataset under ``name`` from 'iris' or a CSV/TSV/Parquet/JSON/Feather
+        path. With ``lazy`` the file is only read when first used. ``coalesced``
+        counts other sessions' loads of the same file that shared this read.
+        """
+        with single_flight.track() as flights:
+            result = self._load_dataset(source, name, lazy, activate)
+        if result['success']:
+            result['coalesced'] = sum(flight.coalesced for flight in flights)
+        return result
+    
+    def _load_dataset(self, source: str, name: Optional[str], lazy: bool, activate: bool) -> Dict[str, Any]:
+        if source.lower() == "iris" and name in (None, "iris"):
+            return self.load_iris_dataset()
+        try:
+            if source.lower() == "iris":
+                loader = _shared_iris
+            elif os.path.exists(source):
+                loader = shared_file_loader(source)
+            else:
+                return {'success': False, 'message': f"Dataset '{source}' not found. Use 'iris' or a path to a data file."}
+            name = name or os.path.splitext(os.path.basename(source))[0]
+            entry = self.datasets.register(name, loader=loader, source=source)
+            self.history.forget(name)
+            if not lazy:
+                entry.load()
+            if activate:
+                self.datasets.activate(name)
+                self.dataset_version += 1
+                self._refresh_dataset_info()
+            return {
+                'success': True,
+                'message': f"Registered dataset '{name}'" + (" (active as df)" if activate else ""),
+                'dataset': entry.describe()
+            }
+        except Exception as e:
+            return {'success': False, 'message': f"Error loading dataset: {str(e)}"}
+    
+    def list_datasets(self) -> Dict[str, Any]:
+        """Describe every named dataset with its memory use; unloaded (lazy) ones use none."""
+        return {
+            'success': True,
+            'active': self.datasets.active_name,
+            'datasets': self.datasets.describe(),
+            'total_memory_bytes': self.datasets.total_memory_bytes(),
+            # Base frames shared with other sessions are counted once per process here
+            'shared_bases': shared_datasets.describe(),
+            'accelerators': {'indexes': self.index_advisor.describe(), 'sorted_tables': self.sql.describe_sorted(),
+                             'index_memory_bytes': self.index_advisor.memory_bytes()}
+        }
+    
+    def list_models(self) -> Dict[str, Any]:
+        """Describe the fitted models stored with ``models.fit``; 'stale' ones were trained on an older dataset version."""
+        return {
+            'success': True,
+            'models': self.models.describe(self.dataset_version),
+            'memory_bytes': self.models.memory_bytes()
+        }
+    
+    @_changes_state
+    def switch_dataset(self, name: str) -> Dict[str, Any]:
+        """Make another named dataset the active ``df`` without reloading it."""
+        try:
+            entry = self.datasets.activate(name)
+        except KeyError as e:
+            return {'success': False, 'message': str(e.args[0])}
+        self.dataset_version += 1
+        self._refresh_dataset_info()
+        return {'success': True, 'message': f"Active dataset is now '{name}'", 'dataset': entry.describe()}
+    
+    @_changes_state
+    def drop_dataset(self, name: str) -> Dict[str, Any]:
+        """Remove a named dataset and free its memory."""
+        try:
+            freed = self.datasets.entry(name).memory_bytes()
+            was_active = self.datasets.active_name == name
+            self.datasets.drop(name)
+            self.history.forget(name)
+        except KeyError as e:
+            return {'success': False, 'message': str(e.args[0])}
+        if was_active:
+            self.dataset_version += 1
+            self.dataset_info = {}
+        return {'success': True, 'message': f"Dropped dataset '{name}'", 'freed_bytes': freed}
+    
+    def _content_key(self, name: str) -> Any:
+        """Identity of a loaded dataset's content: shared by sessions holding the same unmodified base."""
+        entry = self.datasets.entry(name)
+        return shared_datasets.key_of(entry.frame) or ('session', id(self), name, entry.version)
+    
     def get_dataset_info(self) -> Dict[str, Any]:
         """Get information about the current dataset."""
         if self.current_dataset is None:
             return {'success': False, 'message': "No dataset loaded"}
-        
+        frame = self.current_dataset
+        # Sessions profiling the same dataset version at once share one computation
+        info, flight, _ = single_flight.do('get_dataset_info', self._content_key(self.datasets.active_name),
+                                           lambda: self._dataset_info(frame))
+        return {'success': True, 'info': info, 'coalesced': flight.coalesced}
+    
+    def _dataset_info(self, frame: pd.DataFrame) -> Dict[str, Any]:
         # Convert dtypes to strings to avoid JSON serialization issues
         dtypes_dict = {}
-        for col, dtype in self.current_dataset.dtypes.items():
+        for col, dtype in frame.dtypes.items():
             dtypes_dict[str(col)] = str(dtype)
         
         # Get only essential statistics to reduce token usage
-        if not self.current_dataset.empty:
-            numeric_cols = self.current_dataset.select_dtypes(include=[np.number]).columns
+        if not frame.empty:
+            numeric_cols = frame.select_dtypes(include=[np.number]).columns
             if len(numeric_cols) > 0:
                 # Get only basic stats for numeric columns
-                basic_stats = self.current_dataset[numeric_cols].describe()
+                basic_stats = frame[numeric_cols].describe()
                 stats_dict = {}
                 for col in basic_stats.columns:
                     stats_dict[str(col)] = {
@@ -88,17 +420,39 @@ class DatasetTools:
         
         # Return optimized info with minimal token usage
         info = {
-            'shape': self.current_dataset.shape,
-            'columns': [str(col) for col in self.current_dataset.columns],
+            'shape': frame.shape,
+            'columns': [str(col) for col in frame.columns],
             'dtypes': dtypes_dict,
-            'missing_values': {str(k): int(v) for k, v in self.current_dataset.isnull().sum().items()},
+            'missing_values': {str(k): int(v) for k, v in frame.isnull().sum().items()},
             'basic_stats': stats_dict
         }
         
-        return {'success': True, 'info': info}
+        return info
     
-    def execute_python_code(self, code: str) -> Dict[str, Any]:
-        """Safely execute Python code with the current dataset."""
+    def _check_slow_patterns(self, processed_code: str) -> List[Dict[str, Any]]:
+        """Run the static slow-pattern analysis against the shapes of the loaded frames."""
+        shapes = {name: frame.shape for name, frame in self.datasets.loaded_frames().items()}
+        shapes['df'] = self.current_dataset.shape
+        findings = self.code_analyzer.analyze(processed_code, shapes)
+        action = 'blocked' if self.code_analyzer.should_block(findings) else 'warned'
+        for finding in findings:
+            metrics.inc("code_slow_patterns_total", pattern=finding['pattern'], action=action)
+        return findings
+    
+    @_changes_state
+    def execute_python_code(self, code: str, return_result: bool = True, profile: bool = False,
+                            on_output: Optional[Sink] = None) -> Dict[str, Any]:
+        """
+        Safely execute Python code with the current dataset.
+        With ``return_result`` the value of the last expression is returned as a
+        typed 'result'; tables and arrays are previewed and kept under a handle
+        that later snippets can read as results['r1']. With ``profile`` the
+        response includes a 'profile' of where time and memory went. With
+        ``on_output``, prints and ``progress(...)`` calls are also sent to it
+        as events while the snippet runs. Row filters on frequently filtered
+        columns are answered from indexes; the response then reports them
+        under 'accelerated'.
+        """
         if self.current_dataset is None:
             return {'success': False, 'message': "No dataset loaded. Please load a dataset first."}
         
@@ -133,151 +487,199 @@ class DatasetTools:
                 'message': "Security: Operation 'sys.' is not allowed for safety reasons."
             }
         
-        try:
-            # Create a safe execution environment
-            local_vars = {
-                'df': self.current_dataset.copy(),
-                'pd': pd,
-                'np': np,
-                'plt': plt,
-                'sns': sns,
-                'px': px,
-                'go': go,
-                'print': print,
-                'len': len,
-                'range': range,
-                'list': list,
-                'dict': dict,
-                'str': str,
-                'int': int,
-                'float': float,
-                'sklearn': sklearn,
-                'train_test_split': train_test_split,
-                'StandardScaler': StandardScaler,
-                'LinearRegression': LinearRegression,
-                'LogisticRegression': LogisticRegression,
-                'RandomForestClassifier': RandomForestClassifier,
-                'RandomForestRegressor': RandomForestRegressor,
-                'accuracy_score': accuracy_score,
-                'classification_report': classification_report,
-                'confusion_matrix': confusion_matrix,
-                'sm': sm,
-                'smf': smf,
-                'statsmodels': statsmodels
+        # Preprocess the code to handle escaped newlines
+        processed_code = code.replace('\\n', '\n')
+        
+        # Look for slow pandas patterns before paying for them
+        slow_patterns = self._check_slow_patterns(processed_code)
+        if self.code_analyzer.should_block(slow_patterns):
+            total = estimated_total(slow_patterns)
+            return {
+                'success': False,
+                'error_type': 'slow_pattern',
+                'message': f"Not executed: estimated to take about {total:.0f}s on the current data because of "
+                           f"{', '.join(sorted({f['pattern'] for f in slow_patterns}))}. Rewrite it with vectorized operations.",
+                'slow_patterns': slow_patterns,
+                'dataset_unchanged': True
             }
-            
-            # Capture stdout to get print statements
-            old_stdout = sys.stdout
+        
+        # Mine the columns this snippet filters, groups, joins and sorts on; hot ones get indexes
+        self.index_advisor.observe(processed_code)
+        accelerators_built = self._refresh_accelerators()
+        accelerator = self.index_advisor.accelerator()
+        
+        # Capture stdout to get print statements (forwarded live when the caller streams)
+        if on_output is not None and self.output_stream.enabled:
+            new_stdout = self._live_output = StreamingOutput(on_output, self.output_stream)
+        else:
             new_stdout = io.StringIO()
-            sys.stdout = new_stdout
-            
-            # Preprocess the code to handle escaped newlines
-            processed_code = code.replace('\\n', '\n')
+        # Redirected before anything that can fail, so every handler below can restore it
+        old_stdout = redirect_stdout(new_stdout)
+        try:
+            # Create a safe execution environment
+            local_vars = self._build_namespace()
+            if accelerator is not None:
+                local_vars[ACCELERATOR_VARIABLE] = accelerator
+            reserved = set(local_vars)
+            self.kernel.inject(local_vars, processed_code)
             
             # Execute the code with import support
-            exec(processed_code, {'__builtins__': {'__import__': __import__}}, local_vars)
+            profiler = SnippetProfiler(processed_code) if profile else None
+            value = self._run_sandboxed(processed_code, local_vars, "execute", capture_result=return_result,
+                                        profiler=profiler, transform=accelerator.rewrite if accelerator else None)
             
             # Get the output
             output = new_stdout.getvalue()
-            sys.stdout = old_stdout
+            restore_stdout(old_stdout)
+            
+            # Persist df and any named datasets the snippet modified
+            self._store_back(processed_code, local_vars)
+            variables = self.kernel.capture(local_vars, reserved, processed_code)
             
-            # Check if df was modified
-            if 'df' in local_vars and local_vars['df'] is not None:
-                self.current_dataset = local_vars['df']
+            result = encode_result(value, self.results)
             
             # Store execution history
             self.execution_history.append({
                 'code': code,
                 'output': output,
-                'timestamp': pd.Timestamp.now()
+                'timestamp': pd.Timestamp.now(),
+                'result_handle': result.get('handle') if result else None
             })
             
-            return {
+            response = {
                 'success': True,
                 'output': output,
                 'dataset_shape': self.current_dataset.shape if self.current_dataset is not None else None
             }
+            if result is not None:
+                response['result'] = result
+            if self.kernel.enabled:
+                response['variables'] = dict(variables, memory_bytes=self.kernel.memory_bytes())
+            if slow_patterns:
+                response['slow_patterns'] = slow_patterns
+            if profiler is not None:
+                response['profile'] = profiler.summary()
+            if accelerators_built:
+                response['accelerators_built'] = accelerators_built
+            if accelerator is not None and accelerator.summary():
+                response['accelerated'] = accelerator.summary()
+            return response
             
+        except ExecutionLimitExceeded as e:
+            restore_stdout(old_stdout)
+            result = e.to_result()
+            result['output'] = new_stdout.getvalue()
+            if slow_patterns:
+                result['slow_patterns'] = slow_patterns
+            if profiler is not None:
+                # Where the time went until the limit hit is the most useful part
+                result['profile'] = profiler.summary()
+            return result
         except Exception as e:
-            sys.stdout = old_stdout
+            restore_stdout(old_stdout)
             return {
                 'success': False,
                 'message': f"Error executing code: {str(e)}",
                 'traceback': traceback.format_exc()
             }
+        finally:
+            self._live_output = None
+            if isinstance(new_stdout, StreamingOutput):
+                new_stdout.close_stream()
     
+    @_changes_state
     def create_visualization(self, code: str) -> Dict[str, Any]:
-        """Execute arbitrary Python code to create a visualization and return the plot as PNG bytes."""
+        """
+        Execute arbitrary Python code to create a visualization. A Plotly or
+        Vega-Lite figure (last expression, ``fig.show()`` or ``fig``/``chart``
+        variable) is stored as a JSON spec for client-side rendering; otherwise
+        the current matplotlib figure is rendered to PNG.
+        """
+        def render() -> Dict[str, Any]:
+            # pyplot's current figure and Plotly's default renderer are process-wide
+            with _render_lock:
+                return self._create_visualization(code)
+        key = self._plot_key(code)
+        if key is None:
+            return dict(render(), coalesced=0)
+        # Sessions rendering the same code on the same data at once share one render
+        result, flight, joined = single_flight.do('create_visualization', key, render)
+        if joined and result.get('success'):
+            self.execution_history.append({
+                'code': code,
+                'output': result['output'],
+                'timestamp': pd.Timestamp.now(),
+                'visualization_file': result['file_path']
+            })
+        return dict(result, coalesced=flight.coalesced)
+    
+    def _plot_key(self, code: str) -> Optional[Any]:
+        """
+        What a plot depends on, or None when it has session-local effects:
+        dataset writes, models/results access or kept kernel variables.
+        """
+        if self.current_dataset is None:
+            return None
+        processed_code = code.replace('\\n', '\n')
+        names = referenced_names(processed_code)
+        if names & ({'datasets', 'models', 'results'} | set(self.kernel.names() if self.kernel.enabled else ())):
+            return None
+        frames = self.datasets.loaded_frames()
+        if any(snippet_modifies(processed_code, name) for name in ['df', *frames]):
+            return None
+        return (
+            code,
+            self.datasets.active_name,
+            tuple(sorted((name, self._content_key(name)) for name in frames)),
+            repr(self.limits.to_dict()),
+            repr(vars(self.plot_thresholds)),
+        )
+    
+    def _create_visualization(self, code: str) -> Dict[str, Any]:
         if self.current_dataset is None:
             return {'success': False, 'message': "No dataset loaded"}
+        # Prepare to capture stdout (before anything that can fail) and the plot
+        new_stdout = io.StringIO()
+        old_stdout = redirect_stdout(new_stdout)
         try:
-            local_vars = {
-                'df': self.current_dataset.copy(),
-                'pd': pd,
-                'np': np,
-                'plt': plt,
-                'sns': sns,
-                'px': px,
-                'go': go,
-                'print': print,
-                'len': len,
-                'range': range,
-                'list': list,
-                'dict': dict,
-                'str': str,
-                'int': int,
-                'float': float,
-                'sklearn': sklearn,
-                'train_test_split': train_test_split,
-                'StandardScaler': StandardScaler,
-                'LinearRegression': LinearRegression,
-                'LogisticRegression': LogisticRegression,
-                'RandomForestClassifier': RandomForestClassifier,
-                'RandomForestRegressor': RandomForestRegressor,
-                'accuracy_score': accuracy_score,
-                'classification_report': classification_report,
-                'confusion_matrix': confusion_matrix,
-                'sm': sm,
-                'smf': smf,
-                'statsmodels': statsmodels
-            }
-            # Prepare to capture stdout and the plot
-            old_stdout = sys.stdout
-            new_stdout = io.StringIO()
-            sys.stdout = new_stdout
+            local_vars = self._build_namespace()
             plt.clf()
             plt.close('all')
             # Preprocess the code to handle escaped newlines
             processed_code = code.replace('\\n', '\n')
+            # Kept variables can be plotted, but plotting code does not add to them
+            self.kernel.inject(local_vars, processed_code)
             
             # Execute the visualization code with import support
-            exec(processed_code, {'__builtins__': {'__import__': __import__}}, local_vars)
-            # Save the current figure to a buffer
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            
-            # Also save to file for viewing (LangGraph Studio enhancement)
-            import os
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"visualization_{timestamp}.png"
-            filepath = os.path.join("static", "visualizations", filename)
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            
-            # Save to file
-            plt.savefig(filepath, format='png', dpi=300, bbox_inches='tight')
-            plt.close('all')
+            # Large scatter/line/histogram plots are aggregated before drawing
+            with capture_plotly_show() as renderer, accelerate_plots(self.plot_thresholds) as acceleration:
+                value = self._run_sandboxed(processed_code, local_vars, "visualization", capture_result=True)
+            figure = find_interactive_figure(value, local_vars, renderer.shown)
+            summary = {'format': 'png'}
+            with metrics.time("plot_render_seconds", format='png' if figure is None else 'json'):
+                if figure is not None:
+                    # Interactive figures skip rasterization: the client renders the JSON spec
+                    data, extension, content_type, summary = serialize_figure(figure)
+                else:
+                    # Render once and store under the content hash (identical plots are deduplicated)
+                    img_buffer = io.BytesIO()
+                    plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
+                    data, extension, content_type = img_buffer.getvalue(), 'png', 'image/png'
+                plt.close('all')
+                artifact = artifact_store.put(
+                    data, extension,
+                    session_id=self.session_id,
+                    code=code,
+                    dataset_version=self.dataset_version,
+                    content_type=content_type
+                )
             
             output = new_stdout.getvalue()
-            sys.stdout = old_stdout
-            # Optionally update df if modified
-            if 'df' in local_vars and local_vars['df'] is not None:
-                self.current_dataset = local_vars['df']
+            restore_stdout(old_stdout)
+            # Optionally update df (and named datasets) if modified
+            self._store_back(processed_code, local_vars)
             
-            abs_filepath = os.path.abspath(filepath)
+            abs_filepath = artifact['path']
             self.execution_history.append({
                 'code': code,
                 'output': output,
@@ -285,28 +687,255 @@ class DatasetTools:
                 'visualization_file': abs_filepath
             })
             
+            message = f"Visualization created successfully! Saved to: {abs_filepath}"
+            if acceleration.notes:
+                message += f" (large data aggregated: {acceleration.describe()})"
             # Return optimized response with minimal token usage
-            return {
+            result = {
                 'success': True,
-                'message': f"Visualization created successfully! Saved to: {abs_filepath}",
+                'message': message,
                 'file_path': abs_filepath,
+                'artifact_id': artifact['artifact_id'],
+                'deduplicated': artifact['deduplicated'],
+                'figure': summary,
                 'output': output
             }
+            if acceleration.notes:
+                result['aggregation'] = acceleration.notes
+            return result
+        except ExecutionLimitExceeded as e:
+            restore_stdout(old_stdout)
+            plt.close('all')
+            return e.to_result()
         except Exception as e:
-            sys.stdout = old_stdout
+            restore_stdout(old_stdout)
             return {
                 'success': False,
                 'message': f"Error creating visualization: {str(e)}",
                 'traceback': traceback.format_exc()
             }
     
+    @_changes_state
+    def run_sql(self, query: str, rows: Optional[int] = None, into: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run SQL over the session's datasets (the active one is also ``df``) and
+        return the first batch of rows plus a cursor for the rest. With ``into``
+        the full result is stored as a new named dataset instead. Datasets
+        filtered often on one column are queried from a copy sorted by it.
+        """
+        self.index_advisor.observe(query, language='sql')
+        accelerators_built = self._refresh_accelerators(sql=True)
+        accelerated = self.sql.sorted_for(query)
+        try:
+            with metrics.time("sql_query_seconds"):
+                if into:
+                    frame = self.sql.to_frame(query, self.limits)
+                    self._set_dataset(into, frame, _describe_change(query))
+                    if into == self.datasets.active_name:
+                        self.dataset_version += 1
+                    result = {'success': True, 'message': f"Stored {len(frame)} rows as dataset '{into}'",
+                              'dataset': self.datasets.entry(into).describe()}
+                else:
+                    result = self.sql.query(query, rows, self.limits)
+        except ExecutionLimitExceeded as e:
+            return e.to_result()
+        except Exception as e:
+            return {'success': False, 'message': f"Error running SQL: {str(e)}"}
+        if accelerators_built:
+            result['accelerators_built'] = accelerators_built
+        if accelerated:
+            result['accelerated'] = accelerated
+        self.execution_history.append({
+            'code': query,
+            'language': 'sql',
+            'output': result.get('message', ''),
+            'timestamp': pd.Timestamp.now()
+        })
+        return result
+    
+    @_changes_state
+    def fetch_sql(self, cursor: str, rows: Optional[int] = None) -> Dict[str, Any]:
+        """Fetch the next batch of rows from a run_sql cursor."""
+        try:
+            return self.sql.fetch(cursor, rows)
+        except Exception as e:
+            return {'success': False, 'message': f"Error fetching SQL results: {str(e)}"}
+    
+    @_changes_state
+    def train_model(self, target: str, features: Optional[List[str]] = None, estimator: str = 'random_forest',
+                    cv: Any = 5, params: Optional[Dict[str, Any]] = None,
+                    param_grid: Optional[Dict[str, List[Any]]] = None, metric: Optional[str] = None,
+                    name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Cross-validate an estimator on the active dataset with folds and
+        hyperparameter candidates spread over a process pool, refit the best
+        candidate on all rows and store it in the model registry under ``name``.
+        An identical request on unchanged data returns the stored result.
+        """
+        if self.current_dataset is None:
+            return {'success': False, 'message': "No dataset loaded. Please load a dataset first."}
+        name = name or estimator
+        frame = self.current_dataset
+        request = {'target': target, 'features': features, 'estimator': estimator, 'cv': cv,
+                   'params': params, 'param_grid': param_grid, 'metric': metric}
+        key = self.models.key_for(estimator, features, data_fingerprint(frame), self.dataset_version, request)
+        if self.models.lookup(name, key) is not None:
+            metrics.inc("model_registry_lookups_total", result='hit')
+            return dict(self.models.entry(name).info['training'], model=name, reused=True)
+
+        start = time.monotonic()
+        try:
+            with metrics.time("train_model_seconds", estimator=estimator):
+                result, model, X = train(frame, target, features, estimator, cv, params, param_grid, metric,
+                                         settings=self.training, timeout=self.limits.wall_time_seconds)
+        except (FutureTimeout, ExecutionLimitExceeded):
+            # The folds or the refit ran past the wall-time limit
+            return ExecutionLimitExceeded('wall_time', self.limits.wall_time_seconds, None,
+                                          time.monotonic() - start).to_result()
+        except Exception as e:
+            return {'success': False, 'message': f"Error training model: {str(e)}"}
+        metrics.inc("model_registry_lookups_total", result='miss')
+
+        result['model'] = name
+        self.models.put(name, model, key, {
+            'class': type(model).__name__,
+            'features': [str(c) for c in X.columns],
+            'target': target,
+            'params': result['best_params'],
+            'dataset_version': self.dataset_version,
+            'rows': result['rows'],
+            'fit_seconds': result['timing']['refit_seconds'],
+            'cv_score': result['cv_score'],
+            'fitted_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'training': result,
+        })
+        self.execution_history.append({
+            'code': f"train_model({json.dumps(request, default=str)})",
+            'language': 'train_model',
+            'output': f"{result['metric']} = {result['cv_score']:.4f} ± {result['cv_std']:.4f}",
+            'timestamp': pd.Timestamp.now()
+        })
+        return result
+    
+    @_changes_state
+    def set_kernel_mode(self, enabled: bool) -> Dict[str, Any]:
+        """Keep variables defined by snippets for later snippets of this session (turning it off forgets them)."""
+        self.kernel.enabled = enabled
+        if not enabled:
+            self.kernel.clear()
+        return {'success': True, 'kernel_mode': enabled}
+    
+    def list_variables(self) -> Dict[str, Any]:
+        """Describe the variables kept between snippets in kernel mode, most recently used first."""
+        if not self.kernel.enabled:
+            return {'success': False, 'message': "Kernel mode is off: variables do not persist between snippets."}
+        return {
+            'success': True,
+            'variables': self.kernel.describe(),
+            'memory_bytes': self.kernel.memory_bytes(),
+            'max_memory_bytes': self.kernel.max_memory_bytes
+        }
+    
+    @_changes_state
+    def drop_variable(self, name: str) -> Dict[str, Any]:
+        """Forget a kept variable and free its memory."""
+        if not self.kernel.drop(name):
+            return {'success': False, 'message': f"No kept variable named '{name}'. Available: {self.kernel.names()}"}
+        return {'success': True, 'message': f"Dropped variable '{name}'"}
+    
+    def list_versions(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Recorded versions of one dataset (default: all), oldest first."""
+        return {
+            'success': True,
+            'versions': self.history.describe(name),
+            'memory_bytes': self.history.memory_bytes(),
+            'disk_bytes': self.history.disk_bytes()
+        }
+    
+    @_changes_state
+    def undo_dataset(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Restore a dataset (default: the active one) to the version before its last change."""
+        name = name or self.datasets.active_name
+        try:
+            version = self.history.undo(name)
+        except KeyError as e:
+            return {'success': False, 'message': str(e.args[0])}
+        return self._restore_version(version)
+    
+    @_changes_state
+    def checkout_dataset(self, version: int) -> Dict[str, Any]:
+        """Restore the dataset a recorded version belongs to to that version."""
+        try:
+            restored = self.history.checkout(int(version))
+        except KeyError as e:
+            return {'success': False, 'message': str(e.args[0])}
+        except Exception as e:
+            return {'success': False, 'message': f"Error restoring version {version}: {str(e)}"}
+        return self._restore_version(restored)
+    
+    def _restore_version(self, version) -> Dict[str, Any]:
+        self.datasets.set(version.name, version.frame)
+        if version.name == self.datasets.active_name:
+            self.dataset_version += 1
+            self._refresh_dataset_info()
+        return {
+            'success': True,
+            'message': f"Restored dataset '{version.name}' to version {version.id} ({version.description})",
+            'version': version.describe(head=True)
+        }
+    
+    def get_result(self, handle: str, start: int = 0, rows: int = 20) -> Dict[str, Any]:
+        """Page through a stored result without recomputing it."""
+        value = self.results.get(handle)
+        if value is None:
+            return {'success': False, 'message': f"Unknown or expired result handle '{handle}'. Available: {self.results.keys()}"}
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            value = value.iloc[start:start + rows]
+        elif isinstance(value, np.ndarray):
+            value = value[start:start + rows]
+        page = encode_result(value, store=None, max_rows=rows)
+        return {'success': True, 'handle': handle, 'start': start, 'result': page}
+    
     def get_execution_history(self) -> List[Dict[str, Any]]:
         """Get the history of executed code."""
         return self.execution_history
     
+    @_changes_state
     def reset_dataset(self) -> Dict[str, Any]:
-        """Reset the dataset to its original state."""
-        return self.load_iris_dataset()
+        """Reset the active dataset to its original state by reloading it from its source."""
+        name = self.datasets.active_name
+        root = self.history.root(name) if name is not None else None
+        if root is not None:
+            # The first recorded version is the state as loaded; no need to reread the source
+            result = self._restore_version(self.history.checkout(root.id))
+            return dict(result, info=self.dataset_info)
+        if name is None or name == 'iris' or not self.datasets.entry(name).unload():
+            return self.load_iris_dataset()
+        entry = self.datasets.activate(name)
+        self.dataset_version += 1
+        self._refresh_dataset_info()
+        return {'success': True, 'message': f"Reloaded dataset '{name}' from {entry.source}", 'info': self.dataset_info}
 
 # Global instance
-dataset_tools = DatasetTools() 
\ No newline at end of file
+dataset_tools = DatasetTools()
+
+# Isolated per-session instances (batch runs, servers) are selected per thread/task
+_session_tools: ContextVar[Optional[DatasetTools]] = ContextVar('dataset_tools', default=None)
+
+def get_dataset_tools() -> DatasetTools:
+    """The DatasetTools of the current session, or the global instance."""
+    return _session_tools.get() or dataset_tools
+
+class use_dataset_tools:
+    """Make ``tools`` the session used by the agent's tools inside the block (and tasks started from it)."""
+    
+    def __init__(self, tools: DatasetTools):
+        self.tools = tools
+    
+    def __enter__(self) -> DatasetTools:
+        self._token = _session_tools.set(self.tools)
+        return self.tools
+    
+    def __exit__(self, exc_type, exc, tb):
+        _session_tools.reset(self._token)
+        return False 
\ No newline at end of file
@@ -0,0 +1,475 @@
+"""
+Index and sort advisor driven by query patterns
+The code a session runs is mined for the columns it filters, groups, joins
+and sorts on. Columns used at least ``min_uses`` times are "hot", and for
+them the advisor keeps accelerators on the current version of every loaded
+dataset with at least ``min_rows`` rows:
+
+- group offsets for low-cardinality columns: rows grouped by their
+  categorical code, in row order, so a filter touches only matching groups
+- a sorted index for the others: row positions ordered by value, so
+  equality, range, ``isin`` and ``between`` filters are binary searches
+
+Snippets benefit without changes: single-condition row filters such as
+``df[df['city'] == 'Oslo']`` or ``df.loc[df['price'].between(10, 20)]`` on an
+indexed column are rewritten at compile time to ask the accelerator first.
+It answers only while the frame still holds the exact column and row labels
+it indexed (checked by buffer identity, so edits fall back to the plain
+filter) and the value compares like the column's values; the result is the
+same rows in the same order. Columns filtered in SQL are served from DuckDB
+tables sorted by that column (see ``SQLEngine.sort_tables``).
+"""
+
+import ast
+import datetime
+import operator
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from observability.metrics import metrics
+
+# Namespace key of the per-snippet accelerator called by rewritten filters
+ACCELERATOR_VARIABLE = "__index_accelerator__"
+
+_COMPARISONS = {ast.Eq: '==', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+_OPERATORS = {'==': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# Most values an ``isin`` filter may look up one by one
+_MAX_ISIN_VALUES = 1000
+
+Condition = namedtuple('Condition', 'frame column attr op value')
+
+
+def _column_ref(node) -> Optional[tuple]:
+    """(frame name, column, via attribute) for ``name['col']`` or ``name.col``."""
+    if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+        return node.value.id, node.slice.value, False
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return node.value.id, node.attr, True
+    return None
+
+
+def _condition(node) -> Optional[Condition]:
+    """A row condition on one column: ``col <op> value``, ``col.isin(values)`` or ``col.between(a, b)``."""
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARISONS:
+        ref = _column_ref(node.left)
+        if ref is not None:
+            return Condition(*ref, _COMPARISONS[type(node.ops[0])], node.comparators[0])
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and not node.keywords:
+        ref = _column_ref(node.func.value)
+        if ref is not None and node.func.attr == 'isin' and len(node.args) == 1:
+            return Condition(*ref, 'isin', node.args[0])
+        if ref is not None and node.func.attr == 'between' and len(node.args) == 2:
+            return Condition(*ref, 'between', ast.Tuple(elts=list(node.args), ctx=ast.Load()))
+    return None
+
+
+def _names(node) -> List[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [e.value for e in node.elts if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+    return []
+
+
+_QUERY_COLUMN = re.compile(r'`([^`]+)`|([A-Za-z_]\w*)\s*(?:==|<=|>=|<|>|\bin\b)')
+_SQL_IDENT = r'(?:"([^"]+)"|([A-Za-z_]\w*))'
+_SQL_FILTER = re.compile(r'\b(?:WHERE|AND|OR)\s+(?:\w+\.)?' + _SQL_IDENT + r'\s*(?:=|<|>|\bBETWEEN\b|\bIN\b)', re.I)
+_SQL_JOIN = re.compile(r'\bON\s+(?:\w+\.)?' + _SQL_IDENT + r'\s*=\s*(?:\w+\.)?' + _SQL_IDENT, re.I)
+_SQL_LIST = re.compile(r'\b(GROUP|ORDER)\s+BY\s+(.+?)(?=\bHAVING\b|\bLIMIT\b|\bORDER\b|\)|;|$)', re.I | re.S)
+
+
+def mine_sql(query: str) -> Counter:
+    """Count (kind, column) uses in a SQL query: 'sql_filter', 'join', 'group' and 'sort'."""
+    uses = Counter()
+    for quoted, plain in _SQL_FILTER.findall(query):
+        uses['sql_filter', quoted or plain] += 1
+    for match in _SQL_JOIN.findall(query):
+        uses['join', match[0] or match[1]] += 1
+        uses['join', match[2] or match[3]] += 1
+    for clause, columns in _SQL_LIST.findall(query):
+        for column in columns.split(','):
+            name = re.match(r'\s*(?:\w+\.)?' + _SQL_IDENT, column)
+            if name:
+                uses['group' if clause.upper() == 'GROUP' else 'sort', name.group(1) or name.group(2)] += 1
+    return uses
+
+
+def mine_snippet(code: str) -> Counter:
+    """Count (kind, column) uses in a snippet: 'filter', 'group', 'join' and 'sort', plus SQL in ``sql(...)``."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return Counter()
+    uses = Counter()
+    for node in ast.walk(tree):
+        condition = _condition(node)
+        if condition is not None:
+            uses['filter', condition.column] += 1
+            continue
+        if not isinstance(node, ast.Call):
+            continue
+        keywords = {k.arg: k.value for k in node.keywords}
+        if isinstance(node.func, ast.Name) and node.func.id == 'sql' and node.args:
+            if isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+                uses.update(mine_sql(node.args[0].value))
+            continue
+        method = node.func.attr if isinstance(node.func, ast.Attribute) else None
+        if method in ('groupby', 'sort_values'):
+            by = node.args[0] if node.args else keywords.get('by')
+            for column in _names(by) if by is not None else []:
+                uses['group' if method == 'groupby' else 'sort', column] += 1
+        elif method in ('merge', 'join'):
+            for key in ('on', 'left_on', 'right_on'):
+                for column in _names(keywords[key]) if key in keywords else []:
+                    uses['join', column] += 1
+        elif method == 'query' and node.args and isinstance(node.args[0], ast.Constant):
+            for quoted, plain in _QUERY_COLUMN.findall(str(node.args[0].value)):
+                uses['filter', quoted or plain] += 1
+    return uses
+
+
+def data_token(values) -> Optional[tuple]:
+    """
+    Identity of the buffers behind a column or index: equal tokens mean the
+    same memory, so the data is unchanged (writes copy under copy-on-write).
+    None when the data cannot be identified without copying it.
+    """
+    if isinstance(values, pd.RangeIndex):
+        return ('range', values.start, values.stop, values.step)
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype):
+        array = values.to_numpy()
+        return ('numpy', dtype.str, array.__array_interface__['data'][0], array.shape, array.strides)
+    array = values.array
+    if hasattr(array, '__arrow_array__') and type(array).__name__.startswith('Arrow'):
+        chunked = array.__arrow_array__()
+        chunks = getattr(chunked, 'chunks', [chunked])
+        return ('arrow', str(dtype), len(array),
+                tuple((c.offset, tuple(b.address if b is not None else 0 for b in c.buffers())) for c in chunks))
+    return None
+
+
+def _mask(series, op: str, value: Any):
+    """The boolean row condition exactly as the snippet wrote it."""
+    if op == 'isin':
+        return series.isin(value)
+    if op == 'between':
+        return series.between(*value)
+    return _OPERATORS[op](series, value)
+
+
+def _is_number(value: Any) -> bool:
+    return (isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+            and not (isinstance(value, (float, np.floating)) and np.isnan(value)))
+
+
+class ColumnIndex:
+    """
+    Accelerator for one column of one dataset version: 'groups' (row
+    positions grouped by code, with offsets) or 'sorted' (row positions
+    ordered by value). Holds the column so its buffers stay identifiable.
+    """
+
+    def __init__(self, dataset: str, column: str, frame: pd.DataFrame, max_groups: int):
+        start = time.perf_counter()
+        self.dataset = dataset
+        self.column = column
+        self.series = frame[column]
+        self.rows = len(frame)
+        self.token = data_token(self.series)
+        self.index_token = data_token(frame.index)
+        self.hits = 0
+        codes, uniques = pd.factorize(self.series)
+        if len(uniques) <= max_groups:
+            self.structure = 'groups'
+            self.uniques = pd.Series(uniques)
+            # Stable, so rows within a group stay in row order; missing values (-1) come first
+            self.positions = np.argsort(codes, kind='stable')
+            self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes + 1, minlength=len(uniques) + 1))])
+            probe = uniques[0] if len(uniques) else None
+        else:
+            values = self.series.to_numpy()
+            self.kind = self._value_kind(values)
+            if self.kind is None:
+                raise TypeError(f"column '{column}' has no sortable values")
+            self.structure = 'sorted'
+            valid = np.flatnonzero(codes >= 0)
+            self.positions = valid[np.argsort(values[valid], kind='stable')]
+            self.sorted_values = values[self.positions]
+            probe = self.sorted_values[len(self.sorted_values) // 2] if len(self.sorted_values) else None
+        self.build_seconds = time.perf_counter() - start
+        # What the same filter costs as a full scan, for the speedup estimate
+        start = time.perf_counter()
+        frame[_mask(self.series, '==', probe)]
+        self.scan_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def _value_kind(values: np.ndarray) -> Optional[str]:
+        if values.dtype.kind in 'iuf':
+            return 'number'
+        if values.dtype.kind == 'M':
+            return 'datetime'
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) == 'string':
+            return 'string'
+        return None
+
+    def matches(self, frame: pd.DataFrame, series) -> bool:
+        """Whether ``frame`` still holds the indexed column and row labels."""
+        return (self.token is not None and len(frame) == self.rows
+                and data_token(series) == self.token and data_token(frame.index) == self.index_token)
+
+    def memory_bytes(self) -> int:
+        extra = self.sorted_values.nbytes if self.structure == 'sorted' else self.offsets.nbytes
+        return int(self.positions.nbytes + extra)
+
+    def _key(self, value: Any) -> Any:
+        """``value`` as a search key comparable with the sorted values, or None to fall back."""
+        if self.kind == 'number':
+            return value if _is_number(value) else None
+        if self.kind == 'string':
+            return value if isinstance(value, str) else None
+        if isinstance(value, (str, datetime.datetime, np.datetime64)):
+            try:
+                value = pd.Timestamp(value)
+            except (TypeError, ValueError):
+                return None
+            return value.to_datetime64() if value is not pd.NaT and value.tz is None else None
+        return None
+
+    def _range(self, op: str, key: Any) -> slice:
+        left = lambda: int(np.searchsorted(self.sorted_values, key, 'left'))
+        right = lambda: int(np.searchsorted(self.sorted_values, key, 'right'))
+        bounds = {'==': lambda: (left(), right()), '<': lambda: (0, left()), '<=': lambda: (0, right()),
+                  '>': lambda: (right(), len(self.positions)), '>=': lambda: (left(), len(self.positions))}
+        return slice(*bounds[op]())
+
+    def lookup(self, op: str, value: Any) -> Optional[np.ndarray]:
+        """Positions (in no particular order) of the rows matching the condition, or None if it cannot be answered here."""
+        if op == 'isin':
+            if not isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+                return None
+            value = list(value)
+            if len(value) > _MAX_ISIN_VALUES or any(pd.isna(v) for v in value if pd.api.types.is_scalar(v)):
+                return None
+        elif not all(pd.api.types.is_scalar(v) for v in (value if op == 'between' else [value])):
+            return None
+        if self.structure == 'groups':
+            # Compare each distinct value once; a row matches exactly when its value does
+            try:
+                selected = np.flatnonzero(np.asarray(_mask(self.uniques, op, value), dtype=bool))
+            except Exception:
+                return None
+            parts = [self.positions[self.offsets[code + 1]:self.offsets[code + 2]] for code in selected]
+        elif op == 'between':
+            low, high = self._key(value[0]), self._key(value[1])
+            if low is None or high is None:
+                return None
+            parts = [self.positions[self._range('>=', low).start:self._range('<=', high).stop]]
+        else:
+            keys = [self._key(v) for v in (value if op == 'isin' else [value])]
+            if any(key is None for key in keys):
+                return None
+            parts = [self.positions[self._range('==' if op == 'isin' else op, key)] for key in keys]
+            if len(parts) > 1:
+                # Repeated (or equal, like 3 and 3.0) values select the same rows once
+                return np.unique(np.concatenate(parts))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def describe(self) -> Dict[str, Any]:
+        return {'dataset': self.dataset, 'column': self.column, 'structure': self.structure,
+                'memory_bytes': self.memory_bytes(), 'build_seconds': round(self.build_seconds, 4), 'hits': self.hits}
+
+
+class IndexAdvisor:
+    """
+    Mines a session's code for hot columns and keeps their indexes current.
+    Indexes are built hottest first until ``max_memory_mb`` is used.
+    """
+
+    def __init__(self, enabled: bool = True, min_uses: int = 3, min_rows: int = 50_000,
+                 max_groups: int = 10_000, max_memory_mb: float = 256):
+        self.enabled = enabled
+        self.min_uses = min_uses
+        self.min_rows = min_rows
+        self.max_groups = max_groups
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.uses: Dict[str, Counter] = defaultdict(Counter)
+        self._indexes: Dict[str, Dict[str, ColumnIndex]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'IndexAdvisor':
+        """Read AGENT_INDEX_ADVISOR (on/off), AGENT_INDEX_MIN_USES (3), AGENT_INDEX_MIN_ROWS (50000) and AGENT_INDEX_MAX_MB (256)."""
+        return cls(
+            enabled=os.getenv("AGENT_INDEX_ADVISOR", "on").strip().lower() not in ("off", "false", "0"),
+            min_uses=int(os.getenv("AGENT_INDEX_MIN_USES", "3")),
+            min_rows=int(os.getenv("AGENT_INDEX_MIN_ROWS", "50000")),
+            max_memory_mb=float(os.getenv("AGENT_INDEX_MAX_MB", "256")),
+        )
+
+    def observe(self, code: str, language: str = 'python'):
+        """Count the columns used by a snippet or (``language='sql'``) a query."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for (kind, column), count in (mine_sql(code) if language == 'sql' else mine_snippet(code)).items():
+                self.uses[column][kind] += count
+
+    def _eligible(self, frame: pd.DataFrame) -> bool:
+        return self.enabled and len(frame) >= self.min_rows and frame.columns.is_unique
+
+    def hot_columns(self, frame: pd.DataFrame) -> List[str]:
+        """Columns of ``frame`` used at least ``min_uses`` times in any way, hottest first."""
+        if not self._eligible(frame):
+            return []
+        with self._lock:
+            totals = {column: sum(kinds.values()) for column, kinds in self.uses.items()}
+        return sorted((c for c in frame.columns if totals.get(c, 0) >= self.min_uses), key=lambda c: -totals[c])
+
+    def sql_column(self, frame: pd.DataFrame) -> Optional[str]:
+        """The column of ``frame`` filtered most often in SQL, if at least ``min_uses`` times."""
+        if not self._eligible(frame):
+            return None
+        with self._lock:
+            counts = {column: kinds['sql_filter'] for column, kinds in self.uses.items()}
+        columns = [c for c in frame.columns if counts.get(c, 0) >= self.min_uses]
+        return max(columns, key=lambda c: counts[c]) if columns else None
+
+    def refresh(self, frames: Dict[str, pd.DataFrame]) -> List[Dict[str, Any]]:
+        """Keep indexes for the hot columns of the current ``frames``; returns the ones built now."""
+        built = []
+        current: Dict[str, Dict[str, ColumnIndex]] = {}
+        budget = self.max_memory_bytes
+        wanted = sorted(((name, column) for name, frame in frames.items() for column in self.hot_columns(frame)),
+                        key=lambda item: -sum(self.uses[item[1]].values()))
+        for name, column in wanted:
+            frame = frames[name]
+            index = self._indexes.get(name, {}).get(column)
+            if index is None or not index.matches(frame, frame[column]):
+                # Positions plus sorted values are at most twice the column
+                if budget < 16 * len(frame):
+                    continue
+                try:
+                    index = ColumnIndex(name, column, frame, self.max_groups)
+                except (TypeError, ValueError, MemoryError):
+                    continue
+                if index.token is None:
+                    continue
+                metrics.inc("index_builds_total", structure=index.structure)
+                built.append(dict(index.describe(), built='index'))
+            if index.memory_bytes() <= budget:
+                current.setdefault(name, {})[column] = index
+                budget -= index.memory_bytes()
+        with self._lock:
+            self._indexes = current
+        return built
+
+    def memory_bytes(self) -> int:
+        return sum(index.memory_bytes() for indexes in self._indexes.values() for index in indexes.values())
+
+    def indexed_columns(self) -> Set[str]:
+        return {column for indexes in self._indexes.values() for column in indexes}
+
+    def find(self, frame: Any, column: str, attr: bool) -> Optional[ColumnIndex]:
+        """The index of ``frame[column]``, if ``frame`` still holds exactly the indexed data."""
+        if not isinstance(frame, pd.DataFrame) or column not in frame.columns or not frame.columns.is_unique:
+            return None
+        # ``df.name`` means the column only when it is not a DataFrame attribute
+        if attr and hasattr(pd.DataFrame, column):
+            return None
+        series = frame[column]
+        for indexes in list(self._indexes.values()):
+            index = indexes.get(column)
+            if index is not None and index.matches(frame, series):
+                return index
+        return None
+
+    def accelerator(self) -> Optional['FilterAccelerator']:
+        """A per-snippet accelerator, or None while nothing is indexed."""
+        return FilterAccelerator(self) if self.enabled and self._indexes else None
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [index.describe() for indexes in self._indexes.values() for index in indexes.values()]
+
+
+class _FilterRewriter(ast.NodeTransformer):
+    """Rewrites ``frame[cond]`` and ``frame.loc[cond]`` on indexed columns into accelerator calls."""
+
+    def __init__(self, columns: Set[str]):
+        self.columns = columns
+
+    def visit_Subscript(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.ctx, ast.Load):
+            return node
+        target, loc = node.value, False
+        if isinstance(target, ast.Attribute) and target.attr == 'loc':
+            target, loc = target.value, True
+        condition = _condition(node.slice)
+        if (not isinstance(target, ast.Name) or condition is None or condition.frame != target.id
+                or condition.column not in self.columns):
+            return node
+        call = ast.Call(
+            func=ast.Attribute(value=ast.Name(id=ACCELERATOR_VARIABLE, ctx=ast.Load()), attr='filter', ctx=ast.Load()),
+            args=[ast.Name(id=target.id, ctx=ast.Load()), ast.Constant(condition.column), ast.Constant(condition.attr),
+                  ast.Constant(condition.op), condition.value, ast.Constant(loc)],
+            keywords=[])
+        return ast.copy_location(call, node)
+
+
+class FilterAccelerator:
+    """Answers the rewritten filters of one snippet and records how much time they saved."""
+
+    def __init__(self, advisor: IndexAdvisor):
+        self.advisor = advisor
+        self.columns = advisor.indexed_columns()
+        self.filters = 0
+        self.seconds = 0.0
+        self.scan_seconds = 0.0
+
+    def rewrite(self, tree: ast.Module) -> ast.Module:
+        """Compile-time transform passed to ``compile_snippet``."""
+        return _FilterRewriter(self.columns).visit(tree)
+
+    def filter(self, frame: Any, column: str, attr: bool, op: str, value: Any, loc: bool) -> Any:
+        """``frame[cond]`` (or ``frame.loc[cond]``) from the index when possible, else evaluated as written."""
+        start = time.perf_counter()
+        index = self.advisor.find(frame, column, attr)
+        try:
+            positions = index.lookup(op, value) if index is not None else None
+        except Exception:
+            positions = None
+        if positions is None:
+            mask = _mask(getattr(frame, column) if attr else frame[column], op, value)
+            return frame.loc[mask] if loc else frame[mask]
+        if len(positions) > index.rows // 8:
+            # Selecting most rows: a mask is cheaper than sorting the positions
+            mask = np.zeros(index.rows, dtype=bool)
+            mask[positions] = True
+            result = frame[mask]
+        else:
+            result = frame.take(np.sort(positions))
+        elapsed = time.perf_counter() - start
+        index.hits += 1
+        self.filters += 1
+        self.seconds += elapsed
+        self.scan_seconds += index.scan_seconds
+        metrics.inc("index_filters_accelerated_total", structure=index.structure)
+        return result
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """Filters answered from indexes, their time and the estimated time of the same filters as scans."""
+        if not self.filters:
+            return None
+        return {'filters': self.filters, 'seconds': round(self.seconds, 6),
+                'scan_seconds_estimate': round(self.scan_seconds, 6),
+                'speedup': round(self.scan_seconds / self.seconds, 1) if self.seconds else None}
@@ -0,0 +1,134 @@
+"""
+Interactive figure output for create_visualization
+Detects Plotly figures (and Vega-Lite charts such as Altair) produced by a
+snippet and serializes their JSON spec, with numeric data arrays encoded as
+base64 typed arrays, so clients render them and the server skips rasterizing.
+"""
+
+import json
+import base64
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+from plotly.io._base_renderers import ExternalRenderer
+from plotly.utils import PlotlyJSONEncoder
+
+PLOTLY_CONTENT_TYPE = 'application/vnd.plotly.v1+json'
+VEGA_LITE_CONTENT_TYPE = 'application/vnd.vegalite.v5+json'
+
+# numpy dtype -> plotly.js typed array code
+_TYPED_ARRAY_CODES = {
+    'float64': 'f8', 'float32': 'f4',
+    'int32': 'i4', 'int16': 'i2', 'int8': 'i1',
+    'uint32': 'u4', 'uint16': 'u2', 'uint8': 'u1',
+}
+
+
+class _CaptureRenderer(ExternalRenderer):
+    """Plotly renderer that records figures passed to fig.show() instead of opening a browser."""
+
+    def __init__(self):
+        self.shown: List[Dict[str, Any]] = []
+
+    def render(self, fig_dict):
+        self.shown.append(fig_dict)
+
+
+_capture_renderer = _CaptureRenderer()
+pio.renderers['sandbox_capture'] = _capture_renderer
+
+
+class capture_plotly_show:
+    """Route ``fig.show()`` calls made inside the block to an in-memory list."""
+
+    def __enter__(self):
+        self._previous = pio.renderers.default
+        _capture_renderer.shown = []
+        pio.renderers.default = 'sandbox_capture'
+        return _capture_renderer
+
+    def __exit__(self, exc_type, exc, tb):
+        pio.renderers.default = self._previous
+        return False
+
+
+def is_plotly_figure(obj: Any) -> bool:
+    return isinstance(obj, BaseFigure)
+
+
+def is_vega_chart(obj: Any) -> bool:
+    return type(obj).__module__.split('.')[0] == 'altair' and hasattr(obj, 'to_dict')
+
+
+def find_interactive_figure(value: Any, namespace: Dict[str, Any], shown: List[Dict[str, Any]]) -> Optional[Any]:
+    """
+    Pick the figure a snippet meant to produce: its last expression, else the
+    last figure it showed, else a Plotly/Vega object bound to ``fig``/``chart``.
+    """
+    if is_plotly_figure(value) or is_vega_chart(value):
+        return value
+    if shown:
+        return shown[-1]
+    for name in ('fig', 'chart'):
+        candidate = namespace.get(name)
+        if is_plotly_figure(candidate) or is_vega_chart(candidate):
+            return candidate
+    return None
+
+
+def _encode_arrays(obj: Any) -> Any:
+    """Replace numeric numpy arrays with plotly.js typed-array objects ({dtype, bdata, shape})."""
+    if isinstance(obj, np.ndarray):
+        code = _TYPED_ARRAY_CODES.get(str(obj.dtype))
+        if code is None and obj.dtype.kind == 'i':
+            obj, code = obj.astype('float64'), 'f8'  # int64 has no JS typed array
+        if code is None:
+            return obj.tolist()
+        encoded = {'dtype': code, 'bdata': base64.b64encode(np.ascontiguousarray(obj).tobytes()).decode('ascii')}
+        if obj.ndim > 1:
+            encoded['shape'] = ','.join(str(n) for n in obj.shape)
+        return encoded
+    if isinstance(obj, dict):
+        return {k: _encode_arrays(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_encode_arrays(v) for v in obj]
+    return obj
+
+
+def _count_points(spec: Dict[str, Any]) -> int:
+    total = 0
+    for trace in spec.get('data', []):
+        for key in ('x', 'y', 'z', 'values'):
+            values = trace.get(key)
+            if isinstance(values, dict) and 'bdata' in values:
+                itemsize = int(values['dtype'][1])
+                total += len(base64.b64decode(values['bdata'])) // itemsize
+                break
+            if isinstance(values, (list, tuple)):
+                total += len(values)
+                break
+    return total
+
+
+def serialize_figure(figure: Any) -> Tuple[bytes, str, str, Dict[str, Any]]:
+    """
+    Serialize a Plotly figure (object or dict) or Vega-Lite chart.
+    Returns (payload, file extension, content type, summary).
+    """
+    if is_vega_chart(figure):
+        spec = figure.to_dict()
+        payload = json.dumps(spec, separators=(',', ':'), default=str).encode('utf-8')
+        return payload, 'vega.json', VEGA_LITE_CONTENT_TYPE, {'format': 'vega-lite', 'mark': spec.get('mark')}
+
+    spec = figure.to_plotly_json() if is_plotly_figure(figure) else figure
+    spec = _encode_arrays({'data': spec.get('data', []), 'layout': spec.get('layout', {})})
+    payload = json.dumps(spec, cls=PlotlyJSONEncoder, separators=(',', ':')).encode('utf-8')
+    summary = {
+        'format': 'plotly',
+        'traces': len(spec['data']),
+        'trace_types': sorted({t.get('type', 'scatter') for t in spec['data']}),
+        'points': _count_points(spec),
+    }
+    return payload, 'plotly.json', PLOTLY_CONTENT_TYPE, summary
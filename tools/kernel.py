@@ -0,0 +1,161 @@
+"""
+Persistent snippet variables (kernel mode)
+By default every snippet starts from a fresh namespace. In kernel mode the
+variables a snippet defines (``corr = df.corr()``, a fitted scaler, a
+filtered subset) are kept for the session and injected into later
+snippets, like a notebook kernel. Each variable's memory is measured when
+it is (re)assigned or used. The least recently used ones are evicted once
+the total exceeds the memory cap or the variable count cap.
+"""
+
+import ast
+import os
+import pickle
+import sys
+import time
+import types
+from collections import OrderedDict
+from typing import Dict, Any, List, Set
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_bytes(value: Any, depth: int = 2) -> int:
+    """Approximate memory held by a value (deep for pandas/numpy, bounded recursion for containers)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes, int, float, bool, complex, type(None))):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)) and depth > 0:
+        return sys.getsizeof(value) + sum(estimate_bytes(item, depth - 1) for item in value)
+    if isinstance(value, dict) and depth > 0:
+        return sys.getsizeof(value) + sum(estimate_bytes(k, depth - 1) + estimate_bytes(v, depth - 1)
+                                          for k, v in value.items())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def referenced_names(code: str) -> Set[str]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def _keep(name: str, value: Any) -> bool:
+    # Imports are cheap to repeat; private names are snippet scratch
+    return not name.startswith('_') and not isinstance(value, types.ModuleType)
+
+
+class Variable:
+    def __init__(self, name: str, value: Any):
+        self.name = name
+        self.value = value
+        self.size_bytes = estimate_bytes(value)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def describe(self) -> Dict[str, Any]:
+        info = {
+            'name': self.name,
+            'type': type(self.value).__name__,
+            'size_kb': round(self.size_bytes / 1024, 1),
+            'idle_seconds': round(time.time() - self.last_used, 1),
+        }
+        shape = getattr(self.value, 'shape', None)
+        if isinstance(shape, tuple):
+            info['shape'] = list(shape)
+        return info
+
+
+class KernelNamespace:
+    """Variables kept between the snippets of one session, bounded by total memory and count."""
+
+    def __init__(self, enabled: bool = False, max_memory_mb: float = 1024, max_variables: int = 100):
+        self.enabled = enabled
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_variables = max_variables
+        self._variables: "OrderedDict[str, Variable]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> 'KernelNamespace':
+        """Read AGENT_KERNEL_MODE (on/off, default off), AGENT_KERNEL_MEMORY_MB (1024) and AGENT_KERNEL_MAX_VARIABLES (100)."""
+        return cls(
+            enabled=os.getenv("AGENT_KERNEL_MODE", "off").strip().lower() in ("on", "true", "1"),
+            max_memory_mb=float(os.getenv("AGENT_KERNEL_MEMORY_MB", "1024")),
+            max_variables=int(os.getenv("AGENT_KERNEL_MAX_VARIABLES", "100")),
+        )
+
+    def inject(self, namespace: Dict[str, Any], code: str):
+        """Add stored variables to a snippet's namespace; the ones the snippet names count as used."""
+        if not self.enabled:
+            return
+        used = referenced_names(code)
+        now = time.time()
+        for name, variable in list(self._variables.items()):
+            if name not in namespace:
+                namespace[name] = variable.value
+                if name in used:
+                    variable.last_used = now
+                    self._variables.move_to_end(name)
+
+    def capture(self, namespace: Dict[str, Any], reserved: Set[str], code: str) -> Dict[str, List[str]]:
+        """
+        Store the variables left in a finished snippet's namespace (except the
+        ``reserved`` base names) and return the names stored and evicted.
+        Variables the snippet deleted are forgotten.
+        """
+        if not self.enabled:
+            return {'stored': [], 'evicted': []}
+        used = referenced_names(code)
+        for name in [n for n in self._variables if n not in namespace]:
+            del self._variables[name]
+        stored = []
+        for name, value in namespace.items():
+            if name in reserved or not _keep(name, value):
+                continue
+            current = self._variables.get(name)
+            if current is None or current.value is not value:
+                self._variables[name] = Variable(name, value)
+                stored.append(name)
+            elif name in used:
+                # Possibly mutated in place (df_small.drop(..., inplace=True), lists appended to)
+                current.size_bytes = estimate_bytes(value)
+            if name in used or name in stored:
+                self._variables[name].last_used = time.time()
+                self._variables.move_to_end(name)
+        return {'stored': stored, 'evicted': self._evict(keep=set(stored))}
+
+    def _evict(self, keep: Set[str]) -> List[str]:
+        """Drop least recently used variables until both caps hold (this snippet's new ones go last)."""
+        evicted = []
+        for name in [n for n in self._variables if n not in keep] + [n for n in self._variables if n in keep]:
+            if self.memory_bytes() <= self.max_memory_bytes and len(self._variables) <= self.max_variables:
+                break
+            del self._variables[name]
+            evicted.append(name)
+        return evicted
+
+    def drop(self, name: str) -> bool:
+        return self._variables.pop(name, None) is not None
+
+    def clear(self):
+        self._variables.clear()
+
+    def names(self) -> List[str]:
+        return list(self._variables)
+
+    def memory_bytes(self) -> int:
+        return sum(v.size_bytes for v in self._variables.values())
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Variables from most to least recently used."""
+        return [v.describe() for v in reversed(self._variables.values())]
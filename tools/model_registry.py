@@ -0,0 +1,323 @@
+"""
+Fitted-model registry for sandboxed code
+Keeps fitted sklearn estimators and statsmodels results across snippets of
+one session under a name. ``models.fit(name, estimator, X, y)`` reuses the
+stored model when the dataset version, features, training data and
+hyperparameters all match, so follow-up questions don't retrain. Models are
+spilled to disk with joblib (least recently used first) once the in-memory
+ones exceed the size budget, and reloaded transparently on access. Each
+registry spills to its own directory, removed when the session is closed,
+when the registry is garbage collected or at interpreter exit.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from observability.metrics import metrics
+from tools.kernel import estimate_bytes
+
+
+def _params(estimator) -> Dict[str, Any]:
+    if hasattr(estimator, 'get_params'):
+        return {k: v for k, v in estimator.get_params(deep=False).items()}
+    if hasattr(estimator, 'formula') or hasattr(estimator, 'exog_names'):
+        # statsmodels model: the formula / design columns are its "hyperparameters"
+        return {'formula': getattr(estimator, 'formula', None), 'exog': getattr(estimator, 'exog_names', None)}
+    return {}
+
+
+def _changed_params(estimator) -> Dict[str, Any]:
+    """Hyperparameters that differ from the estimator's defaults (keeps listings short)."""
+    params = _params(estimator)
+    try:
+        defaults = type(estimator)().get_params(deep=False)
+    except Exception:
+        return params
+    return {k: v for k, v in params.items() if k not in defaults or repr(defaults[k]) != repr(v)}
+
+
+def _describe_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (v if isinstance(v, (int, float, str, bool, type(None))) else repr(v)[:80]) for k, v in params.items()}
+
+
+def data_fingerprint(*arrays) -> Optional[str]:
+    """Content hash of the training data; O(n) but far cheaper than fitting."""
+    digest = hashlib.sha1()
+    for data in arrays:
+        if data is None:
+            continue
+        if isinstance(data, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+            digest.update(repr(list(data.columns) if isinstance(data, pd.DataFrame) else data.name).encode())
+        else:
+            array = np.ascontiguousarray(np.asarray(data))
+            if array.dtype == object:
+                digest.update(pd.util.hash_array(array.ravel()).tobytes())
+            else:
+                digest.update(array.tobytes())
+            digest.update(repr((array.shape, array.dtype.str)).encode())
+    return digest.hexdigest()
+
+
+def _features(estimator, X) -> Optional[List[str]]:
+    if isinstance(X, pd.DataFrame):
+        return [str(c) for c in X.columns]
+    if isinstance(X, pd.Series):
+        return [str(X.name)]
+    names = getattr(estimator, 'feature_names_in_', None)
+    if names is None:
+        names = getattr(getattr(estimator, 'model', None), 'exog_names', None)
+    return [str(n) for n in names] if names is not None else None
+
+
+def model_bytes(value: Any, depth: int = 6, seen: Optional[Dict[int, Any]] = None) -> int:
+    """
+    Approximate memory held by a fitted model: the arrays reachable through its
+    attributes (or pickled state, for extension types such as sklearn trees) and
+    containers, each counted once. Far cheaper than pickling the whole model.
+    """
+    seen = {} if seen is None else seen
+    if id(value) in seen:
+        return 0
+    # Kept alive so the ids of temporary state dicts are not reused
+    seen[id(value)] = value
+    if isinstance(value, (np.ndarray, pd.DataFrame, pd.Series, pd.Index, str, bytes, int, float, bool, complex,
+                          type(None))):
+        return estimate_bytes(value)
+    if depth <= 0:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(model_bytes(v, depth - 1, seen) for v in value.values())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(model_bytes(v, depth - 1, seen) for v in value)
+    try:
+        state = value.__getstate__()
+    except Exception:
+        state = getattr(value, '__dict__', None)
+    if isinstance(state, tuple) and len(state) == 2:
+        # (state, slots) from objects with __slots__
+        state = dict(state[0] or {}, **(state[1] or {}))
+    if not isinstance(state, dict):
+        return sys.getsizeof(value)
+    return sys.getsizeof(value) + sum(model_bytes(v, depth - 1, seen) for v in state.values())
+
+
+class ModelEntry:
+    def __init__(self, name: str, model: Any, key: str, info: Dict[str, Any]):
+        self.name = name
+        self.model = model
+        self.key = key
+        self.info = info
+        self.size_bytes = model_bytes(model)
+        self.spill_path: Optional[str] = None
+        self.hits = 0
+
+    @property
+    def in_memory(self) -> bool:
+        return self.model is not None
+
+    def describe(self, dataset_version: int) -> Dict[str, Any]:
+        info = {k: v for k, v in self.info.items() if k != 'training'}
+        return dict(
+            info,
+            name=self.name,
+            stale=self.info.get('dataset_version') != dataset_version,
+            in_memory=self.in_memory,
+            size_kb=round(self.size_bytes / 1024, 1),
+            reuses=self.hits,
+        )
+
+
+class ModelRegistry:
+    """Named fitted models of one session with an in-memory size budget and disk spill."""
+
+    def __init__(self, session_id: str = "default", max_memory_mb: float = 512,
+                 spill_dir: str = ".model_cache"):
+        self.session_id = session_id
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        # Unique per registry: sessions sharing an id must not remove each other's files
+        self.spill_dir = os.path.join(spill_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)}-{uuid.uuid4().hex[:8]}")
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        self._entries: "OrderedDict[str, ModelEntry]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls, session_id: str = "default") -> 'ModelRegistry':
+        """Read AGENT_MODEL_CACHE_MB (default 512) and AGENT_MODEL_SPILL_DIR (default .model_cache)."""
+        return cls(
+            session_id=session_id,
+            max_memory_mb=float(os.getenv("AGENT_MODEL_CACHE_MB", "512")),
+            spill_dir=os.getenv("AGENT_MODEL_SPILL_DIR", ".model_cache"),
+        )
+
+    @staticmethod
+    def key_for(estimator, features: Optional[List[str]], fingerprint: Optional[str], dataset_version: int,
+                fit_kwargs: Optional[Dict[str, Any]] = None) -> str:
+        payload = {
+            'class': f"{type(estimator).__module__}.{type(estimator).__qualname__}",
+            'params': _describe_params(_params(estimator)),
+            'features': features,
+            'data': fingerprint,
+            'dataset_version': dataset_version,
+            'fit': _describe_params(fit_kwargs or {}),
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=repr).encode()).hexdigest()
+
+    def lookup(self, name: str, key: str) -> Optional[Any]:
+        """The stored model if ``name`` was fitted with the same key."""
+        entry = self._entries.get(name)
+        if entry is None or entry.key != key:
+            return None
+        entry.hits += 1
+        return self._load(entry)
+
+    def put(self, name: str, model: Any, key: str, info: Dict[str, Any]) -> ModelEntry:
+        self.drop(name)
+        entry = ModelEntry(name, model, key, info)
+        self._entries[name] = entry
+        self._enforce_budget(keep=name)
+        return entry
+
+    def get(self, name: str) -> Any:
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"No model named '{name}'. Available: {list(self._entries)}")
+        return self._load(entry)
+
+    def entry(self, name: str) -> Optional[ModelEntry]:
+        return self._entries.get(name)
+
+    def drop(self, name: str) -> bool:
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return False
+        if entry.spill_path and os.path.exists(entry.spill_path):
+            os.remove(entry.spill_path)
+        return True
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def close(self):
+        """Forget every model and remove the spill directory (the session is gone)."""
+        self._entries.clear()
+        self._cleanup()
+
+    def memory_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._entries.values() if e.in_memory)
+
+    def describe(self, dataset_version: int) -> List[Dict[str, Any]]:
+        return [entry.describe(dataset_version) for entry in self._entries.values()]
+
+    def _load(self, entry: ModelEntry) -> Any:
+        self._entries.move_to_end(entry.name)
+        if entry.model is None:
+            entry.model = joblib.load(entry.spill_path)
+            self._enforce_budget(keep=entry.name)
+        return entry.model
+
+    def _spill(self, entry: ModelEntry):
+        if entry.spill_path is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', entry.name)
+            entry.spill_path = os.path.join(self.spill_dir, f"{safe_name}-{entry.key[:12]}.joblib")
+            joblib.dump(entry.model, entry.spill_path)
+        entry.model = None
+        metrics.inc("model_registry_spills_total")
+
+    def _enforce_budget(self, keep: str):
+        """Spill least recently used models until the in-memory ones fit (the newest always stays)."""
+        for entry in list(self._entries.values()):
+            if self.memory_bytes() <= self.max_memory_bytes:
+                break
+            if entry.in_memory and entry.name != keep:
+                self._spill(entry)
+
+
+class ModelAccessor:
+    """
+    The ``models`` object in snippets::
+
+        rf = models.fit('rf', RandomForestClassifier(n_estimators=200), df[features], df['species'])
+        models['rf'].feature_importances_            # later snippet, no retraining
+        ols = models.fit('ols', smf.ols('y ~ x', data=df))   # statsmodels: fits the model object
+    """
+
+    def __init__(self, registry: ModelRegistry, dataset_version: Callable[[], int]):
+        self._registry = registry
+        self._dataset_version = dataset_version
+
+    def fit(self, name: str, estimator, X=None, y=None, **fit_kwargs):
+        """Fit and store ``estimator``, or return the stored model when nothing relevant changed."""
+        version = self._dataset_version()
+        statsmodels_model = X is None and hasattr(estimator, 'fit') and hasattr(estimator, 'exog')
+        if statsmodels_model:
+            fingerprint = data_fingerprint(estimator.endog, estimator.exog)
+            features = list(getattr(estimator, 'exog_names', None) or [])
+        else:
+            fingerprint = data_fingerprint(X, y)
+            features = _features(None, X)
+        key = self._registry.key_for(estimator, features, fingerprint, version, fit_kwargs)
+
+        cached = self._registry.lookup(name, key)
+        if cached is not None:
+            metrics.inc("model_registry_lookups_total", result='hit')
+            return cached
+        metrics.inc("model_registry_lookups_total", result='miss')
+
+        start = time.perf_counter()
+        if statsmodels_model:
+            fitted = estimator.fit(**fit_kwargs)
+        else:
+            fitted = estimator.fit(X, **fit_kwargs) if y is None else estimator.fit(X, y, **fit_kwargs)
+        self._registry.put(name, fitted, key, {
+            'class': type(estimator).__name__,
+            'features': features,
+            'target': getattr(y, 'name', None) if y is not None else getattr(estimator, 'endog_names', None),
+            'params': _describe_params(_changed_params(estimator)),
+            'dataset_version': version,
+            'rows': len(X) if X is not None else int(getattr(estimator, 'nobs', 0)),
+            'fit_seconds': round(time.perf_counter() - start, 3),
+            'fitted_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        })
+        return fitted
+
+    def __getitem__(self, name: str):
+        return self._registry.get(name)
+
+    def __setitem__(self, name: str, model):
+        """Store an already fitted model; it is never reused by ``fit`` because its training data is unknown."""
+        self._registry.put(name, model, key=f"manual-{time.time_ns()}", info={
+            'class': type(model).__name__,
+            'features': _features(model, None),
+            'params': _describe_params(_changed_params(model)),
+            'dataset_version': self._dataset_version(),
+        })
+
+    def __delitem__(self, name: str):
+        if not self._registry.drop(name):
+            raise KeyError(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._registry.names()
+
+    def get(self, name: str, default=None):
+        return self._registry.get(name) if name in self else default
+
+    def list(self) -> List[Dict[str, Any]]:
+        return self._registry.describe(self._dataset_version())
+
+    def __repr__(self):
+        return f"models({', '.join(self._registry.names()) or 'empty'})"
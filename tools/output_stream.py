@@ -0,0 +1,145 @@
+"""
+Live output from running snippets
+A snippet's prints are normally returned only when it finishes, so a long
+model fit looks hung. When the caller passes a sink (the agent passes the
+graph's custom stream writer), prints and ``progress(...)`` calls are also
+forwarded while the snippet runs. Forwarding is rate limited: text written
+within ``interval_seconds`` of the last event is batched and sent by a
+background flush. At most ``max_bytes`` of text are streamed per snippet;
+beyond that a single notice is sent. The full output is still returned with
+the result as before.
+"""
+
+import contextvars
+import io
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+Sink = Callable[[Dict[str, Any]], None]
+
+
+class OutputStreamSettings:
+    """Whether and how fast snippet output is streamed; ``max_bytes`` caps the text sent per snippet."""
+
+    def __init__(self, enabled: bool = True, interval_seconds: float = 0.25, max_bytes: int = 64 * 1024):
+        self.enabled = enabled
+        self.interval_seconds = interval_seconds
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls) -> 'OutputStreamSettings':
+        """Read AGENT_STREAM_OUTPUT (on/off), AGENT_STREAM_INTERVAL_SECONDS (0.25) and AGENT_STREAM_MAX_KB (64)."""
+        return cls(
+            enabled=os.getenv("AGENT_STREAM_OUTPUT", "on").strip().lower() not in ("off", "false", "0"),
+            interval_seconds=float(os.getenv("AGENT_STREAM_INTERVAL_SECONDS", "0.25")),
+            max_bytes=int(float(os.getenv("AGENT_STREAM_MAX_KB", "64")) * 1024),
+        )
+
+
+class StreamingOutput(io.StringIO):
+    """
+    Output buffer of one snippet that also forwards what is written to
+    ``sink`` as ``{'type': 'output', 'text': ...}`` events, at most one per
+    interval. Call ``close_stream`` when the snippet ends to send the rest.
+    """
+
+    def __init__(self, sink: Sink, settings: OutputStreamSettings, tool: str = 'execute_code'):
+        super().__init__()
+        self.sink = sink
+        self.settings = settings
+        self.tool = tool
+        self.sent_bytes = 0
+        self.truncated = False
+        self._pending = []
+        self._last_sent = 0.0
+        self._last_progress = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self._closed = False  # no more output events (cap reached or snippet done)
+        self._finished = False  # snippet done: no events at all
+        # The graph's stream writer reads context variables that a timer thread
+        # does not inherit, so the background flush runs in the snippet's context
+        self._context = contextvars.copy_context()
+
+    def write(self, text: str) -> int:
+        written = super().write(text)
+        if not text:
+            return written
+        # Events are sent under the lock so output arrives in order
+        with self._lock:
+            if self._closed:
+                return written
+            self._pending.append(text)
+            wait = self._last_sent + self.settings.interval_seconds - time.monotonic()
+            # Complete lines go out at once; partial lines (print() writes the newline
+            # separately) and bursts are batched until the flush
+            if wait <= 0 and text.endswith('\n'):
+                self._send_pending()
+            elif self._timer is None:
+                # A partial line waits up to one interval for the rest of the line
+                delay = max(wait, 0.0) if text.endswith('\n') else max(wait, self.settings.interval_seconds)
+                self._timer = threading.Timer(delay, self._context.run, (self._flush_later,))
+                self._timer.daemon = True
+                self._timer.start()
+        return written
+
+    def _send_pending(self):
+        """Send pending text within the byte cap (caller holds the lock)."""
+        text, self._pending = ''.join(self._pending), []
+        self._last_sent = time.monotonic()
+        data = text.encode('utf-8')
+        room = self.settings.max_bytes - self.sent_bytes
+        if len(data) > room:
+            text = data[:room].decode('utf-8', errors='ignore')
+            self.truncated = self._closed = True
+        self.sent_bytes += len(text.encode('utf-8'))
+        if text:
+            self._emit({'type': 'output', 'tool': self.tool, 'text': text})
+        if self.truncated:
+            self._emit({'type': 'output', 'tool': self.tool, 'truncated': True,
+                        'text': f"\n[live output stopped after {self.settings.max_bytes // 1024} KB; "
+                                f"the full output comes with the result]\n"})
+
+    def _emit(self, event: Dict[str, Any]):
+        try:
+            self.sink(event)
+        except Exception:
+            # A consumer that went away must not fail the snippet
+            pass
+
+    def _flush_later(self):
+        with self._lock:
+            self._timer = None
+            if not self._closed and self._pending:
+                self._send_pending()
+
+    def progress(self, done: Optional[float] = None, total: Optional[float] = None, message: str = ''):
+        """Report progress (``done`` of ``total``, either optional); updates within the interval are dropped."""
+        finished = total is not None and done is not None and done >= total
+        with self._lock:
+            now = time.monotonic()
+            if self._finished or (not finished and now - self._last_progress < self.settings.interval_seconds):
+                return
+            self._last_progress = now
+            if not self._closed and self._pending:
+                self._send_pending()
+            event = {'type': 'progress', 'tool': self.tool, 'message': str(message)[:200]}
+            if done is not None:
+                event['done'] = done
+            if total is not None:
+                event['total'] = total
+                if done is not None and total:
+                    event['percent'] = round(100 * done / total, 1)
+            self._emit(event)
+
+    def close_stream(self):
+        """Send the remaining output; nothing is forwarded afterwards."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._closed and self._pending:
+                self._send_pending()
+            self._closed = self._finished = True
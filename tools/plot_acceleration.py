@@ -0,0 +1,290 @@
+"""
+Plot acceleration for large datasets
+While ``accelerate_plots`` is active on a thread, matplotlib and seaborn
+plotting calls over more points than the configured thresholds are reduced
+before drawing: scatter plots become 2D-binned (hexbin) density plots, lines
+are downsampled with Largest-Triangle-Three-Buckets (LTTB) and histograms are
+drawn from bins precomputed with numpy. Every reduction is recorded so the
+tool result can say what was aggregated and how.
+"""
+
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+import matplotlib
+from matplotlib.axes import Axes
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+_state = threading.local()
+_install_lock = threading.Lock()
+_originals: Dict[str, Any] = {}
+
+
+class PlotThresholds:
+    """Point counts above which plots are aggregated. ``None`` disables a reduction."""
+
+    def __init__(self, scatter_points: Optional[int] = 200_000, line_points: Optional[int] = 50_000,
+                 hist_points: Optional[int] = 1_000_000, line_target_points: int = 5_000,
+                 sample_points: int = 50_000, hexbin_gridsize: int = 200):
+        self.scatter_points = scatter_points
+        self.line_points = line_points
+        self.hist_points = hist_points
+        self.line_target_points = line_target_points
+        self.sample_points = sample_points
+        self.hexbin_gridsize = hexbin_gridsize
+
+    @classmethod
+    def from_env(cls) -> 'PlotThresholds':
+        """Read AGENT_PLOT_SCATTER_MAX / _LINE_MAX / _HIST_MAX ('none' or '0' disables) and _LINE_TARGET / _SAMPLE_POINTS."""
+        def read(name, default):
+            value = os.getenv(name)
+            if value is None:
+                return default
+            if value.strip().lower() in ('', 'none', '0'):
+                return None
+            return int(float(value))
+        return cls(
+            scatter_points=read("AGENT_PLOT_SCATTER_MAX", 200_000),
+            line_points=read("AGENT_PLOT_LINE_MAX", 50_000),
+            hist_points=read("AGENT_PLOT_HIST_MAX", 1_000_000),
+            line_target_points=read("AGENT_PLOT_LINE_TARGET", 5_000) or 5_000,
+            sample_points=read("AGENT_PLOT_SAMPLE_POINTS", 50_000) or 50_000,
+        )
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling."""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = np.nanmean(x[end:next_end])
+        avg_y = np.nanmean(y[end:next_end])
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + (int(np.nanargmax(area)) if np.isfinite(area).any() else 0)
+        kept[i + 1] = a
+    return kept
+
+
+def _active() -> Optional['accelerate_plots']:
+    return getattr(_state, 'active', None)
+
+
+def _as_float(values: Any) -> Optional[np.ndarray]:
+    """1D float view of ``values``, or None if it is not plain numeric data."""
+    try:
+        arr = np.asarray(values)
+    except Exception:
+        return None
+    if arr.ndim != 1 or arr.dtype.kind not in 'biuf':
+        return None
+    return arr.astype('float64', copy=False)
+
+
+def _sample(n: int, size: int) -> np.ndarray:
+    """Sorted, reproducible uniform sample of row positions."""
+    return np.sort(np.random.default_rng(0).choice(n, size=min(n, size), replace=False))
+
+
+def _resolve(data: Any, value: Any) -> Any:
+    if isinstance(value, str) and data is not None:
+        return data[value]
+    return value
+
+
+def _scatter(self, x, y, *args, **kwargs):
+    report, original = _active(), _originals['scatter']
+    limit = report.thresholds.scatter_points if report else None
+    if limit is None or np.size(x) <= limit:
+        return original(self, x, y, *args, **kwargs)
+    n = np.size(x)
+    per_point = [k for k in ('c', 's') if kwargs.get(k) is not None and np.size(kwargs[k]) == n]
+    if args or per_point:
+        # Colours or sizes vary per point, so keep them and draw a uniform sample instead
+        idx = _sample(n, report.thresholds.sample_points)
+        for k in per_point:
+            kwargs[k] = np.asarray(kwargs[k])[idx]
+        report.record('scatter', 'random_sample', n, len(idx))
+        return original(self, np.asarray(x)[idx], np.asarray(y)[idx], *args, **kwargs)
+    xs, ys = _as_float(x), _as_float(y)
+    if xs is None or ys is None:
+        return original(self, x, y, *args, **kwargs)
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    gridsize = report.thresholds.hexbin_gridsize
+    report.record('scatter', 'hexbin_density', n, gridsize * gridsize, gridsize=gridsize)
+    return self.hexbin(xs[finite], ys[finite], gridsize=gridsize, bins='log', mincnt=1,
+                       cmap=kwargs.get('cmap', 'viridis'), alpha=kwargs.get('alpha'), label=kwargs.get('label'))
+
+
+def _plot(self, *args, **kwargs):
+    report, original = _active(), _originals['plot']
+    limit = report.thresholds.line_points if report else None
+    if limit is None or 'data' in kwargs:
+        return original(self, *args, **kwargs)
+    # Only the simple forms plot(y), plot(x, y) and plot(x, y, fmt) are reduced
+    fmt = args[-1:] if args and isinstance(args[-1], str) else ()
+    arrays = args[:len(args) - len(fmt)]
+    if len(arrays) not in (1, 2) or np.size(arrays[-1]) <= limit:
+        return original(self, *args, **kwargs)
+    y = _as_float(arrays[-1])
+    x = _as_float(arrays[0]) if len(arrays) == 2 else np.arange(np.size(arrays[-1]), dtype='float64')
+    if x is None or y is None or len(x) != len(y):
+        return original(self, *args, **kwargs)
+    target = report.thresholds.line_target_points
+    idx = lttb_indices(x, y, target)
+    report.record('plot', 'lttb', len(y), len(idx))
+    kept = (np.asarray(arrays[0])[idx],) if len(arrays) == 2 else (idx,)
+    return original(self, *kept, y[idx], *fmt, **kwargs)
+
+
+def _hist(self, x, bins=None, *args, **kwargs):
+    report, original = _active(), _originals['hist']
+    limit = report.thresholds.hist_points if report else None
+    values = _as_float(x) if limit is not None and kwargs.get('weights') is None and not args else None
+    if values is None or len(values) <= limit:
+        return original(self, x, bins, *args, **kwargs)
+    # Only an explicit weights=None can be left here; the precomputed counts replace it
+    kwargs.pop('weights', None)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins if bins is not None else matplotlib.rcParams['hist.bins'],
+                                 range=kwargs.pop('range', None))
+    report.record('hist', 'precomputed_bins', len(values), len(counts))
+    return original(self, edges[:-1], edges, weights=counts, **kwargs)
+
+
+def _scatterplot(data=None, *, x=None, y=None, hue=None, ax=None, **kwargs):
+    report, original = _active(), _originals['scatterplot']
+    limit = report.thresholds.scatter_points if report else None
+    n = len(data) if data is not None else np.size(x)
+    if limit is None or n <= limit or kwargs.get('size') is not None or kwargs.get('style') is not None:
+        return original(data=data, x=x, y=y, hue=hue, ax=ax, **kwargs)
+    ax = ax if ax is not None else plt.gca()
+    if hue is not None:
+        # Hue needs individual points: draw a uniform sample so the colour mapping is preserved
+        idx = _sample(n, report.thresholds.sample_points)
+        report.record('scatterplot', 'random_sample', n, len(idx))
+
+        def take(v):
+            if isinstance(v, (pd.Series, pd.DataFrame)):
+                return v.iloc[idx]
+            return v if v is None or isinstance(v, str) else np.asarray(v)[idx]
+
+        with _suspended():
+            return original(data=take(data), x=take(x), y=take(y), hue=take(hue), ax=ax, **kwargs)
+    _scatter(ax, _resolve(data, x), _resolve(data, y), alpha=kwargs.get('alpha'))
+    if isinstance(x, str):
+        ax.set_xlabel(x)
+    if isinstance(y, str):
+        ax.set_ylabel(y)
+    return ax
+
+
+def _lineplot(data=None, *, x=None, y=None, hue=None, ax=None, **kwargs):
+    report, original = _active(), _originals['lineplot']
+    limit = report.thresholds.line_points if report else None
+    n = len(data) if data is not None else np.size(y)
+    grouping = [kwargs.get(k) for k in ('size', 'style', 'units')]
+    if limit is None or n <= limit or x is None or y is None or hue is not None or any(g is not None for g in grouping):
+        if limit is not None and n > limit and 'errorbar' not in kwargs:
+            # Bootstrapped confidence intervals dominate runtime on large frames
+            kwargs['errorbar'] = None
+            report.record('lineplot', 'no_errorbar', n, n)
+        return original(data=data, x=x, y=y, hue=hue, ax=ax, **kwargs)
+    ax = ax if ax is not None else plt.gca()
+    xs, ys = pd.Series(np.asarray(_resolve(data, x))), pd.Series(np.asarray(_resolve(data, y)))
+    # seaborn's default estimator: mean of y per distinct x, sorted by x
+    line = ys.groupby(xs.values, sort=True).mean()
+    report.record('lineplot', 'mean_by_x', n, len(line))
+    # Still too many distinct x values: the Axes.plot wrapper applies LTTB
+    _plot(ax, line.index.values, line.values, label=kwargs.get('label'), color=kwargs.get('color'))
+    if isinstance(x, str):
+        ax.set_xlabel(x)
+    if isinstance(y, str):
+        ax.set_ylabel(y)
+    return ax
+
+
+def _histplot(data=None, *, x=None, y=None, hue=None, weights=None, bins='auto', binrange=None, ax=None, **kwargs):
+    report, original = _active(), _originals['histplot']
+    limit = report.thresholds.hist_points if report else None
+    values = None
+    if (limit is not None and y is None and hue is None and weights is None
+            and kwargs.get('binwidth') is None and not kwargs.get('discrete')):
+        values = _as_float(_resolve(data, x) if x is not None else data)
+    if values is None or len(values) <= limit:
+        return original(data=data, x=x, y=y, hue=hue, weights=weights, bins=bins, binrange=binrange, ax=ax, **kwargs)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins, range=binrange)
+    report.record('histplot', 'precomputed_bins', len(values), len(counts))
+    ax = original(x=edges[:-1], weights=counts, bins=list(edges), ax=ax, **kwargs)
+    if isinstance(x, str):
+        ax.set_xlabel(x)
+    return ax
+
+
+class _suspended:
+    """Run nested plotting calls without acceleration (the data is already reduced)."""
+
+    def __enter__(self):
+        self._report = _active()
+        _state.active = None
+
+    def __exit__(self, exc_type, exc, tb):
+        _state.active = self._report
+        return False
+
+
+def _install():
+    """Wrap the plotting entry points once; wrappers are pass-through unless a thread is accelerating."""
+    with _install_lock:
+        if _originals:
+            return
+        for name, wrapper in (('scatter', _scatter), ('plot', _plot), ('hist', _hist)):
+            _originals[name] = getattr(Axes, name)
+            wrapper.__doc__ = _originals[name].__doc__
+            setattr(Axes, name, wrapper)
+        for name, wrapper in (('scatterplot', _scatterplot), ('lineplot', _lineplot), ('histplot', _histplot)):
+            _originals[name] = getattr(sns, name)
+            wrapper.__doc__ = _originals[name].__doc__
+            setattr(sns, name, wrapper)
+
+
+class accelerate_plots:
+    """
+    Reduce large plots drawn on the current thread inside the block.
+    ``notes`` lists each reduction as {'function', 'method', 'input_points', 'output_points'}.
+    """
+
+    def __init__(self, thresholds: Optional[PlotThresholds] = None):
+        self.thresholds = thresholds or PlotThresholds()
+        self.notes: List[Dict[str, Any]] = []
+
+    def record(self, function: str, method: str, input_points: int, output_points: int, **details):
+        self.notes.append(dict({'function': function, 'method': method, 'input_points': int(input_points),
+                                'output_points': int(output_points)}, **details))
+
+    def describe(self) -> str:
+        return "; ".join(f"{n['function']}: {n['method']} ({n['input_points']:,} -> {n['output_points']:,} points)"
+                         for n in self.notes)
+
+    def __enter__(self):
+        _install()
+        self._previous = _active()
+        _state.active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _state.active = self._previous
+        return False
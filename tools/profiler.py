@@ -0,0 +1,168 @@
+"""
+Profiling for sandboxed snippets
+A sampling thread records the executing thread's stack every few
+milliseconds while tracemalloc tracks allocations. The summary names the
+functions and snippet lines that took the time, the peak traced memory and
+the snippet lines holding the most memory, compact enough to hand back to
+the LLM so it can rewrite the slow part itself.
+
+tracemalloc is process-wide: while a profiled snippet runs, allocations from
+other threads are traced (and counted towards the peak) as well.
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from tools.sandbox import SANDBOX_FILENAME
+
+# Functions whose dominance means the snippet is looping in Python over rows
+_ROW_WISE = {'apply', 'iterrows', 'itertuples', 'applymap', 'map', 'agg', 'transform', '_apply_standard'}
+
+
+def _short_path(filename: str) -> str:
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _label(code) -> str:
+    if code.co_filename == SANDBOX_FILENAME:
+        return f"<snippet>:{code.co_name}" if code.co_name != '<module>' else "<snippet>"
+    return f"{_short_path(code.co_filename)}:{code.co_name}"
+
+
+class SnippetProfiler:
+    """
+    Context manager profiling the current thread::
+
+        with SnippetProfiler(code) as profiler:
+            exec(compile(code, SANDBOX_FILENAME, 'exec'), ...)
+        profiler.summary()
+
+    Only frames below the snippet's module frame are sampled, so the
+    sandbox machinery never shows up in the results.
+    """
+
+    def __init__(self, code: str = "", interval: float = 0.005, top: int = 8, trace_frames: int = 32):
+        self.lines = code.splitlines()
+        self.interval = interval
+        self.top = top
+        self.trace_frames = trace_frames
+        self.samples = 0
+        self.cumulative = Counter()
+        self.own = Counter()
+        self.snippet_lines = Counter()
+        self.peak_bytes = None
+        self.allocations: List[Dict[str, Any]] = []
+        self.wall_seconds = 0.0
+        self._thread_id = None
+        self._done = threading.Event()
+        self._sampler = None
+        self._started_tracing = False
+        self._start = 0.0
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._thread_id)
+        stack = []
+        snippet_line = None
+        while frame is not None:
+            stack.append(frame.f_code)
+            if frame.f_code.co_filename == SANDBOX_FILENAME and frame.f_code.co_name == '<module>':
+                snippet_line = frame.f_lineno
+                break
+            frame = frame.f_back
+        if snippet_line is None:
+            return  # not inside the snippet (yet or any more)
+        self.samples += 1
+        self.snippet_lines[snippet_line] += 1
+        self.own[_label(stack[0])] += 1
+        for label in {_label(code) for code in stack}:
+            self.cumulative[label] += 1
+
+    def _run_sampler(self):
+        while not self._done.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run_sampler, name='snippet-profiler', daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_seconds = time.perf_counter() - self._start
+        self._done.set()
+        self._sampler.join()
+        if tracemalloc.is_tracing():
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            self.allocations = self._allocations_by_line(tracemalloc.take_snapshot())
+            if self._started_tracing:
+                tracemalloc.stop()
+        return False
+
+    def _allocations_by_line(self, snapshot) -> List[Dict[str, Any]]:
+        """Memory still held at the end of the snippet, attributed to the snippet line that allocated it."""
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(True, SANDBOX_FILENAME, all_frames=True)])
+        sizes, counts = Counter(), Counter()
+        for stat in snapshot.statistics('traceback'):
+            line = next((frame.lineno for frame in stat.traceback if frame.filename == SANDBOX_FILENAME), None)
+            if line is not None:
+                sizes[line] += stat.size
+                counts[line] += stat.count
+        return [{'line': line, 'code': self._source(line), 'size_mb': round(size / 2 ** 20, 3), 'blocks': counts[line]}
+                for line, size in sizes.most_common(self.top // 2 or 1)]
+
+    def _source(self, line: int) -> str:
+        text = self.lines[line - 1].strip() if 0 < line <= len(self.lines) else ""
+        return text if len(text) <= 100 else text[:97] + "..."
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact report: hottest functions and snippet lines, peak memory and largest retained allocations."""
+        samples = self.samples or 1
+
+        def pct(count):
+            return round(100.0 * count / samples, 1)
+
+        functions = [
+            {'function': label, 'cumulative_pct': pct(count), 'self_pct': pct(self.own[label]),
+             'seconds': round(self.wall_seconds * count / samples, 3)}
+            for label, count in self.cumulative.most_common()
+            if label != "<snippet>"
+        ][:self.top]
+        result = {
+            'wall_seconds': round(self.wall_seconds, 3),
+            'samples': self.samples,
+            'top_functions': functions,
+            'hot_lines': [
+                {'line': line, 'code': self._source(line), 'pct': pct(count)}
+                for line, count in self.snippet_lines.most_common(self.top // 2 or 1)
+            ],
+            'peak_memory_mb': round(self.peak_bytes / 2 ** 20, 3) if self.peak_bytes is not None else None,
+            'largest_allocations': self.allocations,
+        }
+        hint = self._hint(functions)
+        if hint:
+            result['hint'] = hint
+        return result
+
+    def _hint(self, functions: List[Dict[str, Any]]) -> Optional[str]:
+        for entry in functions:
+            name = entry['function'].rsplit(':', 1)[-1]
+            if name in _ROW_WISE and entry['cumulative_pct'] >= 50 and entry['function'].startswith('pandas'):
+                return (f"{entry['function']} takes {entry['cumulative_pct']:g}% of the time; it calls Python code "
+                        f"per row or element. Use vectorized column operations (arithmetic, np.where, .str/.dt "
+                        f"accessors, groupby aggregations) instead.")
+        if functions and functions[0]['function'].startswith('<snippet>:') and functions[0]['self_pct'] >= 50:
+            return "Most time is spent in a Python function defined in the snippet; vectorize it with pandas/numpy."
+        return None
@@ -0,0 +1,155 @@
+"""
+Typed results for sandboxed code
+Encodes the value of a snippet's last expression as a compact, JSON-safe
+preview (schema, true shape, first rows) and keeps the full object in a
+per-session store, bounded by count and memory, under a handle that later
+snippets can reference.
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from tools.kernel import estimate_bytes
+
+
+class ResultStore:
+    """
+    LRU mapping of handles ('r1', 'r2', ...) to full result objects, bounded
+    by entry count and by their total memory. A value larger than the whole
+    memory budget is described but not stored.
+    """
+
+    def __init__(self, max_entries: int = 20, max_memory_mb: float = 256):
+        self.max_entries = max_entries
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.size_bytes = 0
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._counter = 0
+
+    @classmethod
+    def from_env(cls) -> 'ResultStore':
+        """Read AGENT_RESULTS_MAX_ENTRIES (default 20) and AGENT_RESULTS_MEMORY_MB (default 256)."""
+        return cls(
+            max_entries=int(os.getenv("AGENT_RESULTS_MAX_ENTRIES", "20")),
+            max_memory_mb=float(os.getenv("AGENT_RESULTS_MEMORY_MB", "256")),
+        )
+
+    def put(self, value: Any) -> Optional[str]:
+        """Store ``value`` under a new handle, evicting the least recently used; None if it does not fit."""
+        size = estimate_bytes(value)
+        if size > self.max_memory_bytes:
+            return None
+        self._counter += 1
+        handle = f"r{self._counter}"
+        self._items[handle] = value
+        self._sizes[handle] = size
+        self.size_bytes += size
+        while len(self._items) > self.max_entries or self.size_bytes > self.max_memory_bytes:
+            evicted, _ = self._items.popitem(last=False)
+            self.size_bytes -= self._sizes.pop(evicted)
+        return handle
+
+    def __getitem__(self, handle: str) -> Any:
+        if handle not in self._items:
+            raise KeyError(f"Unknown or expired result handle '{handle}'. Available: {list(self._items)}")
+        self._items.move_to_end(handle)
+        return self._items[handle]
+
+    def get(self, handle: str, default: Any = None) -> Any:
+        return self._items.get(handle, default)
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def keys(self):
+        return list(self._items.keys())
+
+    def clear(self):
+        self._items.clear()
+        self._sizes.clear()
+        self.size_bytes = 0
+
+
+def _json_safe(value: Any) -> Any:
+    """Round-trip through pandas' JSON encoder so NaN, timestamps and numpy types serialize."""
+    return json.loads(pd.Series([value]).to_json(orient='values', date_format='iso', default_handler=str))[0]
+
+
+def _frame_preview(frame: pd.DataFrame, max_rows: int, max_columns: int) -> Dict[str, Any]:
+    shown = frame.iloc[:max_rows, :max_columns]
+    return json.loads(shown.to_json(orient='split', date_format='iso', default_handler=str))
+
+
+def encode_result(value: Any, store: Optional[ResultStore] = None, max_rows: int = 10,
+                  max_columns: int = 20, max_chars: int = 2000) -> Optional[Dict[str, Any]]:
+    """
+    Describe ``value`` for the LLM. Tabular and array values are stored in
+    ``store`` and referenced by handle; small scalars are returned inline.
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, pd.DataFrame):
+        result = {
+            'type': 'dataframe',
+            'shape': list(value.shape),
+            'schema': {str(col): str(dtype) for col, dtype in value.dtypes.items()},
+            'preview': _frame_preview(value, max_rows, max_columns),
+            'rows_shown': min(max_rows, len(value)),
+            'truncated': len(value) > max_rows or value.shape[1] > max_columns,
+            'memory_bytes': int(value.memory_usage(index=True).sum()),
+        }
+    elif isinstance(value, pd.Series):
+        preview = json.loads(value.iloc[:max_rows].to_json(orient='split', date_format='iso', default_handler=str))
+        result = {
+            'type': 'series',
+            'name': None if value.name is None else str(value.name),
+            'dtype': str(value.dtype),
+            'length': len(value),
+            'preview': {'index': preview.get('index'), 'data': preview.get('data')},
+            'truncated': len(value) > max_rows,
+        }
+    elif isinstance(value, np.ndarray):
+        flat = value.ravel()[:max_rows]
+        result = {
+            'type': 'ndarray',
+            'shape': list(value.shape),
+            'dtype': str(value.dtype),
+            'preview': [_json_safe(v) for v in flat],
+            'truncated': value.size > max_rows,
+        }
+    elif isinstance(value, (bool, int, float, str, np.generic, pd.Timestamp, pd.Timedelta)):
+        encoded = _json_safe(value.item() if isinstance(value, np.generic) else value)
+        if isinstance(encoded, str) and len(encoded) > max_chars:
+            encoded = encoded[:max_chars] + "..."
+        return {'type': 'scalar', 'dtype': type(value).__name__, 'value': encoded}
+    else:
+        if isinstance(value, (list, tuple, dict)):
+            try:
+                text = json.dumps(value)
+            except (TypeError, ValueError):
+                text = None
+            if text is not None and len(text) <= max_chars:
+                return {'type': type(value).__name__, 'value': json.loads(text)}
+        text = repr(value)
+        result = {
+            'type': type(value).__name__,
+            'repr': text[:max_chars] + ("..." if len(text) > max_chars else ""),
+        }
+        if isinstance(value, (list, tuple, dict, set)):
+            result['length'] = len(value)
+
+    if store is not None:
+        handle = store.put(value)
+        if handle is not None:
+            result['handle'] = handle
+    return result
@@ -0,0 +1,377 @@
+"""
+Execution limits for sandboxed code
+Wall-time, CPU-time and address-space limits with cooperative cancellation.
+A watchdog thread interrupts the executing thread between bytecodes, so the
+snippet stops cleanly and the caller's state is left untouched.
+"""
+
+import os
+import ast
+import sys
+import time
+import ctypes
+import threading
+from typing import Callable, Dict, Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Filename given to compiled snippets so tracebacks can be mapped to their lines
+SANDBOX_FILENAME = "<sandbox>"
+
+# Namespace key that receives the value of the snippet's last expression
+RESULT_VARIABLE = "__sandbox_result__"
+
+
+def compile_snippet(code: str, capture_result: bool = False,
+                    transform: Optional[Callable[[ast.Module], ast.Module]] = None):
+    """
+    Compile a snippet for the sandbox. With ``capture_result`` a trailing
+    expression statement is rewritten to assign its value to RESULT_VARIABLE,
+    like the last line of a notebook cell. ``transform`` may rewrite the
+    parsed tree first; line numbers are kept.
+    """
+    tree = ast.parse(code, SANDBOX_FILENAME, 'exec')
+    if transform is not None:
+        tree = transform(tree)
+    if capture_result and tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = tree.body[-1]
+        assign = ast.Assign(targets=[ast.Name(id=RESULT_VARIABLE, ctx=ast.Store())], value=last.value)
+        tree.body[-1] = ast.copy_location(assign, last)
+    ast.fix_missing_locations(tree)
+    return compile(tree, SANDBOX_FILENAME, 'exec')
+
+
+# DataFrame methods that change the frame they are called on (``pipe`` hands it to a function that may)
+_MUTATING_METHODS = {'insert', 'pop', 'update', 'pipe', '__setitem__', '__delitem__'}
+
+# Callables a frame can be passed to without being changed: read-only builtins and
+# the libraries bound in the sandbox namespace. Any other call may mutate it.
+_READ_ONLY_CALLEES = {
+    'len', 'print', 'repr', 'str', 'type', 'isinstance', 'id', 'list', 'dict', 'tuple', 'set', 'sorted', 'enumerate',
+    'zip', 'bool', 'int', 'float', 'range', 'progress', 'pd', 'np', 'plt', 'sns', 'px', 'go', 'sm', 'smf', 'sklearn',
+    'train_test_split', 'accuracy_score', 'classification_report', 'confusion_matrix',
+}
+
+
+def _base_name(node) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _passes(call: ast.Call, name: str) -> bool:
+    """Whether ``call`` passes ``name`` itself as an argument (also inside a list, tuple or dict literal)."""
+    for arg in [*call.args, *(keyword.value for keyword in call.keywords)]:
+        if isinstance(arg, ast.Starred):
+            arg = arg.value
+        items = arg.elts if isinstance(arg, (ast.List, ast.Tuple, ast.Set)) else \
+            arg.values if isinstance(arg, ast.Dict) else [arg]
+        if any(isinstance(item, ast.Name) and item.id == name for item in items):
+            return True
+    return False
+
+
+def snippet_modifies(code: str, name: str = 'df') -> bool:
+    """
+    Conservatively decide whether a snippet may rebind or mutate ``name``:
+    assignments to it or its items/attributes, ``del``, mutating method calls,
+    ``inplace=True`` calls, passing it to a function that may change it
+    (``def f(d): d['x'] = 1`` then ``f(df)``), or aliasing it to another variable.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            if _base_name(node) == name:
+                return True
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and _base_name(node.func) == name:
+            if node.func.attr in _MUTATING_METHODS:
+                return True
+            for keyword in node.keywords:
+                if keyword.arg == 'inplace' and not (isinstance(keyword.value, ast.Constant) and keyword.value.value is False):
+                    return True
+        elif isinstance(node, ast.Call) and _passes(node, name):
+            if _base_name(node.func) not in _READ_ONLY_CALLEES:
+                return True
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.NamedExpr)) and isinstance(node.value, ast.Name):
+            if node.value.id == name:
+                return True
+    return False
+
+
+class ExecutionLimits:
+    """Per-session limits for one sandboxed execution. ``None`` disables a limit."""
+
+    def __init__(self, wall_time_seconds: Optional[float] = 120.0, cpu_time_seconds: Optional[float] = None,
+                 memory_mb: Optional[float] = None, poll_interval: float = 0.05):
+        self.wall_time_seconds = wall_time_seconds
+        self.cpu_time_seconds = cpu_time_seconds
+        self.memory_mb = memory_mb
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_env(cls) -> 'ExecutionLimits':
+        """Read AGENT_SANDBOX_WALL_TIME / _CPU_TIME / _MEMORY_MB ('none' or '0' disables)."""
+        def read(name, default):
+            value = os.getenv(name)
+            if value is None:
+                return default
+            if value.strip().lower() in ('', 'none', '0'):
+                return None
+            return float(value)
+        return cls(
+            wall_time_seconds=read("AGENT_SANDBOX_WALL_TIME", 120.0),
+            cpu_time_seconds=read("AGENT_SANDBOX_CPU_TIME", None),
+            memory_mb=read("AGENT_SANDBOX_MEMORY_MB", None),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'wall_time_seconds': self.wall_time_seconds,
+            'cpu_time_seconds': self.cpu_time_seconds,
+            'memory_mb': self.memory_mb,
+        }
+
+
+class ExecutionLimitExceeded(Exception):
+    """Raised by ``ExecutionGuard`` when a snippet hit a limit or was cancelled."""
+
+    def __init__(self, limit: str, limit_value: Optional[float], line: Optional[int], elapsed: float):
+        self.limit = limit
+        self.limit_value = limit_value
+        self.line = line
+        self.elapsed = elapsed
+        super().__init__(self.describe())
+
+    def describe(self) -> str:
+        where = f" at line {self.line}" if self.line else ""
+        if self.limit == 'wall_time':
+            return f"Execution timed out after {self.limit_value:g}s{where}"
+        if self.limit == 'cpu_time':
+            return f"Execution exceeded {self.limit_value:g}s of CPU time{where}"
+        if self.limit == 'memory':
+            return f"Execution exceeded the {self.limit_value:g} MB memory limit{where}"
+        return f"Execution cancelled after {self.elapsed:.1f}s{where}"
+
+    def to_result(self) -> Dict[str, Any]:
+        """Structured tool result the LLM can act on."""
+        hints = {
+            'wall_time': "Use vectorized pandas/numpy operations instead of Python loops, or work on df.sample(...) first.",
+            'cpu_time': "Use vectorized pandas/numpy operations instead of Python loops, or work on df.sample(...) first.",
+            'memory': "Avoid cartesian merges and large intermediate copies; select only the needed columns or aggregate first.",
+            'cancelled': "The user cancelled this run.",
+        }
+        return {
+            'success': False,
+            'error_type': 'limit_exceeded' if self.limit != 'cancelled' else 'cancelled',
+            'limit': self.limit,
+            'limit_value': self.limit_value,
+            'line': self.line,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'message': self.describe(),
+            'suggestion': hints.get(self.limit),
+            'dataset_unchanged': True,
+        }
+
+
+class _SandboxInterrupt(BaseException):
+    """Injected into the executing thread. BaseException so snippets can't swallow it."""
+
+
+def _address_space_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _AddressSpaceLimit:
+    """
+    RLIMIT_AS shared by the guards that run at the same time. The host's own
+    limit is saved when the first one enters and restored when the last one
+    exits; in between the cap only grows, to the largest budget asked for.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._host = None
+
+    def acquire(self, budget_bytes: int) -> bool:
+        current = _address_space_bytes()
+        if current is None:
+            return False
+        with self._lock:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            target = current + budget_bytes
+            if hard != resource.RLIM_INFINITY:
+                target = min(target, hard)
+            if self._active and soft != resource.RLIM_INFINITY:
+                target = max(target, soft)
+            try:
+                resource.setrlimit(resource.RLIMIT_AS, (target, hard))
+            except (ValueError, OSError):
+                return False
+            if not self._active:
+                self._host = (soft, hard)
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                resource.setrlimit(resource.RLIMIT_AS, self._host)
+                self._host = None
+
+
+_address_space = _AddressSpaceLimit()
+
+
+def _sandbox_line(tb) -> Optional[int]:
+    line = None
+    while tb is not None:
+        if tb.tb_frame.f_code.co_filename == SANDBOX_FILENAME:
+            line = tb.tb_lineno
+        tb = tb.tb_next
+    return line
+
+
+class ExecutionGuard:
+    """
+    Context manager enforcing ``ExecutionLimits`` on the current thread::
+
+        with ExecutionGuard(limits) as guard:
+            exec(compile(code, SANDBOX_FILENAME, 'exec'), ...)
+
+    Limit hits surface as ``ExecutionLimitExceeded`` when the block exits.
+    The memory limit uses RLIMIT_AS, which is process-wide: guards running at
+    the same time share one cap, and the host's limit comes back with the last.
+    """
+
+    def __init__(self, limits: ExecutionLimits):
+        self.limits = limits
+        self.reason: Optional[str] = None
+        self._thread_id = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._injected = False
+        self._watchdog = None
+        self._limited = False
+        self._start = 0.0
+
+    def cancel(self):
+        """Ask the running snippet to stop at its next bytecode."""
+        self._interrupt('cancelled')
+
+    def _interrupt(self, reason: str):
+        with self._lock:
+            if self._done.is_set() or self._injected:
+                return
+            self.reason = reason
+            self._injected = True
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._thread_id), ctypes.py_object(_SandboxInterrupt))
+
+    def _cpu_clock(self):
+        try:
+            return time.pthread_getcpuclockid(self._thread_id)
+        except (AttributeError, OSError):
+            return None
+
+    def _watch(self):
+        limits = self.limits
+        clock = self._cpu_clock() if limits.cpu_time_seconds else None
+        cpu_start = time.clock_gettime(clock) if clock is not None else time.process_time()
+        while not self._done.wait(limits.poll_interval):
+            if limits.wall_time_seconds and time.monotonic() - self._start > limits.wall_time_seconds:
+                self._interrupt('wall_time')
+                return
+            if limits.cpu_time_seconds:
+                used = (time.clock_gettime(clock) if clock is not None else time.process_time()) - cpu_start
+                if used > limits.cpu_time_seconds:
+                    self._interrupt('cpu_time')
+                    return
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._start = time.monotonic()
+        if self.limits.memory_mb and resource is not None:
+            self._limited = _address_space.acquire(int(self.limits.memory_mb * 1024 * 1024))
+        if self.limits.wall_time_seconds or self.limits.cpu_time_seconds:
+            self._watchdog = threading.Thread(target=self._watch, name='sandbox-watchdog', daemon=True)
+            self._watchdog.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self._done.set()
+            if self._injected and exc_type is not _SandboxInterrupt:
+                # The interrupt raced with normal completion: withdraw it
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._thread_id), None)
+        if self._limited:
+            _address_space.release()
+        if self._watchdog is not None:
+            self._watchdog.join()
+        elapsed = time.monotonic() - self._start
+
+        if exc_type is _SandboxInterrupt:
+            limit_value = {
+                'wall_time': self.limits.wall_time_seconds,
+                'cpu_time': self.limits.cpu_time_seconds,
+            }.get(self.reason)
+            raise ExecutionLimitExceeded(self.reason, limit_value, _sandbox_line(tb), elapsed) from None
+        if exc_type is not None and issubclass(exc_type, MemoryError) and self._limited:
+            raise ExecutionLimitExceeded('memory', self.limits.memory_mb, _sandbox_line(tb), elapsed) from None
+        return False
+
+
+class _ThreadStdout:
+    """
+    ``sys.stdout`` replacement that sends writes from a thread capturing output
+    to that thread's buffer, so concurrent sessions don't mix or lose prints.
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, 'buffer', None) or self._fallback
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._fallback, name)
+
+
+_stdout_lock = threading.Lock()
+
+
+def redirect_stdout(buffer):
+    """Capture this thread's stdout into ``buffer``; returns the previous capture for ``restore_stdout``."""
+    with _stdout_lock:
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+        router = sys.stdout
+    previous = getattr(router._local, 'buffer', None)
+    router._local.buffer = buffer
+    return previous
+
+
+def restore_stdout(previous):
+    if isinstance(sys.stdout, _ThreadStdout):
+        sys.stdout._local.buffer = previous
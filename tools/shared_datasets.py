@@ -0,0 +1,182 @@
+"""
+Process-wide cache of base datasets
+Sessions that load the same file (or the built-in iris data) share one
+immutable base frame, keyed by the file's real path, modification time and
+size, so an edited file gets a new entry. Each session receives its own
+copy-on-write view of the base: writes copy only the columns they touch,
+and the base is never modified. Views are reference-counted. The base is
+released when the last view is garbage collected (session dropped, dataset
+replaced or reloaded), so memory scales with distinct datasets rather than
+sessions. Large bases are written once to an uncompressed Arrow file and
+memory-mapped, so their numeric columns live in the OS page cache rather
+than in process memory.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from tools.dataset_registry import copy_on_write, file_loader
+from tools.single_flight import single_flight
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # bases stay in memory
+    pa = None
+
+Key = Tuple[Any, ...]
+
+
+class _Base:
+    def __init__(self, key: Key, frame: pd.DataFrame, source: str, backing: str, load_seconds: float):
+        self.key = key
+        self.frame = frame
+        self.source = source
+        self.backing = backing
+        self.load_seconds = load_seconds
+        self.memory_bytes = int(frame.memory_usage(index=True, deep=True).sum())
+        self.views = 0
+        self.hits = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'source': self.source,
+            'shape': list(self.frame.shape),
+            'backing': self.backing,
+            'memory_bytes': self.memory_bytes,
+            'views': self.views,
+            'reuses': self.hits,
+            'load_seconds': round(self.load_seconds, 4),
+        }
+
+
+class SharedDatasetCache:
+    """
+    Base frames shared by all sessions of the process. ``backing`` is 'arrow'
+    (bases of at least ``arrow_min_mb`` are memory-mapped from ``cache_dir``)
+    or 'memory'.
+    """
+
+    def __init__(self, enabled: bool = True, backing: str = 'arrow', arrow_min_mb: float = 16,
+                 cache_dir: str = ".dataset_cache"):
+        self.enabled = enabled
+        self.backing = backing if pa is not None else 'memory'
+        self.arrow_min_bytes = int(arrow_min_mb * 1024 * 1024)
+        self.cache_dir = cache_dir
+        self._bases: Dict[Key, _Base] = {}
+        self._lock = threading.Lock()
+        # id(view) -> (view, key), to recognise unmodified views across sessions
+        self._view_keys: Dict[int, Tuple[weakref.ref, Key]] = {}
+
+    @classmethod
+    def from_env(cls) -> 'SharedDatasetCache':
+        """Read AGENT_SHARED_DATASETS (on/off), AGENT_SHARED_BACKING (arrow/memory), AGENT_SHARED_ARROW_MIN_MB (16) and AGENT_SHARED_CACHE_DIR."""
+        return cls(
+            enabled=os.getenv("AGENT_SHARED_DATASETS", "on").strip().lower() not in ("off", "false", "0"),
+            backing=os.getenv("AGENT_SHARED_BACKING", "arrow").strip().lower(),
+            arrow_min_mb=float(os.getenv("AGENT_SHARED_ARROW_MIN_MB", "16")),
+            cache_dir=os.getenv("AGENT_SHARED_CACHE_DIR", ".dataset_cache"),
+        )
+
+    def view(self, key: Key, load: Callable[[], pd.DataFrame], source: str) -> pd.DataFrame:
+        """A new copy-on-write view of the base for ``key``, loading the base once if needed."""
+        # Sessions loading the same dataset at once wait for a single load
+        base, _, joined = single_flight.do('load_dataset', key, lambda: self._base(key, load, source))
+        with self._lock:
+            base.views += 1
+            if joined:
+                base.hits += 1
+        with copy_on_write():
+            frame = base.frame.copy(deep=False)
+        view_id = id(frame)
+        with self._lock:
+            self._view_keys[view_id] = (weakref.ref(frame), key)
+        weakref.finalize(frame, self._release, key, view_id)
+        return frame
+
+    def _base(self, key: Key, load: Callable[[], pd.DataFrame], source: str) -> _Base:
+        with self._lock:
+            base = self._bases.get(key)
+            if base is not None:
+                base.hits += 1
+                return base
+        start = time.perf_counter()
+        frame, backing = self._back(key, load())
+        base = _Base(key, frame, source, backing, time.perf_counter() - start)
+        with self._lock:
+            self._bases[key] = base
+        return base
+
+    def key_of(self, frame: pd.DataFrame) -> Optional[Key]:
+        """The base key of an unmodified shared view (the same for every session), or None."""
+        with self._lock:
+            ref, key = self._view_keys.get(id(frame), (None, None))
+        return key if ref is not None and ref() is frame else None
+
+    def _release(self, key: Key, view_id: int):
+        with self._lock:
+            self._view_keys.pop(view_id, None)
+            base = self._bases.get(key)
+            if base is None:
+                return
+            base.views -= 1
+            if base.views <= 0:
+                del self._bases[key]
+
+    def _back(self, key: Key, frame: pd.DataFrame) -> Tuple[pd.DataFrame, str]:
+        if self.backing != 'arrow' or frame.memory_usage(index=True, deep=True).sum() < self.arrow_min_bytes:
+            return frame, 'memory'
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest()[:20] + ".arrow")
+        try:
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                feather.write_feather(frame, tmp_path, compression='uncompressed')
+                os.replace(tmp_path, path)
+            # split_blocks keeps primitive columns without nulls on the mapped pages (zero-copy)
+            return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True), 'arrow'
+        except Exception:
+            # Columns Arrow can't represent stay in memory
+            return frame, 'memory'
+
+    def describe(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [base.describe() for base in self._bases.values()]
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(base.memory_bytes for base in self._bases.values() if base.backing == 'memory')
+
+
+def file_key(path: str) -> Key:
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def shared_loader(key: Key, load: Callable[[], pd.DataFrame], source: str) -> Callable[[], pd.DataFrame]:
+    """Loader returning a view of the shared base for ``key`` (a plain ``load`` when sharing is off)."""
+    def load_view() -> pd.DataFrame:
+        if shared_datasets.enabled:
+            return shared_datasets.view(key, load, source)
+        # Concurrent loads still read once; each session gets its own copy-on-write frame
+        frame = single_flight.do('load_dataset', key, load)[0]
+        with copy_on_write():
+            return frame.copy(deep=False)
+    return load_view
+
+
+def shared_file_loader(path: str) -> Callable[[], pd.DataFrame]:
+    """Like ``file_loader``, but every session reading the same unchanged file shares one base frame."""
+    read = file_loader(path)
+    # The key is taken when the data is read, so edits between sessions are picked up
+    return lambda: shared_loader(file_key(path), read, path)()
+
+
+# Global instance
+shared_datasets = SharedDatasetCache.from_env()
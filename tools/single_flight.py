@@ -0,0 +1,95 @@
+"""
+Request coalescing (single flight)
+When several sessions ask for the same expensive work at the same moment
+(reading one file, profiling one dataset, rendering one plot), only the
+first call runs it. Identical calls that arrive while it is in flight wait
+for it and share its result or exception. Nothing is cached: once the call
+finishes, the next identical request runs again.
+"""
+
+import contextlib
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, Hashable, Iterator, List, Optional, Tuple
+
+from observability.metrics import metrics
+
+_tracked: ContextVar[Optional[List['Flight']]] = ContextVar('single_flight_tracked', default=None)
+
+
+class Flight:
+    """One in-flight computation and the calls sharing it."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.callers = 1
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+    @property
+    def coalesced(self) -> int:
+        """Calls that shared this computation besides the one that ran it (final once ``done`` is set)."""
+        return self.callers - 1
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time; concurrent callers of a key share it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[str, Hashable], Flight] = {}
+        self.coalesced_total = 0
+
+    def do(self, operation: str, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, Flight, bool]:
+        """
+        Run ``fn`` unless an identical (``operation``, ``key``) call is in
+        flight, in which case wait for that one. Returns the value, the
+        flight and whether this call joined another one.
+        """
+        full_key = (operation, key)
+        with self._lock:
+            flight = self._flights.get(full_key)
+            joined = flight is not None
+            if joined:
+                flight.callers += 1
+                self.coalesced_total += 1
+            else:
+                flight = self._flights[full_key] = Flight(operation)
+        if joined:
+            metrics.inc("tool_calls_coalesced_total", operation=operation)
+            flight.done.wait()
+        else:
+            try:
+                flight.value = fn()
+            except BaseException as e:
+                flight.error = e
+            finally:
+                # Later callers start a new flight; the caller count is final from here on
+                with self._lock:
+                    del self._flights[full_key]
+                flight.done.set()
+        tracked = _tracked.get()
+        if tracked is not None:
+            tracked.append(flight)
+        if flight.error is not None:
+            raise flight.error
+        return flight.value, flight, joined
+
+    @contextlib.contextmanager
+    def track(self) -> Iterator[List[Flight]]:
+        """Collect the flights of calls made in this context, for work that coalesces deep in a call stack."""
+        flights: List[Flight] = []
+        token = _tracked.set(flights)
+        try:
+            yield flights
+        finally:
+            _tracked.reset(token)
+
+    def in_flight(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'operation': f.operation, 'callers': f.callers} for f in self._flights.values()]
+
+
+# Global instance
+single_flight = SingleFlight()
@@ -0,0 +1,275 @@
+"""
+In-process SQL over session datasets
+Runs SQL with DuckDB, a multithreaded columnar engine. Loaded datasets are
+registered as views over the existing DataFrames (no copy); datasets that
+were registered lazily from Parquet/CSV/JSON files are queried straight from
+disk, so DuckDB pushes column projections and filters into the file scan.
+Datasets whose columns are filtered often (see ``tools.index_advisor``) can
+also be kept as DuckDB tables sorted by that column: min/max zone maps then
+let filters on it skip most row groups. Queries that mention the column read
+that table, in the dataset's original row order.
+Results are returned in bounded batches with a cursor for the rest.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.dataset_registry import DatasetRegistry
+from tools.sandbox import ExecutionLimits, ExecutionLimitExceeded
+
+# File extension -> DuckDB connection method used to scan it in place
+FILE_SCANS = {
+    '.parquet': 'read_parquet',
+    '.csv': 'read_csv',
+    '.tsv': 'read_csv',
+    '.json': 'read_json',
+}
+
+
+# Column added to sorted tables to restore the dataset's row order
+ROW_POSITION = "__row_position__"
+
+
+class SQLUnavailable(RuntimeError):
+    pass
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise SQLUnavailable("run_sql requires DuckDB. Install it with: pip install duckdb")
+    return duckdb
+
+
+def _quote(identifier: Any) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _rows_to_json(rows: List[tuple], columns: List[str]) -> List[list]:
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    return json.loads(frame.to_json(orient='split', index=False, date_format='iso', default_handler=str))['data']
+
+
+class SQLEngine:
+    """One DuckDB database per session; every query runs on its own cursor so it can be paged independently."""
+
+    def __init__(self, registry: DatasetRegistry, batch_rows: int = 200, max_batch_rows: int = 1000,
+                 max_open_cursors: int = 8, threads: Optional[int] = None):
+        self.registry = registry
+        self.batch_rows = batch_rows
+        self.max_batch_rows = max_batch_rows
+        self.max_open_cursors = max_open_cursors
+        self.threads = threads
+        self._connection = None
+        self._cursors: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sorted: Dict[str, Dict[str, Any]] = {}
+        self._counter = 0
+        self._tables = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, registry: DatasetRegistry) -> 'SQLEngine':
+        """Read AGENT_SQL_BATCH_ROWS and AGENT_SQL_THREADS (default: all cores)."""
+        threads = os.getenv("AGENT_SQL_THREADS")
+        return cls(registry, batch_rows=int(os.getenv("AGENT_SQL_BATCH_ROWS", "200")),
+                   threads=int(threads) if threads else None)
+
+    def _database(self):
+        if self._connection is None:
+            self._connection = _duckdb().connect(':memory:')
+            if self.threads:
+                self._connection.execute(f"SET threads TO {int(self.threads)}")
+        return self._connection
+
+    def sort_tables(self, wanted: Dict[str, Tuple[pd.DataFrame, str]]) -> List[Dict[str, Any]]:
+        """
+        Keep each wanted dataset (name -> (frame, column)) as a table sorted by
+        the column and drop the other sorted tables. Returns the tables built now.
+        """
+        for name, state in list(self._sorted.items()):
+            frame, column = wanted.get(name, (None, None))
+            if frame is not state['frame'] or column != state['column']:
+                self._drop_sorted(name)
+        built = []
+        for name, (frame, column) in wanted.items():
+            if name in self._sorted or ROW_POSITION in frame.columns:
+                continue
+            try:
+                built.append(self._build_sorted(name, frame, column))
+            except SQLUnavailable:
+                break
+            except Exception:
+                continue
+        return built
+
+    def _build_sorted(self, name: str, frame: pd.DataFrame, column: str) -> Dict[str, Any]:
+        self._tables += 1
+        table = f"__sorted_{self._tables}"
+        cursor = self._database().cursor()
+        try:
+            start = time.perf_counter()
+            cursor.register('__source', frame.assign(**{ROW_POSITION: np.arange(len(frame))}))
+            cursor.execute(f"CREATE TABLE {table} AS SELECT * FROM __source ORDER BY {_quote(column)}")
+            build_seconds = time.perf_counter() - start
+            self._sorted[name] = {'frame': frame, 'column': column, 'table': table}
+        finally:
+            cursor.close()
+        return {'dataset': name, 'column': column, 'structure': 'sql_sorted', 'built': 'sql_table',
+                'build_seconds': round(build_seconds, 4)}
+
+    def _drop_sorted(self, name: str):
+        state = self._sorted.pop(name)
+        # Open cursors keep what they already read
+        self._database().execute(f"DROP TABLE IF EXISTS {state['table']}")
+
+    def drop_stale_sorted(self):
+        """Drop the sorted tables of datasets that changed or went away; new ones wait for the next query."""
+        for name, state in list(self._sorted.items()):
+            entry = self.registry.entry(name) if name in self.registry else None
+            if entry is None or not entry.loaded or entry.frame is not state['frame']:
+                self._drop_sorted(name)
+
+    def sorted_for(self, query: str) -> List[Dict[str, Any]]:
+        """Sorted tables ``query`` reads instead of the DataFrames: those of current datasets whose column it mentions."""
+        used = []
+        for name, state in list(self._sorted.items()):
+            entry = self.registry.entry(name) if name in self.registry else None
+            if (entry is not None and entry.loaded and entry.frame is state['frame']
+                    and re.search(r'(?<!\w)' + re.escape(str(state['column'])) + r'(?!\w)', query)):
+                used.append({'dataset': name, 'sorted_by': state['column']})
+        return used
+
+    def describe_sorted(self) -> List[Dict[str, Any]]:
+        return [{'dataset': name, 'sorted_by': state['column']} for name, state in self._sorted.items()]
+
+    def _cursor(self, active_name: Optional[str], query: str = ''):
+        """A fresh cursor with every dataset visible by name (and the active one as ``df``)."""
+        cursor = self._database().cursor()
+        sorted_names = {used['dataset'] for used in self.sorted_for(query)}
+
+        def bind(alias: str, name: str):
+            if name in sorted_names:
+                table = self._sorted[name]['table']
+                cursor.execute(f"CREATE TEMP VIEW {_quote(alias)} AS SELECT * EXCLUDE ({_quote(ROW_POSITION)}) "
+                               f"FROM {table} ORDER BY {_quote(ROW_POSITION)}")
+            else:
+                cursor.register(alias, self.registry.get(name))
+
+        for name in self.registry.names():
+            entry = self.registry.entry(name)
+            if entry.loaded:
+                bind(name, name)
+            elif entry.source and os.path.splitext(entry.source)[1].lower() in FILE_SCANS:
+                scan = getattr(cursor, FILE_SCANS[os.path.splitext(entry.source)[1].lower()])
+                scan(entry.source).create_view(name)
+        if active_name is not None and 'df' not in self.registry:
+            bind('df', active_name)
+        return cursor
+
+    def _execute(self, cursor, query: str, limits: Optional[ExecutionLimits]):
+        """
+        Run ``query`` under the wall-time and memory limits; DuckDB is interrupted, not the thread.
+        The memory limit is a database-wide setting, so it only holds for this query.
+        """
+        limits = limits or ExecutionLimits(wall_time_seconds=None)
+        if limits.memory_mb:
+            cursor.execute(f"SET memory_limit = '{int(limits.memory_mb)}MB'")
+        timer = None
+        if limits.wall_time_seconds:
+            timer = threading.Timer(limits.wall_time_seconds, cursor.interrupt)
+            timer.daemon = True
+            timer.start()
+        start = time.perf_counter()
+        try:
+            cursor.execute(query)
+        except _duckdb().InterruptException:
+            raise ExecutionLimitExceeded('wall_time', limits.wall_time_seconds, None, time.perf_counter() - start)
+        except _duckdb().OutOfMemoryException:
+            raise ExecutionLimitExceeded('memory', limits.memory_mb, None, time.perf_counter() - start)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if limits.memory_mb:
+                cursor.execute("RESET memory_limit")
+
+    def to_frame(self, query: str, limits: Optional[ExecutionLimits] = None) -> pd.DataFrame:
+        """Run ``query`` and return the whole result as a DataFrame."""
+        cursor = self._cursor(self.registry.active_name, query)
+        try:
+            self._execute(cursor, query, limits)
+            return cursor.df()
+        finally:
+            cursor.close()
+
+    def query(self, query: str, rows: Optional[int] = None, limits: Optional[ExecutionLimits] = None) -> Dict[str, Any]:
+        """Run ``query`` and return its first batch; a 'cursor' is returned while rows remain."""
+        cursor = self._cursor(self.registry.active_name, query)
+        try:
+            self._execute(cursor, query, limits)
+        except BaseException:
+            cursor.close()
+            raise
+        if cursor.description is None:
+            cursor.close()
+            return {'success': True, 'columns': [], 'rows': [], 'cursor': None, 'exhausted': True}
+        with self._lock:
+            self._counter += 1
+            cursor_id = f"sql{self._counter}"
+            self._cursors[cursor_id] = {
+                'cursor': cursor,
+                'columns': [d[0] for d in cursor.description],
+                'types': [str(d[1]) for d in cursor.description],
+                'offset': 0,
+                'pending': [],
+            }
+            while len(self._cursors) > self.max_open_cursors:
+                _, stale = self._cursors.popitem(last=False)
+                stale['cursor'].close()
+        return self.fetch(cursor_id, rows)
+
+    def fetch(self, cursor_id: str, rows: Optional[int] = None) -> Dict[str, Any]:
+        """Next batch of an open result; the cursor is closed once exhausted."""
+        with self._lock:
+            state = self._cursors.get(cursor_id)
+            if state is None:
+                return {'success': False, 'message': f"Unknown or closed cursor '{cursor_id}'. Open: {list(self._cursors)}"}
+            self._cursors.move_to_end(cursor_id)
+        size = max(1, min(rows or self.batch_rows, self.max_batch_rows))
+        # Read one row ahead so the last batch is known to be the last
+        batch = state['pending'] + state['cursor'].fetchmany(size + 1 - len(state['pending']))
+        exhausted = len(batch) <= size
+        batch, state['pending'] = batch[:size], batch[size:]
+        result = {
+            'success': True,
+            'columns': state['columns'],
+            'types': state['types'],
+            'start': state['offset'],
+            'rows': _rows_to_json(batch, state['columns']),
+            'cursor': None if exhausted else cursor_id,
+            'exhausted': exhausted,
+        }
+        state['offset'] += len(batch)
+        if exhausted:
+            self.close(cursor_id)
+        return result
+
+    def close(self, cursor_id: str) -> bool:
+        with self._lock:
+            state = self._cursors.pop(cursor_id, None)
+        if state is None:
+            return False
+        state['cursor'].close()
+        return True
+
+    def close_all(self):
+        for cursor_id in list(self._cursors):
+            self.close(cursor_id)
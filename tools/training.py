@@ -0,0 +1,380 @@
+"""
+Parallel model training and cross-validation
+Runs every (hyperparameter candidate, fold) pair of a cross-validation as
+a separate task on a process pool sized from the available cores. The
+encoded training matrix, target and fold assignment are placed in shared
+memory once; workers attach to them instead of receiving pickled copies.
+Each task fits with ``n_jobs=1`` so the pool, not the estimator, owns the
+cores. The best candidate is then refitted on all rows, in this process,
+within what is left of the same time limit.
+"""
+
+import atexit
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_EXCEPTION
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.sandbox import ExecutionGuard, ExecutionLimits
+
+# Estimator names accepted by train_model: (classifier, regressor)
+ESTIMATORS = {
+    'random_forest': ('sklearn.ensemble.RandomForestClassifier', 'sklearn.ensemble.RandomForestRegressor'),
+    'gradient_boosting': ('sklearn.ensemble.HistGradientBoostingClassifier', 'sklearn.ensemble.HistGradientBoostingRegressor'),
+    'extra_trees': ('sklearn.ensemble.ExtraTreesClassifier', 'sklearn.ensemble.ExtraTreesRegressor'),
+    'decision_tree': ('sklearn.tree.DecisionTreeClassifier', 'sklearn.tree.DecisionTreeRegressor'),
+    'logistic_regression': ('sklearn.linear_model.LogisticRegression', None),
+    'linear_regression': (None, 'sklearn.linear_model.LinearRegression'),
+    'ridge': ('sklearn.linear_model.RidgeClassifier', 'sklearn.linear_model.Ridge'),
+    'knn': ('sklearn.neighbors.KNeighborsClassifier', 'sklearn.neighbors.KNeighborsRegressor'),
+}
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def estimator_class(path: str):
+    module, _, name = path.rpartition('.')
+    return getattr(importlib.import_module(module), name)
+
+
+def _make_estimator(path: str, params: Dict[str, Any], n_jobs: Optional[int]):
+    cls = estimator_class(path)
+    estimator = cls(**params)
+    if n_jobs is not None and 'n_jobs' in estimator.get_params() and 'n_jobs' not in params:
+        estimator.set_params(n_jobs=n_jobs)
+    return estimator
+
+
+class _SharedArray:
+    """A numpy array copied once into a named shared-memory block."""
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self.shape, self.dtype = array.shape, array.dtype.str
+        self.block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=self.block.buf)[...] = array
+
+    def spec(self) -> Tuple[str, Tuple[int, ...], str]:
+        return self.block.name, self.shape, self.dtype
+
+    def release(self):
+        self.block.close()
+        self.block.unlink()
+
+
+def _fit_and_score(task: Dict[str, Any], X: np.ndarray, y: np.ndarray, folds: np.ndarray) -> Dict[str, Any]:
+    from sklearn.metrics import get_scorer
+    test = folds == task['fold']
+    estimator = _make_estimator(task['estimator'], task['params'], n_jobs=1)
+    start = time.perf_counter()
+    estimator.fit(X[~test], y[~test])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    score = get_scorer(task['metric'])(estimator, X[test], y[test])
+    return {
+        'candidate': task['candidate'],
+        'fold': task['fold'],
+        'score': float(score),
+        'fit_seconds': round(fit_seconds, 3),
+        'score_seconds': round(time.perf_counter() - start, 3),
+        'train_rows': int((~test).sum()),
+        'test_rows': int(test.sum()),
+        'pid': os.getpid(),
+    }
+
+
+def _run_fold(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker: fit one candidate on all folds but one and score it on the held-out fold."""
+    specs = (task['X'], task['y'], task['folds'])
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        # The views must be gone before the blocks are closed, hence the separate function
+        return _fit_and_score(task, *(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+                                      for (_, shape, dtype), block in zip(specs, blocks)))
+    finally:
+        for block in blocks:
+            block.close()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _context():
+    """
+    Forking this (multi-threaded) process directly is unsafe, so workers are
+    forked from a forkserver that imported this module and its numeric
+    dependencies once; after the first pool every new worker starts in
+    milliseconds. The main module (the CLI or server, with its import-time
+    setup) is not preloaded.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__, 'numpy', 'pandas', 'sklearn.base', 'sklearn.metrics'])
+    return context
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide worker pool shared by every session, created once on first
+    use with AGENT_TRAIN_WORKERS (or every available core) workers. It is
+    never resized or shut down while in use; each call limits its own share.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=TrainingSettings.from_env().workers or available_cores(),
+                                        mp_context=_context())
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def infer_task(target: pd.Series) -> str:
+    if (target.dtype == object or isinstance(target.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(target)
+            or pd.api.types.is_string_dtype(target)):
+        return 'classification'
+    if pd.api.types.is_integer_dtype(target) and target.nunique() <= 20:
+        return 'classification'
+    return 'regression'
+
+
+def encode_features(frame: pd.DataFrame) -> pd.DataFrame:
+    """Numeric matrix: categorical and text columns are one-hot encoded, booleans become 0/1."""
+    categorical = [c for c in frame.columns if not pd.api.types.is_numeric_dtype(frame[c]) or pd.api.types.is_bool_dtype(frame[c])]
+    if categorical:
+        frame = pd.get_dummies(frame, columns=categorical, dtype=np.float64)
+    return frame.astype(np.float64)
+
+
+def fold_assignment(y: np.ndarray, folds: int, task: str, shuffle: bool = True, random_state: int = 0) -> np.ndarray:
+    from sklearn.model_selection import KFold, StratifiedKFold
+    if task == 'classification' and np.bincount(y).min() >= folds:
+        splitter = StratifiedKFold(folds, shuffle=shuffle, random_state=random_state if shuffle else None)
+    else:
+        splitter = KFold(folds, shuffle=shuffle, random_state=random_state if shuffle else None)
+    assignment = np.empty(len(y), dtype=np.int16)
+    for fold, (_, test) in enumerate(splitter.split(np.zeros(len(y)), y)):
+        assignment[test] = fold
+    return assignment
+
+
+def cross_validate(X: np.ndarray, y: np.ndarray, estimator_path: str, candidates: List[Dict[str, Any]],
+                   folds: int, metric: str, task: str, workers: int, shuffle: bool = True, random_state: int = 0,
+                   timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Score every candidate on every fold in parallel; returns one record per (candidate, fold)."""
+    assignment = fold_assignment(y, folds, task, shuffle, random_state)
+    shared = [_SharedArray(X), _SharedArray(y), _SharedArray(assignment)]
+    try:
+        base = {'X': shared[0].spec(), 'y': shared[1].spec(), 'folds': shared[2].spec(),
+                'estimator': estimator_path, 'metric': metric}
+        tasks = [dict(base, candidate=i, params=params, fold=fold)
+                 for i, params in enumerate(candidates) for fold in range(folds)]
+        if workers <= 1 and timeout is None:
+            return [_run_fold(task) for task in tasks]
+        return _run_limited(tasks, max(workers, 1), timeout)
+    finally:
+        for array in shared:
+            array.release()
+
+
+def _run_limited(tasks: List[Dict[str, Any]], workers: int, timeout: Optional[float]) -> List[Dict[str, Any]]:
+    """
+    Run ``tasks`` on the shared pool with at most ``workers`` of them in flight.
+    On a failure or once ``timeout`` passes, this call's queued tasks are
+    cancelled and nothing more is submitted; other calls' tasks are untouched.
+    Fits already running finish in the background and their results are dropped.
+    """
+    pool = get_pool()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    slots = threading.BoundedSemaphore(workers)
+    futures = []
+    try:
+        for task in tasks:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            if not slots.acquire(timeout=remaining):
+                raise FutureTimeout()
+            if any(future.done() and future.exception() is not None for future in futures):
+                slots.release()
+                break
+            future = pool.submit(_run_fold, task)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        done, pending = wait(futures, timeout=remaining, return_when=FIRST_EXCEPTION)
+        failed = [future for future in done if future.exception() is not None]
+        if failed:
+            raise failed[0].exception()
+        if pending:
+            raise FutureTimeout()
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def summarize(records: List[Dict[str, Any]], candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-candidate mean/std score and timing, best first."""
+    summary = []
+    for i, params in enumerate(candidates):
+        runs = sorted((r for r in records if r['candidate'] == i), key=lambda r: r['fold'])
+        scores = np.array([r['score'] for r in runs])
+        summary.append({
+            'params': params,
+            'mean_score': round(float(scores.mean()), 4),
+            'std_score': round(float(scores.std()), 4),
+            'mean_fit_seconds': round(float(np.mean([r['fit_seconds'] for r in runs])), 3),
+            'folds': [{k: r[k] for k in ('fold', 'score', 'fit_seconds', 'score_seconds', 'train_rows', 'test_rows')}
+                      for r in runs],
+        })
+    return sorted(summary, key=lambda s: s['mean_score'], reverse=True)
+
+
+def _cv_spec(cv) -> Dict[str, Any]:
+    spec = {'folds': 5, 'shuffle': True, 'random_state': 0}
+    if isinstance(cv, int):
+        spec['folds'] = cv
+    elif isinstance(cv, dict):
+        unknown = set(cv) - set(spec)
+        if unknown:
+            raise ValueError(f"Unknown cv options {sorted(unknown)}; use folds, shuffle, random_state")
+        spec.update(cv)
+    if spec['folds'] < 2:
+        raise ValueError("cv needs at least 2 folds")
+    return spec
+
+
+class TrainingSettings:
+    """Pool size and limits for train_model. ``workers=None`` uses every available core."""
+
+    def __init__(self, workers: Optional[int] = None, max_tasks: int = 500, inline_rows: int = 5000):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self.inline_rows = inline_rows
+
+    @classmethod
+    def from_env(cls) -> 'TrainingSettings':
+        """Read AGENT_TRAIN_WORKERS, AGENT_TRAIN_MAX_TASKS (default 500) and AGENT_TRAIN_INLINE_ROWS (default 5000)."""
+        workers = os.getenv("AGENT_TRAIN_WORKERS")
+        return cls(
+            workers=int(workers) if workers else None,
+            max_tasks=int(os.getenv("AGENT_TRAIN_MAX_TASKS", "500")),
+            inline_rows=int(os.getenv("AGENT_TRAIN_INLINE_ROWS", "5000")),
+        )
+
+    def pool_size(self, tasks: int, rows: int) -> int:
+        if rows < self.inline_rows:
+            return 1  # starting worker processes costs more than these folds
+        return max(1, min(tasks, self.workers or available_cores()))
+
+
+def train(frame: pd.DataFrame, target: str, features: Optional[List[str]] = None, estimator: str = 'random_forest',
+          cv=5, params: Optional[Dict[str, Any]] = None, param_grid: Optional[Dict[str, List[Any]]] = None,
+          metric: Optional[str] = None, settings: Optional[TrainingSettings] = None,
+          timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Any, pd.DataFrame]:
+    """
+    Cross-validate ``estimator`` (a name from ESTIMATORS) on ``frame`` and refit
+    the best candidate on all rows. Returns (result, fitted model, encoded X).
+    ``timeout`` bounds the folds (FutureTimeout) and the refit together
+    (ExecutionLimitExceeded).
+    """
+    from sklearn.metrics import get_scorer
+    from sklearn.model_selection import ParameterGrid
+
+    settings = settings or TrainingSettings()
+    if target not in frame.columns:
+        raise ValueError(f"Target column '{target}' not found")
+    features = list(features) if features else [c for c in frame.columns if c != target]
+    missing = [c for c in features if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Feature columns not found: {missing}")
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator '{estimator}'. Choose from: {', '.join(ESTIMATORS)}")
+
+    data = frame[features + [target]].dropna()
+    task = infer_task(data[target])
+    path = ESTIMATORS[estimator][0 if task == 'classification' else 1]
+    if path is None:
+        raise ValueError(f"'{estimator}' does not support {task}")
+    metric = metric or ('accuracy' if task == 'classification' else 'r2')
+    get_scorer(metric)  # raises ValueError for unknown metric names
+    spec = _cv_spec(cv)
+
+    candidates = [dict(params or {}, **grid) for grid in ParameterGrid(param_grid or {})]
+    tasks = len(candidates) * spec['folds']
+    if tasks > settings.max_tasks:
+        raise ValueError(f"{len(candidates)} candidates x {spec['folds']} folds = {tasks} fits exceeds the limit of "
+                         f"{settings.max_tasks}; narrow the param_grid")
+    for candidate in candidates:
+        _make_estimator(path, candidate, n_jobs=None)  # fail fast on invalid hyperparameters
+
+    X = encode_features(data[features])
+    if task == 'classification':
+        y, classes = pd.factorize(data[target], sort=True)
+        y = y.astype(np.int64)
+    else:
+        y, classes = data[target].to_numpy(dtype=np.float64), None
+    workers = settings.pool_size(tasks, len(X))
+
+    start = time.perf_counter()
+    records = cross_validate(X.to_numpy(), y, path, candidates, spec['folds'], metric, task, workers,
+                             spec['shuffle'], spec['random_state'], timeout=timeout)
+    cv_seconds = time.perf_counter() - start
+
+    ranking = summarize(records, candidates)
+    best = ranking[0]
+    start = time.perf_counter()
+    model = _make_estimator(path, best['params'], n_jobs=-1 if workers > 1 else None)
+    if timeout is None:
+        model.fit(X, data[target])
+    else:
+        remaining = timeout - cv_seconds
+        if remaining <= 0:
+            raise FutureTimeout()
+        with ExecutionGuard(ExecutionLimits(wall_time_seconds=remaining)):
+            model.fit(X, data[target])
+    refit_seconds = time.perf_counter() - start
+
+    result = {
+        'success': True,
+        'task': task,
+        'estimator': path.rsplit('.', 1)[-1],
+        'target': target,
+        'features': features,
+        'encoded_features': X.shape[1],
+        'rows': len(X),
+        'dropped_rows': len(frame) - len(X),
+        'classes': [str(c) for c in classes][:20] if classes is not None else None,
+        'metric': metric,
+        'best_params': best['params'],
+        'cv_score': best['mean_score'],
+        'cv_std': best['std_score'],
+        'folds': best['folds'],
+        'candidates': [{k: c[k] for k in ('params', 'mean_score', 'std_score', 'mean_fit_seconds')}
+                       for c in ranking[:5]] if len(ranking) > 1 else None,
+        'timing': {
+            'workers': workers,
+            'fits': len(records),
+            'cv_seconds': round(cv_seconds, 3),
+            'refit_seconds': round(refit_seconds, 3),
+            'sum_fit_seconds': round(sum(r['fit_seconds'] for r in records), 3),
+        },
+    }
+    return result, model, X
@@ -0,0 +1,223 @@
+"""
+Version history of session datasets
+Every change a snippet (or ``run_sql(into=...)``) makes to a dataset is
+recorded as a version whose parent is the state it replaced, so ``undo``
+and ``checkout`` can restore an earlier state without reloading the
+source. With copy-on-write pandas, keeping a reference to an old frame
+costs no copy. Recent versions stay in memory. Past the memory cap, the
+oldest are spilled to uncompressed Arrow IPC files and read back
+memory-mapped on demand. Past the disk cap (or ``max_versions``) the
+oldest are forgotten, except the first version of each dataset (its state
+as loaded), which ``reset_dataset`` restores. Each history spills to its own directory, removed
+when the session is closed, when the history is garbage collected or at
+interpreter exit.
+"""
+
+import os
+import re
+import shutil
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+
+from observability.metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # spill with pickle instead
+    pa = None
+
+
+def _frame_bytes(frame: pd.DataFrame) -> int:
+    # Shallow: a deep count scans every object value, and this runs on every change
+    return int(frame.memory_usage(index=True, deep=False).sum())
+
+
+class Version:
+    def __init__(self, version_id: int, name: str, frame: pd.DataFrame, description: str, parent: Optional[int]):
+        self.id = version_id
+        self.name = name
+        self.frame: Optional[pd.DataFrame] = frame
+        self.description = description
+        self.parent = parent
+        self.created_at = time.time()
+        self.shape = frame.shape
+        self.memory_bytes = _frame_bytes(frame)
+        self.path: Optional[str] = None
+        self.disk_bytes = 0
+
+    @property
+    def location(self) -> str:
+        return 'memory' if self.frame is not None else 'disk'
+
+    def describe(self, head: bool) -> Dict[str, Any]:
+        return {
+            'version': self.id,
+            'dataset': self.name,
+            'parent': self.parent,
+            'description': self.description,
+            'shape': list(self.shape),
+            'created_at': pd.Timestamp(self.created_at, unit='s').isoformat(timespec='seconds'),
+            'location': self.location,
+            'head': head,
+        }
+
+
+class VersionHistory:
+    """Bounded per-session version store with memory and disk caps."""
+
+    def __init__(self, session_id: str = "default", max_versions: int = 50, max_memory_mb: float = 512,
+                 max_disk_mb: float = 4096, spill_dir: str = ".dataset_versions"):
+        self.session_id = session_id
+        self.max_versions = max_versions
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        # Unique per history: sessions sharing an id must not remove each other's files
+        self.spill_dir = os.path.join(spill_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)}-{uuid.uuid4().hex[:8]}")
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        self._versions: "OrderedDict[int, Version]" = OrderedDict()
+        self._heads: Dict[str, int] = {}
+        self._counter = 0
+
+    @classmethod
+    def from_env(cls, session_id: str = "default") -> 'VersionHistory':
+        """Read AGENT_HISTORY_MAX_VERSIONS (50), AGENT_HISTORY_MEMORY_MB (512), AGENT_HISTORY_DISK_MB (4096) and AGENT_HISTORY_DIR."""
+        return cls(
+            session_id=session_id,
+            max_versions=int(os.getenv("AGENT_HISTORY_MAX_VERSIONS", "50")),
+            max_memory_mb=float(os.getenv("AGENT_HISTORY_MEMORY_MB", "512")),
+            max_disk_mb=float(os.getenv("AGENT_HISTORY_DISK_MB", "4096")),
+            spill_dir=os.getenv("AGENT_HISTORY_DIR", ".dataset_versions"),
+        )
+
+    def has(self, name: str) -> bool:
+        return name in self._heads
+
+    def head(self, name: str) -> Optional[Version]:
+        version_id = self._heads.get(name)
+        return self._versions.get(version_id) if version_id is not None else None
+
+    def record(self, name: str, frame: pd.DataFrame, description: str) -> Version:
+        """Add ``frame`` as the new head of ``name``; its parent is the previous head."""
+        self._counter += 1
+        version = Version(self._counter, name, frame, description, self._heads.get(name))
+        self._versions[version.id] = version
+        self._heads[name] = version.id
+        self._enforce_limits()
+        return version
+
+    def get(self, version_id: int) -> Version:
+        version = self._versions.get(version_id)
+        if version is None:
+            raise KeyError(f"Version {version_id} does not exist or was discarded. "
+                           f"Available: {list(self._versions)}")
+        return version
+
+    def checkout(self, version_id: int) -> Version:
+        """Make a version the head of its dataset; returns it with its frame loaded."""
+        version = self.get(version_id)
+        self.load(version)
+        self._heads[version.name] = version.id
+        self._enforce_limits()
+        return version
+
+    def undo(self, name: str) -> Version:
+        head = self.head(name)
+        if head is None:
+            raise KeyError(f"No recorded changes for dataset '{name}'")
+        if head.parent is None:
+            raise KeyError(f"Dataset '{name}' is already at its oldest recorded version ({head.id})")
+        return self.checkout(head.parent)
+
+    def forget(self, name: str):
+        """Discard every version of ``name`` (it was reloaded from its source or dropped)."""
+        self._heads.pop(name, None)
+        for version in [v for v in self._versions.values() if v.name == name]:
+            self._discard(version)
+
+    def close(self):
+        """Forget every version and remove the spill directory (the session is gone)."""
+        self._versions.clear()
+        self._heads.clear()
+        self._cleanup()
+
+    def root(self, name: str) -> Optional[Version]:
+        """The oldest recorded ancestor of the head of ``name``."""
+        version = self.head(name)
+        while version is not None and version.parent is not None:
+            version = self._versions[version.parent]
+        return version
+
+    def load(self, version: Version) -> pd.DataFrame:
+        if version.frame is None:
+            if pa is not None and version.path.endswith('.arrow'):
+                # Memory-mapped; split blocks let numeric columns without nulls stay views of the
+                # mapped pages, and self-destruct frees each Arrow column once it is converted
+                version.frame = feather.read_table(version.path, memory_map=True).to_pandas(
+                    split_blocks=True, self_destruct=True)
+            else:
+                version.frame = pd.read_pickle(version.path)
+        return version.frame
+
+    def describe(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        heads = set(self._heads.values())
+        return [v.describe(v.id in heads) for v in self._versions.values() if name is None or v.name == name]
+
+    def memory_bytes(self) -> int:
+        """Memory held only by history (heads are the live datasets and cost nothing extra)."""
+        heads = set(self._heads.values())
+        return sum(v.memory_bytes for v in self._versions.values() if v.frame is not None and v.id not in heads)
+
+    def disk_bytes(self) -> int:
+        return sum(v.disk_bytes for v in self._versions.values() if v.path is not None)
+
+    def _spill(self, version: Version):
+        if version.path is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            base = os.path.join(self.spill_dir, f"v{version.id}")
+            try:
+                if pa is None:
+                    raise ImportError("pyarrow")
+                version.path = base + '.arrow'
+                feather.write_feather(version.frame, version.path, compression='uncompressed')
+            except Exception:
+                # Columns Arrow can't represent (mixed objects) fall back to pickle
+                version.path = base + '.pkl'
+                version.frame.to_pickle(version.path)
+            version.disk_bytes = os.path.getsize(version.path)
+        version.frame = None
+        metrics.inc("dataset_history_spills_total")
+
+    def _discard(self, version: Version):
+        del self._versions[version.id]
+        if version.path and os.path.exists(version.path):
+            os.remove(version.path)
+        # Children now start from the discarded version's parent
+        for other in self._versions.values():
+            if other.parent == version.id:
+                other.parent = version.parent
+
+    def _enforce_limits(self):
+        heads = set(self._heads.values())
+        candidates = [v for v in self._versions.values() if v.id not in heads]  # oldest first
+        # Roots (the states as loaded) may be spilled but are never forgotten
+        discardable = [v for v in candidates if v.parent is not None]
+        while len(self._versions) > self.max_versions and discardable:
+            self._discard(discardable.pop(0))
+        for version in candidates:
+            if version.id not in self._versions:
+                continue
+            if self.memory_bytes() <= self.max_memory_bytes:
+                break
+            if version.frame is not None:
+                self._spill(version)
+        for version in [v for v in discardable if v.id in self._versions]:
+            if self.disk_bytes() <= self.max_disk_bytes:
+                break
+            if version.path is not None:
+                self._discard(version)